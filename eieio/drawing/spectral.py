@@ -11,6 +11,8 @@ import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 
+from eieio.measurement.resampling import bucket_by_sampling, common_shape, resample, shape_wavelengths
+
 __author__ = 'Joseph Goldstone'
 __copyright__ = 'Copyright (C) 2020 Lilliputian Pictures LLC'
 __license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
@@ -34,8 +36,9 @@ def plot_distributions_by_wavelength(sds, **kwargs):
 
     Parameters
     ----------
-    sds : array-like
-        sequence of SpectralDistribution objects
+    sds : dict
+        SpectralDistribution objects keyed by name; those with different shapes are
+        resampled to a shape covering all of them
     kwargs
 
     Returns
@@ -44,20 +47,15 @@ def plot_distributions_by_wavelength(sds, **kwargs):
     """
     if not sds:
         return
-    shape = None
-    wavelengths = None
-    for sd in sds.values():
-        if not shape:
-            shape = sd.shape
-        elif sd.shape != shape:
-            raise RuntimeError("NYI: different shapes")
-        if not wavelengths:
-            wavelengths = [wavelength for wavelength in sd.wavelengths]
-    n_sds = len(sds)
-    n_wavelengths = len(wavelengths)
-    values = np.zeros((n_wavelengths, n_sds))
-    for i, sd in enumerate(sds.values()):
-        values[:, i] = sd.values
+    distributions = list(sds.values())
+    buckets = bucket_by_sampling(distributions)
+    # spectra of different shapes are resampled to one covering all of them; where a
+    # spectrum has no data, NaN leaves a gap in its trace rather than a made-up value
+    wavelengths = shape_wavelengths(common_shape(wavelengths for wavelengths, _ in buckets.values()))
+    values = np.zeros((len(wavelengths), len(distributions)))
+    for bucket_wavelengths, indices in buckets.values():
+        bucket_values = np.stack([distributions[i].values for i in indices])
+        values[:, indices] = resample(bucket_wavelengths, bucket_values, wavelengths, fill=np.nan).T
     indices = [f"{round(wavelength)}nm" for wavelength in wavelengths]
     columns = [key for key in sds.keys()]
     df = pd.DataFrame(values, columns=columns, index=indices)
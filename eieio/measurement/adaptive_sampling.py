@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive sampling - characterize a display with as few patches as its behavior allows
+================================
+
+Rather than measuring a dense fixed lattice, :class:`AdaptiveRefinement` measures a
+coarse lattice of device RGB values, fits a :class:`DisplayModel` (a tone curve per
+channel and a matrix from linearized RGB to XYZ, plus a black offset) and then
+refines, octree fashion, only those cells of the lattice where the model and the
+measurements disagree.
+
+The final predictor is the model corrected by interpolating its residuals, so a cell
+is well described if its residuals are nearly the same at all its corners, whether
+they are small (the model fits there) or not (interpolation takes up the slack). A
+cell's error is therefore predicted, before spending any measurements on it, as the
+largest CIELAB ΔE*ab at its center between the model corrected by one corner's
+residual and the model corrected by the mean residual of all eight. Cells whose
+predicted error exceeds a threshold are split into eight, largest error first, and the
+(at most nineteen) new lattice points measured. Refinement stops when no
+cell's predicted error exceeds the threshold, when the cells have reached the finest
+allowed size, or when the patch budget would be exceeded.
+
+The resulting :class:`AdaptiveCharacterization` predicts XYZ for any device RGB from
+the model, corrected by tetrahedral (Delaunay) interpolation of the model's residuals
+at the measured points.
+
+Measuring is delegated to a callable, so the driver is independent of meters and
+targets; :class:`eieio.measurement.cli_tools.measure.Measurer` supplies one that shows
+and measures a patch.
+"""
+
+from collections import namedtuple
+from itertools import product
+
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+
+from colour.models import XYZ_to_Lab, XYZ_to_xy
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'DisplayModel', 'AdaptiveRefinement', 'AdaptiveCharacterization', 'delta_E_ab',
+    'DEFAULT_COARSE_SIZE', 'DEFAULT_THRESHOLD', 'DEFAULT_MAX_DEPTH'
+]
+
+DEFAULT_COARSE_SIZE = 3
+DEFAULT_THRESHOLD = 1.0
+DEFAULT_MAX_DEPTH = 3
+
+Cell = namedtuple('Cell', ['origin', 'edge'])
+Cell.__doc__ = """
+An axis-aligned cube of the integer lattice: its lowest corner and its edge length
+"""
+
+
+def delta_E_ab(XYZ_a, XYZ_b, XYZ_white):
+    """
+    Return the CIELAB ΔE*ab between two sets of absolute XYZ values, relative to a white
+
+    Parameters
+    ----------
+    XYZ_a, XYZ_b : array_like
+        N×3 (or 3) absolute XYZ values
+    XYZ_white : array_like
+        absolute XYZ of the display white, setting the adaptation and normalization
+
+    Returns
+    -------
+    ndarray
+        the N (or scalar) color differences
+    """
+    XYZ_white = np.asarray(XYZ_white, dtype=np.float64)
+    xy_white = XYZ_to_xy(XYZ_white)
+    Lab_a = XYZ_to_Lab(np.asarray(XYZ_a, dtype=np.float64) / XYZ_white[1], xy_white)
+    Lab_b = XYZ_to_Lab(np.asarray(XYZ_b, dtype=np.float64) / XYZ_white[1], xy_white)
+    return np.linalg.norm(Lab_a - Lab_b, axis=-1)
+
+
+def _fit_exponent(levels, curve):
+    """
+    Fit, in the log domain, the exponent of the power law through (1, 1) best matching a
+    normalized tone curve; 1 if there are no intermediate levels to fit to
+    """
+    usable = (levels > 0) & (levels < 1) & (curve > 0)
+    if not usable.any():
+        return 1.0
+    log_levels = np.log(levels[usable])
+    return float(np.clip(log_levels @ np.log(curve[usable]) / (log_levels @ log_levels), 0.1, 10.0))
+
+
+class DisplayModel(object):
+    """
+    An additive display model: per-channel tone curves, a primary matrix and a black offset
+
+    XYZ = black + matrix · (curve_r(r), curve_g(g), curve_b(b)), with each curve a
+    power law fitted to the levels at which that channel was measured alone, times a
+    piecewise-linear correction passing exactly through those levels. A channel
+    measured at only a few levels is thus still described well between them.
+
+    Parameters
+    ----------
+    levels : sequence
+        for each channel, the increasing device levels at which its curve is known
+    curves : sequence
+        for each channel, the ratio of the linearized value to the power law at those levels
+    matrix : array_like
+        3×3 matrix whose columns are the XYZ of the full primaries, less black
+    black : array_like
+        XYZ of device black
+    exponents : sequence, optional
+        each channel's power law exponent; by default, 1
+    """
+    def __init__(self, levels, curves, matrix, black, exponents=(1.0, 1.0, 1.0)):
+        self.levels = [np.asarray(levels_, dtype=np.float64) for levels_ in levels]
+        self.curves = [np.asarray(curve, dtype=np.float64) for curve in curves]
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.black = np.asarray(black, dtype=np.float64)
+        self.exponents = [float(exponent) for exponent in exponents]
+
+    @classmethod
+    def fit(cls, rgb, XYZ):
+        """
+        Fit a model to measurements that include, for each channel, that channel alone at
+        its maximum level (and ideally at some levels in between)
+
+        Parameters
+        ----------
+        rgb : array_like
+            N×3 device values
+        XYZ : array_like
+            N×3 measured XYZ
+
+        Returns
+        -------
+        DisplayModel
+        """
+        rgb = np.asarray(rgb, dtype=np.float64)
+        XYZ = np.asarray(XYZ, dtype=np.float64)
+        is_black = ~rgb.any(axis=1)
+        black = XYZ[is_black].mean(axis=0) if is_black.any() else np.zeros(3)
+        levels = []
+        curves = []
+        exponents = []
+        columns = []
+        for channel in range(3):
+            others = [c for c in range(3) if c != channel]
+            alone = ~rgb[:, others].any(axis=1) & (rgb[:, channel] > 0)
+            if not alone.any():
+                raise ValueError(f"can't fit a display model without measurements of channel {channel} alone")
+            channel_levels, inverse = np.unique(rgb[alone, channel], return_inverse=True)
+            channel_XYZ = np.zeros((len(channel_levels), 3))
+            np.add.at(channel_XYZ, inverse, XYZ[alone] - black)
+            channel_XYZ /= np.bincount(inverse)[:, np.newaxis]
+            column = channel_XYZ[-1]
+            if not column.any():
+                raise ValueError(f"channel {channel} at its highest measured level is indistinguishable from black")
+            # project each level onto the full primary, and keep the curve non-decreasing
+            curve = np.maximum.accumulate(np.clip(channel_XYZ @ column / (column @ column), 0, None))
+            curve /= curve[-1]
+            channel_levels = channel_levels / channel_levels[-1]
+            exponents.append(_fit_exponent(channel_levels, curve))
+            levels.append(np.concatenate(([0.0], channel_levels)))
+            # what is left once the power law is divided out, 1 at the top level
+            ratios = curve / channel_levels ** exponents[-1]
+            curves.append(np.concatenate((ratios[:1], ratios)))
+            columns.append(column)
+        return cls(levels, curves, np.column_stack(columns), black, exponents)
+
+    def linearize(self, rgb):
+        """Return the linearized values for N×3 (or 3) device values"""
+        rgb = np.asarray(rgb, dtype=np.float64)
+        return np.stack([np.clip(rgb[..., c], 0, None) ** self.exponents[c]
+                         * np.interp(rgb[..., c], self.levels[c], self.curves[c]) for c in range(3)], axis=-1)
+
+    def predict(self, rgb):
+        """Return the predicted XYZ for N×3 (or 3) device values"""
+        return self.black + self.linearize(rgb) @ self.matrix.T
+
+
+class AdaptiveCharacterization(object):
+    """
+    The outcome of an adaptive characterization: what was measured, and a predictor
+
+    Attributes
+    ----------
+    rgb : ndarray
+        N×3 device values measured, in the order they were measured
+    XYZ : ndarray
+        N×3 XYZ measured
+    model : DisplayModel
+        model fitted to all the measurements
+    residuals : ndarray
+        ΔE*ab between the model and each measurement
+    cells : list
+        the leaf cells of the final lattice, as (lowest corner, highest corner) device value pairs
+    converged : bool
+        True if refinement stopped because no cell's predicted error exceeded the threshold
+        (or every such cell was as small as allowed), False if it ran out of budget
+    """
+    def __init__(self, rgb, XYZ, model, cells, converged):
+        self.rgb = np.asarray(rgb, dtype=np.float64)
+        self.XYZ = np.asarray(XYZ, dtype=np.float64)
+        self.model = model
+        self.cells = cells
+        self.converged = converged
+        self.white = model.predict(np.ones(3))
+        self.residuals = delta_E_ab(model.predict(self.rgb), self.XYZ, self.white)
+        self._correction = LinearNDInterpolator(self.rgb, self.XYZ - model.predict(self.rgb), fill_value=0.0)
+
+    @property
+    def number_of_patches(self):
+        return len(self.rgb)
+
+    def predict(self, rgb):
+        """
+        Return predicted XYZ for N×3 (or 3) device values: the model's prediction,
+        corrected by tetrahedral interpolation of its residuals at the measured points
+        """
+        rgb = np.asarray(rgb, dtype=np.float64)
+        return self.model.predict(rgb) + self._correction(rgb.reshape(-1, 3)).reshape(rgb.shape)
+
+    def delta_E(self, rgb, XYZ):
+        """Return the ΔE*ab between predictions for device values and their actual XYZ"""
+        return delta_E_ab(self.predict(rgb), XYZ, self.white)
+
+
+class AdaptiveRefinement(object):
+    """
+    Drives an adaptive characterization by calling a measuring function
+
+    Parameters
+    ----------
+    measure : callable
+        called with a list of three device values in [0, 1], returns the XYZ measured
+        for that patch; each distinct patch is measured once
+    coarse_size : int, optional
+        number of levels per channel in the initial lattice (at least two)
+    threshold : float, optional
+        predicted ΔE*ab above which a cell is refined
+    budget : int, optional
+        maximum number of patches to measure, coarse lattice included
+    max_depth : int, optional
+        how many times a coarse cell may be split in half
+    """
+    def __init__(self, measure, coarse_size=DEFAULT_COARSE_SIZE, threshold=DEFAULT_THRESHOLD, budget=None,
+                 max_depth=DEFAULT_MAX_DEPTH):
+        if coarse_size < 2:
+            raise ValueError(f"the coarse lattice needs at least two levels per channel, not `{coarse_size}'")
+        if budget is not None and budget < coarse_size ** 3:
+            raise ValueError(f"a budget of {budget} patches can't cover the {coarse_size ** 3}-patch coarse lattice")
+        self.measure = measure
+        self.coarse_size = coarse_size
+        self.threshold = threshold
+        self.budget = budget
+        self.max_depth = max_depth
+        # lattice coordinates are integers; device values are those divided by the scale
+        self._scale = (coarse_size - 1) * 2 ** max_depth
+        self._measured = {}
+
+    def _rgb(self, point):
+        return [coordinate / self._scale for coordinate in point]
+
+    def _measure_points(self, points):
+        for point in points:
+            if point not in self._measured:
+                self._measured[point] = np.asarray(self.measure(self._rgb(point)), dtype=np.float64)
+
+    @staticmethod
+    def _cell_points(cell, steps):
+        step = cell.edge // steps
+        return [tuple(o + i * step for o, i in zip(cell.origin, offsets))
+                for offsets in product(range(steps + 1), repeat=3)]
+
+    def _unmeasured(self, cell):
+        return [point for point in self._cell_points(cell, 2) if point not in self._measured]
+
+    def _predicted_errors(self, cells, model):
+        if not cells:
+            return np.zeros(0)
+        corners = [self._cell_points(cell, 1) for cell in cells]
+        measured = np.array([[self._measured[point] for point in cell_corners] for cell_corners in corners])
+        residuals = measured - model.predict(np.array(corners, dtype=np.float64) / self._scale)
+        centers = model.predict(np.array([[o + cell.edge / 2 for o in cell.origin] for cell in cells]) / self._scale)
+        centers = centers[:, np.newaxis, :]
+        errors = delta_E_ab(centers + residuals, centers + residuals.mean(axis=1, keepdims=True),
+                            model.predict(np.ones(3)))
+        return errors.max(axis=1)
+
+    def _model(self):
+        points = list(self._measured)
+        return DisplayModel.fit(np.array([self._rgb(point) for point in points]),
+                                np.array([self._measured[point] for point in points]))
+
+    def run(self):
+        """
+        Measure the coarse lattice, then refine until convergence or the budget runs out
+
+        Returns
+        -------
+        AdaptiveCharacterization
+        """
+        coarse_edge = 2 ** self.max_depth
+        coarse_cells = [Cell(tuple(i * coarse_edge for i in index), coarse_edge)
+                         for index in product(range(self.coarse_size - 1), repeat=3)]
+        self._measure_points(self._cell_points(Cell((0, 0, 0), self._scale), self.coarse_size - 1))
+        leaves = list(coarse_cells)
+        converged = True
+        while True:
+            model = self._model()
+            errors = self._predicted_errors(leaves, model)
+            candidates = [i for i in np.argsort(-errors)
+                          if errors[i] > self.threshold and leaves[i].edge > 1]
+            if not candidates:
+                break
+            remaining = None if self.budget is None else self.budget - len(self._measured)
+            affordable = [i for i in candidates if remaining is None or len(self._unmeasured(leaves[i])) <= remaining]
+            if not affordable:
+                converged = False
+                break
+            cell = leaves.pop(affordable[0])
+            self._measure_points(self._cell_points(cell, 2))
+            half = cell.edge // 2
+            leaves.extend(Cell(tuple(o + i * half for o, i in zip(cell.origin, offsets)), half)
+                          for offsets in product(range(2), repeat=3))
+        points = list(self._measured)
+        cells = [(self._rgb(cell.origin), self._rgb([o + cell.edge for o in cell.origin])) for cell in leaves]
+        return AdaptiveCharacterization([self._rgb(point) for point in points],
+                                        [self._measured[point] for point in points], self._model(), cells, converged)
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+Batch spectral-to-colorimetry engine
+================================
+
+Computes tristimulus colorimetry for many spectral measurements at once. Measurements
+sharing a wavelength sampling are stacked into an N×W matrix, and each observer's
+colour matching functions, resampled to that sampling and pre-multiplied by the
+wavelength increments, become a W×3 weighting matrix; one matrix multiply per
+(sampling, observer) pair then yields CIE XYZ for the whole batch, and the other
+colour spaces are vectorized conversions of that, done by
+:mod:`eieio.measurement.colorimetry_conversion`.
+
+Measurements are treated as emissive (radiance or irradiance in SI units), so XYZ is
+absolute, with Y in cd/m² (or lux), as meters report it.
+
+:func:`resolve_colorimetry` fills in missing colorimetry from whatever each measurement
+already holds, converting between color spaces where the observer matches and falling
+back to the spectrum only where it doesn't.
+
+Weighting matrices are cached for the life of the process.
+"""
+
+from collections import OrderedDict
+from threading import RLock
+
+import numpy as np
+
+from colour.colorimetry import reshape_msds
+from colour.colorimetry.datasets.cmfs import MSDS_CMFS_STANDARD_OBSERVER
+
+from eieio.measurement.canonical_names import canonical_color_space, canonical_illuminant, canonical_observer
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.colorimetry_conversion import (CONVERTIBLE_COLOR_SPACES, DEFAULT_WHITE_LUMINANCE,
+                                                      conversion_source, convert, white_point_XYZ)
+from eieio.measurement.resampling import (DEFAULT_METHOD, bucket_by_sampling, regular_shape, resample,
+                                            shape_wavelengths)
+from utilities.english import oxford_join
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'K_M', 'DEFAULT_WHITE_LUMINANCE', 'SUPPORTED_COLOR_SPACES',
+    'spectral_weights', 'white_point_XYZ', 'spectra_to_XYZ', 'spectra_to_colorimetry',
+    'derive_colorimetry', 'has_spectral_data', 'resolved_values', 'resolve_colorimetry'
+]
+
+K_M = 683.0  # lm/W, maximum luminous efficacy of photopic vision
+
+SUPPORTED_COLOR_SPACES = CONVERTIBLE_COLOR_SPACES
+
+_CACHE_LOCK = RLock()
+_SPECTRAL_WEIGHTS = {}
+
+
+def spectral_weights(observer, wavelengths):
+    """
+    Return the matrix that takes spectra sampled at the given wavelengths to absolute XYZ
+
+    Parameters
+    ----------
+    observer : str
+        canonical observer name, a key of MSDS_CMFS_STANDARD_OBSERVER
+    wavelengths : array_like
+        wavelengths at which the spectra to be weighted are sampled, in nm
+
+    Returns
+    -------
+    ndarray
+        W×3 matrix of colour matching functions at those wavelengths, multiplied by
+        the wavelength increments and by K_M
+    """
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    key = (observer, wavelengths.tobytes())
+    with _CACHE_LOCK:
+        weights = _SPECTRAL_WEIGHTS.get(key)
+        if weights is not None:
+            return weights
+    cmfs = MSDS_CMFS_STANDARD_OBSERVER[observer]
+    shape = regular_shape(wavelengths)
+    if shape is not None:
+        cmf_values = reshape_msds(cmfs, shape).values
+        increments = np.full(len(wavelengths), shape.interval)
+    else:
+        cmf_values = cmfs[wavelengths]
+        increments = np.gradient(wavelengths) if len(wavelengths) > 1 else np.ones(1)
+    weights = K_M * cmf_values * increments[:, np.newaxis]
+    weights.setflags(write=False)
+    with _CACHE_LOCK:
+        _SPECTRAL_WEIGHTS[key] = weights
+    return weights
+
+
+def _canonical_target(target):
+    observer, color_space, illuminant = target
+    target = (canonical_observer(observer), canonical_color_space(color_space), canonical_illuminant(illuminant))
+    if target[1] not in CONVERTIBLE_COLOR_SPACES:
+        raise ValueError(f"cannot derive `{target[1]}' colorimetry from spectra; supported color spaces "
+                         f"are {oxford_join(SUPPORTED_COLOR_SPACES, 'and')}")
+    return target
+
+
+def spectra_to_XYZ(wavelengths, values, observer):
+    """
+    Compute absolute XYZ for a batch of spectra sharing a wavelength sampling
+
+    Parameters
+    ----------
+    wavelengths : array_like
+        the W wavelengths, in nm, at which every spectrum is sampled
+    values : array_like
+        N×W matrix of spectral radiance (or irradiance), one spectrum per row
+    observer : str
+        canonical observer name
+
+    Returns
+    -------
+    ndarray
+        N×3 matrix of XYZ values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return values @ spectral_weights(observer, wavelengths)
+
+
+def spectra_to_colorimetry(wavelengths, values, targets, white_luminance=DEFAULT_WHITE_LUMINANCE):
+    """
+    Compute colorimetry for a batch of spectra sharing a wavelength sampling
+
+    Parameters
+    ----------
+    wavelengths : array_like
+        the W wavelengths, in nm, at which every spectrum is sampled
+    values : array_like
+        N×W matrix of spectral radiance (or irradiance), one spectrum per row
+    targets : sequence
+        (observer, color space, illuminant) triplets; names are canonicalized by
+        :mod:`eieio.measurement.canonical_names`
+    white_luminance : float
+        luminance of the reference white for colour spaces defined relative to one
+
+    Returns
+    -------
+    OrderedDict
+        maps each canonicalized (observer, color space, illuminant) triplet to an N×3 matrix
+    """
+    canonical_targets = [_canonical_target(target) for target in targets]
+    XYZ_by_observer = {}
+    results = OrderedDict()
+    for target in canonical_targets:
+        observer, _, illuminant = target
+        XYZ = XYZ_by_observer.get(observer)
+        if XYZ is None:
+            XYZ = spectra_to_XYZ(wavelengths, values, observer)
+            XYZ_by_observer[observer] = XYZ
+        results[target] = convert(XYZ, (observer, 'CIE XYZ', illuminant), target, white_luminance)
+    return results
+
+
+def _measurements(measurements_or_group):
+    collections = getattr(measurements_or_group, 'collections', None)
+    if collections is None:
+        return list(measurements_or_group)
+    return [m for measurements in collections.values() for m in measurements.values()]
+
+
+def derive_colorimetry(measurements_or_group, targets, replace_ok=True,
+                       white_luminance=DEFAULT_WHITE_LUMINANCE, shape=None, method=DEFAULT_METHOD):
+    """
+    Compute colorimetry from the spectra of many measurements and insert it into them
+
+    Measurements are bucketed by wavelength sampling and each bucket is computed as a
+    batch. A Group holds its own copies of its measurements (see
+    :class:`eieio.measurement.measurement_cache.MeasurementCache`), so colorimetry
+    inserted into a Group's measurements changes neither the cache nor any other group
+    holding the same file.
+
+    Parameters
+    ----------
+    measurements_or_group : Group or iterable of Measurement
+    targets : sequence
+        (observer, color space, illuminant) triplets
+    replace_ok : bool
+        if false, raise ValueError rather than replace colorimetry already present for
+        a target (whatever its origin)
+    white_luminance : float
+        luminance of the reference white for colour spaces defined relative to one
+    shape : SpectralShape or tuple, optional
+        if given, spectra are first resampled to this sampling (see
+        :mod:`eieio.measurement.resampling`), so that all of them are integrated as one
+        batch, and against the same colour matching function samples
+    method : str
+        interpolation method for that resampling
+
+    Returns
+    -------
+    int
+        the number of Colorimetry objects inserted
+    """
+    measurements = _measurements(measurements_or_group)
+    inserted = 0
+    for wavelengths, indices in bucket_by_sampling(measurements).values():
+        values = np.stack([np.asarray(measurements[i].values, dtype=np.float64) for i in indices])
+        if shape is not None:
+            values = resample(wavelengths, values, shape, method)
+            wavelengths = shape_wavelengths(shape)
+        results = spectra_to_colorimetry(wavelengths, values, targets, white_luminance)
+        for (observer, color_space, illuminant), matrix in results.items():
+            for m, row in zip((measurements[i] for i in indices), matrix.tolist()):
+                m.insert_colorimetry(Colorimetry(observer, color_space, illuminant, row, 'derived'),
+                                     replace_ok=replace_ok)
+                inserted += 1
+    return inserted
+
+
+def has_spectral_data(measurement):
+    """
+    Report whether a measurement carries a real spectrum, as opposed to the flat
+    placeholder written for colorimetry-only measurements because TM-27-14 requires one
+    """
+    values = measurement.values
+    return values is not None and len(values) > 2 and np.ptp(values) > 0
+
+
+def resolved_values(measurements, target, white_luminance=DEFAULT_WHITE_LUMINANCE):
+    """
+    Compute values for one target from the colorimetry or spectra measurements already hold
+
+    Measurements with colorimetry for the target's observer are converted from the
+    cheapest such colorimetry, in one vectorized conversion per distinct source;
+    the rest are computed from their spectra.
+
+    Parameters
+    ----------
+    measurements : sequence of Measurement
+    target : tuple
+        (observer, color space, illuminant)
+    white_luminance : float
+        luminance of the reference white for colour spaces defined relative to one
+
+    Returns
+    -------
+    tuple
+        the canonicalized target, and an N×3 array of values in measurement order
+
+    Raises
+    ------
+    ValueError
+        if a measurement has neither colorimetry for the target's observer nor a spectrum
+    """
+    target = _canonical_target(target)
+    results = np.empty((len(measurements), 3))
+    by_source = OrderedDict()
+    spectral = []
+    for i, m in enumerate(measurements):
+        source = conversion_source(m.colorimetry, target)
+        if source is not None:
+            by_source.setdefault(source[1], []).append(i)
+        elif has_spectral_data(m):
+            spectral.append(i)
+        else:
+            raise ValueError(f"cannot derive `{target[1]}' colorimetry for observer `{target[0]}' "
+                             f"from measurement `{m.path}': it has no colorimetry for that observer "
+                             "and no spectral data")
+    for source, indices in by_source.items():
+        values = [measurements[i].colorimetry[source].values for i in indices]
+        results[indices] = convert(values, source, target, white_luminance)
+    for wavelengths, indices in bucket_by_sampling(measurements, spectral).values():
+        values = np.stack([np.asarray(measurements[i].values, dtype=np.float64) for i in indices])
+        results[indices] = spectra_to_colorimetry(wavelengths, values, [target], white_luminance)[target]
+    return target, results
+
+
+def resolve_colorimetry(measurements_or_group, targets, white_luminance=DEFAULT_WHITE_LUMINANCE):
+    """
+    Fill in whatever target colorimetry measurements lack, from what they already hold
+
+    Colorimetry already present for a target is left alone; anything computed is
+    inserted with origin 'derived'. As with :func:`derive_colorimetry`, inserting into a
+    Group's measurements affects only that group.
+
+    Parameters
+    ----------
+    measurements_or_group : Group or iterable of Measurement
+    targets : sequence
+        (observer, color space, illuminant) triplets
+    white_luminance : float
+        luminance of the reference white for colour spaces defined relative to one
+
+    Returns
+    -------
+    int
+        the number of Colorimetry objects inserted
+    """
+    measurements = _measurements(measurements_or_group)
+    inserted = 0
+    for target in targets:
+        target = _canonical_target(target)
+        missing = [m for m in measurements if target not in m.colorimetry]
+        if not missing:
+            continue
+        observer, color_space, illuminant = target
+        _, values = resolved_values(missing, target, white_luminance)
+        for m, row in zip(missing, values.tolist()):
+            m.insert_colorimetry(Colorimetry(observer, color_space, illuminant, row, 'derived'))
+            inserted += 1
+    return inserted
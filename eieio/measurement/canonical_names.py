@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Canonical names for observers, color spaces and illuminants
+================================
+
+Observers, color spaces and illuminants are named in many ways: by the Colour package
+('CIE 1931 2 Degree Standard Observer', 'cie_2_1931'), by instruction files
+('CIE 2º'), and by the metering service's protobuf enums
+('CIE_1931_2_DEGREE_STANDARD_OBSERVER', 'CIE_LAB', 'F2'). This module resolves all of
+them to the names Colour uses as dictionary keys, which are what
+:class:`eieio.measurement.colorimetry.Colorimetry` stores.
+
+Lookup tables are built once, at import time, from normalized forms of every canonical
+name and alias, so resolving a name costs one string normalization and one dict
+lookup. Canonical names are interned, so comparing them is cheap too.
+"""
+
+import re
+import sys
+
+from colour.colorimetry.datasets.cmfs import MSDS_CMFS_STANDARD_OBSERVER
+from colour.colorimetry.datasets.illuminants.sds import SDS_ILLUMINANTS
+from colour.models.common import COLOURSPACE_MODELS
+
+from utilities.english import oxford_join
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'NameRegistry', 'OBSERVERS', 'COLOR_SPACES', 'ILLUMINANTS',
+    'canonical_observer', 'canonical_color_space', 'canonical_illuminant', 'normalized_name'
+]
+
+_SEPARATORS_RE = re.compile(r'[\s_\-]+')
+_DEGREE_RE = re.compile(r'\s*[º°]')
+
+
+def normalized_name(name):
+    """
+    Reduce a name to the form used for lookups: lower case, with runs of spaces,
+    underscores and hyphens collapsed to single spaces, and degree signs spelled out
+    """
+    name = _DEGREE_RE.sub(' degree ', name.lower())
+    return _SEPARATORS_RE.sub(' ', name).strip()
+
+
+class NameRegistry(object):
+    """
+    Resolves any known spelling of a name of some kind to its canonical form
+
+    Attributes
+    ----------
+    kind : str
+        what the names name, e.g. 'observer', for error messages
+    names : tuple
+        the canonical names, in registration order
+    """
+
+    def __init__(self, kind, canonical_names, aliases=None, protobuf_names=None):
+        """
+
+        Parameters
+        ----------
+        kind : str
+            what the names name, e.g. 'observer'
+        canonical_names : iterable of str
+        aliases : dict, optional
+            maps alternative spellings to canonical names
+        protobuf_names : dict, optional
+            maps canonical names to metering service protobuf enum value names, where
+            those differ from the canonical name with spaces turned to underscores; each
+            protobuf name is also accepted as an alias
+        """
+        self._kind = kind
+        self._names = tuple(sys.intern(name) for name in canonical_names)
+        self._lookup = {}
+        for name in self._names:
+            self._lookup.setdefault(normalized_name(name), name)
+        self._protobuf_names = {}
+        for name, protobuf_name in (protobuf_names or {}).items():
+            name = self._lookup[normalized_name(name)]
+            self._protobuf_names[name] = protobuf_name
+            self._lookup.setdefault(normalized_name(protobuf_name), name)
+        for alias, name in (aliases or {}).items():
+            self._lookup[normalized_name(alias)] = self._lookup[normalized_name(name)]
+
+    @property
+    def kind(self):
+        return self._kind
+
+    @property
+    def names(self):
+        return self._names
+
+    def get(self, name, default=None):
+        """Return the canonical form of name, or default if it isn't known"""
+        return self._lookup.get(normalized_name(name), default)
+
+    def canonical(self, name):
+        """
+        Return the canonical form of name
+
+        Raises
+        ------
+        ValueError
+            if name is not a known spelling of any canonical name
+        """
+        canonical = self._lookup.get(normalized_name(name))
+        if canonical is None:
+            raise ValueError(f"`{name}' is an unsupported {self._kind}. Supported {self._kind}s are "
+                             f"{oxford_join(list(self._names), 'or')}.")
+        return canonical
+
+    def protobuf_name(self, name):
+        """
+        Return the name of the metering service protobuf enum value for name
+        """
+        canonical = self.canonical(name)
+        return self._protobuf_names.get(canonical, canonical.replace(' ', '_'))
+
+    def __contains__(self, name):
+        return normalized_name(name) in self._lookup
+
+
+# Colour also keys the 1931 and 1964 observers as 'cie_2_1931' and 'cie_10_1964'; those
+# become aliases of the long names so each observer has exactly one canonical name.
+# The CIE 2012 observers of the metering protobufs are CIE 170-2, which Colour calls 2015.
+OBSERVERS = NameRegistry(
+    'observer',
+    (name for name in MSDS_CMFS_STANDARD_OBSERVER if name not in ('cie_2_1931', 'cie_10_1964')),
+    aliases={'cie_2_1931': 'CIE 1931 2 Degree Standard Observer',
+             'CIE 2º': 'CIE 1931 2 Degree Standard Observer',
+             'CIE 1931 2º': 'CIE 1931 2 Degree Standard Observer',
+             '2º': 'CIE 1931 2 Degree Standard Observer',
+             'TWO_DEGREE_1931': 'CIE 1931 2 Degree Standard Observer',
+             'cie_10_1964': 'CIE 1964 10 Degree Standard Observer',
+             'CIE 10º': 'CIE 1964 10 Degree Standard Observer',
+             'CIE 1964 10º': 'CIE 1964 10 Degree Standard Observer',
+             '10º': 'CIE 1964 10 Degree Standard Observer',
+             'CIE 2012 2º': 'CIE 2015 2 Degree Standard Observer',
+             'CIE 2012 10º': 'CIE 2015 10 Degree Standard Observer'},
+    protobuf_names={'CIE 1931 2 Degree Standard Observer': 'CIE_1931_2_DEGREE_STANDARD_OBSERVER',
+                    'CIE 1964 10 Degree Standard Observer': 'CIE_1964_10_DEGREE_STANDARD_OBSERVER',
+                    'CIE 2015 2 Degree Standard Observer': 'CIE_2012_2_DEGREE_STANDARD_OBSERVER',
+                    'CIE 2015 10 Degree Standard Observer': 'CIE_2012_10_DEGREE_STANDARD_OBSERVER'})
+
+COLOR_SPACES = NameRegistry(
+    'color space',
+    COLOURSPACE_MODELS,
+    aliases={'CIELAB': 'CIE Lab',
+             'CIELUV': 'CIE Luv',
+             'HDR IPT': 'hdr-IPT',
+             'HDR CIELAB': 'hdr-CIELAB'},
+    protobuf_names={'CIE Lab': 'CIE_LAB',
+                    'CIE 1960 UCS': 'CIE_uv_1960',
+                    'CIE 1976 UCS': 'CIE_uv_1976'})
+
+ILLUMINANTS = NameRegistry(
+    'illuminant',
+    SDS_ILLUMINANTS,
+    protobuf_names={'FL2': 'F2',
+                    'FL7': 'F7',
+                    'FL11': 'F11'})
+
+
+def canonical_observer(name):
+    return OBSERVERS.canonical(name)
+
+
+def canonical_color_space(name):
+    return COLOR_SPACES.canonical(name)
+
+
+def canonical_illuminant(name):
+    return ILLUMINANTS.canonical(name)
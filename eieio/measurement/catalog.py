@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite catalog of measurements and measurement groups
+================================
+
+Defines the :class:`eieio.measurement.catalog.Catalog` class, which keeps an SQLite
+database describing every measurement (.spdx) file and measurement group (.mg or .mgm)
+file found by crawling directory trees: each measurement's header fields, wavelength
+range, colorimetry and file fingerprint (size and modification time), which directory
+it is in, and which groups list it.
+
+Crawls are incremental: a file whose fingerprint matches its catalog entry is not
+opened again, so re-crawling a large, mostly unchanged archive costs little more than
+listing it. Queries run against indexed columns and return file paths;
+:meth:`Catalog.measurements` then loads only the matching files, through the
+process-wide :data:`eieio.measurement.measurement_cache.MEASUREMENT_CACHE`.
+
+TM-27-14 report dates written by the measure tool carry no year, so each measurement
+is also dated by its file's modification time, and that is what the 'year' criterion
+matches.
+"""
+
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from xml.etree.ElementTree import ParseError
+
+from eieio.measurement.canonical_names import canonical_color_space, canonical_illuminant, canonical_observer
+from eieio.measurement.group_manifest import MANIFEST_SUFFIX
+from eieio.measurement.measurement_cache import MEASUREMENT_CACHE
+from eieio.measurement.measurement_group import SPECTRAL_SUFFIX, read_group_membership
+from eieio.measurement.spdx_io import read_measurement
+from utilities.english import oxford_join
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'Catalog', 'CrawlSummary', 'CATALOG_SCHEMA_VERSION'
+]
+
+CATALOG_SCHEMA_VERSION = 1
+
+GROUP_SUFFIXES = ('.mg', MANIFEST_SUFFIX)
+
+CrawlSummary = namedtuple('CrawlSummary', ['added', 'updated', 'removed', 'unchanged', 'failed'])
+CrawlSummary.__doc__ = """
+Summary of the changes :meth:`Catalog.crawl` made; each field is a sorted list of paths,
+of measurement and group files alike. Files that could not be parsed are listed in
+'failed', are left out of the catalog, and are retried on the next crawl.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    dir_id INTEGER NOT NULL REFERENCES dirs(id),
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    manufacturer TEXT,
+    catalog_number TEXT,
+    description TEXT,
+    laboratory TEXT,
+    measurement_equipment TEXT,
+    report_number TEXT,
+    report_date TEXT,
+    spectral_quantity TEXT,
+    start_wavelength REAL,
+    end_wavelength REAL,
+    n_wavelengths INTEGER
+);
+CREATE INDEX IF NOT EXISTS measurements_dir ON measurements(dir_id);
+CREATE INDEX IF NOT EXISTS measurements_manufacturer ON measurements(manufacturer);
+CREATE INDEX IF NOT EXISTS measurements_catalog_number ON measurements(catalog_number);
+CREATE INDEX IF NOT EXISTS measurements_laboratory ON measurements(laboratory);
+CREATE INDEX IF NOT EXISTS measurements_equipment ON measurements(measurement_equipment);
+CREATE INDEX IF NOT EXISTS measurements_year ON measurements(year);
+CREATE TABLE IF NOT EXISTS colorimetry (
+    measurement_id INTEGER NOT NULL REFERENCES measurements(id) ON DELETE CASCADE,
+    observer TEXT NOT NULL,
+    color_space TEXT NOT NULL,
+    illuminant TEXT NOT NULL,
+    origin TEXT,
+    first REAL,
+    second REAL,
+    third REAL,
+    PRIMARY KEY (measurement_id, observer, color_space, illuminant)
+);
+CREATE INDEX IF NOT EXISTS colorimetry_kind ON colorimetry(observer, color_space, illuminant);
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS groups_name ON groups(name);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    PRIMARY KEY (group_id, path)
+);
+CREATE INDEX IF NOT EXISTS group_members_path ON group_members(path);
+"""
+
+# criteria accepted by Catalog.find (and friends) that match a measurements column
+_COLUMN_CRITERIA = {
+    'manufacturer': 'manufacturer',
+    'catalog_number': 'catalog_number',
+    'description': 'description',
+    'laboratory': 'laboratory',
+    'equipment': 'measurement_equipment',
+    'report_number': 'report_number',
+    'spectral_quantity': 'spectral_quantity',
+    'year': 'year'
+}
+
+_HEADER_COLUMNS = ('manufacturer', 'catalog_number', 'description', 'laboratory', 'measurement_equipment',
+                   'report_number', 'report_date')
+
+
+def _header_value(value):
+    # colour's TM-27-14 reader turns absent elements into None and some writers put 'N/A'
+    return None if value in (None, '', 'N/A') else str(value)
+
+
+def _measurement_row(path, stat, measurement):
+    header = measurement.header
+    wavelengths = measurement.wavelengths
+    row = {'path': path, 'filename': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+           'year': datetime.fromtimestamp(stat.st_mtime_ns / 1e9).year,
+           'spectral_quantity': _header_value(measurement.spectral_quantity),
+           'start_wavelength': float(wavelengths[0]) if len(wavelengths) else None,
+           'end_wavelength': float(wavelengths[-1]) if len(wavelengths) else None,
+           'n_wavelengths': len(wavelengths)}
+    for column in _HEADER_COLUMNS:
+        row[column] = _header_value(getattr(header, column))
+    colorimetry = [(c.observer, c.color_space, c.illuminant, c.origin, *[float(v) for v in c.values])
+                   for c in measurement.colorimetry.values()]
+    return row, colorimetry
+
+
+class Catalog(object):
+    """
+    SQLite-backed catalog of measurement and measurement group files
+
+    Attributes
+    ----------
+    path : Path or str
+        location of the database file (or ':memory:')
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._connection = sqlite3.connect(str(path))
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > CATALOG_SCHEMA_VERSION:
+            raise ValueError(f"catalog `{path}' has schema version {version}; only versions up to "
+                             f"{CATALOG_SCHEMA_VERSION} are supported")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _dir_id(self, dir_):
+        row = self._connection.execute('SELECT id FROM dirs WHERE path = ?', (dir_,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self._connection.execute('INSERT INTO dirs (path) VALUES (?)', (dir_,)).lastrowid
+
+    def _fingerprints(self, table, root):
+        prefix = root.rstrip(os.sep) + os.sep
+        rows = self._connection.execute(f"SELECT path, size, mtime_ns FROM {table} "
+                                        "WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def _store_measurement(self, row, colorimetry):
+        self._connection.execute('DELETE FROM measurements WHERE path = ?', (row['path'],))
+        row = dict(row, dir_id=self._dir_id(os.path.dirname(row['path'])))
+        columns = ', '.join(row)
+        placeholders = ', '.join(f":{column}" for column in row)
+        measurement_id = self._connection.execute(f"INSERT INTO measurements ({columns}) VALUES ({placeholders})",
+                                                  row).lastrowid
+        self._connection.executemany('INSERT INTO colorimetry VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                     [(measurement_id, *c) for c in colorimetry])
+
+    def _store_group(self, path, stat, name, membership):
+        self._connection.execute('DELETE FROM groups WHERE path = ?', (path,))
+        group_id = self._connection.execute('INSERT INTO groups (path, name, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                                            (path, name, stat.st_size, stat.st_mtime_ns)).lastrowid
+        members = {str(Path(dir_, file_).resolve()) for dir_, files in membership.items() for file_ in files}
+        self._connection.executemany('INSERT INTO group_members VALUES (?, ?)',
+                                     [(group_id, member) for member in members])
+
+    def crawl(self, root, max_workers=None):
+        """
+        Bring the catalog up to date with the measurement and group files under a directory
+
+        Files added or changed since the last crawl are parsed (measurements in
+        parallel) and their entries replaced; entries for files under root that no
+        longer exist are removed.
+
+        Parameters
+        ----------
+        root : str or Path
+        max_workers : int, optional
+            number of threads used to parse changed measurement files
+
+        Returns
+        -------
+        CrawlSummary
+        """
+        root = str(Path(root).resolve())
+        found_measurements = {}
+        found_groups = {}
+        for dir_path, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(SPECTRAL_SUFFIX):
+                    found = found_measurements
+                elif filename.endswith(GROUP_SUFFIXES):
+                    found = found_groups
+                else:
+                    continue
+                path = os.path.join(dir_path, filename)
+                try:
+                    found[path] = os.stat(path)
+                except FileNotFoundError:
+                    pass  # deleted while we were looking
+        added, updated, removed, unchanged, failed = [], [], [], [], []
+        catalogued_measurements = self._fingerprints('measurements', root)
+        catalogued_groups = self._fingerprints('groups', root)
+        changed_measurements = []
+        for found, catalogued, changed in ((found_measurements, catalogued_measurements, changed_measurements),
+                                           (found_groups, catalogued_groups, None)):
+            for path, stat in found.items():
+                if catalogued.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    unchanged.append(path)
+                elif changed is not None:
+                    changed.append(path)
+
+        def parse(path_):
+            try:
+                return _measurement_row(path_, found_measurements[path_], read_measurement(path_))
+            except (OSError, ParseError, ValueError, KeyError):
+                return None  # probably still being written; try again next crawl
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(parse, changed_measurements))
+        with self._connection:
+            for path, result in zip(changed_measurements, parsed):
+                if result is None:
+                    failed.append(path)
+                    continue
+                self._store_measurement(*result)
+                (updated if path in catalogued_measurements else added).append(path)
+            for path, stat in found_groups.items():
+                if catalogued_groups.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                try:
+                    name, membership = read_group_membership(path)
+                except (OSError, ValueError, KeyError):
+                    failed.append(path)
+                    continue
+                self._store_group(path, stat, name, membership)
+                (updated if path in catalogued_groups else added).append(path)
+            for table, catalogued, found in (('measurements', catalogued_measurements, found_measurements),
+                                             ('groups', catalogued_groups, found_groups)):
+                gone = [path for path in catalogued if path not in found]
+                self._connection.executemany(f"DELETE FROM {table} WHERE path = ?", [(path,) for path in gone])
+                removed.extend(gone)
+        return CrawlSummary(*(sorted(paths) for paths in (added, updated, removed, unchanged, failed)))
+
+    @staticmethod
+    def _condition(column, value):
+        if isinstance(value, str) and '%' in value:
+            return f"{column} LIKE ?", value
+        return f"{column} = ?", value
+
+    def _where(self, criteria):
+        clauses = []
+        parameters = []
+        for criterion, value in criteria.items():
+            if value is None:
+                continue
+            if criterion in _COLUMN_CRITERIA:
+                clause, parameter = self._condition(f"m.{_COLUMN_CRITERIA[criterion]}", value)
+                clauses.append(clause)
+                parameters.append(parameter)
+            elif criterion == 'dir_':
+                clauses.append('m.dir_id = (SELECT id FROM dirs WHERE path = ?)')
+                parameters.append(str(Path(value).resolve()))
+            elif criterion == 'group':
+                # a group is named either by the path of its file or by its name
+                clauses.append('m.path IN (SELECT gm.path FROM group_members gm JOIN groups g '
+                               'ON g.id = gm.group_id WHERE g.path = ? OR g.name = ?)')
+                parameters.extend((str(Path(value).resolve()), str(value)))
+            elif criterion == 'colorimetry':
+                observer, color_space, illuminant = value
+                clauses.append('EXISTS (SELECT 1 FROM colorimetry c WHERE c.measurement_id = m.id '
+                               'AND c.observer = ? AND c.color_space = ? AND c.illuminant = ?)')
+                parameters.extend((canonical_observer(observer), canonical_color_space(color_space),
+                                   canonical_illuminant(illuminant)))
+            else:
+                supported = list(_COLUMN_CRITERIA) + ['dir_', 'group', 'colorimetry']
+                raise ValueError(f"`{criterion}' is an unsupported catalog criterion. Supported criteria are "
+                                 f"{oxford_join(supported, 'and')}.")
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ''), parameters
+
+    def _query(self, select, criteria):
+        where, parameters = self._where(criteria)
+        return self._connection.execute(f"SELECT {select} FROM measurements m{where} ORDER BY m.path", parameters)
+
+    def find(self, **criteria):
+        """
+        Find the catalogued measurements matching all the given criteria
+
+        String criteria match exactly unless they contain '%', in which case they are
+        SQL LIKE patterns (so 'CS%2000' matches 'CS2000' and 'CS-2000'). Criteria whose
+        value is None are ignored.
+
+        Parameters
+        ----------
+        manufacturer, catalog_number, description, laboratory, equipment, report_number,
+        spectral_quantity : str, optional
+            header fields; 'equipment' is the measurement equipment
+        year : int, optional
+            year of the file's modification time
+        dir_ : str or Path, optional
+            directory holding the measurement
+        group : str or Path, optional
+            path or name of a group listing the measurement
+        colorimetry : tuple, optional
+            (observer, color space, illuminant) the measurement must have colorimetry for
+
+        Returns
+        -------
+        list
+            paths of the matching measurement files, sorted
+
+        Raises
+        ------
+        ValueError
+            if a criterion is not one of the above
+        """
+        return [path for (path,) in self._query('m.path', criteria)]
+
+    def count(self, **criteria):
+        """Count the catalogued measurements matching the criteria (see :meth:`find`)"""
+        return self._query('COUNT(*)', criteria).fetchone()[0]
+
+    def measurements(self, **criteria):
+        """
+        Load the measurements matching the criteria (see :meth:`find`), and only those
+
+        Returns
+        -------
+        dict
+            Measurements keyed by path
+        """
+        return {path: MEASUREMENT_CACHE.measurement(path) for path in self.find(**criteria)}
+
+    def colorimetry_keys(self, **criteria):
+        """
+        List the (observer, color space, illuminant) keys of the colorimetry held by the
+        measurements matching the criteria (see :meth:`find`), without loading any
+
+        Returns
+        -------
+        list
+            sorted keys
+        """
+        where, parameters = self._where(criteria)
+        rows = self._connection.execute('SELECT DISTINCT observer, color_space, illuminant FROM colorimetry '
+                                        f"WHERE measurement_id IN (SELECT m.id FROM measurements m{where}) "
+                                        'ORDER BY observer, color_space, illuminant', parameters)
+        return [tuple(row) for row in rows]
+
+    def colorimetry(self, path):
+        """
+        Return the catalogued colorimetry of one measurement, without loading it
+
+        Returns
+        -------
+        dict
+            (values, origin) pairs keyed by (observer, color space, illuminant)
+        """
+        rows = self._connection.execute('SELECT c.observer, c.color_space, c.illuminant, c.first, c.second, '
+                                        'c.third, c.origin FROM colorimetry c JOIN measurements m '
+                                        'ON m.id = c.measurement_id WHERE m.path = ?', (str(path),))
+        return {row[:3]: (list(row[3:6]), row[6]) for row in rows}
+
+    def groups(self, path=None):
+        """
+        List catalogued groups, optionally only those listing a given measurement file
+
+        Returns
+        -------
+        list
+            (path, name) pairs, sorted by path
+        """
+        if path is None:
+            return self._connection.execute('SELECT path, name FROM groups ORDER BY path').fetchall()
+        return self._connection.execute('SELECT g.path, g.name FROM groups g JOIN group_members gm '
+                                        'ON g.id = gm.group_id WHERE gm.path = ? ORDER BY g.path',
+                                        (str(Path(path).resolve()),)).fetchall()
+
+    def dirs(self):
+        """List the directories holding catalogued measurements, sorted"""
+        return [path for (path,) in self._connection.execute('SELECT path FROM dirs WHERE id IN '
+                                                             '(SELECT dir_id FROM measurements) ORDER BY path')]
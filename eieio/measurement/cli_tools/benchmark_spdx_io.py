@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_spdx_io - compare fast TM-27-14 measurement I/O against the colour-based path
+==============================
+
+Writes synthetic 1 nm and 10 nm .spdx files carrying EIEIO colorimetry to a scratch
+directory with :meth:`Measurement.write` and with :func:`eieio.measurement.spdx_io.write_measurements`,
+then times reading them back with :meth:`Measurement.read` and with
+:func:`eieio.measurement.spdx_io.read_measurement`.
+
+Usage: python -m eieio.measurement.cli_tools.benchmark_spdx_io [number_of_files]
+"""
+
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from colour.io.tm2714 import Header_IESTM2714
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.spdx_io import read_measurement, write_measurements
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+DEFAULT_NUMBER_OF_FILES = 200
+SHAPES = {'1 nm': (380, 780, 1), '10 nm': (380, 780, 10)}
+
+
+def synthetic_measurement(min_lambda, max_lambda, inc_lambda, seed):
+    header = Header_IESTM2714(manufacturer='Synthetic', catalog_number='Benchmark',
+                              description=f"sample {seed}", document_creator='benchmark_spdx_io')
+    m = Measurement(header=header, spectral_quantity='radiance', bandwidth_FWHM=inc_lambda)
+    wavelengths = np.arange(min_lambda, max_lambda + 1, inc_lambda)
+    m.wavelengths = wavelengths
+    m.values = np.random.default_rng(seed).random(len(wavelengths))
+    m.insert_colorimetry(Colorimetry('CIE 1931 2 Degree Standard Observer', 'CIE XYZ', 'D65',
+                                     [95.0, 100.0, 108.9], 'measured'))
+    m.insert_colorimetry(Colorimetry('CIE 1931 2 Degree Standard Observer', 'CIE xyY', 'D65',
+                                     [0.3127, 0.329, 100.0], 'measured'))
+    return m
+
+
+def synthetic_measurements(dir_, shape, number_of_files):
+    measurements = []
+    for i in range(number_of_files):
+        m = synthetic_measurement(*shape, seed=i)
+        m.path = str(Path(dir_, f"sample.{i:04}.spdx"))
+        measurements.append(m)
+    return measurements
+
+
+def colour_write(measurements):
+    for m in measurements:
+        m.write()
+
+
+def colour_read(path):
+    m = Measurement()
+    m.path = path
+    m.read()
+    return m
+
+
+def time_reader(reader, paths):
+    start = perf_counter()
+    for path in paths:
+        reader(path)
+    return perf_counter() - start
+
+
+def time_writer(writer, measurements):
+    start = perf_counter()
+    writer(measurements)
+    return perf_counter() - start
+
+
+def benchmark(number_of_files=DEFAULT_NUMBER_OF_FILES):
+    for label, shape in SHAPES.items():
+        with TemporaryDirectory() as dir_:
+            measurements = synthetic_measurements(dir_, shape, number_of_files)
+            baseline = time_writer(colour_write, measurements)
+            fast = time_writer(write_measurements, measurements)
+            print(f"{label:>6}: {number_of_files} files, Measurement.write {baseline:.3f}s, "
+                  f"write_measurements {fast:.3f}s ({baseline / fast:.1f}x)", flush=True)
+            paths = [m.path for m in measurements]
+            baseline = time_reader(colour_read, paths)
+            fast = time_reader(read_measurement, paths)
+            print(f"{label:>6}: {number_of_files} files, Measurement.read {baseline:.3f}s, "
+                  f"read_measurement {fast:.3f}s ({baseline / fast:.1f}x)", flush=True)
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER_OF_FILES)
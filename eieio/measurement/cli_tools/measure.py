@@ -10,25 +10,39 @@ from socket import gethostname
 import sys
 import os
 import queue
+from itertools import count
 from pathlib import Path
 from datetime import timedelta
-from time import sleep
+from time import perf_counter, sleep
 
 import grpc
+import numpy as np
 from services.metering.metering_pb2 import (
     IntegrationMode, Observer, MeasurementMode, ColorSpace, Illuminant,
-    Instrument, MeterName,  GenericErrorCode,
-    StatusRequest, ConfigurationRequest, CalibrationRequest, CaptureRequest,
+    Instrument, MeterName,  GenericErrorCode, CaptureSpecificErrorCode,
+    StatusRequest, ConfigurationRequest, CalibrationRequest, CaptureRequest, CaptureManyRequest,
+    RetrieveManyRequest,
     ColorimetricConfiguration, RetrievalRequest, RetrievalResponse)
 from services.metering import metering_pb2_grpc
 from services.ports import PORT_METERING, PORT_GRPC_TARGET_COLOR_CHANGING
 
+from eieio.measurement.adaptive_sampling import AdaptiveRefinement
+from eieio.measurement.batch_colorimetry import resolved_values
 from eieio.measurement.instructions import Instructions
+from utilities.english import oxford_join
 from utilities.log import Log, LogEvent
 from eieio.meter.xrite.i1pro import I1Pro
 from eieio.measurement.measurement import Measurement
 from eieio.measurement.measurement_group import Group
+from eieio.measurement.group_manifest import GroupManifestWriter, MANIFEST_SUFFIX
+from eieio.measurement.canonical_names import COLOR_SPACES, ILLUMINANTS, OBSERVERS
 from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.run_planner import DEFAULT_HISTORY_PATH, RunPlanner, TimingHistory
+from eieio.measurement.retry import REQUEUE, RETRY, RequeueingRunner, RetryPolicy
+from eieio.measurement.running_statistics import STATISTICS_DIR, StatisticsAccumulator
+from eieio.measurement.sample_ordering import TransitionCost, order_samples
+from eieio.measurement.spdx_io import write_measurement
+from eieio.measurement.stimulus_memo import StimulusMemo
 from eieio.targets.unreal.live_link_target import UnrealLiveLinkTarget
 from eieio.targets.unreal.web_control_api_target import UnrealWebControlApiTarget
 from eieio.targets.grpc_based.grpc_target import GrpcControlledTarget
@@ -50,6 +64,12 @@ __all__ = [
 LIVE_LINK_LENS_HOST = '192.168.1.157'
 LIVE_LINK_LENS_METADATA_PORT = 40123
 QUEUE_WAIT_TIMEOUT_SECONDS = 3
+ADAPTIVE_XYZ_TARGET = ('CIE 1931 2 Degree Standard Observer', 'CIE XYZ', 'D65')
+# errors a short wait may cure, so worth retrying before giving up on a sample; meter exceptions
+# themselves never reach this process, arriving instead as error codes in the metering service's responses
+TRANSIENT_GENERIC_ERROR_CODES = (GenericErrorCode.DEVICE_BUSY, GenericErrorCode.DEVICE_UNRESPONSIVE)
+TRANSIENT_CAPTURE_ERROR_CODES = (CaptureSpecificErrorCode.SKETCHY_ILLUMINATION,)
+TRANSIENT_RPC_STATUS_CODES = (grpc.StatusCode.UNAVAILABLE,)
 
 
 def iestm2714_header(**kwargs):
@@ -80,6 +100,29 @@ def iestm2714_sd(header, spectral_quantity='radiance', reflection_geometry='Unkn
                                           reflection_geometry=reflection_geometry, bandwidth_FWHM=25)
 
 
+class MeteringFailure(RuntimeError):
+    """
+    A capture or retrieval the metering service reported as failed
+    """
+    def __init__(self, stage, generic_error_code, specific_error_code=0, details=None):
+        self.stage = stage
+        self.generic_error_code = generic_error_code
+        self.specific_error_code = specific_error_code
+        self.details = details
+        if generic_error_code:
+            description = Measurer.pretty_generic_error(generic_error_code, details)
+        elif stage == 'capture' and specific_error_code:
+            description = f"{CaptureSpecificErrorCode.Name(specific_error_code)}: {details}"
+        else:
+            description = details or 'unspecified error'
+        super().__init__(f"{stage} failed: {description}")
+
+    @property
+    def transient(self):
+        return (self.generic_error_code in TRANSIENT_GENERIC_ERROR_CODES
+                or (self.stage == 'capture' and self.specific_error_code in TRANSIENT_CAPTURE_ERROR_CODES))
+
+
 class Measurer(object):
     """
     Coordinating object for measuring stimuli with a metering device and writing results to storage.
@@ -93,8 +136,21 @@ class Measurer(object):
         self._channel = None
         self._client = None
         self._meter_name = None
+        self._meter_names = []
         self._measurement_group = None
+        self._manifest_writer = None
         self._target = None
+        # per-sample running statistics, and recent measurements of repeated stimuli, kept per meter
+        # if the instructions ask for them
+        self._statistics_by_meter = {}
+        self._memos = {}
+        # wall-clock seconds taken by each stage of the last sample measured, and the meter's estimate
+        # of its integration time, for planning time-budgeted runs
+        self._stage_seconds = {}
+        self._integration_seconds = None
+        retry_params = {} if instructions.retry_policy in (None, True) else dict(instructions.retry_policy)
+        self._retry_policy = RetryPolicy(**retry_params)
+        self._runner = None
 
     def print_if_debug(self, str_):
         if self.instructions.verbose:
@@ -147,6 +203,22 @@ class Measurer(object):
         del self._meter_name
         self._meter_name = None
 
+    @property
+    def meter_names(self):
+        """The MeterNames of every meter measuring each sample; the first is :attr:`meter_name`"""
+        return self._meter_names
+
+    @meter_names.setter
+    def meter_names(self, value):
+        self._meter_names = list(value)
+        self.meter_name = self._meter_names[0] if self._meter_names else None
+        if self.instructions.statistics:
+            self._statistics_by_meter = {name.name: StatisticsAccumulator() for name in self._meter_names}
+        if self.instructions.stimulus_memo:
+            memo = self.instructions.stimulus_memo
+            memo_params = {} if memo is True else dict(memo)
+            self._memos = {name.name: StimulusMemo(**memo_params) for name in self._meter_names}
+
     @property
     def measurement_group(self):
         return self._measurement_group
@@ -155,6 +227,28 @@ class Measurer(object):
     def measurement_group(self, value):
         self._measurement_group = value
 
+    @property
+    def manifest_writer(self):
+        return self._manifest_writer
+
+    @manifest_writer.setter
+    def manifest_writer(self, value):
+        self._manifest_writer = value
+
+    @property
+    def statistics(self):
+        """Per-sample statistics of the (first) meter's measurements, if kept"""
+        return self._statistics_by_meter.get(self.meter_name.name) if self.meter_name else None
+
+    @property
+    def runner(self):
+        return self._runner
+
+    @property
+    def memo(self):
+        """The (first) meter's stimulus memo, if kept"""
+        return self._memos.get(self.meter_name.name) if self.meter_name else None
+
     @property
     def target(self):
         return self._target
@@ -232,13 +326,19 @@ class Measurer(object):
 
     def _setup_measurement_device(self, instructions):
         device_host_and_port = f"{instructions.meter['host']}:{PORT_METERING}"
-        self.meter_name = MeterName(name=instructions.meter['name'])
+        # several meters on one metering server can measure each sample together
+        names = instructions.meter.get('names') or [instructions.meter['name']]
+        self.meter_names = [MeterName(name=name) for name in names]
         self.log.add(LogEvent.GRPC_ACTIVITY, f"setting up measurement device with host and port "
                                              f"`{device_host_and_port}'", 'Measurer._setup_measurement_device')
         self.channel = grpc.insecure_channel(device_host_and_port)
         self.client = metering_pb2_grpc.MeteringStub(self.channel)
+        for meter_name in self.meter_names:
+            self._setup_meter(meter_name)
+
+    def _setup_meter(self, meter_name):
         # Get and print meter status
-        status_request = StatusRequest(meter_name=self.meter_name)
+        status_request = StatusRequest(meter_name=meter_name)
         status_response = self.client.ReportStatus(status_request)
         Measurer.print_meter_description(status_response.description)
         # calibrate if need be
@@ -248,7 +348,7 @@ class Measurer(object):
             mode = used_and_left.mode
             left = used_and_left.left
             if left.ToTimedelta() < timedelta(hours=1):
-                calibration_request = CalibrationRequest(meter_name=self.meter_name, mode=mode)
+                calibration_request = CalibrationRequest(meter_name=meter_name, mode=mode)
                 if needs_tile_positioning:
                     I1Pro.prompt_for_calibration_positioning("place i1Pro on tile and press RETURN")
                     needs_tile_positioning = False
@@ -261,7 +361,7 @@ class Measurer(object):
         # TODO add configuration request options for path to USB device
         # elif self.meter_type == 'cs2000':
         #     self.device = CS2000(debug=self.instructions.verbose, **meter_params)
-        configuration_request = ConfigurationRequest(meter_name=self.meter_name,
+        configuration_request = ConfigurationRequest(meter_name=meter_name,
                                                      observer=Observer.CIE_1931_2_DEGREE_STANDARD_OBSERVER,
                                                      measurement_mode=MeasurementMode.EMISSIVE,
                                                      illuminant=Illuminant.D65,
@@ -351,20 +451,68 @@ class Measurer(object):
             Measurer.print_if_not_blank(measurement_angle, 'supported spectral_measurement angle')
         Measurer.print_if_not_blank(meter_desc.current_measurement_angle, 'current spectral_measurement angle')
 
-    def capture_stimulus(self):
-        # capture the stimulus
+    def capture_stimulus(self, meter_names=None):
+        """
+        Trigger meters (by default, all of them) to capture the stimulus, returning the longest
+        integration time they estimate, or None if none gives an estimate
+
+        Several meters are triggered with one CaptureMany request, which the metering server
+        carries out concurrently, so capture takes as long as the slowest meter.
+        """
+        meter_names = meter_names if meter_names is not None else self.meter_names
         self.log.add(LogEvent.METER_TRIGGER, 'about to send capture request')
-        capture_request = CaptureRequest(meter_name=self.meter_name)
+        capture_requests = [CaptureRequest(meter_name=meter_name) for meter_name in meter_names]
         self.log.add(LogEvent.METER_TRIGGER, 'send capture request, waiting for capture response')
-        capture_response = self.client.Capture(capture_request)
+        if len(capture_requests) == 1:
+            capture_responses = [self.client.Capture(capture_requests[0])]
+        else:
+            capture_responses = self.client.CaptureMany(CaptureManyRequest(requests=capture_requests)).responses
         self.log.add(LogEvent.METER_TRIGGER, 'received capture response')
-        if capture_response.estimated_duration:
-            self.log.add(LogEvent.METER_TRIGGER, f"estimated time is {capture_response.estimated_duration}")
+        estimates = []
+        for meter_name, capture_response in zip(meter_names, capture_responses):
+            if capture_response.HasField('error'):
+                error = capture_response.error
+                raise MeteringFailure('capture', error.generic, error.capture_specific,
+                                      f"{meter_name.name}: {error.message}")
+            if capture_response.estimated_duration:
+                self.log.add(LogEvent.METER_TRIGGER, f"estimated time for `{meter_name.name}' is "
+                                                     f"{capture_response.estimated_duration}")
+                estimates.append(capture_response.estimated_duration.ToTimedelta().total_seconds())
+        if estimates:
+            return max(estimates)
+        self.log.add(LogEvent.METER_TRIGGER, 'no time estimate (assuming zero)')
+        return None
+
+    def retrieve_measurements(self, configs, meter_names=None):
+        """
+        Retrieve the spectrum and colorimetry of the last capture from meters (by default, all of
+        them), returning a Measurement from each, in meter order
+        """
+        meter_names = meter_names if meter_names is not None else self.meter_names
+        retrieval_requests = [RetrievalRequest(meter_name=meter_name,
+                                               spectrum_requested=True,
+                                               colorimetric_configurations=configs)
+                              for meter_name in meter_names]
+        self.log.add(LogEvent.METER_SPECTRAL_RETRIEVAL | LogEvent.METER_COLORIMETRIC_RETRIEVAL,
+                     "retrieving spectrum and colorimetry")
+        if len(retrieval_requests) == 1:
+            retrieval_responses = [self.client.Retrieve(retrieval_requests[0])]
         else:
-            self.log.add(LogEvent.METER_TRIGGER, 'no time estimate (assuming zero)')
-
-    def _process_retrieval_response(self, response: RetrievalResponse):
+            retrieval_responses = self.client.RetrieveMany(RetrieveManyRequest(requests=retrieval_requests)).responses
+        for meter_name, retrieval_response in zip(meter_names, retrieval_responses):
+            if retrieval_response.HasField('error'):
+                error = retrieval_response.error
+                raise MeteringFailure('retrieval', error.generic, error.retrieval_specific,
+                                      f"{meter_name.name}: {error.details}")
+        self.log.add(LogEvent.METER_SPECTRAL_RETRIEVAL | LogEvent.METER_COLORIMETRIC_RETRIEVAL,
+                     "processing retrieved spectrum and colorimetry")
+        return [self._process_retrieval_response(retrieval_response, meter_name)
+                for meter_name, retrieval_response in zip(meter_names, retrieval_responses)]
+
+    def _process_retrieval_response(self, response: RetrievalResponse, meter_name=None):
         header = iestm2714_header_from_instructions(self.instructions)
+        if meter_name is not None and len(self.meter_names) > 1:
+            header.measurement_equipment = f"{header.measurement_equipment} ({meter_name.name})"
         measurement = Measurement(header=header)
         # first let's gather all the data together
         if response.HasField('spectral_measurement'):
@@ -386,20 +534,14 @@ class Measurer(object):
         return measurement
 
     def _colorimetric_configurations(self):
-        # TODO come up with a way to canonicalize standard observers (two->2, c/standard observer//, etc)
-        obs_map = {'cie 2º': Observer.CIE_1931_2_DEGREE_STANDARD_OBSERVER,
-                   'cie 10º': Observer.CIE_1964_10_DEGREE_STANDARD_OBSERVER}
-        cs_map = {'cie xyz': ColorSpace.CIE_XYZ,
-                  'cie xyy': ColorSpace.CIE_xyY}
-        il_map = {'d65': Illuminant.D65}
         configs = []
         for config_in_instructions in self.instructions.colorimetry:
-            observer = config_in_instructions['observer'].lower().replace('_', ' ')
-            color_space = config_in_instructions['color_space'].lower().replace('_', ' ')
-            illuminant = config_in_instructions['illuminant'].lower().replace('_', ' ')
-            config = ColorimetricConfiguration(observer=obs_map[observer],
-                                               color_space=cs_map[color_space],
-                                               illuminant=il_map[illuminant])
+            observer = OBSERVERS.protobuf_name(config_in_instructions['observer'])
+            color_space = COLOR_SPACES.protobuf_name(config_in_instructions['color_space'])
+            illuminant = ILLUMINANTS.protobuf_name(config_in_instructions['illuminant'])
+            config = ColorimetricConfiguration(observer=Observer.Value(observer),
+                                               color_space=ColorSpace.Value(color_space),
+                                               illuminant=Illuminant.Value(illuminant))
             configs.append(config)
         return configs
 
@@ -413,9 +555,236 @@ class Measurer(object):
             self.log.add(LogEvent.RESOURCE_DELETIONS, "deleting channel")
             del self.channel
             self.log.add(LogEvent.RESOURCE_DELETIONS, "deleted channel")
+        if self.manifest_writer:
+            self.manifest_writer.close()
+            self.manifest_writer = None
         if self._measurement_group:
             self.log.add(LogEvent.INTERNAL_API_ENTRY, "saving measurement group")
             self._measurement_group.save_group(Path(dir_, self.measurement_group.name + '.mg'))
+        for meter_name, statistics in self._statistics_by_meter.items():
+            if statistics:
+                self.log.add(LogEvent.INTERNAL_API_ENTRY, f"saving per-sample statistics for `{meter_name}'")
+                statistics.write(Path(self._meter_dir(dir_, meter_name), STATISTICS_DIR))
+        if self.runner is not None and self.runner.failures:
+            summary = self.runner.summary()
+            self.log.add(LogEvent.INTERNAL_API_ENTRY, summary)
+            print(summary, flush=True)
+        for meter_name, memo in self._memos.items():
+            if memo.reused or memo.drift_checks:
+                exceeded = sum(check.exceeded for check in memo.drift_checks)
+                print(f"`{meter_name}' reused {memo.reused} measurements of repeated stimuli; "
+                      f"{len(memo.drift_checks)} drift checks, {exceeded} over tolerance", flush=True)
+
+    def _meter_dir(self, dir_, meter_name):
+        """
+        Return the directory for a meter's measurements: dir_ itself if there is only one
+        meter, or else a subdirectory named for the meter
+        """
+        if len(self.meter_names) < 2:
+            return dir_
+        meter_dir = Path(dir_, meter_name)
+        meter_dir.mkdir(exist_ok=True)
+        return meter_dir
+
+    def _record_measurement(self, dir_, filename, measurement):
+        measurement.path = str(Path(dir_, filename))
+        write_measurement(measurement)
+        if dir_ not in self.measurement_group.collections:
+            self.measurement_group.collections[dir_] = {}
+        self.measurement_group.collections[dir_][filename] = measurement
+        reused_from = {filename: measurement.reused_from} if measurement.reused_from is not None else None
+        self.manifest_writer.add(dir_, filename, reused_from=reused_from)
+
+    @staticmethod
+    def classify_error(error):
+        """
+        Decide what to do about an error measuring a sample: RETRY it after a wait, REQUEUE
+        the sample for the end of the run, or (None) let the error end the run
+        """
+        if isinstance(error, MeteringFailure):
+            return RETRY if error.transient else REQUEUE
+        if isinstance(error, grpc.RpcError):
+            return RETRY if error.code() in TRANSIENT_RPC_STATUS_CODES else REQUEUE
+        return None
+
+    def _report_retry(self, key, attempt, error, delay):
+        message = f"attempt {attempt} at `{key}' failed ({error}); retrying in {delay:.1f} s"
+        self.log.add(LogEvent.INTERNAL_API_ENTRY, message)
+        print(message, flush=True)
+
+    @staticmethod
+    def _sample_filename(sequence_number, sample):
+        filename = f"sample.{sequence_number}"
+        if 'name' in sample:
+            filename = f"{filename}.{sample['name']}"
+        return f"{filename}.spdx"
+
+    def _measure_sample_retrying(self, dir_, sequence_number, sample, configs):
+        """
+        Measure a sample, retrying transient failures; return None if it failed and was requeued
+        """
+        return self.runner.run(Measurer._sample_filename(sequence_number, sample),
+                               lambda: self._measure_sample(dir_, sequence_number, sample, configs))
+
+    def _measure_requeued(self, keep_going=None):
+        if self.runner.pending:
+            message = f"trying {len(self.runner.pending)} failed samples again"
+            self.log.add(LogEvent.INTERNAL_API_ENTRY, message)
+            print(message, flush=True)
+        return self.runner.drain(keep_going)
+
+    def _measure_sample(self, dir_, sequence_number, sample, configs):
+        """
+        Show a sample on the target, measure it, and write and record the measurement
+
+        Every meter measures the sample, concurrently, and each measurement is written to its
+        meter's directory; the first meter's measurement is returned. With a stimulus memo, a
+        meter that recently measured the same stimulus does not measure it again; a copy of
+        its earlier measurement, marked as reused, is recorded instead.
+        """
+        filename = Measurer._sample_filename(sequence_number, sample)
+        self._stage_seconds = {}
+        self._integration_seconds = None
+
+        measurements = {}
+        to_measure = []
+        for meter_name in self.meter_names:
+            memo = self._memos.get(meter_name.name)
+            reused = memo.reuse(sample) if memo is not None else None
+            if reused is not None:
+                self.log.add(LogEvent.INTERNAL_API_ENTRY,
+                             f"reusing `{reused.reused_from}' for `{filename}' from `{meter_name.name}'")
+                measurements[meter_name.name] = reused
+            else:
+                to_measure.append(meter_name)
+
+        if to_measure:
+            if self.instructions.frame_preflight == 'manual_advance':
+                print(f"manually set target to stimulus with name `{sample['name']}' and values {sample['value']}",
+                      flush=True)
+
+            # configure the target (if need be; if it's passive, it doesn't show up)
+            if self.target:
+                start = perf_counter()
+                rgb = sample['value']
+                name = sample['name']
+                self.target.set_target_stimulus(name, rgb)
+                sleep(1)
+                self._stage_seconds['target'] = perf_counter() - start
+
+            # trigger the spectral_measurement
+            start = perf_counter()
+            self._integration_seconds = self.capture_stimulus(to_measure)
+            self._stage_seconds['capture'] = perf_counter() - start
+
+            # retrieve spectral data and colorimetry
+            start = perf_counter()
+            measured = self.retrieve_measurements(configs, to_measure)
+            self._stage_seconds['retrieve'] = perf_counter() - start
+            for meter_name, measurement in zip(to_measure, measured):
+                measurements[meter_name.name] = measurement
+
+        start = perf_counter()
+        for meter_name in self.meter_names:
+            measurement = measurements[meter_name.name]
+            self._record_measurement(self._meter_dir(dir_, meter_name.name), filename, measurement)
+            if measurement.reused_from is not None:
+                # a copy is not an independent observation, so it stays out of the statistics
+                continue
+            statistics = self._statistics_by_meter.get(meter_name.name)
+            if statistics is not None and 'name' in sample:
+                statistics.add(sample['name'], measurement)
+            memo = self._memos.get(meter_name.name)
+            if memo is not None:
+                check = memo.record(sample, filename, measurement)
+                if check is not None and check.exceeded:
+                    message = (f"luminance drifted {check.drift:.1%} between `{check.previous_filename}' and "
+                               f"`{filename}' measured by `{meter_name.name}'; discarded its memoized measurements")
+                    self.log.add(LogEvent.INTERNAL_API_ENTRY, message)
+                    print(message, flush=True)
+        self._stage_seconds['write'] = perf_counter() - start
+        return measurements[self.meter_name.name]
+
+    def _adaptive_loop(self, dir_, configs):
+        """
+        Characterize the target adaptively, measuring only as many patches as its behavior needs
+        """
+        params = dict(self.instructions.adaptive_sampling)
+        sequence_numbers = count()
+
+        def measure(rgb):
+            sequence_number = next(sequence_numbers)
+            sample = {'name': f"adaptive_{sequence_number}", 'space': 'deviceRGB', 'value': rgb}
+            measurement = self._measure_sample_retrying(dir_, sequence_number, sample, configs)
+            if measurement is None:
+                # the refinement needs every patch it asks for, so a failed one can't wait for the end
+                raise RuntimeError(f"could not measure adaptive patch {rgb}:\n{self.runner.summary()}")
+            return resolved_values([measurement], ADAPTIVE_XYZ_TARGET)[1][0]
+
+        characterization = AdaptiveRefinement(measure, **params).run()
+        outcome = 'converged' if characterization.converged else 'stopped at its patch budget'
+        self.log.add(LogEvent.INTERNAL_API_ENTRY,
+                     f"adaptive characterization {outcome} after {characterization.number_of_patches} patches")
+        print(f"adaptive characterization {outcome} after {characterization.number_of_patches} patches; "
+              f"median model residual {np.median(characterization.residuals):.3f} ΔE*ab", flush=True)
+        return characterization
+
+    def _order_samples(self, samples):
+        """
+        Reorder samples to shorten settling and integration time, reporting the predicted saving
+        """
+        params = {} if self.instructions.sample_ordering is True else dict(self.instructions.sample_ordering)
+        solver_params = {key: params.pop(key) for key in ('start', 'window', 'max_passes') if key in params}
+        ordering = order_samples(samples, TransitionCost(**params), **solver_params)
+        saved = ordering.original_seconds - ordering.ordered_seconds
+        message = (f"reordered {len(samples)} samples: predicted transition time {ordering.original_seconds:.0f} s "
+                   f"-> {ordering.ordered_seconds:.0f} s ({timedelta(seconds=round(saved))} saved)")
+        self.log.add(LogEvent.INTERNAL_API_ENTRY, message)
+        print(message, flush=True)
+        return ordering
+
+    def _budgeted_loop(self, dir_, configs):
+        """
+        Measure the highest-priority samples that fit the time budget, planning again after each
+
+        With sample ordering as well, samples of equal priority are measured in the order it finds.
+        """
+        budget = dict(self.instructions.time_budget)
+        budget_seconds = budget.get('seconds', 0) + 60 * budget.get('minutes', 0)
+        history = TimingHistory.load(budget.get('history', DEFAULT_HISTORY_PATH))
+        samples = list(self.instructions.sample_sequence)
+        # with sample ordering too, samples of equal priority are measured in the shorter order
+        order = self._order_samples(samples).order if self.instructions.sample_ordering else None
+        planner = RunPlanner(samples, budget_seconds, history, order=order)
+        initial = planner.plan()
+        message = (f"planned {len(initial.order)} of {len(samples)} samples in a predicted "
+                   f"{timedelta(seconds=round(initial.predicted_seconds))} of {timedelta(seconds=budget_seconds)}")
+        self.log.add(LogEvent.INTERNAL_API_ENTRY, message)
+        print(message, flush=True)
+        indices = {}
+
+        def measurer(sequence_number, sample):
+            def measure():
+                result = self._measure_sample(dir_, sequence_number, sample, configs)
+                # observed as part of the attempt, so a requeued sample that later succeeds counts too
+                planner.observe(sequence_number, self._stage_seconds, self._integration_seconds)
+                return result
+            return measure
+
+        try:
+            # files keep the samples' sequence numbers, whatever order they are measured in
+            for sequence_number, sample in planner:
+                key = Measurer._sample_filename(sequence_number, sample)
+                indices[key] = sequence_number
+                self.runner.run(key, measurer(sequence_number, sample))
+            # a requeued sample is tried again only if its predicted cost still fits
+            self._measure_requeued(lambda key: planner.fits(indices[key]))
+        finally:
+            history.save()
+            report = planner.report()
+            self.log.add(LogEvent.INTERNAL_API_ENTRY, report)
+            print(report, flush=True)
+        return planner
 
     def main_loop(self):
         self.log = Log()
@@ -436,46 +805,35 @@ class Measurer(object):
                 return
         group_name = dir_.name
         self.measurement_group = Group(Path(dir_, group_name), missing_ok=True)
+        # appended to as each sample is written, so an interrupted run still has an accurate manifest
+        self.manifest_writer = GroupManifestWriter(Path(dir_, group_name + MANIFEST_SUFFIX), group_name)
+        self._runner = RequeueingRunner(self._retry_policy, Measurer.classify_error, self._report_retry)
         try:
             self._setup_output_dir()
             self.target = self._setup_target()
             self._setup_measurement_device(self.instructions)
             configs = self._colorimetric_configurations()
-            for sequence_number, sample in enumerate(self.instructions.sample_sequence):
-
-                if self.instructions.frame_preflight == 'manual_advance':
-                    print(f"manually set target to stimulus with name `{sample['name']}' and values {sample.value}",
-                          flush=True)
-
-                # configure the target (if need be; if it's passive, it doesn't show up)
-                if self.target:
-                    rgb = sample['value']
-                    name = sample['name']
-                    self.target.set_target_stimulus(name, rgb)
-                    sleep(1)
-
-                # trigger the spectral_measurement
-                self.capture_stimulus()
-
-                # retrieve spectral data and colorimetry
-                retrieval_request = RetrievalRequest(meter_name=self.meter_name,
-                                                     spectrum_requested=True,
-                                                     colorimetric_configurations=configs)
-                self.log.add(LogEvent.METER_SPECTRAL_RETRIEVAL | LogEvent.METER_COLORIMETRIC_RETRIEVAL,
-                             "retrieving spectrum and colorimetry")
-                retrieval_response = self.client.Retrieve(retrieval_request)
-                self.log.add(LogEvent.METER_SPECTRAL_RETRIEVAL | LogEvent.METER_COLORIMETRIC_RETRIEVAL,
-                             "processing retrieved spectrum and colorimetry")
-                measurement = self._process_retrieval_response(retrieval_response)
-                filename = f"sample.{sequence_number}"
-                if 'name' in sample:
-                    filename = f"{filename}.{sample['name']}"
-                filename = f"{filename}.spdx"
-                measurement.path = str(Path(dir_, filename))
-                measurement.write()
-                if dir_ not in self.measurement_group.collections:
-                    self.measurement_group.collections[dir_] = {}
-                self.measurement_group.collections[dir_][filename] = measurement
+            if self.instructions.adaptive_sampling:
+                ignored = [option for option, value in (('time budget', self.instructions.time_budget),
+                                                        ('sample ordering', self.instructions.sample_ordering))
+                           if value]
+                if ignored:
+                    message = f"adaptive sampling chooses its own patches; ignoring {oxford_join(ignored, 'and')}"
+                    self.log.add(LogEvent.INTERNAL_API_ENTRY, message)
+                    print(message, flush=True)
+                self._adaptive_loop(dir_, configs)
+            elif self.instructions.time_budget:
+                self._budgeted_loop(dir_, configs)
+            elif self.instructions.sample_ordering:
+                samples = list(self.instructions.sample_sequence)
+                # files keep the samples' original sequence numbers, whatever order they are measured in
+                for sequence_number in self._order_samples(samples).order:
+                    self._measure_sample_retrying(dir_, sequence_number, samples[sequence_number], configs)
+                self._measure_requeued()
+            else:
+                for sequence_number, sample in enumerate(self.instructions.sample_sequence):
+                    self._measure_sample_retrying(dir_, sequence_number, sample, configs)
+                self._measure_requeued()
         finally:
             self.cleanup(dir_)
 
@@ -3,13 +3,36 @@
 Merge old-style outboard colorimetry information in .colx into .spdx JSON_encoded header comment
 ================================
 
+Bulk migration of legacy measurement directories, where each ``sample.N.spdx`` frame
+has its colorimetry alongside in one ``sample.N.<color space>.colx`` XML file per
+color space, to .spdx files carrying that colorimetry in their header comments.
 
+The work is planned up front from the directories' fileseq sequences: every .spdx
+sequence is paired, frame by frame, with the .colx sequences sharing its base name,
+so the color spaces to merge are either given or discovered from the .colx names.
+Frames are then merged on a pool of processes. Each .spdx is rewritten in place and
+atomically, so an interrupted migration leaves every frame either untouched or fully
+merged, and each merged frame is recorded, with the color spaces merged into it, in a
+progress journal in its directory, so a rerun skips the frames that already have every
+color space asked for, and merges only the missing ones into the rest. The .colx files
+are left where they are.
+
+Usage: python -m eieio.measurement.cli_tools.merge_colx_into_spdx [-r] [-j N] [-c CS ...] dir [dir ...]
 """
 
+import argparse
+import json
+import os
 import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from eieio.measurement.measurement import Measurement
+import xml.etree.ElementTree as ET
+
+import fileseq
+
 from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.spdx_io import read_measurement, write_measurement
 
 __author__ = 'Joseph Goldstone'
 __copyright__ = 'Copyright (C) 2020 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
@@ -19,74 +42,255 @@ __email__ = 'jgoldstone@arri.com'
 __status__ = 'Experimental'
 
 __all__ = [
+    'FrameTask', 'MigrationSummary', 'plan_migration', 'merge_frame', 'read_journal', 'migrate_colx_into_spdx',
+    'merge_spdx_colx_samples', 'JOURNAL_NAME'
 ]
 
+NAMESPACES = {'arri': 'http://www.arri.de/camera'}
+OBSERVER = 'CIE 1931 2 Degree Standard Observer'
+ILLUMINANT = 'D65'
 
-import xml.etree.ElementTree as ET
+SPDX_EXTENSION = '.spdx'
+COLX_EXTENSION = '.colx'
+JOURNAL_NAME = '.merge_colx_into_spdx.journal'
 
-from pathlib import Path
-import fileseq
-import os
+FrameTask = namedtuple('FrameTask', ['spdx', 'colx'])
+FrameTask.__doc__ = """
+One .spdx frame and the (color space suffix, .colx path) pairs to merge into it
+"""
+
+MigrationSummary = namedtuple('MigrationSummary', ['merged', 'skipped', 'failed'])
+MigrationSummary.__doc__ = """
+The .spdx paths merged, those skipped as already journaled with every color space asked for,
+and (path, reason) pairs for those that failed
+"""
+
+
+def colx_color_space(extension):
+    """
+    Return the color space suffix of a .colx sequence extension, e.g. 'cie_xyy' for
+    '.cie_xyy.colx', or None if the extension is not that of a .colx file
+    """
+    if not extension.endswith(COLX_EXTENSION):
+        return None
+    color_space = extension[:-len(COLX_EXTENSION)].lstrip('.')
+    return color_space if color_space and '.' not in color_space else None
+
+
+def _colx_path(spdx_path, color_space):
+    return str(Path(spdx_path).with_suffix(f".{color_space.lower()}{COLX_EXTENSION}"))
+
+
+def plan_migration(dir_, color_spaces=None):
+    """
+    Plan the merge of a directory's .colx files into its .spdx files
+
+    Parameters
+    ----------
+    dir_ : str or Path
+        directory holding .spdx and .colx frame sequences
+    color_spaces : sequence, optional
+        .colx color space suffixes (e.g. 'cie_xyy') to merge into every frame; a frame
+        missing any of them will fail. By default, each frame gets whatever .colx files
+        the directory's sequences have for it.
+
+    Returns
+    -------
+    list
+        a :class:`FrameTask` for each .spdx frame with something to merge
+    """
+    sequences = fileseq.findSequencesOnDisk(str(dir_))
+    colx_sequences = {}
+    for seq in sequences:
+        color_space = colx_color_space(seq.extension())
+        if color_space is not None and seq.frameSet() is not None:
+            colx_sequences.setdefault(seq.basename(), []).append((color_space, seq))
+    tasks = []
+    for seq in sequences:
+        if seq.extension() != SPDX_EXTENSION or seq.frameSet() is None:
+            continue
+        for frame in seq.frameSet():
+            spdx = seq.frame(frame)
+            if color_spaces is not None:
+                colx = tuple((color_space, _colx_path(spdx, color_space)) for color_space in color_spaces)
+            else:
+                colx = tuple((color_space, colx_seq.frame(frame))
+                             for color_space, colx_seq in sorted(colx_sequences.get(seq.basename(), []))
+                             if frame in colx_seq.frameSet())
+            if colx:
+                tasks.append(FrameTask(spdx, colx))
+    return tasks
 
 
-def move_frames_to_dir(src_dir, name_pattern, dst_dir):
-    seq = fileseq.findSequenceOnDisk(str(Path(src_dir, name_pattern)))
-    for ix, _ in enumerate(seq.frameSet()):
-        old_path = seq[ix]
-        new_path = Path(dst_dir, Path(old_path).name)
-        print(f"will call os.rename({old_path}, {new_path})")
-        os.rename(old_path, new_path)
+def read_colx(path):
+    """
+    Read the colorimetry from a .colx file
 
+    Returns
+    -------
+    Colorimetry
+    """
+    root = ET.parse(path).getroot()
+    colorimetry = root.find('arri:Colorimetry', NAMESPACES)
+    if colorimetry is None:
+        raise RuntimeError(f"couldn't find Colorimetry element in .colx XML file `{path}'")
+    color_space = colorimetry.findtext('arri:ColorSpaceModel', namespaces=NAMESPACES)
+    if not color_space:
+        raise RuntimeError(f"couldn't find color space inside Colorimetry element in .colx XML file `{path}'")
+    component_values = [float(value.text) for value in colorimetry.findall('arri:ComponentValue', NAMESPACES)]
+    return Colorimetry(OBSERVER, color_space, ILLUMINANT, component_values, origin='measured')
 
-def prep_dir_for_merge(src_dir, old_style_sub_dir):
-    old_style_dir = Path(src_dir, old_style_sub_dir)
-    print(f"will call os.mkdir({old_style_dir})")
-    os.mkdir(old_style_dir)
-    move_frames_to_dir(src_dir, r'sample.@.spdx', old_style_dir)
-    move_frames_to_dir(src_dir, r'sample.@.cie_xyy.colx', old_style_dir)
-    move_frames_to_dir(src_dir, r'sample.@.cie_xyz.colx', old_style_dir)
+
+def merge_frame(task):
+    """
+    Merge a frame's .colx colorimetry into its .spdx file, replacing the file atomically
+
+    Colorimetry already in the .spdx under the same key is replaced, so merging a frame
+    twice is harmless.
+
+    Returns
+    -------
+    list
+        the color space suffixes merged
+    """
+    m = read_measurement(task.spdx)
+    for _, colx in task.colx:
+        m.insert_colorimetry(read_colx(colx), replace_ok=True)
+    write_measurement(m, task.spdx, atomic=True)
+    return [color_space for color_space, _ in task.colx]
+
+
+def read_journal(dir_):
+    """
+    Return the .spdx files in a directory recorded as merged, with the color spaces merged into each
+
+    A line torn by an interrupted run is ignored, so its frame is merged again.
+
+    Returns
+    -------
+    dict
+        maps each .spdx filename to the set of (lower-case) color space suffixes merged into it
+    """
+    done = {}
+    try:
+        with open(Path(dir_, JOURNAL_NAME)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    color_spaces = {color_space.lower() for color_space in entry.get('color_spaces', ())}
+                    done.setdefault(entry['spdx'], set()).update(color_spaces)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _unmerged(task, done):
+    """Return the task cut down to the color spaces its frame's journal entries don't cover, or None"""
+    merged = done.get(Path(task.spdx).name, set())
+    colx = tuple((color_space, path) for color_space, path in task.colx if color_space.lower() not in merged)
+    return task._replace(colx=colx) if colx else None
+
+
+def _migration_dirs(dirs, recursive):
+    for dir_ in dirs:
+        if recursive:
+            for sub_dir, _, _ in os.walk(dir_):
+                yield sub_dir
+        else:
+            yield str(dir_)
+
+
+def migrate_colx_into_spdx(dirs, color_spaces=None, recursive=False, max_workers=None, verbose=False):
+    """
+    Merge the .colx colorimetry of one or more directories into their .spdx files
+
+    Parameters
+    ----------
+    dirs : str or Path or sequence
+        directories to migrate
+    color_spaces : sequence, optional
+        .colx color space suffixes to merge; by default, those found for each frame
+    recursive : bool, optional
+        if True, migrate subdirectories too
+    max_workers : int, optional
+        size of the process pool; if 1, frames are merged in this process
+    verbose : bool, optional
+        if True, report each frame as it finishes
+
+    Returns
+    -------
+    MigrationSummary
+    """
+    if isinstance(dirs, (str, Path)):
+        dirs = [dirs]
+    tasks = []
+    skipped = []
+    for dir_ in _migration_dirs(dirs, recursive):
+        done = read_journal(dir_)
+        for task in plan_migration(dir_, color_spaces):
+            unmerged = _unmerged(task, done)
+            if unmerged is None:
+                skipped.append(task)
+            else:
+                tasks.append(unmerged)
+    merged = []
+    failed = []
+
+    def record(task, result):
+        if isinstance(result, BaseException):
+            failed.append((task.spdx, f"{type(result).__name__}: {result}"))
+            if verbose:
+                print(f"{task.spdx}: failed: {result}")
+            return
+        # opened for each entry, since a recursive run can cover more directories than a process may have files open
+        with open(Path(Path(task.spdx).parent, JOURNAL_NAME), 'a') as journal:
+            journal.write(json.dumps({'spdx': Path(task.spdx).name, 'color_spaces': result}) + '\n')
+        merged.append(task.spdx)
+        if verbose:
+            print(f"{task.spdx}: merged {', '.join(result)}")
+
+    if max_workers == 1:
+        for task in tasks:
+            try:
+                result = merge_frame(task)
+            except Exception as e:
+                result = e
+            record(task, result)
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(merge_frame, task): task for task in tasks}
+            for future in as_completed(futures):
+                exception = future.exception()
+                record(futures[future], exception if exception is not None else future.result())
+    return MigrationSummary(merged, [task.spdx for task in skipped], failed)
 
 
 def merge_spdx_colx_samples(src_dir, color_spaces):
+    """
+    Merge the given .colx color spaces into the .spdx files of a single directory
+    """
     if not color_spaces:
-        return
-    sub_dir = 'old_style'
-    prep_dir_for_merge(src_dir, sub_dir)
-    spdx_pattern = str(Path(src_dir, sub_dir, r'sample.@.spdx'))
-    seq = fileseq.findSequenceOnDisk(spdx_pattern)
-    for ix, _ in enumerate(seq):
-        in_spdx = seq[ix]
-        out_spdx = str(Path(Path(in_spdx).parents[1], Path(in_spdx).name))
-        print(f"{in_spdx} -> {out_spdx}")
-        m = Measurement()
-        m.path = in_spdx
-        m.read()
-        m.path = out_spdx
-        ns = {'arri': 'http://www.arri.de/camera'}
-        for color_space in color_spaces:
-            in_colx_name = f"{Path(in_spdx).stem}.{color_space.lower()}.colx"
-            in_colx_dir = Path(in_spdx).parent
-            in_colx = Path(in_colx_dir, in_colx_name)
-            tree = ET.parse(in_colx)
-            root = tree.getroot()
-            colorimetry = root.find('arri:Colorimetry', ns)
-            if not colorimetry:
-                raise RuntimeError("couldn't find Colorimetry element in .colx XML")
-            color_space = colorimetry.find('arri:ColorSpaceModel', ns).text
-            if not color_space:
-                raise RuntimeError("couldn't find color space inside Colorimetry element in .colx XML file")
-            component_values = []
-            for value in colorimetry.findall('arri:ComponentValue', ns):
-                v = float(value.text)
-                component_values.append(v)
-            new_c = Colorimetry('CIE 1931 2 Degree Standard Observer', color_space, 'D65',
-                                component_values, origin='measured')
-            m.insert_colorimetry(new_c)
-        print(f"will write to {m.path}")
-        m.write()
+        return None
+    return migrate_colx_into_spdx(src_dir, color_spaces)
 
 
-if __name__ == '__main__':
-    in_base = sys.argv[1]
-    merge_spdx_colx_samples(in_base, ["cie_xyy", "cie_xyz"])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge outboard .colx colorimetry into .spdx files')
+    parser.add_argument('dirs', nargs='+', help='directories holding sample.N.spdx and sample.N.<cs>.colx files')
+    parser.add_argument('-c', '--color-spaces', nargs='+',
+                        help='.colx color space suffixes to merge (e.g. cie_xyy cie_xyz); default: all found')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also migrate subdirectories')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('-q', '--quiet', action='store_true', help="don't report each frame")
+    args = parser.parse_args(argv)
+    summary = migrate_colx_into_spdx(args.dirs, args.color_spaces, args.recursive, args.jobs, not args.quiet)
+    print(f"{len(summary.merged)} merged, {len(summary.skipped)} already merged, {len(summary.failed)} failed")
+    for path, reason in summary.failed:
+        print(f"  {path}: {reason}")
+    return 1 if summary.failed else 0
 
+
+if __name__ == '__main__':
+    sys.exit(main())
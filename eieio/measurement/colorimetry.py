@@ -13,9 +13,7 @@ different observers.
 The tristimulus values are linearly represented.
 """
 
-from colour.colorimetry.datasets.cmfs import MSDS_CMFS_STANDARD_OBSERVER
-from colour.models.common import COLOURSPACE_MODELS
-from colour.colorimetry.datasets.illuminants.sds import SDS_ILLUMINANTS
+from eieio.measurement.canonical_names import COLOR_SPACES, ILLUMINANTS, OBSERVERS
 from utilities.english import oxford_join
 
 __author__ = 'Joseph Goldstone'
@@ -31,6 +29,13 @@ __all__ = [
 
 MEASUREMENT_ORIGINS = ('unknown', 'measured', 'derived', 'synthesized', 'manual_input')
 
+_PRETTY_OBSERVERS = {'CIE 1931 2 Degree Standard Observer': ' 2º',
+                     'CIE 1964 10 Degree Standard Observer': ' 10º',
+                     'CIE 2015 2 Degree Standard Observer': ' 2º (2012)',
+                     'CIE 2015 10 Degree Standard Observer': ' 10º (2012)'}
+
+_ILLUMINANT_FREE_COLOR_SPACES = frozenset(('CIE XYZ', 'CIE xyY', 'RGB'))
+
 
 class Colorimetry(object):
     """
@@ -55,24 +60,6 @@ class Colorimetry(object):
         self.observer = observer
         self.color_space = color_space
         self.illuminant = illuminant
-        observer = observer.replace('_', ' ').lower()  # TODO clean this up
-        color_space = color_space.replace('_' ,' ').lower()
-        illuminant = illuminant.replace('_', ' ').lower()
-        # if observer not in [key.lower() for key in MSDS_CMFS_STANDARD_OBSERVER.keys()]:
-        #     raise ValueError(f"'observer' argument to Colorimetry ctor must be one of "
-        #                      f"{oxford_join(list(MSDS_CMFS_STANDARD_OBSERVER.keys()), 'or')}")
-        # self._observer = None
-        # self.observer = observer
-        # if color_space not in [model.lower() for model in COLOURSPACE_MODELS]:
-        #     raise ValueError(f"'color_space' argument to Colorimetry ctor must be one of "
-        #                      f"{oxford_join(COLOURSPACE_MODELS, 'or')}")
-        # self._color_space = None
-        # self.color_space = color_space
-        # if illuminant not in [illum.lower() for illum in SDS_ILLUMINANTS.keys()]:
-        #     raise ValueError(f"'illuminant' argument to Colorimetry ctor must be one of "
-        #                      f"{oxford_join(list(SDS_ILLUMINANTS.keys()), 'or')}")
-        # self._illuminant = None
-        # self.illuminant = illuminant
         if len(values) != 3:
             raise ValueError("'values' argument to Colorimetry ctor must have exactly "
                              "three elements")
@@ -85,21 +72,10 @@ class Colorimetry(object):
         self.origin = origin
 
     def __str__(self):
-        pretty_observer = ''
-        if self.observer:
-            if self.observer.lower() in (o.lower() for o in ('CIE 1931 2 Degree Standard Observer', 'cie_2_1931')):
-                pretty_observer = ' 2º'
-            elif self.observer.lower() in (o.lower() for o in ('CIE 1964 10 Degree Standard Observer', 'cie_10_1964')):
-                pretty_observer = ' 10º'
-            elif self.observer.lower() == 'CIE 2012 2 Degree Standard Observer'.lower():
-                pretty_observer = ' 2º (2012)'
-            elif self.observer.lower() == 'CIE 2012 10 Degree Standard Observer'.lower():
-                pretty_observer = ' 10º (2012)'
+        pretty_observer = _PRETTY_OBSERVERS.get(self.observer, '') if self.observer else ''
         pretty_illuminant = ''
         if self.illuminant:
-            if self.color_space.lower() not in (cs.lower() for cs in ('CIE_XYZ', 'CIE_xyY', 'RxRyRz', 'RGB',
-                                                                      'Lv_xy', 'Y_xy', 'Lv_T_duv',
-                                                                      'Dominant_wavelength_and_excitation_purity')):
+            if self.color_space not in _ILLUMINANT_FREE_COLOR_SPACES:
                 pretty_illuminant = f" / {self.illuminant}" if pretty_observer else f" {self.illuminant}"
         pretty_origin = f" {self.origin}" if self.origin and self.origin != 'measured' else ''
         result = f"{self.color_space}"
@@ -119,14 +95,12 @@ class Colorimetry(object):
 
     @observer.setter
     def observer(self, value):
-        new_value = value.replace('_', ' ').lower()
-        for candidate_observer in list(MSDS_CMFS_STANDARD_OBSERVER.keys()):
-            if new_value == candidate_observer.lower():
-                self._observer = candidate_observer
-                return
-        raise ValueError(f"Attempt to set Colorimetry observer attribute to `{value}', "
-                         f"an unsupported observer. Supported observers are "
-                         f"{oxford_join(list(MSDS_CMFS_STANDARD_OBSERVER.keys()), 'or')}.")
+        canonical = OBSERVERS.get(value)
+        if canonical is None:
+            raise ValueError(f"Attempt to set Colorimetry observer attribute to `{value}', "
+                             f"an unsupported observer. Supported observers are "
+                             f"{oxford_join(list(OBSERVERS.names), 'or')}.")
+        self._observer = canonical
 
     @property
     def color_space(self):
@@ -134,14 +108,12 @@ class Colorimetry(object):
 
     @color_space.setter
     def color_space(self, value):
-        new_value = value.replace('_', ' ').lower()
-        for candidate_space in COLOURSPACE_MODELS:
-            if new_value == candidate_space.lower():
-                self._color_space = candidate_space
-                return
-        raise ValueError(f"Attempt to set Colorimetry color_space attribute to `{value}', "
-                         f"an unsupported color space. Supported color spaces are "
-                         f"{oxford_join(COLOURSPACE_MODELS, 'or')}.")
+        canonical = COLOR_SPACES.get(value)
+        if canonical is None:
+            raise ValueError(f"Attempt to set Colorimetry color_space attribute to `{value}', "
+                             f"an unsupported color space. Supported color spaces are "
+                             f"{oxford_join(list(COLOR_SPACES.names), 'or')}.")
+        self._color_space = canonical
 
     @property
     def illuminant(self):
@@ -149,14 +121,12 @@ class Colorimetry(object):
 
     @illuminant.setter
     def illuminant(self, value):
-        new_value = value.replace('_', ' ').lower()
-        for candidate_illuminant in SDS_ILLUMINANTS:
-            if new_value == candidate_illuminant.lower():
-                self._illuminant = candidate_illuminant
-                return
-        raise ValueError(f"Attempt to set Colorimetry illuminant to `{value}', "
-                         f"an unsupported illuminant. Supported illuminants are "
-                         f"{oxford_join(SDS_ILLUMINANTS, 'or')}.")
+        canonical = ILLUMINANTS.get(value)
+        if canonical is None:
+            raise ValueError(f"Attempt to set Colorimetry illuminant to `{value}', "
+                             f"an unsupported illuminant. Supported illuminants are "
+                             f"{oxford_join(list(ILLUMINANTS.names), 'or')}.")
+        self._illuminant = canonical
 
     @property
     def values(self):
@@ -184,5 +154,5 @@ class Colorimetry(object):
         return (other.observer == self.observer
                 and other.color_space == self.color_space
                 and other.illuminant == self.illuminant
-                and other.values == self.values
+                and list(other.values) == list(self.values)
                 and other.origin == self.origin)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Conversions between colorimetric models
+================================
+
+Derives colorimetry in one model from colorimetry in another, for the same observer,
+without going back to a spectrum. The supported models form a small graph of
+vectorized conversions centred on CIE XYZ; :func:`conversion_path` finds the cheapest
+path between two models and :func:`convert` runs the compiled path over an N×3 array
+of values, so a whole group converts at once.
+
+Some models (CIE Lab, CIE Luv, Hunter Lab) are defined relative to a reference white.
+The white chromaticity comes from the illuminant named in the colorimetry, as seen by
+its observer; the white's luminance is supplied by the caller, and defaults to 100 in
+the units of the absolute XYZ the meters report. Every other model ignores the
+illuminant, so e.g. CIE xyY under D65 and CIE xyY under D50 are the same values.
+
+Observers cannot be converted between: colorimetry for a different observer has to be
+computed from spectral data, as :mod:`eieio.measurement.batch_colorimetry` does.
+
+Compiled paths and white points are cached for the life of the process.
+"""
+
+import heapq
+from threading import RLock
+
+import numpy as np
+
+from colour.colorimetry import reshape_sd
+from colour.colorimetry.datasets.cmfs import MSDS_CMFS_STANDARD_OBSERVER
+from colour.colorimetry.datasets.illuminants.sds import SDS_ILLUMINANTS
+from colour.models import (XYZ_to_Hunter_Lab, XYZ_to_IPT, XYZ_to_Lab, XYZ_to_Luv, XYZ_to_UCS, XYZ_to_xyY,
+                           Hunter_Lab_to_XYZ, IPT_to_XYZ, Lab_to_XYZ, Luv_to_XYZ, UCS_to_XYZ, xyY_to_XYZ)
+from colour.utilities import domain_range_scale
+
+from utilities.english import oxford_join
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'DEFAULT_WHITE_LUMINANCE', 'CONVERTIBLE_COLOR_SPACES', 'ILLUMINANT_SENSITIVE_COLOR_SPACES',
+    'white_point_XYZ', 'conversion_path', 'convert', 'conversion_source'
+]
+
+DEFAULT_WHITE_LUMINANCE = 100.0
+
+_CACHE_LOCK = RLock()
+_WHITE_POINTS = {}
+_PATHS = {}
+
+# each conversion takes (values, white XYZ normalized to Y=1, white luminance) and runs
+# in colour's 'reference' domain-range scale; the white is that of whichever end of the
+# edge is illuminant-sensitive, and is ignored otherwise
+
+
+def _xy(XYZ_w):
+    return XYZ_w[:2] / XYZ_w.sum()
+
+
+_EDGES = {
+    ('CIE XYZ', 'CIE xyY'): lambda v, w, l: XYZ_to_xyY(v),
+    ('CIE xyY', 'CIE XYZ'): lambda v, w, l: xyY_to_XYZ(v),
+    ('CIE XYZ', 'CIE UCS'): lambda v, w, l: XYZ_to_UCS(v),
+    ('CIE UCS', 'CIE XYZ'): lambda v, w, l: UCS_to_XYZ(v),
+    ('CIE XYZ', 'CIE Lab'): lambda v, w, l: XYZ_to_Lab(v / l, _xy(w)),
+    ('CIE Lab', 'CIE XYZ'): lambda v, w, l: Lab_to_XYZ(v, _xy(w)) * l,
+    ('CIE XYZ', 'CIE Luv'): lambda v, w, l: XYZ_to_Luv(v / l, _xy(w)),
+    ('CIE Luv', 'CIE XYZ'): lambda v, w, l: Luv_to_XYZ(v, _xy(w)) * l,
+    ('CIE XYZ', 'Hunter Lab'): lambda v, w, l: XYZ_to_Hunter_Lab(v * (100 / l), w * 100),
+    ('Hunter Lab', 'CIE XYZ'): lambda v, w, l: Hunter_Lab_to_XYZ(v, w * 100) * (l / 100),
+    ('CIE XYZ', 'IPT'): lambda v, w, l: XYZ_to_IPT(v / l),
+    ('IPT', 'CIE XYZ'): lambda v, w, l: IPT_to_XYZ(v) * l,
+}
+
+# relative cost of each edge; all equal for now, but kept separate from the edges so
+# that lossy or expensive conversions can be discouraged without restructuring
+_EDGE_COSTS = {edge: 1 for edge in _EDGES}
+
+ILLUMINANT_SENSITIVE_COLOR_SPACES = frozenset(('CIE Lab', 'CIE Luv', 'Hunter Lab'))
+CONVERTIBLE_COLOR_SPACES = tuple(sorted({space for edge in _EDGES for space in edge}))
+
+
+def white_point_XYZ(observer, illuminant):
+    """
+    Return the XYZ of an illuminant as seen by an observer, normalized so that Y is 1
+
+    Parameters
+    ----------
+    observer : str
+        canonical observer name, a key of MSDS_CMFS_STANDARD_OBSERVER
+    illuminant : str
+        canonical illuminant name, a key of SDS_ILLUMINANTS
+    """
+    key = (observer, illuminant)
+    with _CACHE_LOCK:
+        XYZ_w = _WHITE_POINTS.get(key)
+        if XYZ_w is not None:
+            return XYZ_w
+    cmfs = MSDS_CMFS_STANDARD_OBSERVER[observer]
+    sd = reshape_sd(SDS_ILLUMINANTS[illuminant], cmfs.shape)
+    XYZ_w = sd.values @ cmfs.values
+    XYZ_w = XYZ_w / XYZ_w[1]
+    XYZ_w.setflags(write=False)
+    with _CACHE_LOCK:
+        _WHITE_POINTS[key] = XYZ_w
+    return XYZ_w
+
+
+def _same_colorimetry(source_space, source_illuminant, target_space, target_illuminant):
+    return (source_space == target_space
+            and (source_space not in ILLUMINANT_SENSITIVE_COLOR_SPACES or source_illuminant == target_illuminant))
+
+
+def conversion_path(source_space, target_space):
+    """
+    Find the cheapest sequence of conversions from one color space to another
+
+    Parameters
+    ----------
+    source_space : str
+        canonical color space name
+    target_space : str
+        canonical color space name
+
+    Returns
+    -------
+    tuple
+        (cost, spaces) where spaces runs from source_space to target_space inclusive
+
+    Raises
+    ------
+    ValueError
+        if there is no way to get from source_space to target_space
+    """
+    key = (source_space, target_space)
+    with _CACHE_LOCK:
+        path = _PATHS.get(key)
+        if path is not None:
+            return path
+    queue = [(0, (source_space,))]
+    settled = set()
+    path = None
+    while queue:
+        cost, spaces = heapq.heappop(queue)
+        space = spaces[-1]
+        if space == target_space:
+            path = (cost, spaces)
+            break
+        if space in settled:
+            continue
+        settled.add(space)
+        for (from_space, to_space), edge_cost in _EDGE_COSTS.items():
+            if from_space == space and to_space not in settled:
+                heapq.heappush(queue, (cost + edge_cost, spaces + (to_space,)))
+    if path is None:
+        raise ValueError(f"no conversion from `{source_space}' to `{target_space}'; convertible color spaces "
+                         f"are {oxford_join(CONVERTIBLE_COLOR_SPACES, 'and')}")
+    with _CACHE_LOCK:
+        _PATHS[key] = path
+    return path
+
+
+def convert(values, source, target, white_luminance=DEFAULT_WHITE_LUMINANCE):
+    """
+    Convert colorimetry from one color space and illuminant to another
+
+    Parameters
+    ----------
+    values : array_like
+        a triplet, or an N×3 array of triplets
+    source : tuple
+        canonical (observer, color space, illuminant) of values
+    target : tuple
+        canonical (observer, color space, illuminant) wanted
+    white_luminance : float
+        luminance of the reference white for colour spaces defined relative to one
+
+    Returns
+    -------
+    ndarray
+        converted values, shaped like values
+
+    Raises
+    ------
+    ValueError
+        if the observers differ, or there is no conversion between the color spaces
+    """
+    source_observer, source_space, source_illuminant = source
+    target_observer, target_space, target_illuminant = target
+    if source_observer != target_observer:
+        raise ValueError(f"cannot convert colorimetry from observer `{source_observer}' to observer "
+                         f"`{target_observer}' without spectral data")
+    values = np.asarray(values, dtype=np.float64)
+    if _same_colorimetry(source_space, source_illuminant, target_space, target_illuminant):
+        return values.copy()
+    _, spaces = conversion_path(source_space, target_space)
+    if source_space == target_space:
+        # same illuminant-sensitive space under a different white: go by way of XYZ
+        spaces = conversion_path(source_space, 'CIE XYZ')[1] + conversion_path('CIE XYZ', target_space)[1][1:]
+    with domain_range_scale('reference'):
+        for i, (from_space, to_space) in enumerate(zip(spaces, spaces[1:])):
+            if from_space in ILLUMINANT_SENSITIVE_COLOR_SPACES and i == 0:
+                illuminant = source_illuminant
+            else:
+                illuminant = target_illuminant
+            values = _EDGES[(from_space, to_space)](values, white_point_XYZ(source_observer, illuminant),
+                                                    white_luminance)
+    return values
+
+
+def conversion_source(colorimetry, target):
+    """
+    Choose the colorimetry from which a target can most cheaply be converted
+
+    Parameters
+    ----------
+    colorimetry : dict
+        maps (observer, color space, illuminant) to Colorimetry, as Measurement.colorimetry does
+    target : tuple
+        canonical (observer, color space, illuminant) wanted
+
+    Returns
+    -------
+    tuple or None
+        (cost, key) for the best source in colorimetry, preferring measured colorimetry
+        over other origins at equal cost, or None if no colorimetry for the target's
+        observer can be converted
+    """
+    target_observer, target_space, target_illuminant = target
+    best = None
+    for key, c in colorimetry.items():
+        observer, space, illuminant = key
+        if observer != target_observer:
+            continue
+        if _same_colorimetry(space, illuminant, target_space, target_illuminant):
+            cost = 0
+        else:
+            try:
+                cost = conversion_path(space, target_space)[0]
+            except ValueError:
+                continue
+            if space == target_space:
+                cost = conversion_path(space, 'CIE XYZ')[0] + conversion_path('CIE XYZ', space)[0]
+        rank = (cost, 0 if c.origin == 'measured' else 1)
+        if best is None or rank < best[0]:
+            best = (rank, key)
+    return None if best is None else (best[0][0], best[1])
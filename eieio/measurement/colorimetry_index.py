@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial index over colorimetry
+================================
+
+Defines the :class:`eieio.measurement.colorimetry_index.ColorimetryIndex` class, which
+answers range, radius and k-nearest-neighbour queries over one kind of colorimetry
+(an observer, color space and illuminant, optionally restricted to some of the three
+components, e.g. the x and y of CIE xyY) held by one or more groups of measurements.
+
+Points are taken from a :class:`eieio.measurement.colorimetry_table.ColorimetryTable`
+and organized in a k-d tree, built the first time a query needs it. An index can be
+saved to and loaded from an .npz file together with a digest of the membership it was
+built from, so a group can keep its index alongside it and rebuild it only when its
+members change.
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from eieio.measurement.canonical_names import canonical_color_space, canonical_illuminant, canonical_observer
+from eieio.measurement.colorimetry_table import ColorimetryTable
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'ColorimetryIndex', 'index_key', 'membership_digest', 'sidecar_path'
+]
+
+INDEX_SUFFIX = '.cidx.npz'
+
+
+def index_key(observer, color_space, illuminant, components=None):
+    """
+    Canonicalize what an index covers
+
+    Returns
+    -------
+    tuple
+        canonical observer, color space and illuminant, and a tuple of component indices
+    """
+    return (canonical_observer(observer), canonical_color_space(color_space), canonical_illuminant(illuminant),
+            tuple(range(3)) if components is None else tuple(components))
+
+
+def membership_digest(fingerprints):
+    """
+    Digest an iterable of (source, size, mtime_ns) fingerprints, order-independently
+    """
+    h = hashlib.sha1()
+    for source, size, mtime_ns in sorted(fingerprints):
+        h.update(f"{source}\0{size}\0{mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+class ColorimetryIndex(object):
+    """
+    k-d tree over one kind of colorimetry, answering geometric queries with the sources
+    (measurement file paths) of matching points
+
+    Attributes
+    ----------
+    key : tuple
+        observer, color space, illuminant and the indexed component numbers
+    sources : ndarray
+        source of each indexed point
+    points : ndarray
+        N×D array of indexed points
+    digest : str or None
+        membership digest of whatever the index was built from, if known
+    """
+
+    def __init__(self, key, sources, points, digest=None):
+        self._key = key
+        self._sources = np.asarray(sources, dtype=object)
+        self._points = np.asarray(points, dtype=np.float64).reshape(len(self._sources), len(key[3]))
+        self._digest = digest
+        self._tree = None
+
+    @classmethod
+    def from_table(cls, table, observer, color_space, illuminant, components=None, digest=None):
+        """
+        Index the colorimetry of one kind in a ColorimetryTable
+        """
+        key = index_key(observer, color_space, illuminant, components)
+        rows = table.where(observer=key[0], color_space=key[1], illuminant=key[2])
+        return cls(key, rows.column('source'), rows.values[:, list(key[3])], digest)
+
+    @classmethod
+    def from_groups(cls, groups, observer, color_space, illuminant, components=None):
+        """
+        Index the colorimetry of one kind across several groups
+        """
+        table = ColorimetryTable.concatenate([group.colorimetry_table() for group in groups])
+        return cls.from_table(table, observer, color_space, illuminant, components)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            key = tuple(str(name) for name in npz['key']) + (tuple(int(c) for c in npz['components']),)
+            digest = str(npz['digest']) or None
+            return cls(key, npz['sources'].astype(object), npz['points'], digest)
+
+    def save(self, path):
+        """
+        Write the index's points and sources, not its tree, which is quicker to rebuild than to read
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, key=np.array(self._key[:3]), components=np.array(self._key[3], dtype=np.int64),
+                     sources=self._sources.astype(str), points=self._points, digest=np.array(self._digest or ''))
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def sources(self):
+        return self._sources
+
+    @property
+    def points(self):
+        return self._points
+
+    @property
+    def digest(self):
+        return self._digest
+
+    def __len__(self):
+        return len(self._sources)
+
+    def _query_point(self, point):
+        point = np.asarray(point, dtype=np.float64)
+        if point.shape[-1] == 3 and len(self._key[3]) != 3:
+            point = point[..., list(self._key[3])]
+        return point
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = cKDTree(self._points)
+        return self._tree
+
+    def within_range(self, lower, upper):
+        """
+        Find the points inside an axis-aligned box
+
+        Parameters
+        ----------
+        lower : array_like
+            per-component lower bounds (inclusive)
+        upper : array_like
+            per-component upper bounds (inclusive)
+
+        Returns
+        -------
+        list
+            sources of the points in the box, in index order
+        """
+        lower = self._query_point(lower)
+        upper = self._query_point(upper)
+        if not len(self):
+            return []
+        centre = (lower + upper) / 2
+        candidates = np.array(self.tree.query_ball_point(centre, np.max(upper - centre), p=np.inf), dtype=np.intp)
+        candidates.sort()
+        points = self._points[candidates]
+        inside = np.all((points >= lower) & (points <= upper), axis=1)
+        return list(self._sources[candidates[inside]])
+
+    def within_radius(self, point, radius):
+        """
+        Find the points within a Euclidean distance of a point
+
+        Returns
+        -------
+        list
+            (source, distance) pairs, nearest first
+        """
+        point = self._query_point(point)
+        if not len(self):
+            return []
+        indices = np.array(self.tree.query_ball_point(point, radius), dtype=np.intp)
+        distances = np.linalg.norm(self._points[indices] - point, axis=1)
+        order = np.argsort(distances, kind='stable')
+        return list(zip(self._sources[indices[order]], distances[order].tolist()))
+
+    def nearest(self, point, k=1):
+        """
+        Find the k points nearest a point
+
+        Returns
+        -------
+        list
+            up to k (source, distance) pairs, nearest first
+        """
+        point = self._query_point(point)
+        k = min(k, len(self))
+        if k < 1:
+            return []
+        distances, indices = self.tree.query(point, k=[i + 1 for i in range(k)])
+        return list(zip(self._sources[indices], np.asarray(distances).tolist()))
+
+
+def sidecar_path(group_path, key, suffix=INDEX_SUFFIX):
+    """
+    Return where the index for a key is kept next to a group file
+    """
+    tag = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    group_path = Path(group_path)
+    return group_path.with_name(f"{group_path.name}.{tag}{suffix}")
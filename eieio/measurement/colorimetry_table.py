@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar colorimetry storage
+================================
+
+Defines the :class:`eieio.measurement.colorimetry_table.ColorimetryTable` class, which
+holds the colorimetry of many measurements as columns rather than as one
+:class:`eieio.measurement.colorimetry.Colorimetry` object per value: each of the
+observer, color space, illuminant, origin and source (the file a measurement came
+from) columns is an array of small integer codes into a list of distinct strings, and
+the values are a single N×3 float64 array.
+
+Indexing a table yields :class:`eieio.measurement.colorimetry_table.ColorimetryRow`
+objects, which look like Colorimetry objects but whose values are views into the
+table's array rather than copies.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from eieio.measurement.colorimetry import Colorimetry
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'ColorimetryTable', 'ColorimetryRow'
+]
+
+CATEGORICAL_COLUMNS = ('observer', 'color_space', 'illuminant', 'origin', 'source')
+KEY_COLUMNS = ('observer', 'color_space', 'illuminant')
+
+CODE_DTYPE = np.int32
+
+
+class ColorimetryRow(object):
+    """
+    One row of a ColorimetryTable, usable wherever a Colorimetry is read
+
+    The row's values are a view of the table's storage; writing to them writes to the table.
+    """
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def _category(self, column):
+        return self._table.categories(column)[self._table.codes(column)[self._index]]
+
+    @property
+    def observer(self):
+        return self._category('observer')
+
+    @property
+    def color_space(self):
+        return self._category('color_space')
+
+    @property
+    def illuminant(self):
+        return self._category('illuminant')
+
+    @property
+    def origin(self):
+        return self._category('origin')
+
+    @property
+    def source(self):
+        return self._category('source')
+
+    @property
+    def values(self):
+        return self._table.values[self._index]
+
+    def key(self):
+        return self.observer, self.color_space, self.illuminant
+
+    def to_colorimetry(self):
+        """Return an independent Colorimetry holding a copy of this row's values"""
+        return Colorimetry(self.observer, self.color_space, self.illuminant, self.values.tolist(), self.origin)
+
+    def __str__(self):
+        return Colorimetry.__str__(self)
+
+    def __eq__(self, other):
+        return (other.observer == self.observer
+                and other.color_space == self.color_space
+                and other.illuminant == self.illuminant
+                and list(other.values) == list(self.values)
+                and other.origin == self.origin)
+
+
+class ColorimetryTable(object):
+    """
+    Columnar store of colorimetry for many measurements
+
+    Tables are built in bulk, from measurements or a Group, and are not grown row by
+    row; filtering and concatenation produce new tables.
+    """
+
+    def __init__(self, codes=None, categories=None, values=None):
+        """
+
+        Parameters
+        ----------
+        codes : dict
+            maps each categorical column name to an integer array of length N
+        categories : dict
+            maps each categorical column name to the list of strings its codes index
+        values : ndarray
+            N×3 float64 array
+        """
+        self._categories = {column: list(categories[column]) if categories else [] for column in CATEGORICAL_COLUMNS}
+        self._lookup = {column: {name: code for code, name in enumerate(names)}
+                        for column, names in self._categories.items()}
+        if values is None:
+            values = np.empty((0, 3))
+        self._values = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+        self._codes = {column: np.asarray(codes[column], dtype=CODE_DTYPE) if codes
+                       else np.empty(0, dtype=CODE_DTYPE)
+                       for column in CATEGORICAL_COLUMNS}
+
+    @classmethod
+    def from_measurements(cls, measurements, sources=None):
+        """
+        Build a table of all the colorimetry some measurements hold
+
+        Parameters
+        ----------
+        measurements : iterable of Measurement
+        sources : iterable of str, optional
+            name to record as the source of each measurement; defaults to its path
+
+        Returns
+        -------
+        ColorimetryTable
+        """
+        categories = {column: OrderedDict() for column in CATEGORICAL_COLUMNS}
+        codes = {column: [] for column in CATEGORICAL_COLUMNS}
+        values = []
+        if sources is None:
+            pairs = ((m, m.path) for m in measurements)
+        else:
+            pairs = zip(measurements, sources)
+        for m, source in pairs:
+            source_code = categories['source'].setdefault(str(source), len(categories['source']))
+            for c in m.colorimetry.values():
+                for column, name in (('observer', c.observer), ('color_space', c.color_space),
+                                     ('illuminant', c.illuminant), ('origin', c.origin)):
+                    codes[column].append(categories[column].setdefault(name, len(categories[column])))
+                codes['source'].append(source_code)
+                values.append(c.values)
+        return cls(codes, {column: list(names) for column, names in categories.items()},
+                   np.array(values, dtype=np.float64).reshape(-1, 3))
+
+    @classmethod
+    def from_group(cls, group):
+        """
+        Build a table of all the colorimetry a Group holds, with each measurement's file as its source
+        """
+        measurements = []
+        sources = []
+        for dir_, members in group.collections.items():
+            for file_, m in members.items():
+                measurements.append(m)
+                sources.append(str(Path(dir_, file_)))
+        return cls.from_measurements(measurements, sources)
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Combine tables into one, e.g. to query the colorimetry of several groups together
+        """
+        categories = {column: OrderedDict() for column in CATEGORICAL_COLUMNS}
+        codes = {column: [] for column in CATEGORICAL_COLUMNS}
+        for table in tables:
+            for column in CATEGORICAL_COLUMNS:
+                remap = np.array([categories[column].setdefault(name, len(categories[column]))
+                                  for name in table.categories(column)], dtype=CODE_DTYPE)
+                codes[column].append(remap[table.codes(column)] if len(remap) else table.codes(column))
+        values = [table.values for table in tables]
+        return cls({column: np.concatenate(arrays) if arrays else [] for column, arrays in codes.items()},
+                   {column: list(names) for column, names in categories.items()},
+                   np.concatenate(values) if values else None)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"row {index} out of range for ColorimetryTable of {len(self)} rows")
+        return ColorimetryRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ColorimetryRow(self, index)
+
+    @property
+    def values(self):
+        return self._values
+
+    def codes(self, column):
+        return self._codes[column]
+
+    def categories(self, column):
+        return self._categories[column]
+
+    def column(self, column):
+        """Return a categorical column decoded to an array of strings"""
+        return np.array(self._categories[column], dtype=object)[self._codes[column]] if len(self) else \
+            np.empty(0, dtype=object)
+
+    def mask(self, **criteria):
+        """
+        Compute which rows match all the given criteria
+
+        Parameters
+        ----------
+        criteria
+            column=name or column=(name, ...) for any categorical column; a row matches a
+            sequence if it matches any name in it
+
+        Returns
+        -------
+        ndarray
+            boolean array of length N
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, wanted in criteria.items():
+            if column not in self._lookup:
+                raise KeyError(f"ColorimetryTable has no column `{column}'")
+            names = (wanted,) if isinstance(wanted, str) else wanted
+            codes = [self._lookup[column][name] for name in names if name in self._lookup[column]]
+            mask &= np.isin(self._codes[column], codes)
+        return mask
+
+    def where(self, mask=None, **criteria):
+        """
+        Return a table of the rows selected by a boolean mask and/or matching criteria as for :meth:`mask`
+        """
+        selected = self.mask(**criteria)
+        if mask is not None:
+            selected &= mask
+        return ColorimetryTable({column: codes[selected] for column, codes in self._codes.items()},
+                                self._categories, self._values[selected])
+
+    def colorimetry_for(self, source):
+        """
+        Return the colorimetry recorded for one source, keyed as Measurement.colorimetry is
+        """
+        return OrderedDict((row.key(), row) for row in self.where(source=source))
+
+    def aggregate(self, by=KEY_COLUMNS):
+        """
+        Summarize values over all rows sharing the same codes in the given columns
+
+        Parameters
+        ----------
+        by : sequence of str
+            categorical column names
+
+        Returns
+        -------
+        OrderedDict
+            maps each distinct tuple of names in the 'by' columns to a dict with the row
+            'count' and per-component 'mean', 'std' (population), 'min' and 'max' arrays
+        """
+        summary = OrderedDict()
+        if not len(self):
+            return summary
+        stacked = np.stack([self._codes[column] for column in by], axis=1)
+        groups, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, minlength=len(groups))
+        sums = np.zeros((len(groups), 3))
+        np.add.at(sums, inverse, self._values)
+        means = sums / counts[:, np.newaxis]
+        squares = np.zeros((len(groups), 3))
+        np.add.at(squares, inverse, (self._values - means[inverse]) ** 2)
+        minima = np.full((len(groups), 3), np.inf)
+        np.minimum.at(minima, inverse, self._values)
+        maxima = np.full((len(groups), 3), -np.inf)
+        np.maximum.at(maxima, inverse, self._values)
+        for g, codes in enumerate(groups):
+            key = tuple(self._categories[column][code] for column, code in zip(by, codes))
+            summary[key] = {'count': int(counts[g]),
+                            'mean': means[g],
+                            'std': np.sqrt(squares[g] / counts[g]),
+                            'min': minima[g],
+                            'max': maxima[g]}
+        return summary
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar export to Apache Parquet and Arrow IPC
+================================
+
+Writes measurements, from a :class:`eieio.measurement.measurement_group.Group` or a
+:class:`eieio.measurement.catalog.Catalog` query, as a table with one row per
+measurement, for pandas and BI tools:
+
+- 'source', the measurement file path, and its header fields as string columns;
+- 'spectrum', a fixed-size list of float64 holding the spectrum resampled (by
+  :mod:`eieio.measurement.resampling`) to a common shape, null for measurements
+  carrying only a placeholder spectrum; the shape is stored in the schema metadata;
+- for each (observer, color space, illuminant) key, three float64 columns named like
+  the keys of the EIEIO JSON, e.g. 'CIE 1931 2 Degree Standard Observer,CIE xyY,D65[0]',
+  and a dictionary-encoded origin column, all null where a measurement has no such
+  colorimetry.
+
+Rows are assembled and written a chunk at a time, so memory use is bounded by the chunk
+size, not by the number of measurements; measurements from a catalog query are loaded
+only as their chunk is written.
+
+pyarrow is needed only to write, and is imported then.
+"""
+
+import json
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from eieio.measurement.batch_colorimetry import has_spectral_data
+from eieio.measurement.canonical_names import canonical_color_space, canonical_illuminant, canonical_observer
+from eieio.measurement.colorimetry import MEASUREMENT_ORIGINS
+from eieio.measurement.measurement_cache import MEASUREMENT_CACHE
+from eieio.measurement.resampling import DEFAULT_METHOD, bucket_by_sampling, resample, shape_wavelengths
+from eieio.measurement.spectral_index import DEFAULT_SHAPE
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'export_group', 'export_catalog_query', 'write_measurements_table', 'record_columns',
+    'colorimetry_column_names', 'group_items', 'catalog_items', 'DEFAULT_CHUNK_SIZE'
+]
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+HEADER_COLUMNS = ('manufacturer', 'catalog_number', 'description', 'laboratory', 'measurement_equipment',
+                  'report_number', 'report_date')
+
+FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+SCHEMA_METADATA_KEY = b'eieio'
+
+_ORIGIN_CODES = {origin: code for code, origin in enumerate(MEASUREMENT_ORIGINS)}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError('exporting to Parquet or Arrow requires the pyarrow package') from e
+    return pyarrow
+
+
+def colorimetry_column_names(key):
+    """
+    Return the names of the three value columns and the origin column for a colorimetry key
+    """
+    comma_key = ','.join(key)
+    return [f"{comma_key}[{i}]" for i in range(3)], f"{comma_key} origin"
+
+
+def _canonical_key(key):
+    observer, color_space, illuminant = key
+    return canonical_observer(observer), canonical_color_space(color_space), canonical_illuminant(illuminant)
+
+
+def group_items(group):
+    """Yield the (source, measurement) pairs of a group's members"""
+    for dir_, members in group.collections.items():
+        for file_, measurement in members.items():
+            yield str(Path(dir_, file_)), measurement
+
+
+def catalog_items(catalog, **criteria):
+    """
+    Yield (path, measurement) pairs for a catalog query, loading each measurement only
+    when it is reached
+    """
+    for path in catalog.find(**criteria):
+        yield path, MEASUREMENT_CACHE.measurement(path)
+
+
+def record_columns(items, shape=DEFAULT_SHAPE, colorimetry_keys=(), method=DEFAULT_METHOD):
+    """
+    Assemble the columns for a chunk of measurements
+
+    Parameters
+    ----------
+    items : sequence
+        (source, measurement) pairs
+    shape : SpectralShape or tuple
+        common sampling for the spectrum column
+    colorimetry_keys : sequence
+        (observer, color space, illuminant) keys to give columns
+    method : str
+        interpolation method for resampling spectra
+
+    Returns
+    -------
+    dict
+        column name to list (for strings) or ndarray (for numbers); the spectrum column
+        is an N×W array with a companion validity mask under 'spectrum valid', and each
+        colorimetry value column has NaN where the key is missing
+    """
+    wavelengths = shape_wavelengths(shape)
+    columns = {'source': [source for source, _ in items]}
+    measurements = [measurement for _, measurement in items]
+    for attribute in HEADER_COLUMNS:
+        columns[attribute] = [getattr(m.header, attribute) for m in measurements]
+    columns['spectral_quantity'] = [m.spectral_quantity for m in measurements]
+    spectra = np.zeros((len(measurements), len(wavelengths)))
+    valid = np.array([has_spectral_data(m) for m in measurements], dtype=bool)
+    for source_wavelengths, indices in bucket_by_sampling(measurements, np.flatnonzero(valid)).values():
+        values = np.stack([np.asarray(measurements[i].values, dtype=np.float64) for i in indices])
+        spectra[indices] = resample(source_wavelengths, values, wavelengths, method)
+    columns['spectrum'] = spectra
+    columns['spectrum valid'] = valid
+    for key in colorimetry_keys:
+        key = _canonical_key(key)
+        value_names, origin_name = colorimetry_column_names(key)
+        values = np.full((len(measurements), 3), np.nan)
+        origins = []
+        for i, m in enumerate(measurements):
+            colorimetry = m.colorimetry.get(key)
+            origins.append(None if colorimetry is None else colorimetry.origin)
+            if colorimetry is not None:
+                values[i] = colorimetry.values
+        for j, name in enumerate(value_names):
+            columns[name] = values[:, j]
+        columns[origin_name] = origins
+    return columns
+
+
+def _schema(pa, shape, colorimetry_keys):
+    wavelengths = shape_wavelengths(shape)
+    fields = [pa.field('source', pa.string(), nullable=False)]
+    fields += [pa.field(attribute, pa.string()) for attribute in HEADER_COLUMNS + ('spectral_quantity',)]
+    fields.append(pa.field('spectrum', pa.list_(pa.float64(), len(wavelengths))))
+    for key in colorimetry_keys:
+        value_names, origin_name = colorimetry_column_names(_canonical_key(key))
+        fields += [pa.field(name, pa.float64()) for name in value_names]
+        fields.append(pa.field(origin_name, pa.dictionary(pa.int8(), pa.string())))
+    metadata = {'wavelengths': wavelengths.tolist(),
+                'colorimetry': [','.join(_canonical_key(key)) for key in colorimetry_keys]}
+    return pa.schema(fields, metadata={SCHEMA_METADATA_KEY: json.dumps(metadata).encode()})
+
+
+def _record_batch(pa, schema, columns):
+    arrays = []
+    for field in schema:
+        column = columns[field.name]
+        if field.name == 'spectrum':
+            valid = columns['spectrum valid']
+            flat = pa.array(column.reshape(-1), type=pa.float64())
+            # Arrow validity bitmaps are little-endian bit order, one bit per row
+            validity = None if valid.all() else pa.py_buffer(np.packbits(valid, bitorder='little'))
+            array = pa.Array.from_buffers(field.type, len(valid), [validity], null_count=int((~valid).sum()),
+                                          children=[flat])
+        elif pa.types.is_floating(field.type):
+            array = pa.array(column, type=field.type, from_pandas=True)
+        elif pa.types.is_dictionary(field.type):
+            # one dictionary for every batch, as the IPC file format can't replace dictionaries
+            codes = [None if origin is None else _ORIGIN_CODES[origin] for origin in column]
+            array = pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int8()),
+                                                   pa.array(MEASUREMENT_ORIGINS, type=pa.string()))
+        else:
+            array = pa.array([None if value is None else str(value) for value in column], type=field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_measurements_table(items, path, colorimetry_keys, shape=DEFAULT_SHAPE, format_=None,
+                             chunk_size=DEFAULT_CHUNK_SIZE, method=DEFAULT_METHOD):
+    """
+    Stream (source, measurement) pairs to a Parquet or Arrow IPC file, a chunk at a time
+
+    Parameters
+    ----------
+    items : iterable
+        (source, measurement) pairs, e.g. from :func:`group_items` or :func:`catalog_items`
+    path : str or Path
+    colorimetry_keys : sequence
+        (observer, color space, illuminant) keys to give columns; these must be known
+        before the first chunk is written
+    shape : SpectralShape or tuple
+        common sampling for the spectrum column
+    format_ : str, optional
+        'parquet' or 'arrow'; by default, inferred from the file suffix
+    chunk_size : int
+        number of measurements per record batch (and Parquet row group)
+    method : str
+        interpolation method for resampling spectra
+
+    Returns
+    -------
+    int
+        the number of rows written
+    """
+    if format_ is None:
+        format_ = FORMATS.get(Path(path).suffix.lower())
+        if format_ is None:
+            raise ValueError(f"can't tell what format to write `{path}' in; pass format_='parquet' or 'arrow'")
+    pa = _pyarrow()
+    schema = _schema(pa, shape, colorimetry_keys)
+    if format_ == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(str(path), schema)
+
+        def write(batch):
+            writer.write_table(pa.Table.from_batches([batch]))
+    elif format_ == 'arrow':
+        writer = pa.ipc.new_file(str(path), schema)
+        write = writer.write_batch
+    else:
+        raise ValueError(f"`{format_}' is an unsupported export format; use 'parquet' or 'arrow'")
+    rows = 0
+    items = iter(items)
+    try:
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            write(_record_batch(pa, schema, record_columns(chunk, shape, colorimetry_keys, method)))
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+def export_group(group, path, colorimetry_keys=None, **kwargs):
+    """
+    Write a group's members to a Parquet or Arrow IPC file
+
+    Parameters
+    ----------
+    group : Group
+    path : str or Path
+    colorimetry_keys : sequence, optional
+        keys to give columns; by default, every key any member has
+    kwargs
+        passed on to :func:`write_measurements_table`
+    """
+    if colorimetry_keys is None:
+        colorimetry_keys = sorted({key for _, m in group_items(group) for key in m.colorimetry})
+    return write_measurements_table(group_items(group), path, colorimetry_keys, **kwargs)
+
+
+def export_catalog_query(catalog, path, colorimetry_keys=None, shape=DEFAULT_SHAPE, format_=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE, method=DEFAULT_METHOD, **criteria):
+    """
+    Write the measurements matching a catalog query to a Parquet or Arrow IPC file
+
+    Parameters
+    ----------
+    catalog : Catalog
+    path : str or Path
+    colorimetry_keys : sequence, optional
+        keys to give columns; by default, every key any matching measurement has,
+        found from the catalog without loading anything
+    criteria
+        query criteria, as for :meth:`eieio.measurement.catalog.Catalog.find`
+    """
+    if colorimetry_keys is None:
+        colorimetry_keys = catalog.colorimetry_keys(**criteria)
+    return write_measurements_table(catalog_items(catalog, **criteria), path, colorimetry_keys, shape, format_,
+                                    chunk_size, method)
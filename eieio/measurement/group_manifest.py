@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Measurement group manifests
+================================
+
+Defines a line-oriented manifest format for measurement groups that scales to
+hundreds of thousands of members, as an alternative to the TOML .mg file written by
+:meth:`eieio.measurement.measurement_group.Group.save_group`.
+
+A manifest is a UTF-8 text file holding one JSON object per line. The first line
+identifies the file and names the group::
+
+    {"eieio_group_manifest": 2, "name": "20210518_regression_KRGBYCMW"}
+
+Every following line adds members to, or removes members from, the collection for a
+directory::
+
+    {"dir": "/data/run", "files": ["sample.0.black.spdx", "sample.1.white.spdx"]}
+    {"dir": "/data/run", "sequence": "sample.@@@@.spdx", "frames": "0-99,120-140"}
+    {"dir": "/data/run", "sequence": "sample.@.spdx", "frames": "2-4", "names": ["red", "green", "blue"]}
+    {"dir": "/data/run", "sequence": "sample.@.spdx", "frames": "5-900", "name": "adaptive_@"}
+    {"dir": "/data/run", "remove": ["sample.0.black.spdx"]}
+    {"dir": "/data/run", "files": ["sample.7.white.spdx"], "reused_from": {"sample.7.white.spdx": "sample.1.white.spdx"}}
+
+Sequences use fileseq-style padding, where each '@' stands for one digit of
+zero-padding (so 'sample.@.spdx' is unpadded), and fileseq-style frame ranges. The
+files the measure tool writes carry a sample name after the frame number
+('sample.2.red.spdx'); a sequence of those lists the names, one per frame, or, when each
+name embeds its own frame number, gives a single name with '@' standing for the frame.
+A 'reused_from' mapping, on any line, marks members that were not measured but copied
+from an earlier measurement of the same stimulus (see
+:class:`eieio.measurement.stimulus_memo.StimulusMemo`), naming the file each was copied
+from; :func:`read_reused_members` collects them. Because lines only ever accumulate, a
+measurement run can append each sample as it is taken without rewriting anything, and a
+reader can stream the file line by line.
+"""
+
+import json
+import os
+import re
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'MANIFEST_SUFFIX', 'is_group_manifest', 'iter_group_manifest', 'read_group_manifest', 'read_reused_members',
+    'write_group_manifest', 'GroupManifestWriter', 'compress_frames', 'expand_frames'
+]
+
+MANIFEST_SUFFIX = '.mgm'
+MANIFEST_VERSION = 2
+MANIFEST_KEY = 'eieio_group_manifest'
+
+# frame number before the extension, optionally followed by a name, e.g. 'sample.' '0042' '.spdx'
+# or 'sample.' '12' '.red' '.spdx'
+_FRAME_FILENAME_RE = re.compile(r'^(.*\.)(\d+)(\.[^.]+)?(\.[A-Za-z0-9]+)$')
+_FRAME_PLACEHOLDER_RE = re.compile(r'@+')
+_SEQUENCE_PATTERN_RE = re.compile(r'^(.*?)(@+)(\.[A-Za-z0-9]+)$')
+_FRAME_RANGE_RE = re.compile(r'^(-?\d+)(?:-(-?\d+)(?:x(\d+))?)?$')
+# bytes read at a time, from the end, looking for the last complete line
+_TAIL_CHUNK_SIZE = 4096
+
+
+def compress_frames(frames):
+    """
+    Render an ascending sequence of frame numbers as a fileseq-style frame range
+
+    Parameters
+    ----------
+    frames : sequence of int
+
+    Returns
+    -------
+    str
+        e.g. '0-99,120,125-130'
+    """
+    chunks = []
+    start = previous = None
+    for frame in frames:
+        if start is None:
+            start = previous = frame
+        elif frame == previous + 1:
+            previous = frame
+        else:
+            chunks.append(f"{start}-{previous}" if previous != start else f"{start}")
+            start = previous = frame
+    if start is not None:
+        chunks.append(f"{start}-{previous}" if previous != start else f"{start}")
+    return ','.join(chunks)
+
+
+def expand_frames(frame_range):
+    """
+    Expand a fileseq-style frame range ('1-10', '1-10x2', '3', or comma-separated
+    combinations of these) into the frame numbers it denotes, in order
+    """
+    for chunk in frame_range.split(','):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        match = _FRAME_RANGE_RE.match(chunk)
+        if not match:
+            raise ValueError(f"could not parse `{chunk}' in frame range `{frame_range}'")
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) is not None else first
+        step = int(match.group(3)) if match.group(3) else 1
+        yield from range(first, last + 1, step)
+
+
+def _sequence_parts(filename):
+    """
+    Return (prefix, padding, suffix, named, frame, name) if filename is a frame of a
+    sequence, else None; named is whether a name follows the frame number
+    """
+    match = _FRAME_FILENAME_RE.match(filename)
+    if not match:
+        return None
+    prefix, digits, name, suffix = match.groups()
+    # only claim padding when a leading zero proves it, so expansion reproduces the name exactly
+    padding = len(digits) if len(digits) > 1 and digits[0] == '0' else 1
+    if name is not None:
+        name = name[1:]
+    return prefix, padding, suffix, name is not None, int(digits), name
+
+
+def _frame_text(frame, padding):
+    return f"{frame:0{padding}d}" if padding > 1 else f"{frame}"
+
+
+def _substitute_frame(template, frame):
+    """Replace each run of '@' in template with frame, padded to the run's length"""
+    return _FRAME_PLACEHOLDER_RE.sub(lambda match: _frame_text(frame, len(match.group())), template)
+
+
+def _name_template(frames, names):
+    """Return a name template with '@' for the frame if it reproduces every name, else None"""
+    first = str(frames[0])
+    if '@' in ''.join(names) or first not in names[0]:
+        return None
+    template = names[0].replace(first, '@', 1)
+    if all(_substitute_frame(template, frame) == name for frame, name in zip(frames, names)):
+        return template
+    return None
+
+
+def _sequence_filenames(pattern, frame_range, names=None, name=None):
+    match = _SEQUENCE_PATTERN_RE.match(pattern)
+    if not match:
+        raise ValueError(f"sequence pattern `{pattern}' has no '@' frame placeholder before its extension")
+    prefix, ats, suffix = match.groups()
+    padding = len(ats)
+    frames = list(expand_frames(frame_range))
+    if names is not None and len(names) != len(frames):
+        raise ValueError(f"sequence `{pattern}' has {len(frames)} frames but {len(names)} names")
+    for i, frame in enumerate(frames):
+        if names is not None:
+            yield f"{prefix}{_frame_text(frame, padding)}.{names[i]}{suffix}"
+        elif name is not None:
+            yield f"{prefix}{_frame_text(frame, padding)}.{_substitute_frame(name, frame)}{suffix}"
+        else:
+            yield f"{prefix}{_frame_text(frame, padding)}{suffix}"
+
+
+def _records_for_collection(dir_, filenames, compress):
+    """Yield manifest records for one collection, preserving member order"""
+    plain = []
+    run_key = None
+    run_frames = []
+    run_names = []
+    run_filenames = []
+
+    def flush_run():
+        if len(run_frames) > 1:
+            prefix, padding, suffix, named = run_key
+            record = {'dir': dir_, 'sequence': f"{prefix}{'@' * padding}{suffix}",
+                      'frames': compress_frames(run_frames)}
+            if named:
+                template = _name_template(run_frames, run_names)
+                if template is not None:
+                    record['name'] = template
+                else:
+                    record['names'] = list(run_names)
+            return record
+        plain.extend(run_filenames)
+        return None
+
+    for filename in filenames:
+        parts = _sequence_parts(filename) if compress else None
+        if parts is not None and parts[:4] == run_key and parts[4] > run_frames[-1]:
+            run_frames.append(parts[4])
+            run_names.append(parts[5])
+            run_filenames.append(filename)
+            continue
+        sequence = flush_run()
+        if sequence is not None:
+            if plain:
+                yield {'dir': dir_, 'files': plain}
+                plain = []
+            yield sequence
+        if parts is None:
+            run_key = None
+            run_frames, run_names, run_filenames = [], [], []
+            plain.append(filename)
+        else:
+            run_key = parts[:4]
+            run_frames, run_names, run_filenames = [parts[4]], [parts[5]], [filename]
+    sequence = flush_run()
+    if plain:
+        yield {'dir': dir_, 'files': plain}
+    if sequence is not None:
+        yield sequence
+
+
+def is_group_manifest(path):
+    """
+    Report whether a file is a group manifest (as opposed to, say, a TOML .mg file)
+    """
+    try:
+        with open(path, mode='r') as f:
+            first_line = f.readline()
+    except (FileNotFoundError, UnicodeDecodeError):
+        return False
+    if not first_line.lstrip().startswith('{'):
+        return False
+    try:
+        return MANIFEST_KEY in json.loads(first_line)
+    except json.JSONDecodeError:
+        return False
+
+
+def _iter_records(path):
+    """Yield a manifest's header, then each of its records"""
+    with open(path, mode='r') as f:
+        header = json.loads(f.readline())
+        if MANIFEST_KEY not in header:
+            raise ValueError(f"`{path}' is not an EIEIO measurement group manifest")
+        if header[MANIFEST_KEY] > MANIFEST_VERSION:
+            raise ValueError(f"`{path}' is a version {header[MANIFEST_KEY]} manifest; "
+                             f"only versions up to {MANIFEST_VERSION} are supported")
+        yield header
+        torn = None
+        for line_number, line in enumerate(f, start=2):
+            line = line.strip()
+            if not line:
+                continue
+            if torn is not None:
+                raise ValueError(f"could not parse line {torn} of group manifest `{path}'")
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a run that died mid-append leaves at most one torn final line, which is ignored
+                torn = line_number
+                continue
+            yield record
+
+
+def _truncate_torn_line(path):
+    """Cut off a final line left unfinished by a writer that died mid-append"""
+    with open(path, mode='rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - _TAIL_CHUNK_SIZE, 0)
+            f.seek(start)
+            chunk = f.read(position - start)
+            if position == end and chunk.endswith(b'\n'):
+                return
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+
+
+def iter_group_manifest(path):
+    """
+    Stream the contents of a group manifest
+
+    Parameters
+    ----------
+    path : str or Path
+
+    Yields
+    ------
+    tuple
+        first ('name', name, None), then ('add', dir, filename) or ('remove', dir, filename)
+        for each member, in file order
+
+    Raises
+    ------
+    ValueError
+        if the file is not a group manifest, or has a version this code doesn't know
+    """
+    records = _iter_records(path)
+    yield 'name', next(records)['name'], None
+    for record in records:
+        dir_ = record['dir']
+        if 'files' in record:
+            for filename in record['files']:
+                yield 'add', dir_, filename
+        if 'sequence' in record:
+            for filename in _sequence_filenames(record['sequence'], record['frames'],
+                                                record.get('names'), record.get('name')):
+                yield 'add', dir_, filename
+        if 'remove' in record:
+            for filename in record['remove']:
+                yield 'remove', dir_, filename
+
+
+def read_group_manifest(path):
+    """
+    Read a group manifest, applying its additions and removals in order
+
+    Returns
+    -------
+    tuple
+        group name, and an OrderedDict mapping each directory to a list of filenames
+    """
+    name = None
+    collections = OrderedDict()
+    for op, dir_or_name, filename in iter_group_manifest(path):
+        if op == 'name':
+            name = dir_or_name
+        elif op == 'add':
+            members = collections.setdefault(dir_or_name, OrderedDict())
+            members[filename] = None
+        else:
+            members = collections.get(dir_or_name)
+            if members is not None:
+                members.pop(filename, None)
+    return name, OrderedDict((dir_, list(members)) for dir_, members in collections.items())
+
+
+def read_reused_members(path):
+    """
+    Read which members of a group manifest were copied from earlier measurements rather than measured
+
+    Returns
+    -------
+    OrderedDict
+        maps each directory to a dict from the filename of each reused member still in the
+        group to the filename it was copied from
+    """
+    reused = OrderedDict()
+    for record in islice(_iter_records(path), 1, None):
+        dir_ = record['dir']
+        if 'reused_from' in record:
+            reused.setdefault(dir_, {}).update(record['reused_from'])
+        if 'remove' in record and dir_ in reused:
+            for filename in record['remove']:
+                reused[dir_].pop(filename, None)
+    return OrderedDict((dir_, members) for dir_, members in reused.items() if members)
+
+
+def write_group_manifest(path, name, collections, compress=True, reused_from=None):
+    """
+    Write a complete group manifest, replacing any file already at path
+
+    Parameters
+    ----------
+    path : str or Path
+    name : str
+        group name
+    collections : dict
+        maps each directory to an iterable of filenames
+    compress : bool
+        if true, runs of frame-numbered files are written as sequences with frame ranges
+    reused_from : dict, optional
+        maps directories to dicts from the filenames of reused members to the filenames
+        they were copied from, as :func:`read_reused_members` returns
+    """
+    reused_from = reused_from or {}
+    with open(path, mode='w') as f:
+        f.write(json.dumps({MANIFEST_KEY: MANIFEST_VERSION, 'name': name}) + '\n')
+        for dir_, filenames in collections.items():
+            for record in _records_for_collection(str(dir_), filenames, compress):
+                f.write(json.dumps(record) + '\n')
+            reused = reused_from.get(dir_)
+            if reused:
+                f.write(json.dumps({'dir': str(dir_), 'reused_from': dict(reused)}) + '\n')
+
+
+class GroupManifestWriter(object):
+    """
+    Appends members to a group manifest one at a time, creating it if need be
+
+    Each addition or removal is written and flushed as its own line, so a manifest being
+    written by a measurement run that dies is complete up to the last sample taken. A line
+    such a run left unfinished is cut off before anything more is appended.
+    """
+
+    def __init__(self, path, name):
+        self._path = Path(path)
+        exists = self._path.exists() and self._path.stat().st_size > 0
+        if exists and not is_group_manifest(self._path):
+            raise ValueError(f"`{self._path}' exists and is not an EIEIO measurement group manifest")
+        if exists:
+            _truncate_torn_line(self._path)
+        self._file = open(self._path, mode='a')
+        if not exists:
+            self._write({MANIFEST_KEY: MANIFEST_VERSION, 'name': name})
+
+    @property
+    def path(self):
+        return self._path
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def add(self, dir_, *filenames, reused_from=None):
+        """
+        Add members, optionally with a dict from the filenames of any that were reused to
+        the filenames they were copied from
+        """
+        record = {'dir': str(dir_), 'files': list(filenames)}
+        if reused_from:
+            record['reused_from'] = dict(reused_from)
+        self._write(record)
+
+    def remove(self, dir_, *filenames):
+        self._write({'dir': str(dir_), 'remove': list(filenames)})
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -15,6 +15,7 @@ import argparse as ap
 from pathlib import Path
 
 from services.metering.metering_pb2 import MeasurementMode
+from eieio.measurement.sample_sources import SampleSequence
 from utilities.english import oxford_join
 
 import toml
@@ -52,15 +53,34 @@ class Instructions(object):
     -   :attr:`~eieio.spectral_measurement.instructions.sample_model`
     -   :attr:`~eieio.spectral_measurement.instructions.sample_description`
     -   :attr:`~eieio.spectral_measurement.instructions.meter_desc`
+            the metering server's 'host', and the 'name' of the meter to use, or the 'names' of
+            several to measure each sample with at once
     -   :attr:`~eieio.spectral_measurement.instructions.mode`
     -   :attr:`~eieio.spectral_measurement.instructions.colorspace`
     -   :attr:`~eieio.spectral_measurement.instructions.output_dir`
     -   :attr:`~eieio.spectral_measurement.instructions.sample_sequence`
+            a :class:`eieio.measurement.sample_sources.SampleSequence`
+    -   :attr:`~eieio.spectral_measurement.instructions.adaptive_sampling`
+            parameters for :class:`eieio.measurement.adaptive_sampling.AdaptiveRefinement`, which
+            if present replaces the sample sequence
+    -   :attr:`~eieio.spectral_measurement.instructions.sample_ordering`
+            True, or :class:`eieio.measurement.sample_ordering.TransitionCost` parameters (and
+            optionally 'start', 'window' and 'max_passes'), to measure samples in a faster order
+    -   :attr:`~eieio.spectral_measurement.instructions.stimulus_memo`
+            True, or :class:`eieio.measurement.stimulus_memo.StimulusMemo` parameters, to reuse
+            recent measurements of repeated stimuli
+    -   :attr:`~eieio.spectral_measurement.instructions.time_budget`
+            'minutes' and/or 'seconds' available for the run, and optionally the 'history' file of
+            stage timings; if present, only the highest-priority samples that fit are measured
+    -   :attr:`~eieio.spectral_measurement.instructions.retry_policy`
+            :class:`eieio.measurement.retry.RetryPolicy` parameters for retrying and requeueing
+            samples whose measurement fails
     -   :attr:`~eieio.spectral_measurement.instructions.frame_preflight`
     -   :attr:`~eieio.spectral_measurement.instructions.frame_postflight`
     -   :attr:`~eieio.spectral_measurement.instructions.create_parent_dirs`
     -   :attr:`~eieio.spectral_measurement.instructions.output_dir_exists_ok`
     -   :attr:`~eieio.spectral_measurement.instructions.base_measurement_name`
+    -   :attr:`~eieio.spectral_measurement.instructions.statistics`
     -   :attr:`~eieio.spectral_measurement.instructions.verbose`
 
     Methods
@@ -84,14 +104,20 @@ class Instructions(object):
         self.colorspace = None
         self.output_dir = None
         self.sample_sequence = None
+        self.adaptive_sampling = None
+        self.sample_ordering = None
+        self.stimulus_memo = None
+        self.time_budget = None
+        self.retry_policy = None
         self.frame_preflight = None
         self.frame_postflight = None
         self.create_parent_dirs = False
         self.output_dir_exists_ok = False
         self.base_measurement_name = None
+        self.statistics = False
         self.verbose = False
 
-    def _merge_if_present(self, content, source_desc):
+    def _merge_if_present(self, content, source_desc, base_dir=None):
         if 'verbose' in content:  # up front so we know to be verbose in arg processing
             self.verbose = True
         key_attr_dicts_by_table = {'context': {'location': 'location', 'target': 'target'},
@@ -101,6 +127,11 @@ class Instructions(object):
                                    'output': {'colorimetry': 'colorimetry', 'dir': 'output_dir'},
                                    'samples': {'sequence_preflight': 'sequence_preflight',
                                                'sample_sequence': 'sample_sequence',
+                                               'adaptive': 'adaptive_sampling',
+                                               'order': 'sample_ordering',
+                                               'memo': 'stimulus_memo',
+                                               'budget': 'time_budget',
+                                               'retry': 'retry_policy',
                                                'frame_preflight': 'frame_preflight',
                                                'name_pattern': 'base_measurement_name',
                                                'frame_postflight': 'frame_postflight'}}
@@ -110,14 +141,18 @@ class Instructions(object):
                 for key, attr in key_attr_dict.items():
                     if key in content[section]:
                         value = content[section][key]
+                        if attr == 'sample_sequence':
+                            # sample sources are only described here; samples are generated as the run reaches them
+                            value = SampleSequence(value, base_dir)
                         setattr(self, attr, value)
                         if self.verbose:
-                            if attr == 'samples.sequence':
+                            if attr == 'sample_sequence':
                                 print(f"loaded sequence of {len(value)} samples from {source_desc}")
                             else:
                                 print(f"overrode setting of `{attr}' with `{value}' from {source_desc}")
         for section, key_attr_dict in {'output': {'create_parent_dirs': 'create_parent_dirs',
-                                                  'output_dir_exists_ok': 'output_dir_exists_ok'}}.items():
+                                                  'output_dir_exists_ok': 'output_dir_exists_ok',
+                                                  'statistics': 'statistics'}}.items():
             if section in content:
                 for key, attr in key_attr_dict.items():
                     if key in content[section]:
@@ -129,7 +164,7 @@ class Instructions(object):
         if config_path.exists():
             try:
                 content = toml.load(str(config_path))
-                self._merge_if_present(content, source_desc)
+                self._merge_if_present(content, source_desc, config_path.parent)
             except toml.decoder.TomlDecodeError as e:
                 print(f"error decoding EIEIO config file: {e}")
 
@@ -172,6 +207,7 @@ class Instructions(object):
         self._parser.add_argument('--output_dir', '-o')
         self._parser.add_argument('--create_parent_dirs', '-p', action='store_true')
         self._parser.add_argument('--output_dir_exists_ok', '-e', action='store_true')
+        self._parser.add_argument('--statistics', action='store_true')
         self._parser.add_argument('--verbose', '-v', action='store_true')
         self._args = self._parser.parse_args(arg_source)
         # check and if found set verbosity as early as possible, so parse/merge can reference it
@@ -187,7 +223,7 @@ class Instructions(object):
         args_as_dict = vars(self._args)
         for attr in ['location', 'sample_make', 'sample_model', 'sample_description',
                      'meter_desc', 'mode', 'colorspace', 'create_parent_dirs', 'output_dir_exists_ok',
-                     'output_dir', 'sequence_preflight',
+                     'statistics', 'output_dir', 'sequence_preflight',
                      'frame_preflight', 'base_measurement_mode', 'frame_postflight']:
             if attr in args_as_dict:
                 value = args_as_dict[attr]
@@ -10,7 +10,10 @@ Defines the :class:`eieio.measurement.Measurement` class by subclassing :class:`
 
 import json
 from colour.io.tm2714 import SpectralDistribution_IESTM2714
+from eieio.measurement.canonical_names import canonical_color_space, canonical_illuminant, canonical_observer
 from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.colorimetry_conversion import DEFAULT_WHITE_LUMINANCE
+from eieio.measurement.batch_colorimetry import resolved_values
 
 
 __author__ = 'Joseph Goldstone'
@@ -26,6 +29,8 @@ __all__ = [
 
 # TODO make this list comprehensive
 ILLUMINANT_INSENSITIVE_MODELS = ('CIE XYZ', 'CIE xyY', 'CIE UCS', 'IPT', 'HDR IPT')
+# the illuminant given to colorimetry derived in those models, when none is asked for
+DEFAULT_ILLUMINANT = 'D65'
 
 
 class Measurement(SpectralDistribution_IESTM2714):
@@ -33,7 +38,11 @@ class Measurement(SpectralDistribution_IESTM2714):
         super(Measurement, self).__init__(**kwargs)
         comments = self.header.comments
         self._colorimetry = None
+        self._statistics = None
+        self._reused_from = None
         self.colorimetry = Measurement.extract_colorimetry_from_json(comments) if comments else {}
+        self.statistics = Measurement.extract_statistics_from_json(comments) if comments else None
+        self.reused_from = Measurement.extract_reused_from_from_json(comments) if comments else None
 
     def write(self):
         self.header.comments = self.extra_metadata_as_json()
@@ -51,6 +60,8 @@ class Measurement(SpectralDistribution_IESTM2714):
         super(Measurement, self).read()
         if self.header.comments and self.header.comments != 'N/A':
             self.colorimetry = Measurement.extract_colorimetry_from_json(self.header.comments)
+            self.statistics = Measurement.extract_statistics_from_json(self.header.comments)
+            self.reused_from = Measurement.extract_reused_from_from_json(self.header.comments)
 
     def __eq__(self, other):
         mappings = getattr(self, 'mapping')
@@ -81,7 +92,12 @@ class Measurement(SpectralDistribution_IESTM2714):
         return comma_keyed
 
     def extra_metadata_as_json(self):
-        return json.dumps({'eieio': {'colorimetry': self.comma_keyed_colorimetry()}})
+        extra_md = {'colorimetry': self.comma_keyed_colorimetry()}
+        if self._statistics is not None:
+            extra_md['statistics'] = self._statistics
+        if self._reused_from is not None:
+            extra_md['reused_from'] = self._reused_from
+        return json.dumps({'eieio': extra_md})
 
     @property
     def colorimetry(self):
@@ -91,6 +107,39 @@ class Measurement(SpectralDistribution_IESTM2714):
     def colorimetry(self, value):
         self._colorimetry = value
 
+    @property
+    def statistics(self):
+        """
+        Summary statistics, for measurements written by
+        :mod:`eieio.measurement.running_statistics`; None for ordinary measurements
+        """
+        return self._statistics
+
+    @statistics.setter
+    def statistics(self, value):
+        self._statistics = value
+
+    @staticmethod
+    def extract_statistics_from_json(text):
+        return json.loads(text)['eieio'].get('statistics')
+
+    @property
+    def reused_from(self):
+        """
+        For a measurement of a repeated stimulus that was not measured again (see
+        :mod:`eieio.measurement.stimulus_memo`), the file name of the measurement reused;
+        None for measurements actually made
+        """
+        return self._reused_from
+
+    @reused_from.setter
+    def reused_from(self, value):
+        self._reused_from = value
+
+    @staticmethod
+    def extract_reused_from_from_json(text):
+        return json.loads(text)['eieio'].get('reused_from')
+
     @staticmethod
     def extract_colorimetry_from_json(text):
         extra_md = json.loads(text)
@@ -118,7 +167,7 @@ class Measurement(SpectralDistribution_IESTM2714):
                              "be removed")
         del self.colorimetry[key]
 
-    def retrieve_colorimetry(self, color_space, observer, illuminant):
+    def retrieve_colorimetry(self, color_space, observer, illuminant, white_luminance=DEFAULT_WHITE_LUMINANCE):
         """
 
         Parameters
@@ -127,22 +176,35 @@ class Measurement(SpectralDistribution_IESTM2714):
             filtering parameter matching color space names used in :class:`eieio.measurement.colorimetry`.
         observer : str
             filtering parameter matching observer names used in :class:`eieio.measurement.colorimetry`.
-            Defaults to None; if so defaulted, acts as a wildcard
         illuminant
-            filtering parameter matching illuminant names used in :class:`eieio.measurement.colorimetry`
+            filtering parameter matching illuminant names used in :class:`eieio.measurement.colorimetry`;
+            may be None for color spaces in ILLUMINANT_INSENSITIVE_MODELS
+        white_luminance : float
+            luminance of the reference white, should the color space be defined relative to one
 
         Returns
         -------
-        Colorimetry either found in existing colorimetry, or converted directly
-        or indirectly from what we have.
+        Colorimetry either found in existing colorimetry, in any color space, or converted
+        directly or indirectly from what we have (in which case its origin is 'derived',
+        and it is not inserted into the measurement).
 
         """
         if not color_space:
             raise ValueError("Can't derive colorimetry if no color space is specified")
-        for c in self.colorimetry:
-            if c.color_space == color_space and c.observer == observer:
-                if color_space in ILLUMINANT_INSENSITIVE_MODELS:
-                    return c
-                elif c.illuminant == illuminant:
+        # stored colorimetry is returned as is, even in color spaces we can't derive
+        observer, color_space = canonical_observer(observer), canonical_color_space(color_space)
+        if illuminant is not None:
+            illuminant = canonical_illuminant(illuminant)
+        elif color_space in ILLUMINANT_INSENSITIVE_MODELS:
+            illuminant = DEFAULT_ILLUMINANT
+        else:
+            raise ValueError(f"Can't retrieve `{color_space}' colorimetry if no illuminant is specified")
+        if (observer, color_space, illuminant) in self.colorimetry:
+            return self.colorimetry[(observer, color_space, illuminant)]
+        if color_space in ILLUMINANT_INSENSITIVE_MODELS:
+            for (c_observer, c_color_space, _), c in self.colorimetry.items():
+                if c_observer == observer and c_color_space == color_space:
                     return c
-        # TODO derive the requested colorspace from something we already have
+        key, values = resolved_values([self], (observer, color_space, illuminant), white_luminance)
+        observer, color_space, illuminant = key
+        return Colorimetry(observer, color_space, illuminant, values[0].tolist(), 'derived')
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of parsed measurements
+================================
+
+Defines the :class:`eieio.measurement.measurement_cache.MeasurementCache` class, an LRU
+cache of :class:`eieio.measurement.measurement.Measurement` objects parsed from .spdx
+files. Entries are keyed by the file's resolved path together with its size and
+modification time, so a file rewritten in place is simply a different key and is
+parsed afresh; the stale entry ages out. Eviction is driven by an approximate byte
+budget rather than an entry count, since 1 nm and 10 nm spectra differ tenfold in size.
+
+The cache keeps its own pristine copy of each measurement and hands every caller a
+private copy of that, so inserting colorimetry into, or changing the path of, a
+measurement obtained from the cache affects neither the cache nor anyone else holding
+the same file. Copying costs a fraction of parsing.
+"""
+
+import os
+import sys
+from collections import OrderedDict
+from copy import deepcopy
+from pathlib import Path
+from threading import RLock
+
+from eieio.measurement.spdx_io import read_measurement
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'MeasurementCache', 'MEASUREMENT_CACHE', 'cached_measurement'
+]
+
+DEFAULT_BYTE_BUDGET = 256 * 1024 * 1024
+
+# rough per-object overheads for what a Measurement drags along besides its arrays
+MEASUREMENT_OVERHEAD_BYTES = 8 * 1024
+COLORIMETRY_OVERHEAD_BYTES = 1024
+
+
+def measurement_size(measurement):
+    """
+    Estimate the memory held by a Measurement
+
+    Parameters
+    ----------
+    measurement : Measurement
+
+    Returns
+    -------
+    int
+        approximate size in bytes
+    """
+    size = MEASUREMENT_OVERHEAD_BYTES + measurement.wavelengths.nbytes + measurement.values.nbytes
+    comments = measurement.header.comments
+    if comments:
+        size += sys.getsizeof(comments)
+    if measurement.colorimetry:
+        size += COLORIMETRY_OVERHEAD_BYTES * len(measurement.colorimetry)
+    return size
+
+
+class MeasurementCache(object):
+    """
+    Byte-budgeted LRU cache of measurements parsed from files
+
+    Attributes
+    ----------
+    byte_budget : int
+        upper bound on the estimated size of all cached measurements
+    size : int
+        estimated size of all cached measurements
+    hits : int
+        number of lookups satisfied from the cache
+    misses : int
+        number of lookups that had to parse the file
+    evictions : int
+        number of entries dropped to stay within the byte budget
+    """
+
+    def __init__(self, byte_budget=DEFAULT_BYTE_BUDGET):
+        self._entries = OrderedDict()
+        self._lock = RLock()
+        self._byte_budget = byte_budget
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def key(path):
+        """
+        Compute the cache key for a file
+
+        Parameters
+        ----------
+        path : str or Path
+
+        Returns
+        -------
+        tuple
+            resolved path, size in bytes, and modification time in nanoseconds
+        """
+        resolved = str(Path(path).resolve())
+        stat = os.stat(resolved)
+        return resolved, stat.st_size, stat.st_mtime_ns
+
+    def measurement(self, path):
+        """
+        Return the measurement stored at path, parsing it only if no current copy is cached
+
+        Parameters
+        ----------
+        path : str or Path
+            location of a .spdx file
+
+        Returns
+        -------
+        Measurement
+            a private copy of the parsed measurement; its path is the resolved path of the file
+        """
+        return self.measurement_for_key(MeasurementCache.key(path))
+
+    def measurement_for_key(self, key):
+        """
+        Return the measurement for a key obtained from :meth:`key` (or an equivalent
+        stat already in hand), parsing the file only if no current copy is cached
+
+        Parameters
+        ----------
+        key : tuple
+            resolved path, size in bytes, and modification time in nanoseconds
+
+        Returns
+        -------
+        Measurement
+            a private copy of the parsed measurement
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                cached = entry[0]
+            else:
+                cached = None
+                self._misses += 1
+        if cached is None:
+            # parse outside the lock so that concurrent loaders don't serialize on I/O
+            cached = read_measurement(key[0])
+            self.insert(key, cached)
+        return deepcopy(cached)
+
+    def insert(self, key, measurement):
+        """
+        Cache a measurement under a key; the cache keeps it, so the caller should not modify it afterwards
+        """
+        size = measurement_size(measurement)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (measurement, size)
+            self._size += size
+            self._evict()
+
+    def _evict(self):
+        # never evict the entry just inserted, even if it alone exceeds the budget
+        while self._size > self._byte_budget and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._size -= size
+            self._evictions += 1
+
+    def invalidate(self, path):
+        """
+        Drop every cached measurement parsed from path, whatever its size or mtime then was
+        """
+        resolved = str(Path(path).resolve())
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == resolved]:
+                _, size = self._entries.pop(key)
+                self._size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def reset_statistics(self):
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def statistics(self):
+        """
+        Report cache effectiveness
+
+        Returns
+        -------
+        dict
+            entries, size, byte_budget, hits, misses, evictions and hit_rate
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {'entries': len(self._entries),
+                    'size': self._size,
+                    'byte_budget': self._byte_budget,
+                    'hits': self._hits,
+                    'misses': self._misses,
+                    'evictions': self._evictions,
+                    'hit_rate': self._hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def byte_budget(self):
+        return self._byte_budget
+
+    @byte_budget.setter
+    def byte_budget(self, value):
+        with self._lock:
+            self._byte_budget = value
+            self._evict()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+
+MEASUREMENT_CACHE = MeasurementCache()
+
+
+def cached_measurement(path):
+    """
+    Return the measurement stored at path from the process-wide cache
+    """
+    return MEASUREMENT_CACHE.measurement(path)
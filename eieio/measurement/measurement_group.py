@@ -7,14 +7,26 @@ Defines the :class:`eieio.measurement.Group` class handling directories full of
 *IES TM-27-14*-compliant spectral data XML files: saving, loading, fetching, storing, and
 updating.
 
+Measurements are loaded through the process-wide
+:data:`eieio.measurement.measurement_cache.MEASUREMENT_CACHE`, so groups that overlap
+parse their common members only once; each group still holds its own copies.
+
 """
 
+import os
 import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from pathlib import Path
+from xml.etree.ElementTree import ParseError
 
 import toml
 
-from eieio.measurement.measurement import Measurement
+from eieio.measurement.group_manifest import is_group_manifest, read_group_manifest, write_group_manifest
+
+# the cache, tables, statistics and indexes (the last needing scipy) are imported where they are
+# first used, so that reading a group's membership doesn't pay for them
 
 __author__ = 'Joseph Goldstone'
 __copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
@@ -24,9 +36,48 @@ __email__ = 'jgoldstone@arri.com'
 __status__ = 'Experimental'
 
 __all__ = [
-    'Group'
+    'Group', 'DirectorySync', 'read_group_membership'
 ]
 
+SPECTRAL_SUFFIX = '.spdx'
+
+DirectorySync = namedtuple('DirectorySync', ['added', 'modified', 'removed', 'unchanged', 'failed'])
+DirectorySync.__doc__ = """
+Summary of the changes :meth:`Group.sync_dir` applied to one collection; each field is a
+sorted list of filenames. Files that could not be parsed (typically because they were
+still being written) are listed in 'failed' and are retried on the next sync.
+"""
+
+
+def read_group_membership(group_file):
+    """
+    Read a group's name and membership from its file without loading any measurements
+
+    Parameters
+    ----------
+    group_file : str or Path
+        TOML group file or group manifest
+
+    Returns
+    -------
+    tuple
+        the group name, and a dict mapping each collection directory to a list of filenames
+    """
+    if is_group_manifest(group_file):
+        return read_group_manifest(group_file)
+    membership = {}
+    with open(group_file, mode='r') as f:
+        contents = toml.loads(f.read())
+    if 'id' in contents and 'name' in contents['id']:
+        name = contents['id']['name']
+    else:
+        raise KeyError("Measurement group file must have an 'id' section with a 'name' attribute")
+    collection_re = re.compile(r'collections_c\d+')
+    for key in contents.keys():
+        if collection_re.match(key):
+            membership[contents[key]['dir']] = list(contents[key]['files'])
+    return name, membership
+
 
 class Group(object):
     """
@@ -45,28 +96,17 @@ class Group(object):
         Parameters
         ----------
         group_file : str or Path
-            path to a TOML file identifying a group and defining groups of measurements
+            path to a TOML file identifying a group and defining groups of measurements,
+            or to a group manifest (see :mod:`eieio.measurement.group_manifest`)
         """
+        self._path = Path(group_file)
+        self._fingerprints = {}
+        self._indexes = {}
         try:
-            with open(group_file, mode='r') as f:
-                contents = toml.loads(f.read())
-                if 'id' in contents and 'name' in contents['id']:
-                    self._name = contents['id']['name']
-                else:
-                    raise KeyError("Measurement group file must have an 'id' section with a 'name' attribute")
-                self._collections = {}
-                collection_re = re.compile(r'collections_c\d+')
-                for key in contents.keys():
-                    if collection_re.match(key):
-                        measurements = {}
-                        dir_ = contents[key]['dir']
-                        files = contents[key]['files']
-                        for file_ in files:
-                            measurement = Measurement()
-                            measurement.path = str(Path(dir_, file_))
-                            measurement.read()
-                            measurements[file_] = measurement
-                        self.collections[dir_] = measurements
+            self._name, membership = read_group_membership(group_file)
+            self._collections = {}
+            for dir_, files in membership.items():
+                self.collections[dir_] = {file_: self._load_measurement(dir_, file_) for file_ in files}
         except FileNotFoundError:
             if missing_ok:  # getting ready to create it, but not yet
                 self.name = Path(group_file).name
@@ -103,6 +143,21 @@ class Group(object):
         """
         return self._collections
 
+    def _load_measurement(self, dir_, file_, stat=None):
+        """
+        Load a measurement through the process-wide cache, remembering the size and
+        modification time it had so that :meth:`sync_dir` can tell if it changes later.
+        """
+        from eieio.measurement.measurement_cache import MEASUREMENT_CACHE, MeasurementCache
+
+        if stat is None:
+            key = MeasurementCache.key(Path(dir_, file_))
+        else:
+            key = (str(Path(dir_, file_).resolve()), stat.st_size, stat.st_mtime_ns)
+        measurement = MEASUREMENT_CACHE.measurement_for_key(key)
+        self._fingerprints[(dir_, file_)] = key[1:]
+        return measurement
+
     def save_group(self, path):
         """
 
@@ -125,6 +180,193 @@ class Group(object):
         with open(path, 'w') as f:
             print(toml.dumps(top_level), file=f)
 
+    def save_manifest(self, path, compress=True):
+        """
+
+        Parameters
+        ----------
+        path : str or Path
+            where to write the group manifest
+        compress : bool
+            if true, runs of frame-numbered files such as sample.0000.spdx ... sample.0999.spdx
+            are written as a single sequence with a frame range
+        """
+        reused_from = {}
+        for dir_, members in self.collections.items():
+            reused = {file_: m.reused_from for file_, m in members.items() if getattr(m, 'reused_from', None)}
+            if reused:
+                reused_from[dir_] = reused
+        write_group_manifest(path, self.name, self.collections, compress=compress, reused_from=reused_from)
+
+    def colorimetry_table(self):
+        """
+        Gather the colorimetry of every member into one columnar table
+
+        Returns
+        -------
+        ColorimetryTable
+            with each row's source being the path of the member it came from
+        """
+        from eieio.measurement.colorimetry_table import ColorimetryTable
+
+        return ColorimetryTable.from_group(self)
+
+    def statistics(self, sample_name=None, accumulator=None):
+        """
+        Accumulate streaming statistics over the members, per sample
+
+        Parameters
+        ----------
+        sample_name : callable, optional
+            maps a member's filename to the name of the sample it measures, or to None
+            to leave it out; by default, names are parsed from the measure tool's
+            sample.<number>.<name>.spdx filenames
+        accumulator : StatisticsAccumulator, optional
+            accumulator to add to, e.g. one loaded from an earlier run's summaries
+
+        Returns
+        -------
+        StatisticsAccumulator
+        """
+        from eieio.measurement.running_statistics import StatisticsAccumulator, sample_name_from_filename
+
+        if sample_name is None:
+            sample_name = sample_name_from_filename
+        if accumulator is None:
+            accumulator = StatisticsAccumulator()
+        for members in self.collections.values():
+            for file_, measurement in members.items():
+                name = sample_name(file_)
+                if name is not None:
+                    accumulator.add(name, measurement)
+        return accumulator
+
+    def _member_fingerprints(self):
+        for dir_, members in self.collections.items():
+            for file_ in members:
+                size, mtime_ns = self._fingerprints.get((dir_, file_), (None, None))
+                yield str(Path(dir_, file_)), size, mtime_ns
+
+    def colorimetry_index(self, observer, color_space, illuminant, components=None, persist=True, rebuild=False):
+        """
+        Return a spatial index over one kind of the members' colorimetry, for range,
+        radius and nearest-neighbour queries
+
+        The index is built on first use and kept until the group's membership (or a
+        member's file) changes. If persist is true it is also saved next to the group
+        file, and later Group objects for the same file reuse it while it is current.
+        Colorimetry added to members in memory (e.g. by
+        :func:`eieio.measurement.batch_colorimetry.derive_colorimetry`) doesn't change
+        the membership, so pass rebuild=True after adding some.
+
+        Parameters
+        ----------
+        observer : str
+        color_space : str
+        illuminant : str
+        components : sequence of int, optional
+            which of the three components to index, e.g. (0, 1) for the chromaticity
+            of CIE xyY; defaults to all three
+        persist : bool
+            if true, load the index from and save it to a file alongside the group file
+        rebuild : bool
+            if true, ignore any index already built or saved
+
+        Returns
+        -------
+        ColorimetryIndex
+        """
+        from eieio.measurement.colorimetry_index import ColorimetryIndex, index_key, sidecar_path
+
+        key = index_key(observer, color_space, illuminant, components)
+
+        def build(digest):
+            return ColorimetryIndex.from_table(self.colorimetry_table(), *key, digest=digest)
+
+        def load(path):
+            index = ColorimetryIndex.load(path)
+            if index.key != key:
+                raise ValueError(f"colorimetry index in {path} is not for {key}")
+            return index
+
+        sidecar = sidecar_path(self._path, key) if persist else None
+        return self._cached_index(key, load, build, sidecar, rebuild)
+
+    def spectral_index(self, shape=None, n_components=None, persist=True, rebuild=False):
+        """
+        Return an index for finding the members whose spectra are nearest a reference
+        spectrum
+
+        The index is cached and persisted just as :meth:`colorimetry_index` is.
+
+        Parameters
+        ----------
+        shape : tuple, optional
+            (start, end, interval) in nm to which member spectra are resampled; defaults to
+            :data:`eieio.measurement.spectral_index.DEFAULT_SHAPE`
+        n_components : int, optional
+            number of principal components used to prune candidates; defaults to
+            :data:`eieio.measurement.spectral_index.DEFAULT_NUMBER_OF_COMPONENTS`
+        persist : bool
+            if true, load the index from and save it to a file alongside the group file
+        rebuild : bool
+            if true, ignore any index already built or saved
+
+        Returns
+        -------
+        SpectralIndex
+        """
+        from eieio.measurement.colorimetry_index import sidecar_path
+        from eieio.measurement.spectral_index import (DEFAULT_NUMBER_OF_COMPONENTS, DEFAULT_SHAPE,
+                                                      SPECTRAL_INDEX_SUFFIX, SpectralIndex)
+
+        shape = DEFAULT_SHAPE if shape is None else shape
+        n_components = DEFAULT_NUMBER_OF_COMPONENTS if n_components is None else n_components
+        key = ('spectra', tuple(float(x) for x in shape), int(n_components))
+
+        def build(digest):
+            sources = []
+            measurements = []
+            for dir_, members in self.collections.items():
+                for file_, measurement in members.items():
+                    sources.append(str(Path(dir_, file_)))
+                    measurements.append(measurement)
+            return SpectralIndex.from_measurements(measurements, sources, key[1], key[2], digest)
+
+        def load(path):
+            index = SpectralIndex.load(path)
+            if index.shape != key[1] or index.basis.shape[1] > key[2]:
+                raise ValueError(f"spectral index in {path} is not for {key}")
+            return index
+
+        sidecar = sidecar_path(self._path, key, SPECTRAL_INDEX_SUFFIX) if persist else None
+        return self._cached_index(key, load, build, sidecar, rebuild)
+
+    def _cached_index(self, key, load, build, sidecar, rebuild):
+        from eieio.measurement.colorimetry_index import membership_digest
+
+        digest = membership_digest(self._member_fingerprints())
+        index = None if rebuild else self._indexes.get(key)
+        if index is not None and index.digest == digest:
+            return index
+        index = None
+        if sidecar is not None and not rebuild and sidecar.exists():
+            try:
+                loaded = load(sidecar)
+                if loaded.digest == digest:
+                    index = loaded
+            except (OSError, ValueError, KeyError):
+                pass  # unreadable or from some other version; just rebuild it
+        if index is None:
+            index = build(digest)
+            if sidecar is not None:
+                try:
+                    index.save(sidecar)
+                except OSError:
+                    pass  # an index that can't be saved is still an index
+        self._indexes[key] = index
+        return index
+
     def insert_measurement_from_file(self, path, replace_ok=False):
         """
 
@@ -135,11 +377,9 @@ class Group(object):
         replace_ok : bool
             if false and there is a measurement from the same file, raise ValueError
         """
-        m = Measurement()
-        m.path = str(path)
-        m.read()
         dir_ = str(Path(path).parents[0])
         file_ = str(Path(path).name)
+        m = self._load_measurement(dir_, file_)
         if dir_ in self.collections:
             if file_ in self.collections[dir_] and not replace_ok:
                 raise ValueError(f"Attempted insertion of measurement from file {path} in a "
@@ -150,7 +390,7 @@ class Group(object):
             self.collections[dir_] = {file_: m}
 
     def remove_measurement_from_file(self, path, missing_ok=False):
-        dir_ = Path(path).parents[0]
+        dir_ = str(Path(path).parents[0])
         name = Path(path).name
         if dir_ not in self.collections:
             if not missing_ok:
@@ -169,6 +409,72 @@ class Group(object):
         for path_ in spectral_paths:
             self.insert_measurement_from_file(path_, replace_ok=replace_ok)
 
+    def sync_dir(self, dir_, max_workers=None):
+        """
+        Bring the collection for a directory up to date with the .spdx files now in it
+
+        Only files that are new, or whose size or modification time differ from when they
+        were loaded, are read; they are read concurrently. Measurements whose files have
+        disappeared are dropped. Calling this repeatedly on a growing capture directory
+        costs one directory scan plus the parsing of whatever arrived in between.
+
+        Parameters
+        ----------
+        dir_ : str or Path
+            directory to synchronize with
+        max_workers : int, optional
+            size of the thread pool loading added and modified files
+
+        Returns
+        -------
+        DirectorySync
+            filenames added, modified, removed, unchanged and failed
+        """
+        dir_ = str(Path(dir_))
+        stats = {}
+        with os.scandir(dir_) as entries:
+            for entry in entries:
+                if entry.name.endswith(SPECTRAL_SUFFIX) and entry.is_file():
+                    stats[entry.name] = entry.stat()
+        existing = self.collections.get(dir_, {})
+        added = sorted(name for name in stats if name not in existing)
+        removed = sorted(name for name in existing if name not in stats)
+        modified = []
+        unchanged = []
+        for name in sorted(name for name in stats if name in existing):
+            stat = stats[name]
+            if self._fingerprints.get((dir_, name)) == (stat.st_size, stat.st_mtime_ns):
+                unchanged.append(name)
+            else:
+                modified.append(name)
+
+        def load(name):
+            try:
+                return name, self._load_measurement(dir_, name, stats[name])
+            except (ParseError, FileNotFoundError):
+                return name, None
+
+        loaded = {}
+        failed = []
+        to_load = added + modified
+        if to_load:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for name, measurement in executor.map(load, to_load):
+                    if measurement is None:
+                        failed.append(name)
+                    else:
+                        loaded[name] = measurement
+        collection = self.collections.setdefault(dir_, {})
+        for name in removed:
+            del collection[name]
+            self._fingerprints.pop((dir_, name), None)
+        collection.update(loaded)
+        if not collection:
+            del self.collections[dir_]
+        return DirectorySync(added=[name for name in added if name in loaded],
+                             modified=[name for name in modified if name in loaded],
+                             removed=removed, unchanged=unchanged, failed=failed)
+
     def remove_measurements_from_dir(self, dir_, missing_ok=False):
         if dir_ not in self.collections:
             if not missing_ok:
@@ -178,8 +484,14 @@ class Group(object):
             del self.collections[dir_]
 
     def insert_measuremments_from_group(self, other, replace_ok=False):
+        # copies, so that colorimetry later derived in one group doesn't appear in the other
+        self._insert_measurements(other, replace_ok, copy=True)
+
+    def _insert_measurements(self, other, replace_ok, copy):
         for dir_ in other.collections:
             for file, measurement in other.collections[dir_].items():
+                if copy:
+                    measurement = deepcopy(measurement)
                 if dir_ in self.collections:
                     if file in self.collections[dir_] and not replace_ok:
                         raise ValueError(f"Attempted insertion of measurement from group in a "
@@ -188,13 +500,24 @@ class Group(object):
                     self.collections[dir_][file] = measurement
                 else:
                     self.collections[dir_] = {file: measurement}
+                # so that sync_dir and index digests see the file as the other group loaded it
+                fingerprint = other._fingerprints.get((dir_, file))
+                if fingerprint is not None:
+                    self._fingerprints[(dir_, file)] = fingerprint
+                else:
+                    self._fingerprints.pop((dir_, file), None)
 
     def remove_measurements_from_group(self, other, missing_ok=False):
-        for dir_ in other.collections:
+        self._remove_members(other.collections, missing_ok)
+
+    def _remove_members(self, membership, missing_ok):
+        """Remove the measurements named in a dict from directories to filenames"""
+        for dir_ in membership:
             if dir_ in self.collections:
-                for file in other.collections[dir_].keys():
+                for file in membership[dir_]:
                     if file in self.collections[dir_]:
                         del self.collections[dir_][file]
+                        self._fingerprints.pop((dir_, file), None)
                     else:
                         if not missing_ok:
                             raise ValueError("Attempted removal of measurement from group in a "
@@ -216,7 +539,18 @@ class Group(object):
         replace_ok: bool
             if false and there is a measurement from the same file, raise ValueError
         """
-        self.insert_measuremments_from_group(Group(path), replace_ok=replace_ok)
+        # the cache already hands the group its own copies, so they needn't be copied again
+        self._insert_measurements(Group(path), replace_ok, copy=False)
 
     def remove_measurements_from_group_file(self, path, missing_ok=False):
-        self.remove_measurements_from_group(Group(path), missing_ok=missing_ok)
+        """
+
+        Parameters
+        ----------
+        path : str or Path
+            location of a TOML file or manifest defining a measurement group; only its
+            membership is read, so none of its measurements are loaded
+        missing_ok: bool
+            if false and a measurement named in the file is not in this group, raise ValueError
+        """
+        self._remove_members(read_group_membership(path)[1], missing_ok)
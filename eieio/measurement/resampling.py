@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Batch spectral resampling
+================================
+
+Brings spectra sampled at different wavelengths (e.g. 10 nm i1Pro data and 1 nm
+CS-2000 data) to a common sampling, many at a time.
+
+Every interpolation method offered here is linear in the sampled values, so resampling
+from one wavelength sampling to another is a matrix: interpolating each column of an
+identity matrix gives its columns once, and applying it to any number of spectra is
+then a single matrix multiply. Those matrices are cached per (source sampling, target
+sampling, method) for the life of the process. :func:`resample_measurements` buckets
+measurements by sampling so that each bucket takes one multiply, however many
+measurements are in it.
+
+Outside the range a spectrum was measured over there is nothing to interpolate, so
+those target wavelengths get a fill value (zero by default) rather than an
+extrapolated guess.
+"""
+
+from collections import OrderedDict
+from threading import RLock
+
+import numpy as np
+
+from colour.algebra import CubicSplineInterpolator, LinearInterpolator, SpragueInterpolator
+from colour.colorimetry import SpectralShape
+
+from utilities.english import oxford_join
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'DEFAULT_METHOD', 'INTERPOLATORS', 'regular_shape', 'shape_wavelengths', 'common_shape',
+    'resampling_matrix', 'resample', 'bucket_by_sampling', 'resample_measurements'
+]
+
+DEFAULT_METHOD = 'Linear'
+
+# only interpolators whose output is linear in their input values belong here; PCHIP,
+# for one, isn't, so it can't be expressed as a matrix
+INTERPOLATORS = {
+    'Linear': LinearInterpolator,
+    'Sprague': SpragueInterpolator,
+    'Cubic Spline': CubicSplineInterpolator
+}
+
+# Sprague (1880) interpolation is defined for evenly-spaced samples only
+_REGULAR_ONLY_METHODS = {'Sprague'}
+
+_CACHE_LOCK = RLock()
+_RESAMPLING_MATRICES = {}
+
+
+def regular_shape(wavelengths):
+    """Return the SpectralShape of evenly-spaced wavelengths, or None if they aren't"""
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    if len(wavelengths) < 2:
+        return None
+    increments = np.diff(wavelengths)
+    if np.allclose(increments, increments[0]):
+        return SpectralShape(wavelengths[0], wavelengths[-1], increments[0])
+    return None
+
+
+def shape_wavelengths(shape):
+    """
+    Return the wavelengths of a sampling
+
+    Parameters
+    ----------
+    shape : SpectralShape, tuple or array_like
+        a SpectralShape, a (start, end, interval) tuple in nm, or the wavelengths themselves
+
+    Returns
+    -------
+    ndarray
+    """
+    if isinstance(shape, SpectralShape):
+        shape = (shape.start, shape.end, shape.interval)
+    if isinstance(shape, tuple) and len(shape) == 3:
+        start, end, interval = (float(x) for x in shape)
+        return np.arange(start, end + interval / 2, interval, dtype=np.float64)
+    return np.asarray(shape, dtype=np.float64)
+
+
+def common_shape(samplings):
+    """
+    Return the sampling covering every given sampling at the finest interval among them
+
+    Parameters
+    ----------
+    samplings : iterable
+        SpectralShapes, (start, end, interval) tuples or wavelength arrays
+
+    Returns
+    -------
+    SpectralShape
+    """
+    start = end = interval = None
+    for sampling in samplings:
+        wavelengths = shape_wavelengths(sampling)
+        step = np.min(np.diff(wavelengths)) if len(wavelengths) > 1 else None
+        start = wavelengths[0] if start is None else min(start, wavelengths[0])
+        end = wavelengths[-1] if end is None else max(end, wavelengths[-1])
+        if step is not None:
+            interval = step if interval is None else min(interval, step)
+    if start is None:
+        raise ValueError('cannot find the common shape of no samplings')
+    return SpectralShape(start, end, 1 if interval is None else interval)
+
+
+def _sampling_key(wavelengths):
+    shape = regular_shape(wavelengths)
+    if shape is not None:
+        return shape.start, shape.end, shape.interval, len(wavelengths)
+    return wavelengths.tobytes()
+
+
+def resampling_matrix(source_wavelengths, target_wavelengths, method=DEFAULT_METHOD):
+    """
+    Return the matrix that resamples spectra from one wavelength sampling to another
+
+    Parameters
+    ----------
+    source_wavelengths : array_like
+        the S wavelengths, in nm, at which spectra are sampled
+    target_wavelengths : array_like
+        the T wavelengths, in nm, at which they are wanted
+    method : str
+        a key of INTERPOLATORS
+
+    Returns
+    -------
+    tuple
+        the T×S resampling matrix, and a T-element boolean array that is true for
+        target wavelengths outside the source range; neither is writable
+    """
+    source_wavelengths = np.asarray(source_wavelengths, dtype=np.float64)
+    target_wavelengths = np.asarray(target_wavelengths, dtype=np.float64)
+    if method not in INTERPOLATORS:
+        raise ValueError(f"`{method}' is an unsupported resampling method. Supported methods are "
+                         f"{oxford_join(list(INTERPOLATORS), 'and')}.")
+    key = (_sampling_key(source_wavelengths), _sampling_key(target_wavelengths), method)
+    with _CACHE_LOCK:
+        cached = _RESAMPLING_MATRICES.get(key)
+        if cached is not None:
+            return cached
+    n_source = len(source_wavelengths)
+    outside = (target_wavelengths < source_wavelengths[0]) | (target_wavelengths > source_wavelengths[-1])
+    inside = ~outside
+    matrix = np.zeros((len(target_wavelengths), n_source))
+    if n_source == 1:
+        matrix[inside, 0] = 1
+    elif np.array_equal(source_wavelengths, target_wavelengths):
+        matrix = np.eye(n_source)
+    else:
+        if method in _REGULAR_ONLY_METHODS and regular_shape(source_wavelengths) is None:
+            raise ValueError(f"`{method}' resampling requires evenly-spaced source wavelengths")
+        interpolator_class = INTERPOLATORS[method]
+        basis = np.eye(n_source)
+        wanted = target_wavelengths[inside]
+        for j in range(n_source):
+            matrix[inside, j] = interpolator_class(source_wavelengths, basis[:, j])(wanted)
+    matrix.setflags(write=False)
+    outside.setflags(write=False)
+    with _CACHE_LOCK:
+        _RESAMPLING_MATRICES[key] = (matrix, outside)
+    return matrix, outside
+
+
+def resample(wavelengths, values, target, method=DEFAULT_METHOD, fill=0.0):
+    """
+    Resample a batch of spectra sharing a wavelength sampling
+
+    Parameters
+    ----------
+    wavelengths : array_like
+        the S wavelengths, in nm, at which every spectrum is sampled
+    values : array_like
+        N×S matrix with one spectrum per row, or a single S-element spectrum
+    target : SpectralShape, tuple or array_like
+        the sampling wanted (see :func:`shape_wavelengths`)
+    method : str
+        a key of INTERPOLATORS
+    fill : float
+        value for target wavelengths outside the source range
+
+    Returns
+    -------
+    ndarray
+        N×T matrix (or T-element array, for a single spectrum) of resampled values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    matrix, outside = resampling_matrix(wavelengths, shape_wavelengths(target), method)
+    resampled = values @ matrix.T
+    if fill != 0 and outside.any():
+        resampled[..., outside] = fill
+    return resampled
+
+
+def bucket_by_sampling(measurements, indices=None):
+    """
+    Group measurements by wavelength sampling
+
+    Parameters
+    ----------
+    measurements : sequence of Measurement
+    indices : iterable of int, optional
+        which of the measurements to bucket; defaults to all of them
+
+    Returns
+    -------
+    OrderedDict
+        maps an opaque sampling key to a (wavelengths, indices) pair, indices being
+        positions in measurements, in order of first appearance
+    """
+    buckets = OrderedDict()
+    for i in range(len(measurements)) if indices is None else indices:
+        wavelengths = np.asarray(measurements[i].wavelengths, dtype=np.float64)
+        buckets.setdefault(wavelengths.tobytes(), (wavelengths, []))[1].append(i)
+    return buckets
+
+
+def resample_measurements(measurements, target, method=DEFAULT_METHOD, fill=0.0):
+    """
+    Resample the spectra of many measurements to one sampling, a bucket at a time
+
+    Parameters
+    ----------
+    measurements : sequence of Measurement
+    target : SpectralShape, tuple or array_like
+        the sampling wanted (see :func:`shape_wavelengths`)
+    method : str
+        a key of INTERPOLATORS
+    fill : float
+        value for target wavelengths outside each measurement's range
+
+    Returns
+    -------
+    tuple
+        the T target wavelengths, and an N×T matrix of resampled spectra in
+        measurement order
+    """
+    target_wavelengths = shape_wavelengths(target)
+    results = np.empty((len(measurements), len(target_wavelengths)))
+    for wavelengths, indices in bucket_by_sampling(measurements).values():
+        values = np.stack([np.asarray(measurements[i].values, dtype=np.float64) for i in indices])
+        results[indices] = resample(wavelengths, values, target_wavelengths, method, fill)
+    return target_wavelengths, results
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Retry - keep a measurement run moving past samples that fail
+================================
+
+A meter that times out, a patch that flickers, or a busy or briefly unreachable
+metering server should not end a run that has hours left in it. :class:`RetryPolicy`
+retries a failing call with exponential backoff, a bounded number of times, when the
+error is one a moment's wait may cure. :class:`RequeueingRunner` applies a policy to
+each sample of a run; a sample that still fails is set aside and tried again in up to
+``requeue_rounds`` rounds at the end of the run, when conditions may have changed.
+Failures are collected for a summary at exit.
+
+What counts as transient is the caller's business: a classifier maps each error to
+:data:`RETRY` (retry with backoff, then requeue), :data:`REQUEUE` (requeue without
+retrying), or None (not a measurement failure at all, so it propagates).
+"""
+
+from collections import OrderedDict, namedtuple
+from itertools import count
+from time import sleep
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'RetryPolicy', 'RequeueingRunner', 'Outcome', 'SampleFailure', 'RETRY', 'REQUEUE'
+]
+
+RETRY = 'retry'
+REQUEUE = 'requeue'
+
+Outcome = namedtuple('Outcome', ['result', 'attempts', 'error'])
+Outcome.__doc__ = """
+The result of a call made under a retry policy, how many attempts it took, and the last
+error if every attempt failed (in which case result is None)
+"""
+
+SampleFailure = namedtuple('SampleFailure', ['key', 'attempts', 'errors', 'recovered'])
+SampleFailure.__doc__ = """
+A sample that failed at least once: its key, total attempts, the error that ended each
+round of attempts, and whether it was eventually measured
+"""
+
+
+class RetryPolicy(object):
+    """
+    Bounded retry with exponential backoff
+
+    Parameters
+    ----------
+    max_attempts : int, optional
+        most attempts at a call whose errors are transient
+    initial_delay : float, optional
+        seconds to wait before the first retry
+    backoff : float, optional
+        factor by which each successive wait grows
+    max_delay : float, optional
+        longest wait, in seconds
+    requeue_rounds : int, optional
+        rounds, at the end of a run, in which samples that still failed are tried again
+    max_consecutive_failures : int or None, optional
+        consecutive failed samples after which the run is abandoned as hopeless; None never abandons it
+    sleep : callable, optional
+        waits for a number of seconds
+    """
+    def __init__(self, max_attempts=3, initial_delay=1.0, backoff=2.0, max_delay=30.0, requeue_rounds=1,
+                 max_consecutive_failures=10, sleep=sleep):
+        if max_attempts < 1:
+            raise ValueError(f"maximum attempts `{max_attempts}' must be at least 1")
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.requeue_rounds = requeue_rounds
+        self.max_consecutive_failures = max_consecutive_failures
+        self._sleep = sleep
+
+    def delay(self, attempt):
+        """Return the seconds to wait after a given (1-based) failed attempt"""
+        return min(self.initial_delay * self.backoff ** (attempt - 1), self.max_delay)
+
+    def call(self, fn, classify, on_retry=None):
+        """
+        Call fn until it succeeds, its error is not transient, or attempts run out
+
+        Parameters
+        ----------
+        fn : callable
+            called with no arguments
+        classify : callable
+            maps an exception to RETRY, REQUEUE or None; exceptions classified None are re-raised
+        on_retry : callable, optional
+            called with the attempt number, the error and the delay before each retry
+
+        Returns
+        -------
+        Outcome
+        """
+        for attempt in count(1):
+            try:
+                return Outcome(fn(), attempt, None)
+            except Exception as error:
+                disposition = classify(error)
+                if disposition is None:
+                    raise
+                if disposition != RETRY or attempt >= self.max_attempts:
+                    return Outcome(None, attempt, error)
+                delay = self.delay(attempt)
+                if on_retry:
+                    on_retry(attempt, error, delay)
+                self._sleep(delay)
+
+
+class RequeueingRunner(object):
+    """
+    Runs each sample of a run under a retry policy, requeueing those that still fail
+
+    Parameters
+    ----------
+    policy : RetryPolicy
+    classify : callable
+        maps an exception to RETRY, REQUEUE or None
+    on_retry : callable, optional
+        called with the sample key, attempt number, error and delay before each retry
+
+    Methods
+    -------
+    -   :meth:`~eieio.measurement.retry.RequeueingRunner.run`
+    -   :meth:`~eieio.measurement.retry.RequeueingRunner.drain`
+    -   :meth:`~eieio.measurement.retry.RequeueingRunner.summary`
+    """
+    def __init__(self, policy, classify, on_retry=None):
+        self.policy = policy
+        self.classify = classify
+        self.on_retry = on_retry
+        self._pending = OrderedDict()
+        self._failures = OrderedDict()
+        self._consecutive_failures = 0
+
+    @property
+    def pending(self):
+        """Keys of the samples waiting to be tried again, in the order they failed"""
+        return list(self._pending)
+
+    @property
+    def failures(self):
+        """Every sample that failed at least once, in the order of first failure"""
+        return list(self._failures.values())
+
+    def run(self, key, fn):
+        """
+        Call fn for the sample with the given key, retrying and if need be requeueing it
+
+        Returns
+        -------
+        object
+            whatever fn returned, or None if the sample failed and was requeued
+
+        Raises
+        ------
+        RuntimeError
+            if too many samples in a row have failed
+        """
+        def on_retry(attempt, error, delay):
+            if self.on_retry:
+                self.on_retry(key, attempt, error, delay)
+
+        outcome = self.policy.call(fn, self.classify, on_retry)
+        previous = self._failures.get(key)
+        if outcome.error is None:
+            self._consecutive_failures = 0
+            if previous is not None:
+                self._failures[key] = previous._replace(attempts=previous.attempts + outcome.attempts, recovered=True)
+            return outcome.result
+        if previous is None:
+            self._failures[key] = SampleFailure(key, outcome.attempts, [outcome.error], False)
+        else:
+            self._failures[key] = previous._replace(attempts=previous.attempts + outcome.attempts,
+                                                    errors=previous.errors + [outcome.error])
+        self._pending[key] = fn
+        self._consecutive_failures += 1
+        limit = self.policy.max_consecutive_failures
+        if limit is not None and self._consecutive_failures >= limit:
+            raise RuntimeError(f"abandoning run after {self._consecutive_failures} consecutive failed samples; "
+                               f"last error: {outcome.error}") from outcome.error
+        return None
+
+    def drain(self, keep_going=None):
+        """
+        Try the requeued samples again, in up to the policy's requeue_rounds rounds
+
+        Parameters
+        ----------
+        keep_going : callable, optional
+            called with each sample's key before trying it; returning False leaves that
+            sample requeued
+
+        Returns
+        -------
+        dict
+            results of the samples that succeeded, keyed by sample key
+        """
+        results = {}
+        for _ in range(self.policy.requeue_rounds):
+            if not self._pending:
+                break
+            round_ = self._pending
+            self._pending = OrderedDict()
+            for key, fn in round_.items():
+                if keep_going is not None and not keep_going(key):
+                    self._pending[key] = fn
+                    continue
+                result = self.run(key, fn)
+                if key not in self._pending:
+                    results[key] = result
+        return results
+
+    def summary(self):
+        """Describe the samples that failed, and which of them were recovered"""
+        if not self._failures:
+            return 'no samples failed'
+        recovered = [f for f in self._failures.values() if f.recovered]
+        lost = [f for f in self._failures.values() if not f.recovered]
+        lines = [f"{len(self._failures)} samples failed at least once; {len(recovered)} recovered, "
+                 f"{len(lost)} not measured"]
+        for failure in lost:
+            lines.append(f"  {failure.key}: {failure.attempts} attempts, last error: {failure.errors[-1]}")
+        return '\n'.join(lines)
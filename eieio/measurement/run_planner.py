@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Run planner - measure the most important samples that fit in a time budget
+================================
+
+On set there is often a fixed window of stage time, and a sample sequence that would
+take longer than that to measure. :class:`RunPlanner` predicts what each sample will
+cost, picks samples in priority order (a sample's optional 'priority', higher first,
+then sequence order, or an order given to it) while their predicted cost fits the time left, and hands them out
+one at a time, planning again after each so that the plan follows the timings actually
+observed. A sample counts as measured once its timings are observed; one handed out but
+never observed is reported as failed, and whatever was never handed out as dropped.
+
+Predictions come from a :class:`TimingHistory` of per-stage wall-clock times (showing the
+stimulus on the target, capturing, retrieving, writing), which can persist between
+runs. Capture time depends mostly on how long the meter integrates, which depends on
+luminance, so capture times are kept per decade of estimated luminance, and the meter's
+own integration estimates (``CaptureResponse.estimated_duration``) fill in decades not
+yet captured.
+"""
+
+import json
+from collections import namedtuple
+from pathlib import Path
+from time import monotonic
+
+import numpy as np
+
+from eieio.measurement.sample_ordering import MINIMUM_LUMINANCE, TransitionCost
+from eieio.measurement.spdx_io import write_atomically
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'TimingHistory', 'RunPlanner', 'RunPlan', 'STAGES', 'DEFAULT_STAGE_SECONDS', 'DEFAULT_HISTORY_PATH'
+]
+
+STAGES = ('target', 'capture', 'retrieve', 'write')
+# used until a stage has been timed at least once
+DEFAULT_STAGE_SECONDS = {'target': 1.0, 'capture': 3.0, 'retrieve': 0.5, 'write': 0.05}
+DEFAULT_HISTORY_PATH = '~/.eieio_timings.json'
+# newer timings are weighted at least this much, so estimates follow a changing setup
+MINIMUM_WEIGHT = 0.2
+
+RunPlan = namedtuple('RunPlan', ['order', 'dropped', 'predicted_seconds'])
+RunPlan.__doc__ = """
+The indices of the samples to measure, in the order to measure them; those left out;
+and the predicted time to measure those kept
+"""
+
+
+class _Mean(object):
+    """Exponentially weighted mean that starts as a plain mean"""
+    def __init__(self, count=0, mean=0.0):
+        self.count = count
+        self.mean = mean
+
+    def add(self, value):
+        self.count += 1
+        self.mean += (value - self.mean) * max(1 / self.count, MINIMUM_WEIGHT)
+
+    def as_list(self):
+        return [self.count, self.mean]
+
+
+class TimingHistory(object):
+    """
+    Running estimates of how long each stage of measuring a sample takes
+
+    Parameters
+    ----------
+    path : path-like, optional
+        where :meth:`save` writes the history
+
+    Methods
+    -------
+    -   :meth:`~eieio.measurement.run_planner.TimingHistory.load`
+    -   :meth:`~eieio.measurement.run_planner.TimingHistory.save`
+    -   :meth:`~eieio.measurement.run_planner.TimingHistory.observe`
+    -   :meth:`~eieio.measurement.run_planner.TimingHistory.observe_integration`
+    -   :meth:`~eieio.measurement.run_planner.TimingHistory.stage_seconds`
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._stages = {}
+        self._captures_by_decade = {}
+        self._integrations_by_decade = {}
+        # capture time beyond the meter's integration estimate
+        self._capture_overhead = _Mean()
+
+    @classmethod
+    def load(cls, path):
+        """Read a history saved by :meth:`save`; a missing file is an empty history"""
+        history = cls(path)
+        path = Path(path).expanduser()
+        if path.exists():
+            content = json.loads(path.read_text())
+            history._stages = {stage: _Mean(*v) for stage, v in content.get('stages', {}).items()}
+            history._captures_by_decade = {int(d): _Mean(*v) for d, v in content.get('captures', {}).items()}
+            history._integrations_by_decade = {int(d): _Mean(*v) for d, v in content.get('integrations', {}).items()}
+            history._capture_overhead = _Mean(*content.get('capture_overhead', [0, 0.0]))
+        return history
+
+    def save(self, path=None):
+        path = path if path is not None else self.path
+        if path is None:
+            raise ValueError('no path given for saving the timing history')
+        content = {'stages': {stage: m.as_list() for stage, m in self._stages.items()},
+                   'captures': {str(d): m.as_list() for d, m in self._captures_by_decade.items()},
+                   'integrations': {str(d): m.as_list() for d, m in self._integrations_by_decade.items()},
+                   'capture_overhead': self._capture_overhead.as_list()}
+        write_atomically(Path(path).expanduser(), json.dumps(content, indent=2))
+
+    def observe(self, stage, seconds, decade=None):
+        """Record how long a stage took, and for captures, the decade of the stimulus's luminance"""
+        if stage not in STAGES:
+            raise ValueError(f"unknown stage `{stage}'; known stages are {', '.join(STAGES)}")
+        self._stages.setdefault(stage, _Mean()).add(seconds)
+        if stage == 'capture' and decade is not None:
+            self._captures_by_decade.setdefault(decade, _Mean()).add(seconds)
+            integration = self._integrations_by_decade.get(decade)
+            if integration is not None:
+                self._capture_overhead.add(seconds - integration.mean)
+
+    def observe_integration(self, seconds, decade):
+        """Record the meter's own estimate of its integration time for a stimulus"""
+        self._integrations_by_decade.setdefault(decade, _Mean()).add(seconds)
+
+    def stage_seconds(self, stage, decade=None):
+        """
+        Predict how long a stage will take, for captures of a stimulus in a given luminance decade
+        """
+        if stage == 'capture' and decade is not None:
+            if decade in self._captures_by_decade:
+                return self._captures_by_decade[decade].mean
+            if decade in self._integrations_by_decade:
+                return self._integrations_by_decade[decade].mean + max(self._capture_overhead.mean, 0.0)
+        if stage in self._stages:
+            return self._stages[stage].mean
+        return DEFAULT_STAGE_SECONDS[stage]
+
+
+class RunPlanner(object):
+    """
+    Chooses which samples to measure, and when, to fit a run into a time budget
+
+    Iterating over a planner yields ``(index, sample)`` pairs, planning again before each
+    from the time left; call :meth:`observe` after measuring each sample so that it counts
+    as measured and later plans use its timings. A sample not observed by the time the
+    next is asked for is taken to have failed; observing it later (e.g. once a retry
+    succeeds) still counts it as measured.
+
+    Parameters
+    ----------
+    samples : sequence
+        sample dicts, each with a 'value' and optionally a numeric 'priority'
+    budget_seconds : float
+        time available for the whole run
+    history : TimingHistory, optional
+        timings to predict from; it is updated as samples are observed
+    rgb_to_XYZ : callable, optional
+        estimates stimuli from device RGB, as for :class:`eieio.measurement.sample_ordering.TransitionCost`
+    clock : callable, optional
+        returns the current time in seconds
+    order : sequence of int, optional
+        every sample's index, in the order to measure samples of equal priority (e.g. one
+        found by :func:`eieio.measurement.sample_ordering.order_samples`); by default,
+        sequence order
+
+    Attributes
+    ----------
+    measured : list of int
+        indices of the samples observed so far, in the order they were measured
+    """
+    def __init__(self, samples, budget_seconds, history=None, rgb_to_XYZ=None, clock=monotonic, order=None):
+        self.samples = samples
+        self.budget_seconds = budget_seconds
+        self.history = history if history is not None else TimingHistory()
+        self._clock = clock
+        self._started = None
+        self.measured = []
+        self._measured = set()
+        self._pending = set(range(len(samples)))
+        self._failed = []
+        self._decades = self._luminance_decades(samples, rgb_to_XYZ)
+        if order is None:
+            order = range(len(samples))
+        elif sorted(order) != list(range(len(samples))):
+            raise ValueError(f"sample order must list each of the {len(samples)} sample indices exactly once")
+        position = {index: i for i, index in enumerate(order)}
+        self._rank = sorted(range(len(samples)), key=lambda i: (-samples[i].get('priority', 0), position[i]))
+
+    @staticmethod
+    def _luminance_decades(samples, rgb_to_XYZ):
+        decades = [None] * len(samples)
+        rgb_indices = [i for i, sample in enumerate(samples) if np.size(sample['value']) == 3]
+        if rgb_indices:
+            XYZ = TransitionCost(rgb_to_XYZ=rgb_to_XYZ).stimuli([samples[i]['value'] for i in rgb_indices])
+            for i, Y in zip(rgb_indices, XYZ[:, 1]):
+                decades[i] = int(np.floor(np.log10(max(Y, MINIMUM_LUMINANCE))))
+        return decades
+
+    def sample_seconds(self, index):
+        """Predict how long measuring one sample will take"""
+        decade = self._decades[index]
+        return sum(self.history.stage_seconds(stage, decade) for stage in STAGES)
+
+    @property
+    def elapsed_seconds(self):
+        return 0.0 if self._started is None else self._clock() - self._started
+
+    @property
+    def remaining_seconds(self):
+        return self.budget_seconds - self.elapsed_seconds
+
+    @property
+    def dropped(self):
+        """Indices of the samples never handed out, in sequence order"""
+        return sorted(self._pending)
+
+    @property
+    def failed(self):
+        """Indices of the samples handed out but not measured, in sequence order"""
+        return sorted(self._failed)
+
+    def fits(self, index):
+        """Report whether a sample's predicted cost fits the time left"""
+        return self.sample_seconds(index) <= self.remaining_seconds
+
+    def plan(self, remaining_seconds=None):
+        """
+        Choose, by priority, the unmeasured samples whose predicted cost fits the time left
+
+        A sample too expensive to fit is passed over for cheaper, lower-priority ones.
+
+        Returns
+        -------
+        RunPlan
+        """
+        remaining_seconds = self.remaining_seconds if remaining_seconds is None else remaining_seconds
+        order, dropped, total = [], [], 0.0
+        for index in self._rank:
+            if index not in self._pending:
+                continue
+            seconds = self.sample_seconds(index)
+            if total + seconds <= remaining_seconds:
+                order.append(index)
+                total += seconds
+            else:
+                dropped.append(index)
+        return RunPlan(order, sorted(dropped), total)
+
+    def __iter__(self):
+        if self._started is None:
+            self._started = self._clock()
+        while True:
+            plan = self.plan()
+            if not plan.order:
+                return
+            index = plan.order[0]
+            self._pending.discard(index)
+            yield index, self.samples[index]
+            if index not in self._measured:
+                self._failed.append(index)
+
+    def observe(self, index, stage_seconds, integration_seconds=None):
+        """
+        Record the timings of measuring a sample
+
+        Parameters
+        ----------
+        index : int
+            the sample's index
+        stage_seconds : dict
+            wall-clock seconds taken by each stage, keyed by stage name; stages skipped are left out
+        integration_seconds : float, optional
+            the meter's estimate of its integration time for the sample
+        """
+        decade = self._decades[index]
+        if integration_seconds is not None and decade is not None:
+            self.history.observe_integration(integration_seconds, decade)
+        for stage, seconds in stage_seconds.items():
+            self.history.observe(stage, seconds, decade)
+        if index not in self._measured:
+            self._pending.discard(index)
+            if index in self._failed:
+                self._failed.remove(index)
+            self._measured.add(index)
+            self.measured.append(index)
+
+    def report(self):
+        """Describe how the run went against its budget, naming the samples that failed or were dropped"""
+        lines = [f"measured {len(self.measured)} of {len(self.samples)} samples in "
+                 f"{self.elapsed_seconds:.0f} s of a {self.budget_seconds:.0f} s budget"]
+        for label, indices in (('failed', self.failed), ('dropped', self.dropped)):
+            if indices:
+                names = [self.samples[i].get('name', str(i)) for i in indices]
+                lines.append(f"{label} {len(indices)}: {', '.join(names)}")
+        return '\n'.join(lines)
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming statistics over repeated measurements
+================================
+
+Accumulates the running mean, variance, minimum and maximum of the spectra and
+colorimetry of repeated measurements of the same samples (as in drift and
+repeatability studies) without keeping the measurements themselves: memory use depends
+on the number of distinct samples, not on the number of measurements.
+
+Means and variances are updated with Welford's algorithm, and accumulators are combined
+with Chan et al.'s pairwise formula, so both are numerically stable however many
+measurements go in.
+
+A sample's statistics persist as a summary :class:`eieio.measurement.measurement.Measurement`
+whose spectrum and colorimetry are the means, and whose EIEIO JSON carries the count,
+variance, minimum and maximum under 'statistics'. Loading a summary restores the
+accumulator exactly, so accumulation can resume in a later run; writing summaries into a
+directory that already holds some merges with them rather than replacing them.
+"""
+
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+
+from eieio.measurement.batch_colorimetry import has_spectral_data
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.resampling import resample
+from eieio.measurement.spdx_io import read_measurement, write_measurement
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'RunningStatistics', 'SampleStatistics', 'StatisticsAccumulator', 'sample_name_from_filename',
+    'summary_filename', 'STATISTICS_DIR'
+]
+
+# subdirectory of a run's output directory where summary measurements are written
+STATISTICS_DIR = 'statistics'
+
+SUMMARY_SUFFIX = '.spdx'
+
+# characters left as they are in summary filenames; everything else, path separators and '%'
+# included, is percent-encoded
+_FILENAME_SAFE = " !#$&'()+,;=@[]^_{}~-"
+
+
+class RunningStatistics(object):
+    """
+    Running mean, variance, minimum and maximum of a stream of equal-length vectors
+
+    Attributes
+    ----------
+    count : int
+        number of vectors accumulated
+    mean : ndarray
+    variance : ndarray
+        sample (n - 1) variance; zero until two vectors have been accumulated
+    minimum : ndarray
+    maximum : ndarray
+    """
+
+    def __init__(self, width):
+        self._count = 0
+        self._mean = np.zeros(width)
+        self._m2 = np.zeros(width)
+        self._minimum = np.full(width, np.inf)
+        self._maximum = np.full(width, -np.inf)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def variance(self):
+        if self._count < 2:
+            return np.zeros_like(self._m2)
+        return self._m2 / (self._count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def minimum(self):
+        return self._minimum
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    def update(self, values):
+        """Accumulate one vector"""
+        values = np.asarray(values, dtype=np.float64)
+        self._count += 1
+        delta = values - self._mean
+        self._mean = self._mean + delta / self._count
+        self._m2 = self._m2 + delta * (values - self._mean)
+        self._minimum = np.minimum(self._minimum, values)
+        self._maximum = np.maximum(self._maximum, values)
+
+    def update_many(self, values):
+        """Accumulate the rows of an N×W matrix as one batch"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        batch = RunningStatistics(values.shape[1])
+        batch._count = len(values)
+        batch._mean = values.mean(axis=0)
+        batch._m2 = np.sum((values - batch._mean) ** 2, axis=0)
+        batch._minimum = values.min(axis=0)
+        batch._maximum = values.max(axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        """Accumulate everything another RunningStatistics has accumulated"""
+        if not other._count:
+            return
+        count = self._count + other._count
+        delta = other._mean - self._mean
+        self._mean = self._mean + delta * (other._count / count)
+        self._m2 = self._m2 + other._m2 + delta ** 2 * (self._count * other._count / count)
+        self._minimum = np.minimum(self._minimum, other._minimum)
+        self._maximum = np.maximum(self._maximum, other._maximum)
+        self._count = count
+
+    def to_json(self):
+        """
+        Return the count, variance, minimum and maximum as JSON-serializable values;
+        the mean is persisted separately, as the values of the summary measurement
+        """
+        return {'count': self._count, 'variance': self.variance.tolist(),
+                'min': self._minimum.tolist(), 'max': self._maximum.tolist()}
+
+    @classmethod
+    def from_json(cls, mean, value):
+        """Rebuild a RunningStatistics from its mean and the output of :meth:`to_json`"""
+        mean = np.asarray(mean, dtype=np.float64)
+        statistics = cls(len(mean))
+        statistics._count = int(value['count'])
+        statistics._mean = mean
+        statistics._m2 = np.asarray(value['variance'], dtype=np.float64) * max(statistics._count - 1, 0)
+        statistics._minimum = np.asarray(value['min'], dtype=np.float64)
+        statistics._maximum = np.asarray(value['max'], dtype=np.float64)
+        return statistics
+
+
+class SampleStatistics(object):
+    """
+    Statistics of the spectra and colorimetry of repeated measurements of one sample
+
+    Spectra are accumulated at the wavelengths of the first one seen; later spectra
+    sampled otherwise are resampled to those. Measurements carrying only placeholder
+    spectra, or spectra not covering all of those wavelengths, contribute their
+    colorimetry alone, so the spectral statistics' count can be less than the sample's.
+
+    Attributes
+    ----------
+    name : str
+    count : int
+        number of measurements accumulated
+    wavelengths : ndarray or None
+        wavelengths of the accumulated spectra, if any have been
+    spectral : RunningStatistics or None
+    colorimetry : dict
+        RunningStatistics keyed by (observer, color space, illuminant)
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._count = 0
+        self._wavelengths = None
+        self._spectral = None
+        self._colorimetry = {}
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def wavelengths(self):
+        return self._wavelengths
+
+    @property
+    def spectral(self):
+        return self._spectral
+
+    @property
+    def colorimetry(self):
+        return self._colorimetry
+
+    def add(self, measurement):
+        """Accumulate a measurement of the sample"""
+        self._count += 1
+        if has_spectral_data(measurement):
+            wavelengths = np.asarray(measurement.wavelengths, dtype=np.float64)
+            values = np.asarray(measurement.values, dtype=np.float64)
+            if self._spectral is None:
+                self._wavelengths = wavelengths
+                self._spectral = RunningStatistics(len(wavelengths))
+            elif not np.array_equal(wavelengths, self._wavelengths):
+                if wavelengths.min() > self._wavelengths[0] or wavelengths.max() < self._wavelengths[-1]:
+                    # resampling would make up values where the spectrum has none
+                    values = None
+                else:
+                    values = resample(wavelengths, values, self._wavelengths)
+            if values is not None:
+                self._spectral.update(values)
+        for key, colorimetry in measurement.colorimetry.items():
+            statistics = self._colorimetry.get(key)
+            if statistics is None:
+                statistics = self._colorimetry[key] = RunningStatistics(3)
+            statistics.update(colorimetry.values)
+
+    def merge(self, other):
+        """Accumulate everything another SampleStatistics has accumulated"""
+        self._count += other._count
+        if other._spectral is not None:
+            if self._spectral is None:
+                self._wavelengths = other._wavelengths
+                self._spectral = RunningStatistics(len(self._wavelengths))
+            if np.array_equal(other._wavelengths, self._wavelengths):
+                self._spectral.merge(other._spectral)
+            else:
+                raise ValueError(f"cannot merge statistics of sample `{self._name}' accumulated at different "
+                                 "wavelengths")
+        for key, statistics in other._colorimetry.items():
+            self._colorimetry.setdefault(key, RunningStatistics(3)).merge(statistics)
+
+    def to_measurement(self, measurement=None):
+        """
+        Return a summary measurement holding the means, with the rest of the statistics
+        in its 'statistics' metadata
+
+        Parameters
+        ----------
+        measurement : Measurement, optional
+            measurement to fill in, e.g. one with a header already set up; if None, a new
+            Measurement is created
+        """
+        if measurement is None:
+            measurement = Measurement()
+        if self._spectral is not None:
+            measurement.wavelengths = self._wavelengths
+            measurement.values = self._spectral.mean
+        measurement.colorimetry = {}
+        for (observer, color_space, illuminant), statistics in self._colorimetry.items():
+            measurement.insert_colorimetry(Colorimetry(observer, color_space, illuminant,
+                                                       statistics.mean.tolist(), 'derived'))
+        measurement.statistics = {
+            'name': self._name,
+            'count': self._count,
+            'spectral': None if self._spectral is None else self._spectral.to_json(),
+            'colorimetry': {','.join(key): statistics.to_json() for key, statistics in self._colorimetry.items()}
+        }
+        return measurement
+
+    @classmethod
+    def from_measurement(cls, measurement):
+        """
+        Restore the statistics a summary measurement was written from
+
+        Raises
+        ------
+        ValueError
+            if the measurement carries no statistics
+        """
+        summary = measurement.statistics
+        if not summary:
+            raise ValueError(f"measurement `{measurement.path}' is not a statistics summary")
+        sample = cls(summary['name'])
+        sample._count = int(summary['count'])
+        if summary.get('spectral'):
+            sample._wavelengths = np.asarray(measurement.wavelengths, dtype=np.float64)
+            sample._spectral = RunningStatistics.from_json(measurement.values, summary['spectral'])
+        for comma_key, value in summary['colorimetry'].items():
+            key = tuple(comma_key.split(','))
+            sample._colorimetry[key] = RunningStatistics.from_json(measurement.colorimetry[key].values, value)
+        return sample
+
+
+def sample_name_from_filename(filename):
+    """
+    Recover the sample name from a measurement filename written by the measure tool
+
+    'sample.12.red.spdx' is a measurement of sample 'red'; 'sample.12.spdx' is of an
+    unnamed sample, for which None is returned. Files named otherwise are taken to be
+    named by their stem.
+    """
+    parts = Path(filename).name.split('.')[:-1]
+    if len(parts) >= 2 and parts[0] == 'sample' and parts[1].isdigit():
+        return '.'.join(parts[2:]) or None
+    return '.'.join(parts) or None
+
+
+def summary_filename(name):
+    """
+    Return the filename of a sample's summary measurement
+
+    The name is percent-encoded so that any sample name, including one with path
+    separators, gives a distinct filename inside the statistics directory; the sample's
+    own name is read back from the summary, not the filename.
+    """
+    encoded = quote(name, safe=_FILENAME_SAFE)
+    if encoded.startswith('.'):
+        encoded = '%2E' + encoded[1:]
+    return f"{encoded}{SUMMARY_SUFFIX}"
+
+
+class StatisticsAccumulator(object):
+    """
+    Per-sample streaming statistics, keyed by sample name
+    """
+
+    def __init__(self):
+        self._samples = {}
+        # summary files whose contents the accumulated statistics already include
+        self._merged_paths = set()
+
+    def add(self, name, measurement):
+        """Accumulate a measurement of the named sample"""
+        sample = self._samples.get(name)
+        if sample is None:
+            sample = self._samples[name] = SampleStatistics(name)
+        sample.add(measurement)
+
+    def merge(self, other):
+        """Accumulate everything another StatisticsAccumulator has accumulated"""
+        for name, sample in other._samples.items():
+            self._samples.setdefault(name, SampleStatistics(name)).merge(sample)
+
+    @property
+    def names(self):
+        return list(self._samples)
+
+    def __getitem__(self, name):
+        return self._samples[name]
+
+    def __contains__(self, name):
+        return name in self._samples
+
+    def __len__(self):
+        return len(self._samples)
+
+    def summary_measurements(self):
+        """Return a summary measurement for each sample, keyed by sample name"""
+        return {name: sample.to_measurement() for name, sample in self._samples.items()}
+
+    def write(self, dir_, merge=True):
+        """
+        Write one summary measurement per sample into a directory, named by :func:`summary_filename`
+
+        Parameters
+        ----------
+        dir_ : str or Path
+        merge : bool, optional
+            if true, a summary already in the directory (e.g. from an earlier run) is merged
+            into this accumulator's statistics for its sample before the two are written
+            back together; each file is merged only once however often the accumulator is
+            written. If false, existing summaries are replaced.
+
+        Returns
+        -------
+        list
+            the paths written
+
+        Raises
+        ------
+        ValueError
+            if an existing summary file holds the statistics of some other sample
+        """
+        dir_ = Path(dir_)
+        dir_.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name in list(self._samples):
+            path = Path(dir_, summary_filename(name))
+            key = str(path.resolve())
+            if merge and key not in self._merged_paths and path.exists():
+                existing = SampleStatistics.from_measurement(read_measurement(path))
+                if existing.name != name:
+                    raise ValueError(f"summary `{path}' holds statistics for sample `{existing.name}', "
+                                     f"not `{name}'")
+                existing.merge(self._samples[name])
+                self._samples[name] = existing
+            write_measurement(self._samples[name].to_measurement(), path, atomic=True)
+            self._merged_paths.add(key)
+            paths.append(path)
+        return paths
+
+    @classmethod
+    def load(cls, dir_):
+        """
+        Restore an accumulator from the summary measurements in a directory
+        """
+        accumulator = cls()
+        for path in sorted(Path(dir_).glob(f"*{SUMMARY_SUFFIX}")):
+            sample = SampleStatistics.from_measurement(read_measurement(path))
+            accumulator._samples[sample.name] = sample
+            accumulator._merged_paths.add(str(path.resolve()))
+        return accumulator
@@ -28,6 +28,7 @@ class SampleIDSequence(object):
     def __init__(self, path):
         self.path = path
         self.ids = []
+        self._id_set = set()
 
     def num_samples(self):
         return len(self.ids)
@@ -42,8 +43,9 @@ class SampleIDSequence(object):
             match = re.search(pat, line)
             if match:
                 sample_id = match.group(1)
-                if sample_id in self.ids:
+                if sample_id in self._id_set:
                     raise RuntimeError("sample IDs must be unique in .sis file")
+                self._id_set.add(sample_id)
                 self.ids.append(sample_id)
             else:
                 raise SyntaxError
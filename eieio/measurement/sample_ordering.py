@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Sample ordering - measure a sample sequence in the order that wastes the least time
+================================
+
+Jumping between very different stimuli costs time: a display (and an LED processor)
+takes longer to settle after a large luminance or chromaticity change, and a meter
+integrating adaptively (the CS-2000, for one) may have to change its integration time.
+:func:`order_samples` reorders a sequence to keep consecutive stimuli similar.
+
+The cost of moving from one sample to another is modeled by :class:`TransitionCost` as
+
+    settle_per_decade · |Δ log10 Y| + settle_per_chromaticity · (|Δu'| + |Δv'|)
+        + integration_change · |Δ decade of Y|
+
+seconds, which is an L1 distance between per-sample feature vectors; the ordering is
+then an open traveling-salesman path in that space. It is built greedily by nearest
+neighbour (with a k-d tree, so large sequences are practical) and improved by 2-opt,
+with segment reversals limited to a window of positions so each pass is linear in the
+sequence length.
+
+Stimuli are estimated from their device RGB values, by default as a gamma 2.2 display
+with BT.709 primaries, or by any callable mapping device RGB to XYZ, such as
+:meth:`eieio.measurement.adaptive_sampling.AdaptiveCharacterization.predict`.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'TransitionCost', 'SampleOrdering', 'order_samples', 'nearest_neighbour_path', 'two_opt',
+    'DEFAULT_WINDOW'
+]
+
+DEFAULT_WINDOW = 50
+DEFAULT_MAX_PASSES = 10
+DEFAULT_GAMMA = 2.2
+BT709_RGB_TO_XYZ = np.array([[0.4124, 0.3576, 0.1805],
+                             [0.2126, 0.7152, 0.0722],
+                             [0.0193, 0.1192, 0.9505]])
+# below this (relative) luminance, stimuli count as black
+MINIMUM_LUMINANCE = 1e-4
+NEIGHBOURS_TO_QUERY = 16
+
+SampleOrdering = namedtuple('SampleOrdering', ['order', 'original_seconds', 'ordered_seconds'])
+SampleOrdering.__doc__ = """
+The sample indices in the order to measure them, and the predicted total transition time,
+in seconds, of the original and of the new order
+"""
+
+
+class TransitionCost(object):
+    """
+    Predicts the time lost moving from one stimulus to another
+
+    Parameters
+    ----------
+    settle_per_decade : float, optional
+        seconds of settling per decade of luminance change
+    settle_per_chromaticity : float, optional
+        seconds of settling per unit of u', v' change (summed)
+    integration_change : float, optional
+        seconds lost per decade-of-luminance integration-time bracket crossed
+    rgb_to_XYZ : callable, optional
+        maps an N×3 array of device RGB to XYZ; by default, a gamma 2.2 BT.709 display
+    """
+    def __init__(self, settle_per_decade=2.0, settle_per_chromaticity=5.0, integration_change=1.0, rgb_to_XYZ=None):
+        self.settle_per_decade = settle_per_decade
+        self.settle_per_chromaticity = settle_per_chromaticity
+        self.integration_change = integration_change
+        self.rgb_to_XYZ = rgb_to_XYZ
+
+    def stimuli(self, rgb):
+        """Return the N×3 XYZ, relative to a white of luminance 1, estimated for device RGB"""
+        rgb = np.asarray(rgb, dtype=np.float64).reshape(-1, 3)
+        if self.rgb_to_XYZ is None:
+            return np.clip(rgb, 0, None) ** DEFAULT_GAMMA @ BT709_RGB_TO_XYZ.T
+        XYZ = np.asarray(self.rgb_to_XYZ(rgb), dtype=np.float64).reshape(-1, 3)
+        white = np.asarray(self.rgb_to_XYZ(np.ones((1, 3))), dtype=np.float64).reshape(3)
+        return XYZ / white[1]
+
+    def features(self, rgb):
+        """
+        Return N×4 feature vectors whose L1 distances are the transition costs
+        """
+        XYZ = self.stimuli(rgb)
+        Y = np.maximum(XYZ[:, 1], MINIMUM_LUMINANCE)
+        log_Y = np.log10(Y)
+        denominator = XYZ @ [1.0, 15.0, 3.0]
+        # black has no chromaticity; treat it as sitting at the equal-energy point
+        black = denominator <= 0
+        denominator[black] = 1.0
+        u = np.where(black, 4 / 19, 4 * XYZ[:, 0] / denominator)
+        v = np.where(black, 9 / 19, 9 * XYZ[:, 1] / denominator)
+        return np.column_stack((self.settle_per_decade * log_Y, self.settle_per_chromaticity * u,
+                                self.settle_per_chromaticity * v, self.integration_change * np.floor(log_Y)))
+
+    def path_seconds(self, features, order=None):
+        """Return the total transition time of visiting feature vectors in an order"""
+        path = features if order is None else features[np.asarray(order)]
+        return float(np.abs(np.diff(path, axis=0)).sum())
+
+
+def nearest_neighbour_path(features, start=0):
+    """
+    Build an open path through feature vectors by always moving to the nearest (L1)
+    unvisited one
+
+    Returns
+    -------
+    ndarray
+        the visiting order, beginning with start
+    """
+    n = len(features)
+    tree = cKDTree(features)
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=np.intp)
+    current = start
+    for position in range(n):
+        order[position] = current
+        visited[current] = True
+        if position == n - 1:
+            break
+        k = min(NEIGHBOURS_TO_QUERY, n)
+        while True:
+            _, candidates = tree.query(features[current], k=k, p=1)
+            candidates = np.atleast_1d(candidates)
+            unvisited = candidates[~visited[candidates]]
+            if len(unvisited):
+                nearest = unvisited[0]
+                break
+            if k * 4 >= n - position:
+                # the neighbourhood is used up and few samples are left; scanning them is cheaper
+                remaining = np.flatnonzero(~visited)
+                nearest = remaining[np.abs(features[remaining] - features[current]).sum(axis=1).argmin()]
+                break
+            k *= 4
+        current = nearest
+    return order
+
+
+def two_opt(features, order, window=DEFAULT_WINDOW, max_passes=DEFAULT_MAX_PASSES):
+    """
+    Improve an open path by reversing segments wherever that shortens it
+
+    The first position is left in place. Only segments of at most ``window`` positions
+    are considered, so each pass costs O(N · window).
+
+    Returns
+    -------
+    ndarray
+        the improved visiting order
+    """
+    order = np.array(order, dtype=np.intp)
+    n = len(order)
+
+    def distance(a, b):
+        return np.abs(features[a] - features[b]).sum(axis=-1)
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            # reverse order[i + 1:j + 1] for j in (i + 1, i + window]
+            j = np.arange(i + 2, min(i + window, n - 1) + 1)
+            if not len(j):
+                continue
+            a, b = order[i], order[i + 1]
+            c = order[j]
+            has_next = j + 1 < n
+            d = order[np.minimum(j + 1, n - 1)]
+            before = distance(a, b) + np.where(has_next, distance(c, d), 0.0)
+            after = distance(a, c) + np.where(has_next, distance(b, d), 0.0)
+            gains = before - after
+            best = gains.argmax()
+            if gains[best] > 1e-12:
+                order[i + 1:j[best] + 1] = order[i + 1:j[best] + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_samples(samples, cost=None, start=0, window=DEFAULT_WINDOW, max_passes=DEFAULT_MAX_PASSES):
+    """
+    Find an order in which to measure samples that keeps consecutive stimuli similar
+
+    Parameters
+    ----------
+    samples : sequence
+        sample dicts, each with a device RGB 'value'
+    cost : TransitionCost, optional
+        model of the time lost between stimuli; by default, :class:`TransitionCost` defaults
+    start : int, optional
+        index of the sample to measure first
+    window : int, optional
+        longest segment 2-opt considers reversing
+    max_passes : int, optional
+        most 2-opt passes over the path
+
+    Returns
+    -------
+    SampleOrdering
+        the indices, into samples, in the order to measure them, and the predicted
+        transition time of the original and new orders
+    """
+    cost = cost if cost is not None else TransitionCost()
+    if not len(samples):
+        return SampleOrdering([], 0.0, 0.0)
+    if not 0 <= start < len(samples):
+        raise ValueError(f"starting sample index `{start}' is outside the {len(samples)}-sample sequence")
+    features = cost.features([sample['value'] for sample in samples])
+    order = two_opt(features, nearest_neighbour_path(features, start), window, max_passes)
+    original_seconds = cost.path_seconds(features)
+    ordered_seconds = cost.path_seconds(features, order)
+    if ordered_seconds > original_seconds and start == 0:
+        # the heuristic can't beat an already well-ordered sequence; keep it
+        order, ordered_seconds = np.arange(len(samples)), original_seconds
+    return SampleOrdering(order.tolist(), original_seconds, ordered_seconds)
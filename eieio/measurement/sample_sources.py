@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Sample sources - lazily generated sample sequences
+================================
+
+A measurement run's ``sample_sequence`` has been a TOML list of inline tables, each
+with a ``value`` (and usually a ``name`` and ``space``). Large plans, such as a 17³
+cube or a set of fine ramps, are better described than listed, so an entry of the list
+(or the whole ``sample_sequence``) may instead be a table with a ``source`` key:
+
+- ``{ source = 'ramp', steps = 33, channels = ['red', 'gray'], min = 0.0, max = 1.0 }``
+  steps from min to max in each of the named channels (any of 'red', 'green', 'blue'
+  and 'gray', by default all four), the other channels held at min;
+- ``{ source = 'cube', size = 17, min = 0.0, max = 1.0 }``
+  every combination of ``size`` evenly-spaced levels in each of red, green and blue;
+- ``{ source = 'grid', red = [0.0, 0.5, 1.0], green = [...], blue = [...] }``
+  every combination of explicitly listed levels (``levels`` gives all three at once);
+- ``{ source = 'random', count = 1000, seed = 1, min = 0.0, max = 1.0 }``
+  uniformly random values inside the device RGB cube, reproducible from the seed;
+- ``{ source = 'file', path = 'patches.npz' }``
+  values from an external .npy (an N×3 array), .npz (a 'values' N×3 array and
+  optionally a 'names' array) or .csv (rows of red, green, blue, or name, red, green,
+  blue) file, resolved relative to the instructions file.
+
+Every source yields the same dicts as a listed sample, with ``name``, ``space`` and
+``value``; every optional key above may be combined with ``name`` (a prefix for the
+generated names, defaulting to the source type) and ``space`` (default 'deviceRGB').
+Nothing is generated until :class:`SampleSequence` is iterated, and its length is known
+without generating anything, so a plan of any size loads instantly.
+"""
+
+import csv
+import zipfile
+from abc import ABC, abstractmethod
+from itertools import chain, product
+from pathlib import Path
+
+import numpy as np
+
+from utilities.english import oxford_join
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'SampleSequence', 'sample_source', 'write_sample_file', 'SAMPLE_SOURCES'
+]
+
+DEFAULT_SPACE = 'deviceRGB'
+RAMP_CHANNELS = ('red', 'green', 'blue', 'gray')
+SAMPLE_FILE_SUFFIXES = ('.npy', '.npz', '.csv')
+RANDOM_BLOCK_SIZE = 4096
+
+
+def _sample(name, space, value):
+    return {'name': name, 'space': space, 'value': [float(v) for v in value]}
+
+
+def _width(count):
+    return len(str(max(count - 1, 0)))
+
+
+class _Source(ABC):
+    """
+    A sample source: a known number of samples, generated on iteration
+    """
+    def __init__(self, spec):
+        self.name = spec.get('name', spec['source'])
+        self.space = spec.get('space', DEFAULT_SPACE)
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def __iter__(self):
+        pass
+
+
+class _Ramp(_Source):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.steps = int(spec['steps'])
+        if self.steps < 2:
+            raise ValueError(f"a ramp needs at least two steps, not `{self.steps}'")
+        self.channels = list(spec.get('channels', RAMP_CHANNELS))
+        unknown = [channel for channel in self.channels if channel not in RAMP_CHANNELS]
+        if unknown:
+            raise ValueError(f"unknown ramp channel(s) {oxford_join(unknown, 'and')}; "
+                             f"ramp channels are {oxford_join(list(RAMP_CHANNELS), 'and')}")
+        self.minimum = float(spec.get('min', 0.0))
+        self.maximum = float(spec.get('max', 1.0))
+
+    def __len__(self):
+        return self.steps * len(self.channels)
+
+    def __iter__(self):
+        levels = np.linspace(self.minimum, self.maximum, self.steps)
+        width = _width(self.steps)
+        for channel in self.channels:
+            for i, level in enumerate(levels):
+                value = [self.minimum] * 3
+                if channel == 'gray':
+                    value = [level] * 3
+                else:
+                    value[RAMP_CHANNELS.index(channel)] = level
+                yield _sample(f"{self.name}_{channel}_{i:0{width}}", self.space, value)
+
+
+class _Grid(_Source):
+    def __init__(self, spec):
+        super().__init__(spec)
+        default = spec.get('levels')
+        self.levels = []
+        for channel in RAMP_CHANNELS[:3]:
+            levels = spec.get(channel, default)
+            if levels is None:
+                raise ValueError(f"grid sample source needs levels for `{channel}' (or `levels' for all channels)")
+            self.levels.append([float(level) for level in levels])
+
+    def __len__(self):
+        return int(np.prod([len(levels) for levels in self.levels]))
+
+    def __iter__(self):
+        widths = [_width(len(levels)) for levels in self.levels]
+        for indices in product(*(range(len(levels)) for levels in self.levels)):
+            suffix = '_'.join(f"{i:0{width}}" for i, width in zip(indices, widths))
+            value = [levels[i] for levels, i in zip(self.levels, indices)]
+            yield _sample(f"{self.name}_{suffix}", self.space, value)
+
+
+class _Cube(_Grid):
+    def __init__(self, spec):
+        size = int(spec['size'])
+        if size < 2:
+            raise ValueError(f"a cube needs at least two levels per channel, not `{size}'")
+        levels = np.linspace(float(spec.get('min', 0.0)), float(spec.get('max', 1.0)), size).tolist()
+        super().__init__(dict(spec, levels=levels))
+
+
+class _Random(_Source):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.count = int(spec['count'])
+        self.seed = spec.get('seed', 0)
+        self.minimum = float(spec.get('min', 0.0))
+        self.maximum = float(spec.get('max', 1.0))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed)
+        width = _width(self.count)
+        # drawn a block at a time; the stream is the same as drawing every value at once
+        for start in range(0, self.count, RANDOM_BLOCK_SIZE):
+            block = rng.uniform(self.minimum, self.maximum, (min(RANDOM_BLOCK_SIZE, self.count - start), 3))
+            for i, value in enumerate(block.tolist(), start):
+                yield _sample(f"{self.name}_{i:0{width}}", self.space, value)
+
+
+class _File(_Source):
+    def __init__(self, spec, base_dir=None):
+        super().__init__(dict(spec, name=spec.get('name', Path(spec['path']).stem)))
+        path = Path(spec['path']).expanduser()
+        self.path = path if path.is_absolute() or base_dir is None else Path(base_dir, path)
+        self.suffix = self.path.suffix.lower()
+        if self.suffix not in SAMPLE_FILE_SUFFIXES:
+            raise ValueError(f"sample file `{self.path}' should be one of {oxford_join(SAMPLE_FILE_SUFFIXES, 'or')}")
+        if not self.path.exists():
+            raise FileNotFoundError(f"sample file `{self.path}' does not exist")
+        self._length = None
+
+    def _arrays(self):
+        if self.suffix == '.npy':
+            # memory-mapped, so rows are read only as they are reached
+            return np.load(self.path, mmap_mode='r'), None
+        with np.load(self.path) as npz:
+            return npz['values'], npz['names'] if 'names' in npz.files else None
+
+    def _csv_rows(self):
+        with open(self.path, newline='') as f:
+            for row in csv.reader(f):
+                if not row or row[0].lstrip().startswith('#'):
+                    continue
+                try:
+                    value = [float(v) for v in row[-3:]]
+                except ValueError:
+                    continue  # a header row
+                yield (row[0].strip() if len(row) > 3 else None), value
+
+    def _npz_length(self):
+        """Read the number of rows of an .npz's 'values' from its header, without loading the array"""
+        with zipfile.ZipFile(self.path) as npz, npz.open('values.npy') as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+        return shape[0] if shape else 0
+
+    def __len__(self):
+        if self._length is None:
+            if self.suffix == '.csv':
+                self._length = sum(1 for _ in self._csv_rows())
+            elif self.suffix == '.npy':
+                self._length = len(np.load(self.path, mmap_mode='r'))
+            else:
+                self._length = self._npz_length()
+        return self._length
+
+    def __iter__(self):
+        if self.suffix == '.csv':
+            rows = self._csv_rows()
+        else:
+            values, names = self._arrays()
+            if values.ndim != 2 or values.shape[1] != 3:
+                raise ValueError(f"sample file `{self.path}' should hold an N×3 array, not one of shape {values.shape}")
+            rows = zip(names if names is not None else [None] * len(values), values)
+        width = None
+        for i, (name, value) in enumerate(rows):
+            if name is None or str(name) == '':
+                width = width if width is not None else _width(len(self))
+                name = f"{self.name}_{i:0{width}}"
+            yield _sample(str(name), self.space, value)
+
+
+class _Listed(_Source):
+    """Samples listed inline, as in the original sample_sequence format"""
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __iter__(self):
+        return iter(self.samples)
+
+
+SAMPLE_SOURCES = {'ramp': _Ramp, 'cube': _Cube, 'grid': _Grid, 'random': _Random, 'file': _File}
+
+
+def sample_source(spec, base_dir=None):
+    """
+    Build a sample source from its TOML table
+
+    Parameters
+    ----------
+    spec : dict
+        a table with a 'source' key naming one of :data:`SAMPLE_SOURCES`
+    base_dir : str or Path, optional
+        directory against which a relative sample file path is resolved
+
+    Returns
+    -------
+    object
+        an iterable of sample dicts with a cheap ``len()``
+    """
+    kind = spec.get('source')
+    if kind not in SAMPLE_SOURCES:
+        raise ValueError(f"unknown sample source `{kind}'; known sources are "
+                         f"{oxford_join(list(SAMPLE_SOURCES), 'and')}")
+    try:
+        return _File(spec, base_dir) if kind == 'file' else SAMPLE_SOURCES[kind](spec)
+    except KeyError as e:
+        raise ValueError(f"`{kind}' sample source is missing required key {e}") from None
+
+
+class SampleSequence(object):
+    """
+    A run's samples, from listed samples and sample sources, generated as they are iterated
+
+    Parameters
+    ----------
+    sequence : list or dict
+        the ``sample_sequence`` value from an instructions file: a list whose entries
+        are samples or sample source tables, or a single sample source table
+    base_dir : str or Path, optional
+        directory against which relative sample file paths are resolved
+    """
+    def __init__(self, sequence, base_dir=None):
+        if isinstance(sequence, dict):
+            sequence = [sequence]
+        self._sources = []
+        listed = []
+        for entry in sequence:
+            if 'source' in entry:
+                if listed:
+                    self._sources.append(_Listed(listed))
+                    listed = []
+                self._sources.append(sample_source(entry, base_dir))
+            else:
+                if 'value' not in entry:
+                    raise ValueError(f"sample `{entry}' has neither a `value' nor a `source'")
+                listed.append(entry)
+        if listed:
+            self._sources.append(_Listed(listed))
+
+    def __len__(self):
+        return sum(len(source) for source in self._sources)
+
+    def __iter__(self):
+        return chain.from_iterable(self._sources)
+
+
+def write_sample_file(path, samples):
+    """
+    Write samples to a compact .npz sample file, for use as a 'file' sample source
+
+    Parameters
+    ----------
+    path : str or Path
+        destination, ending in .npz
+    samples : iterable
+        sample dicts with 'value' and optionally 'name' keys, e.g. a listed
+        ``sample_sequence`` or a :class:`SampleSequence`
+
+    Returns
+    -------
+    int
+        the number of samples written
+    """
+    if Path(path).suffix.lower() != '.npz':
+        raise ValueError(f"sample file `{path}' should have the suffix .npz")
+    names = []
+    values = []
+    for sample in samples:
+        names.append(str(sample.get('name', '')))
+        values.append(sample['value'])
+    values = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+    if any(names):
+        np.savez(path, values=values, names=np.array(names))
+    else:
+        np.savez(path, values=values)
+    return len(values)
@@ -6,11 +6,31 @@ Measurement session structure and I/O
 Defines the :class:`spectral_measurement.session.MeasurementSession` class handling directories full of
 *IES TM-27-14* spectral data XML files.
 
+Loading scans the session directory and its subdirectories with ``os.scandir`` and
+reads the .spdx and .colx files it finds on a thread pool. The threads overlap waiting
+on file reads, which helps on network storage, but parsing holds the GIL, so parsing
+itself is not parallel; a process pool can't be used instead because colour's TM-27-14
+objects can't be pickled back from workers. The size and modification
+time of every file loaded is remembered, so :meth:`MeasurementSession.rescan` can pick up
+just the files that are new or have changed since, which keeps refreshing a session that
+is still being captured into cheap.
+
+Unsaved measurements can be written by a background saver (see
+:meth:`MeasurementSession.start_autosave`) once enough have been added or the oldest has
+waited long enough; every save replaces files atomically.
 """
 
+import atexit
 import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from xml.etree.ElementTree import ParseError
 
 from colour.io.tm2714 import SpectralDistribution_IESTM2714
 from eieio.measurement.old_colorimetry import Colorimetry_IESTM2714
@@ -23,12 +43,81 @@ __email__ = 'jgoldstone@arri.com'
 __status__ = 'Experimental'
 
 __all__ = [
-    'MeasurementSession'
+    'MeasurementSession', 'SessionScan'
 ]
 
 SPECTRAL_SUFFIX = '.spdx'
 COLORIMETRIC_SUFFIX = '.colx'
 
+DEFAULT_AUTOSAVE_MAX_PENDING = 10
+DEFAULT_AUTOSAVE_MAX_DELAY = 5.0
+
+SessionScan = namedtuple('SessionScan', ['added', 'modified', 'removed', 'unchanged', 'failed'])
+SessionScan.__doc__ = """
+Summary of what :meth:`MeasurementSession.rescan` found; each field is a sorted list of
+file paths. Files that could not be parsed (typically because they were still being
+written) are listed in 'failed' and are retried on the next rescan.
+"""
+
+
+def _scan_measurement_files(dir_, stats=None):
+    """
+    Return a dict mapping the path of every .spdx and .colx file in a directory tree to its stat result
+    """
+    stats = {} if stats is None else stats
+    with os.scandir(dir_) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _scan_measurement_files(entry.path, stats)
+            elif entry.name.endswith((SPECTRAL_SUFFIX, COLORIMETRIC_SUFFIX)) and entry.is_file():
+                stats[entry.path] = entry.stat()
+    return stats
+
+
+def _read_measurement_file(path):
+    if path.endswith(SPECTRAL_SUFFIX):
+        measurement = SpectralDistribution_IESTM2714(path)
+    else:
+        measurement = Colorimetry_IESTM2714(path)
+    measurement.read()
+    return measurement
+
+
+def _write_atomically(measurement, path):
+    """
+    Have a measurement write itself to a temporary file beside its destination, flush
+    that to disk, then move it over the destination
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=Path(path).parent, prefix=f".{Path(path).name}.", suffix='.tmp')
+    try:
+        measurement.path = tmp_path
+        try:
+            measurement.write()
+        finally:
+            measurement.path = path
+        # the measurement wrote through its own handle on the same file; without this, a crash
+        # soon after the rename could leave an empty file where the old one was
+        os.fsync(fd)
+        os.close(fd)
+        fd = None
+        os.replace(tmp_path, path)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+# sessions with a background saver running, stopped (with a final save) at interpreter exit;
+# held weakly, so that registering for exit doesn't keep a session alive
+_AUTOSAVING_SESSIONS = weakref.WeakSet()
+
+
+@atexit.register
+def _stop_autosaves():
+    for session in list(_AUTOSAVING_SESSIONS):
+        session.stop_autosave()
+
 
 class MeasurementSession(object):
     """
@@ -36,11 +125,11 @@ class MeasurementSession(object):
 
     Attributes
     sds : dict
-        colour.colorimetry.spectrum.SpectralDistribution objects, keyed by filename
+        colour.colorimetry.spectrum.SpectralDistribution objects, keyed by path
     tsc_colorspace : str
         name of tristimulus color space.
     tscs : dict
-        tristimulus colorimetry measurements, keyed by filename
+        tristimulus colorimetry measurements, keyed by path
     """
 
     TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
@@ -57,44 +146,262 @@ class MeasurementSession(object):
         self._dirty_sds_keys = set()
         self._tscs = {}
         self._dirty_tscs_keys = set()
+        self._fingerprints = {}
         self.measurement_dir = measurement_dir
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._pending_additions = 0
+        self._first_pending_time = None
+        self._autosave_thread = None
+        self._autosave_stopping = False
+        self._autosave_max_pending = None
+        self._autosave_max_delay = None
+        self._autosave_error = None
 
-    def load(self):
-        for _, _, files in os.walk(self.measurement_dir):
-            files.sort()
-            for file in files:
-                if Path(file).suffix == SPECTRAL_SUFFIX:
-                    measurement_path = str(Path(self.measurement_dir, file))
-                    sd = SpectralDistribution_IESTM2714(measurement_path)
-                    sd.read()
-                    self.add_spectral_measurement(sd)
-                elif Path(file).suffix == COLORIMETRIC_SUFFIX:
-                    tcm = Colorimetry_IESTM2714(file)
-                    self.add_tristimulus_colorimetry_measurement(tcm)
-
-    def save(self):
-        for key in self._dirty_sds_keys:
-            sd = self._sds[key]
-            if not sd:
-                raise RuntimeError(f"could not find spectral distribution with path {key}")
-            print(f"writing spectral distribution to {sd.path}")
-            sd.write()
-        self._dirty_sds_keys = set()
-        for key in self._dirty_tscs_keys:
-            tsc = self._tscs[key]
-            if not tsc:
-                raise RuntimeError(f"could not find tristimulus colorimetry with path {key}")
-            print(f"writing tristimulus colorimetry to {tsc.path}")
-            tsc.write()
-        self._dirty_tscs_keys = set()
+    def load(self, max_workers=None):
+        """
+        Load every .spdx and .colx file in the session directory and its subdirectories
+
+        Measurements loaded from disk are not considered unsaved. Anything previously
+        loaded is forgotten, but measurements added and not yet saved are kept.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            size of the thread pool reading the files; if 1, they are read in this thread
+
+        Returns
+        -------
+        SessionScan
+        """
+        with self._lock:
+            for dict_, key_set in ((self._sds, self._dirty_sds_keys), (self._tscs, self._dirty_tscs_keys)):
+                for key in [key for key in dict_ if key not in key_set]:
+                    del dict_[key]
+            self._fingerprints = {}
+        return self.rescan(max_workers)
+
+    def rescan(self, max_workers=None):
+        """
+        Bring the session up to date with the .spdx and .colx files now on disk
+
+        Only files that are new, or whose size or modification time differ from when
+        they were loaded or saved, are parsed. Measurements whose files have disappeared
+        are dropped, unless they hold unsaved changes, which also take precedence over
+        changes made to their files on disk.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            size of the thread pool reading added and modified files; if 1, they are read
+            in this thread
+
+        Returns
+        -------
+        SessionScan
+        """
+        stats = _scan_measurement_files(str(Path(self.measurement_dir)))
+        added = sorted(path for path in stats if path not in self._fingerprints)
+        removed = sorted(path for path in self._fingerprints if path not in stats)
+        modified = []
+        unchanged = []
+        for path in sorted(path for path in stats if path in self._fingerprints):
+            stat = stats[path]
+            if self._fingerprints[path] == (stat.st_size, stat.st_mtime_ns):
+                unchanged.append(path)
+            else:
+                modified.append(path)
+        to_load = [path for path in added + modified if not self._is_dirty(path)]
+
+        def load(path):
+            try:
+                return path, _read_measurement_file(path)
+            except (ParseError, FileNotFoundError):
+                return path, None
+
+        if max_workers == 1 or len(to_load) < 2:
+            results = [load(path) for path in to_load]
+        else:
+            # overlaps file I/O only; parsing holds the GIL
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(load, to_load))
+        loaded = set()
+        failed = []
+        with self._lock:
+            for path, measurement in results:
+                if measurement is None:
+                    failed.append(path)
+                elif not self._is_dirty(path):
+                    self._dict_for(path)[path] = measurement
+                    loaded.add(path)
+                    self._fingerprints[path] = (stats[path].st_size, stats[path].st_mtime_ns)
+            for path in removed:
+                del self._fingerprints[path]
+                if not self._is_dirty(path):
+                    self._dict_for(path).pop(path, None)
+        return SessionScan(added=[path for path in added if path in loaded],
+                           modified=[path for path in modified if path in loaded],
+                           removed=removed, unchanged=unchanged, failed=failed)
+
+    def _dict_for(self, path):
+        return self._sds if path.endswith(SPECTRAL_SUFFIX) else self._tscs
+
+    def _is_dirty(self, path):
+        return path in self._dirty_sds_keys or path in self._dirty_tscs_keys
+
+    def _remember_fingerprint(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        self._fingerprints[path] = (stat.st_size, stat.st_mtime_ns)
+
+    def save(self, verbose=True):
+        """
+        Write every measurement added since it was last written
+
+        Each file is replaced atomically, so a crash mid-save leaves either the old
+        file or the new one. A measurement whose write fails stays unsaved and the
+        error is re-raised once the others have been written.
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            if True, print a line per file written
+
+        Returns
+        -------
+        int
+            the number of files written
+        """
+        with self._lock:
+            pending = [(self._sds, self._dirty_sds_keys, key) for key in self._dirty_sds_keys]
+            pending += [(self._tscs, self._dirty_tscs_keys, key) for key in self._dirty_tscs_keys]
+            for dict_, key_set, key in pending:
+                if not dict_.get(key):
+                    kind = 'spectral distribution' if dict_ is self._sds else 'tristimulus colorimetry'
+                    raise RuntimeError(f"could not find {kind} with path {key}")
+            # snapshot and clear, so additions made while writing are kept for the next save
+            pending = [(dict_, key_set, key, dict_[key]) for dict_, key_set, key in pending]
+            self._dirty_sds_keys.clear()
+            self._dirty_tscs_keys.clear()
+            self._pending_additions = 0
+            self._first_pending_time = None
+        error = None
+        written = 0
+        for dict_, key_set, key, measurement in pending:
+            if verbose:
+                kind = 'spectral distribution' if dict_ is self._sds else 'tristimulus colorimetry'
+                print(f"writing {kind} to {key}")
+            try:
+                _write_atomically(measurement, key)
+            except Exception as e:
+                with self._lock:
+                    key_set.add(key)
+                error = e
+                continue
+            written += 1
+            with self._lock:
+                self._remember_fingerprint(key)
+        if error is not None:
+            raise error
+        return written
+
+    def start_autosave(self, max_pending=DEFAULT_AUTOSAVE_MAX_PENDING, max_delay=DEFAULT_AUTOSAVE_MAX_DELAY):
+        """
+        Save in the background whenever enough measurements have been added, or the
+        oldest unsaved one has waited long enough
+
+        Repeated additions under the same path are coalesced into a single write. The
+        background saver is stopped, with a final save, by :meth:`stop_autosave`, by
+        leaving a ``with`` block, or at interpreter exit.
+
+        Parameters
+        ----------
+        max_pending : int, optional
+            save once this many measurements have been added since the last save
+        max_delay : float, optional
+            save once the oldest unsaved addition is this many seconds old
+        """
+        if max_pending is not None and max_pending < 1:
+            raise ValueError(f"autosave threshold `{max_pending}' must be at least one addition")
+        if max_delay is not None and max_delay <= 0:
+            raise ValueError(f"autosave delay `{max_delay}' must be a positive number of seconds")
+        with self._lock:
+            if self._autosave_thread is not None:
+                raise RuntimeError('autosave is already running for this session')
+            self._autosave_max_pending = max_pending
+            self._autosave_max_delay = max_delay
+            self._autosave_stopping = False
+            self._autosave_error = None
+            self._autosave_thread = threading.Thread(target=self._autosave_loop, name='session autosave', daemon=True)
+            self._autosave_thread.start()
+            _AUTOSAVING_SESSIONS.add(self)
+
+    def stop_autosave(self, flush=True):
+        """
+        Stop the background saver, if running, then (by default) save whatever is left
+        """
+        with self._lock:
+            thread = self._autosave_thread
+            self._autosave_stopping = True
+            self._changed.notify_all()
+        try:
+            if thread is not None:
+                thread.join()
+                with self._lock:
+                    self._autosave_thread = None
+        finally:
+            _AUTOSAVING_SESSIONS.discard(self)
+        if flush:
+            self.save(verbose=False)
+
+    @property
+    def autosave_error(self):
+        """The exception from the most recent failed background save, if any"""
+        return self._autosave_error
+
+    def _autosave_due(self):
+        if self._pending_additions == 0:
+            return False, None
+        if self._autosave_max_pending is not None and self._pending_additions >= self._autosave_max_pending:
+            return True, None
+        if self._autosave_max_delay is None:
+            return False, None
+        remaining = self._first_pending_time + self._autosave_max_delay - time.monotonic()
+        return remaining <= 0, remaining
+
+    def _autosave_loop(self):
+        while True:
+            with self._lock:
+                while not self._autosave_stopping:
+                    due, remaining = self._autosave_due()
+                    if due:
+                        break
+                    self._changed.wait(remaining)
+                if self._autosave_stopping:
+                    return
+            try:
+                self.save(verbose=False)
+            except Exception as e:
+                self._autosave_error = e
+                # back off until the next addition rather than retrying a failing write in a tight loop
+                with self._lock:
+                    self._pending_additions = 0
+                    self._first_pending_time = None
 
     def add_timestamped_measurement(self, measurement, dict_, key_set):
         addition_timestamp = self.timestamp()
         # There shouldn't already be a directory but just in case, remove any before
         # setting up this spectral_measurement for later saving to the spectral_measurement session_dir.
         measurement.path = str(Path(self.measurement_dir, Path(measurement.path).name))
-        dict_[measurement.path] = measurement
-        key_set.add(measurement.path)
+        with self._lock:
+            dict_[measurement.path] = measurement
+            key_set.add(measurement.path)
+            if self._pending_additions == 0:
+                self._first_pending_time = time.monotonic()
+            self._pending_additions += 1
+            self._changed.notify_all()
 
     def add_spectral_measurement(self, measurement):
         self.add_timestamped_measurement(measurement, self._sds, self._dirty_sds_keys)
@@ -106,6 +413,12 @@ class MeasurementSession(object):
     def contains_unsaved_measurements(self):
         return len(self._dirty_sds_keys) > 0 or len(self._dirty_tscs_keys) > 0
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop_autosave()
+
     @property
     def sds(self):
         return self._sds
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Nearest-spectrum search
+================================
+
+Defines the :class:`eieio.measurement.spectral_index.SpectralIndex` class, which finds
+the measured spectra closest (in Euclidean distance) to a reference spectrum, e.g. to
+find metamers or near-duplicates across an archive.
+
+Spectra are resampled to a common wavelength sampling (by
+:mod:`eieio.measurement.resampling`) and projected onto a truncated
+PCA basis computed from them. Because projection onto an orthonormal basis can only
+shrink distances, the distance between projections is a lower bound on the true
+distance; queries use it to discard almost every spectrum cheaply and then compute
+exact distances, on the full resampled spectra, only for the survivors. Results are
+therefore exact, not approximate.
+"""
+
+import numpy as np
+
+from eieio.measurement.batch_colorimetry import has_spectral_data
+from eieio.measurement.resampling import DEFAULT_METHOD, resample, resample_measurements, shape_wavelengths
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'SpectralIndex', 'DEFAULT_SHAPE', 'DEFAULT_NUMBER_OF_COMPONENTS', 'SPECTRAL_INDEX_SUFFIX', 'pca_basis'
+]
+
+SPECTRAL_INDEX_SUFFIX = '.sidx.npz'
+
+DEFAULT_SHAPE = (380.0, 780.0, 5.0)
+DEFAULT_NUMBER_OF_COMPONENTS = 12
+
+
+def _with_slack(distance):
+    # a bound and an exact distance that are mathematically equal can differ in their
+    # last bits, which must not exclude a spectrum the bound should have let through
+    return distance * (1 + 1e-9) + 1e-12
+
+
+def pca_basis(spectra, n_components):
+    """
+    Compute the mean and leading principal components of a set of spectra
+
+    Parameters
+    ----------
+    spectra : ndarray
+        N×W array
+    n_components : int
+
+    Returns
+    -------
+    tuple
+        W-element mean, and W×n_components array of orthonormal components,
+        most significant first
+    """
+    mean = spectra.mean(axis=0)
+    centred = spectra - mean
+    # the W×W scatter matrix is small whatever N is
+    eigenvalues, eigenvectors = np.linalg.eigh(centred.T @ centred)
+    order = np.argsort(eigenvalues)[::-1][:min(n_components, spectra.shape[1])]
+    return mean, eigenvectors[:, order]
+
+
+class SpectralIndex(object):
+    """
+    Exact nearest-spectrum search accelerated by a PCA projection
+
+    Attributes
+    ----------
+    shape : tuple
+        (start, end, interval) in nm of the common wavelength sampling
+    sources : ndarray
+        source (measurement file path) of each indexed spectrum
+    spectra : ndarray
+        N×W array of resampled spectra
+    mean : ndarray
+        W-element mean spectrum
+    basis : ndarray
+        W×K orthonormal PCA basis
+    projections : ndarray
+        N×K coordinates of each spectrum in the basis
+    digest : str or None
+        membership digest of whatever the index was built from, if known
+    method : str
+        interpolation method used to resample spectra, including query spectra
+    """
+
+    def __init__(self, shape, sources, spectra, mean=None, basis=None, n_components=DEFAULT_NUMBER_OF_COMPONENTS,
+                 digest=None, method=DEFAULT_METHOD):
+        self._shape = tuple(float(x) for x in shape)
+        self._method = method
+        self._sources = np.asarray(sources, dtype=object)
+        self._spectra = np.asarray(spectra, dtype=np.float64).reshape(len(self._sources), -1)
+        if basis is None:
+            if len(self._spectra):
+                mean, basis = pca_basis(self._spectra, n_components)
+            else:
+                width = len(shape_wavelengths(self._shape))
+                mean, basis = np.zeros(width), np.zeros((width, 0))
+        self._mean = np.asarray(mean, dtype=np.float64)
+        self._basis = np.asarray(basis, dtype=np.float64)
+        self._projections = (self._spectra - self._mean) @ self._basis
+        self._digest = digest
+
+    @classmethod
+    def from_measurements(cls, measurements, sources=None, shape=DEFAULT_SHAPE,
+                          n_components=DEFAULT_NUMBER_OF_COMPONENTS, digest=None, method=DEFAULT_METHOD):
+        """
+        Index the spectra of some measurements; measurements with only placeholder
+        spectra are skipped
+
+        Parameters
+        ----------
+        measurements : iterable of Measurement
+        sources : iterable of str, optional
+            name to record as the source of each measurement; defaults to its path
+        shape : tuple
+            (start, end, interval) in nm to resample to
+        n_components : int
+            number of principal components to keep
+        method : str
+            interpolation method for resampling (see :mod:`eieio.measurement.resampling`)
+        """
+        measurements = list(measurements)
+        sources = [m.path for m in measurements] if sources is None else list(sources)
+        kept = [i for i, m in enumerate(measurements) if has_spectral_data(m)]
+        _, spectra = resample_measurements([measurements[i] for i in kept], shape, method)
+        return cls(shape, [str(sources[i]) for i in kept], spectra, n_components=n_components, digest=digest,
+                   method=method)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            digest = str(npz['digest']) or None
+            return cls(tuple(float(x) for x in npz['shape']), npz['sources'].astype(object), npz['spectra'],
+                       npz['mean'], npz['basis'], digest=digest, method=str(npz['method']))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, shape=np.array(self._shape, dtype=np.float64), sources=self._sources.astype(str),
+                     spectra=self._spectra, mean=self._mean, basis=self._basis,
+                     digest=np.array(self._digest or ''), method=np.array(self._method))
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def method(self):
+        return self._method
+
+    @property
+    def sources(self):
+        return self._sources
+
+    @property
+    def spectra(self):
+        return self._spectra
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def basis(self):
+        return self._basis
+
+    @property
+    def projections(self):
+        return self._projections
+
+    @property
+    def digest(self):
+        return self._digest
+
+    def __len__(self):
+        return len(self._sources)
+
+    def _query(self, reference, wavelengths):
+        if wavelengths is None:
+            spectrum = np.asarray(reference, dtype=np.float64)
+            if spectrum.shape != self._mean.shape:
+                raise ValueError(f"reference spectrum has {spectrum.shape[0]} samples but the index's "
+                                 f"{self._shape} sampling has {self._mean.shape[0]}; pass its wavelengths too")
+        else:
+            spectrum = resample(wavelengths, reference, self._shape, self._method)
+        return spectrum, (spectrum - self._mean) @ self._basis
+
+    def _exact_distances(self, spectrum, indices):
+        return np.linalg.norm(self._spectra[indices] - spectrum, axis=1)
+
+    def nearest(self, reference, k=1, wavelengths=None):
+        """
+        Find the k indexed spectra nearest a reference spectrum
+
+        Parameters
+        ----------
+        reference : array_like
+            reference spectrum, sampled as the index is unless wavelengths are given
+        k : int
+        wavelengths : array_like, optional
+            wavelengths at which the reference is sampled, if not the index's sampling
+
+        Returns
+        -------
+        list
+            up to k (source, distance) pairs, nearest first
+        """
+        spectrum, projection = self._query(reference, wavelengths)
+        k = min(k, len(self))
+        if k < 1:
+            return []
+        bounds = np.linalg.norm(self._projections - projection, axis=1)
+        # the k spectra with the smallest bounds give an upper limit on the k-th nearest
+        # distance; only spectra whose bound is within that limit can be among the k nearest
+        seeds = np.argpartition(bounds, k - 1)[:k]
+        limit = self._exact_distances(spectrum, seeds).max()
+        candidates = np.flatnonzero(bounds <= _with_slack(limit))
+        distances = self._exact_distances(spectrum, candidates)
+        order = np.lexsort((candidates, distances))[:k]
+        return list(zip(self._sources[candidates[order]], distances[order].tolist()))
+
+    def within(self, reference, threshold, wavelengths=None):
+        """
+        Find the indexed spectra within a distance of a reference spectrum
+
+        Returns
+        -------
+        list
+            (source, distance) pairs, nearest first
+        """
+        spectrum, projection = self._query(reference, wavelengths)
+        if not len(self):
+            return []
+        bounds = np.linalg.norm(self._projections - projection, axis=1)
+        candidates = np.flatnonzero(bounds <= _with_slack(threshold))
+        distances = self._exact_distances(spectrum, candidates)
+        inside = distances <= threshold
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return list(zip(self._sources[candidates[order]], distances[order].tolist()))
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Stimulus memo - reuse recent measurements of stimuli a sequence repeats
+================================
+
+Sample sequences often show the same stimulus more than once: white and black
+anchors between blocks, a reference patch repeated through a cube, or the same
+primaries listed by several sample sources. While the display and meter are stable,
+measuring such a stimulus again only costs time. :class:`StimulusMemo` remembers the
+most recent measurement of each stimulus, keyed by its colour space and target values,
+so a repeat seen within a staleness window can reuse it instead.
+
+A reused measurement is a copy of the original whose
+:attr:`~eieio.measurement.measurement.Measurement.reused_from` names the file it came
+from, so a group records which of its members were actually measured.
+
+Reuse assumes nothing drifts. In drift-guard mode, anchor stimuli (by default, every
+repeated one) are measured again on every ``drift_guard_every``-th occurrence however
+recent their last measurement, and the change in luminance since is checked; if it
+exceeds ``drift_tolerance``, everything memoized is discarded, since it was measured
+under conditions that no longer hold.
+"""
+
+from collections import namedtuple
+from copy import deepcopy
+from time import monotonic
+
+import numpy as np
+
+from eieio.measurement.batch_colorimetry import resolved_values
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+    'StimulusMemo', 'MemoEntry', 'DriftCheck', 'stimulus_key',
+    'DEFAULT_STALENESS_SECONDS', 'DEFAULT_DRIFT_TOLERANCE'
+]
+
+DEFAULT_STALENESS_SECONDS = 600.0
+DEFAULT_DRIFT_TOLERANCE = 0.02
+# target values equal to this many decimal places are the same stimulus
+KEY_DECIMALS = 6
+DRIFT_XYZ_TARGET = ('CIE 1931 2 Degree Standard Observer', 'CIE XYZ', 'D65')
+
+MemoEntry = namedtuple('MemoEntry', ['filename', 'measurement', 'measured_at', 'reuses'])
+MemoEntry.__doc__ = """
+The most recent measurement of a stimulus, the file it was written to, the clock time
+at which it was made, and how many times it has been reused since
+"""
+
+DriftCheck = namedtuple('DriftCheck', ['previous_filename', 'filename', 'drift', 'exceeded'])
+DriftCheck.__doc__ = """
+The comparison of a new measurement of a stimulus with the previous one: the relative
+change in luminance, and whether it exceeded the memo's drift tolerance
+"""
+
+
+def stimulus_key(sample):
+    """
+    Return the memo key of a sample: its colour space and rounded target values
+    """
+    values = np.atleast_1d(np.asarray(sample['value'], dtype=np.float64))
+    return sample.get('space'), tuple(np.round(values, KEY_DECIMALS).tolist())
+
+
+class StimulusMemo(object):
+    """
+    Remembers the latest measurement of each stimulus so that repeats can reuse it
+
+    Parameters
+    ----------
+    staleness : float or None, optional
+        seconds after which a measurement is too old to reuse; None to reuse for the whole run
+    drift_guard_every : int or None, optional
+        measure an anchor stimulus again on every this-many-th occurrence; None (the default)
+        disables the drift guard
+    anchors : iterable of unicode, optional
+        names of the anchor stimuli; by default, any repeated stimulus is one
+    drift_tolerance : float or None, optional
+        relative luminance change between measurements of a stimulus beyond which the memo
+        is discarded; None never discards it
+    clock : callable, optional
+        returns the current time in seconds
+
+    Attributes
+    ----------
+    reused : int
+        number of measurements reused so far
+    drift_checks : list of DriftCheck
+        every comparison of a stimulus measured again with its previous measurement
+    """
+    def __init__(self, staleness=DEFAULT_STALENESS_SECONDS, drift_guard_every=None, anchors=None,
+                 drift_tolerance=DEFAULT_DRIFT_TOLERANCE, clock=monotonic):
+        if drift_guard_every is not None and drift_guard_every < 1:
+            raise ValueError(f"drift guard period `{drift_guard_every}' must be at least 1")
+        self.staleness = staleness
+        self.drift_guard_every = drift_guard_every
+        self.anchors = None if anchors is None else frozenset(anchors)
+        self.drift_tolerance = drift_tolerance
+        self._clock = clock
+        self._entries = {}
+        self.reused = 0
+        self.drift_checks = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _is_anchor(self, sample):
+        return self.anchors is None or sample.get('name') in self.anchors
+
+    def lookup(self, sample):
+        """
+        Return the memo entry a sample could reuse, or None if the sample must be measured
+
+        A sample must be measured if its stimulus has not been, if its last measurement is
+        stale, or if it is an anchor the drift guard is due to measure again.
+        """
+        key = stimulus_key(sample)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.staleness is not None and self._clock() - entry.measured_at > self.staleness:
+            del self._entries[key]
+            return None
+        if self.drift_guard_every is not None and self._is_anchor(sample) \
+                and entry.reuses + 1 >= self.drift_guard_every:
+            return None
+        return entry
+
+    def reuse(self, sample):
+        """
+        Return a copy of the measurement memoized for a sample, marked as reused, or None
+
+        Returns
+        -------
+        Measurement or None
+            a copy whose ``reused_from`` is the file name of the measurement copied, or None
+            if the sample must be measured
+        """
+        entry = self.lookup(sample)
+        if entry is None:
+            return None
+        self._entries[stimulus_key(sample)] = entry._replace(reuses=entry.reuses + 1)
+        self.reused += 1
+        reused = deepcopy(entry.measurement)
+        reused.reused_from = entry.filename
+        return reused
+
+    @staticmethod
+    def _luminance_drift(previous, current):
+        try:
+            Y = resolved_values([previous, current], DRIFT_XYZ_TARGET)[1][:, 1]
+        except ValueError:
+            return None
+        if Y[0] <= 0:
+            return None
+        return float(abs(Y[1] - Y[0]) / Y[0])
+
+    def record(self, sample, filename, measurement):
+        """
+        Remember a new measurement of a sample
+
+        If the stimulus was measured before, the luminance drift since is checked and, if it
+        exceeds the drift tolerance, everything previously memoized is discarded.
+
+        Returns
+        -------
+        DriftCheck or None
+            the comparison with the previous measurement, or None if there was none to
+            compare with
+        """
+        key = stimulus_key(sample)
+        previous = self._entries.get(key)
+        check = None
+        if previous is not None:
+            drift = self._luminance_drift(previous.measurement, measurement)
+            if drift is not None:
+                exceeded = self.drift_tolerance is not None and drift > self.drift_tolerance
+                check = DriftCheck(previous.filename, filename, drift, exceeded)
+                self.drift_checks.append(check)
+                if exceeded:
+                    self._entries.clear()
+        self._entries[key] = MemoEntry(filename, measurement, self._clock(), 0)
+        return check
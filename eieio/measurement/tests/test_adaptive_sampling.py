@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for adaptive sampling
+================================
+
+Test :mod:`eieio.measurement.adaptive_sampling` against synthetic displays.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+
+import numpy as np
+
+from eieio.measurement.adaptive_sampling import AdaptiveRefinement, DisplayModel
+
+PRIMARIES = np.array([[41.2, 35.8, 18.0],
+                      [21.3, 71.5, 7.2],
+                      [1.9, 11.9, 95.0]])
+BLACK = np.array([0.05, 0.05, 0.06])
+
+
+def additive_display(rgb):
+    return BLACK + np.asarray(rgb, dtype=np.float64) ** 2.2 @ PRIMARIES.T
+
+
+def crosstalk_display(rgb):
+    # extra light from a saturated red, as from an LED driver interaction
+    rgb = np.asarray(rgb, dtype=np.float64)
+    bump = 12.0 * np.exp(-np.sum((rgb - [0.9, 0.2, 0.2]) ** 2, axis=-1) / 0.1)
+    return additive_display(rgb) + bump[..., np.newaxis] * np.array([1.0, 0.4, 0.1])
+
+
+class Meter(object):
+    def __init__(self, display):
+        self.display = display
+        self.patches = []
+
+    def __call__(self, rgb):
+        self.patches.append(tuple(rgb))
+        return self.display(rgb)
+
+
+class TestAdaptiveSampling(unittest.TestCase):
+    def setUp(self):
+        self.test_rgb = np.random.default_rng(3).random((500, 3))
+
+    def test_display_model(self):
+        levels = np.linspace(0, 1, 5)
+        rgb = np.array([[0, 0, 0]] + [np.eye(3)[c] * level for c in range(3) for level in levels[1:]])
+        model = DisplayModel.fit(rgb, additive_display(rgb))
+        np.testing.assert_allclose([2.2, 2.2, 2.2], model.exponents)
+        np.testing.assert_allclose(additive_display(self.test_rgb), model.predict(self.test_rgb), atol=1e-9)
+        with self.assertRaises(ValueError):
+            DisplayModel.fit(rgb[:5], additive_display(rgb[:5]))
+
+    def test_additive_display_needs_only_the_coarse_lattice(self):
+        meter = Meter(additive_display)
+        characterization = AdaptiveRefinement(meter, coarse_size=3, threshold=0.5).run()
+        self.assertTrue(characterization.converged)
+        self.assertEqual(27, characterization.number_of_patches)
+        self.assertEqual(27, len(set(meter.patches)))
+        self.assertLess(characterization.delta_E(self.test_rgb, additive_display(self.test_rgb)).max(), 1e-6)
+
+    def test_refinement_concentrates_where_the_model_fails(self):
+        meter = Meter(crosstalk_display)
+        coarse = AdaptiveRefinement(Meter(crosstalk_display), threshold=0.5, budget=27).run()
+        characterization = AdaptiveRefinement(meter, threshold=0.5, budget=400).run()
+        self.assertLessEqual(characterization.number_of_patches, 400)
+        self.assertEqual(len(meter.patches), len(set(meter.patches)))
+        # far fewer patches than the equally fine 17³ lattice
+        self.assertLess(characterization.number_of_patches, 17 ** 3 // 10)
+        truth = crosstalk_display(self.test_rgb)
+        refined_error = np.percentile(characterization.delta_E(self.test_rgb, truth), 95)
+        coarse_error = np.percentile(coarse.delta_E(self.test_rgb, truth), 95)
+        self.assertLess(refined_error, coarse_error / 2)
+        # patches cluster around the crosstalk, not in the well-behaved blue corner
+        patches = np.array(meter.patches[27:])
+        near_red = np.linalg.norm(patches - [0.9, 0.2, 0.2], axis=1) < 0.5
+        near_blue = np.linalg.norm(patches - [0.0, 0.0, 1.0], axis=1) < 0.5
+        self.assertGreater(near_red.sum(), 4 * near_blue.sum())
+        with self.assertRaises(ValueError):
+            AdaptiveRefinement(meter, coarse_size=3, budget=20)
+
+
+if __name__ == '__main__':
+    unittest.main()
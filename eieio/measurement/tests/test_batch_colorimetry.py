@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for batch colorimetry
+================================
+
+Test the functions in :mod:`eieio.measurement.batch_colorimetry`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from colour.colorimetry import SpectralDistribution, SpectralShape, sd_to_XYZ
+from colour.colorimetry.datasets.cmfs import MSDS_CMFS_STANDARD_OBSERVER
+from colour.colorimetry.datasets.illuminants.sds import SDS_ILLUMINANTS
+from colour.models import XYZ_to_Lab, XYZ_to_xy
+
+from eieio.measurement.batch_colorimetry import (derive_colorimetry, spectra_to_colorimetry, spectra_to_XYZ,
+                                                 white_point_XYZ)
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.tests.test_measurement_group import make_meas_seq, make_group_file
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+OBS_10 = 'CIE 1964 10 Degree Standard Observer'
+
+
+def random_spectra(n, wavelengths, seed=0):
+    return np.random.default_rng(seed).random((n, len(wavelengths))) * 0.01
+
+
+def colour_XYZ(wavelengths, values, observer):
+    sd = SpectralDistribution(dict(zip(wavelengths, values)))
+    return sd_to_XYZ(sd, MSDS_CMFS_STANDARD_OBSERVER[observer], SDS_ILLUMINANTS['E'], k=683,
+                     shape=sd.shape, method='Integration')
+
+
+class TestBatchColorimetry(unittest.TestCase):
+    def test_XYZ_matches_colour(self):
+        for inc in (1, 5, 10):
+            wavelengths = np.arange(380, 781, inc, dtype=np.float64)
+            values = random_spectra(4, wavelengths)
+            for observer in (OBS_2, OBS_10):
+                XYZ = spectra_to_XYZ(wavelengths, values, observer)
+                for row, expected in zip(XYZ, (colour_XYZ(wavelengths, v, observer) for v in values)):
+                    np.testing.assert_allclose(row, expected, rtol=1e-9)
+
+    def test_white_point(self):
+        expected = sd_to_XYZ(SDS_ILLUMINANTS['D65'], MSDS_CMFS_STANDARD_OBSERVER[OBS_2],
+                             SDS_ILLUMINANTS['E'], shape=SpectralShape(360, 830, 1), method='Integration')
+        np.testing.assert_allclose(white_point_XYZ(OBS_2, 'D65'), expected / expected[1], rtol=1e-9)
+
+    def test_Lab_relative_to_white_luminance(self):
+        wavelengths = np.arange(380, 781, 5, dtype=np.float64)
+        values = random_spectra(3, wavelengths)
+        targets = [('cie 1931 2 degree standard observer', 'cie_lab', 'd65'), (OBS_2, 'CIE XYZ', 'D65')]
+        results = spectra_to_colorimetry(wavelengths, values, targets, white_luminance=50)
+        self.assertEqual([(OBS_2, 'CIE Lab', 'D65'), (OBS_2, 'CIE XYZ', 'D65')], list(results.keys()))
+        XYZ = results[(OBS_2, 'CIE XYZ', 'D65')]
+        expected = XYZ_to_Lab(XYZ / 50, XYZ_to_xy(white_point_XYZ(OBS_2, 'D65')))
+        np.testing.assert_allclose(results[(OBS_2, 'CIE Lab', 'D65')], expected)
+
+    def test_unsupported_color_space_raises(self):
+        wavelengths = np.arange(380, 781, 10, dtype=np.float64)
+        with self.assertRaises(ValueError):
+            spectra_to_colorimetry(wavelengths, random_spectra(1, wavelengths), [(OBS_2, 'CAM16UCS', 'D65')])
+
+    def test_irregular_wavelengths(self):
+        wavelengths = np.array([400, 450, 500, 510, 520, 600, 700], dtype=np.float64)
+        XYZ = spectra_to_XYZ(wavelengths, np.ones((1, len(wavelengths))), OBS_2)
+        self.assertEqual((1, 3), XYZ.shape)
+        self.assertTrue(np.all(XYZ > 0))
+
+    def test_derive_colorimetry_for_group(self):
+        with TemporaryDirectory() as tmp_dir:
+            make_meas_seq(tmp_dir, 0, 3)
+            group = Group(make_group_file(tmp_dir, 'g.mg', 'g', *[[tmp_dir, 0, 3]]))
+            targets = [(OBS_2, 'CIE XYZ', 'D65'), (OBS_10, 'CIE xyY', 'D65')]
+            self.assertEqual(8, derive_colorimetry(group, targets))
+            for m in group.collections[tmp_dir].values():
+                c = m.colorimetry[(OBS_2, 'CIE XYZ', 'D65')]
+                self.assertEqual('derived', c.origin)
+                np.testing.assert_allclose(c.values, colour_XYZ(m.wavelengths, m.values, OBS_2), rtol=1e-9)
+                self.assertIn((OBS_10, 'CIE xyY', 'D65'), m.colorimetry)
+            with self.assertRaises(ValueError):
+                derive_colorimetry(group, targets, replace_ok=False)
+
+    def test_derivation_stays_in_its_group(self):
+        with TemporaryDirectory() as tmp_dir:
+            make_meas_seq(tmp_dir, 0, 3)
+            group_file = make_group_file(tmp_dir, 'g.mg', 'g', *[[tmp_dir, 0, 3]])
+            group, overlapping = Group(group_file), Group(group_file)
+            copied = Group(group_file)
+            copied.insert_measuremments_from_group(group, replace_ok=True)
+            target = (OBS_2, 'CIE XYZ', 'D65')
+            self.assertEqual(4, derive_colorimetry(group, [target]))
+            for other in (overlapping, copied, Group(group_file)):
+                for m in other.collections[tmp_dir].values():
+                    self.assertNotIn(target, m.colorimetry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for canonical names
+================================
+
+Test the registries in :mod:`eieio.measurement.canonical_names`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+
+from eieio.measurement.canonical_names import COLOR_SPACES, ILLUMINANTS, OBSERVERS, canonical_observer
+from eieio.measurement.colorimetry import Colorimetry
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+OBS_10 = 'CIE 1964 10 Degree Standard Observer'
+
+
+class TestCanonicalNames(unittest.TestCase):
+    def test_observer_aliases(self):
+        for alias in (OBS_2, 'cie 1931 2 degree standard observer', 'cie_2_1931', 'CIE 2º', 'cie 2°',
+                      'CIE_1931_2_DEGREE_STANDARD_OBSERVER'):
+            self.assertEqual(OBS_2, canonical_observer(alias), alias)
+        self.assertEqual(OBS_10, canonical_observer('cie 10º'))
+        self.assertEqual('CIE 2015 2 Degree Standard Observer',
+                         canonical_observer('CIE_2012_2_DEGREE_STANDARD_OBSERVER'))
+        self.assertNotIn('cie_2_1931', OBSERVERS.names)
+        with self.assertRaises(ValueError):
+            canonical_observer('CIE 3º')
+
+    def test_color_spaces_and_illuminants(self):
+        self.assertEqual('CIE Lab', COLOR_SPACES.canonical('CIE_LAB'))
+        self.assertEqual('CIE xyY', COLOR_SPACES.canonical('cie xyy'))
+        self.assertEqual('hdr-IPT', COLOR_SPACES.canonical('HDR_IPT'))
+        self.assertEqual('FL2', ILLUMINANTS.canonical('F2'))
+        self.assertEqual('D65', ILLUMINANTS.canonical('d65'))
+        self.assertIsNone(ILLUMINANTS.get('ACES'))
+
+    def test_protobuf_names(self):
+        self.assertEqual('CIE_1931_2_DEGREE_STANDARD_OBSERVER', OBSERVERS.protobuf_name('cie 2º'))
+        self.assertEqual('CIE_2012_10_DEGREE_STANDARD_OBSERVER',
+                         OBSERVERS.protobuf_name('CIE 2015 10 Degree Standard Observer'))
+        self.assertEqual('CIE_LAB', COLOR_SPACES.protobuf_name('CIE Lab'))
+        self.assertEqual('CIE_xyY', COLOR_SPACES.protobuf_name('cie_xyy'))
+        self.assertEqual('CIE_XYZ', COLOR_SPACES.protobuf_name('CIE XYZ'))
+        self.assertEqual('D65', ILLUMINANTS.protobuf_name('D65'))
+        self.assertEqual('F11', ILLUMINANTS.protobuf_name('fl11'))
+
+    def test_colorimetry_uses_canonical_names(self):
+        c = Colorimetry('cie_2_1931', 'CIE_LAB', 'd65', [50.0, 1.0, 2.0], 'measured')
+        self.assertEqual((OBS_2, 'CIE Lab', 'D65'), (c.observer, c.color_space, c.illuminant))
+        self.assertEqual('CIE Lab ( 2º / D65 ): 50.0 1.0 2.0', str(c))
+        xyz = Colorimetry('CIE_1931_2_DEGREE_STANDARD_OBSERVER', 'CIE_XYZ', 'D65', [1.0, 2.0, 3.0], 'derived')
+        self.assertEqual('CIE XYZ ( 2º ) [derived]: 1.0 2.0 3.0', str(xyz))
+
+
+if __name__ == '__main__':
+    unittest.main()
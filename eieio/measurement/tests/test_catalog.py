@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the measurement catalog
+================================
+
+Test the :class:`eieio.measurement.catalog.Catalog` class.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import os
+import unittest
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from colour.io.tm2714 import Header_IESTM2714
+
+from eieio.measurement.catalog import Catalog
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.group_manifest import write_group_manifest
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.spdx_io import write_measurement
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+XYY_KEY = (OBS_2, 'CIE xyY', 'D65')
+
+
+def write_catalogued_measurement(path, manufacturer, equipment, xyY=None, year=None):
+    header = Header_IESTM2714(manufacturer=manufacturer, catalog_number='panel', laboratory='stage 3',
+                              measurement_equipment=equipment, report_date='Mon 10:11:12.000000')
+    m = Measurement(header=header)
+    m.wavelengths = np.arange(380, 781, 10.0)
+    m.values = np.linspace(0.01, 0.02, len(m.wavelengths))
+    if xyY is not None:
+        m.insert_colorimetry(Colorimetry(*XYY_KEY, list(xyY), 'measured'))
+    write_measurement(m, path)
+    if year is not None:
+        timestamp = datetime(year, 6, 1).timestamp()
+        os.utime(path, (timestamp, timestamp))
+
+
+class TestCatalog(unittest.TestCase):
+    def test_crawl_and_query(self):
+        with TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir).resolve()
+            wall, monitor = Path(root, 'wall'), Path(root, 'monitor')
+            wall.mkdir()
+            monitor.mkdir()
+            write_catalogued_measurement(Path(wall, 'sample.0.spdx'), 'ROE', 'cs2000', (0.31, 0.33, 100.0), 2026)
+            write_catalogued_measurement(Path(wall, 'sample.1.spdx'), 'ROE', 'cs2000', year=2025)
+            write_catalogued_measurement(Path(wall, 'sample.2.spdx'), 'ROE', 'i1pro2', year=2026)
+            write_catalogued_measurement(Path(monitor, 'sample.0.spdx'), 'Sony', 'cs2000', year=2026)
+            write_group_manifest(Path(root, 'mixed.mgm'), 'mixed',
+                                 {str(wall): ['sample.0.spdx'], str(monitor): ['sample.0.spdx']})
+            with Catalog(Path(root, 'catalog.sqlite')) as catalog:
+                summary = catalog.crawl(root)
+                self.assertEqual(5, len(summary.added))
+                self.assertEqual([], summary.failed)
+                self.assertEqual([str(Path(wall, 'sample.0.spdx'))],
+                                 catalog.find(equipment='cs2000', manufacturer='ROE', year=2026))
+                self.assertEqual(3, catalog.count(manufacturer='R%'))
+                self.assertEqual(3, catalog.count(dir_=wall))
+                self.assertEqual([str(Path(wall, 'sample.0.spdx')), str(Path(monitor, 'sample.0.spdx'))],
+                                 sorted(catalog.find(group='mixed'), reverse=True))
+                self.assertEqual([str(Path(wall, 'sample.0.spdx'))],
+                                 catalog.find(colorimetry=('cie 2º', 'cie xyy', 'd65')))
+                self.assertEqual({XYY_KEY: ([0.31, 0.33, 100.0], 'measured')},
+                                 catalog.colorimetry(Path(wall, 'sample.0.spdx')))
+                self.assertEqual([(str(Path(root, 'mixed.mgm')), 'mixed')],
+                                 catalog.groups(Path(monitor, 'sample.0.spdx')))
+                loaded = catalog.measurements(manufacturer='Sony')
+                self.assertEqual([str(Path(monitor, 'sample.0.spdx'))], list(loaded))
+                self.assertEqual('Sony', loaded[str(Path(monitor, 'sample.0.spdx'))].header.manufacturer)
+                with self.assertRaises(ValueError):
+                    catalog.find(colour='red')
+
+    def test_incremental_crawl(self):
+        with TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir).resolve()
+            for i in range(3):
+                write_catalogued_measurement(Path(root, f"sample.{i}.spdx"), 'ROE', 'cs2000', year=2026)
+            Path(root, 'torn.spdx').write_text('<?xml version="1.0" ?><IESTM2714')
+            catalog_path = Path(root, 'catalog.sqlite')
+            with Catalog(catalog_path) as catalog:
+                summary = catalog.crawl(root)
+                self.assertEqual(3, len(summary.added))
+                self.assertEqual([str(Path(root, 'torn.spdx'))], summary.failed)
+            write_catalogued_measurement(Path(root, 'sample.1.spdx'), 'Sony', 'cs2000', year=2025)
+            Path(root, 'sample.2.spdx').unlink()
+            with Catalog(catalog_path) as catalog:
+                summary = catalog.crawl(root)
+                self.assertEqual([], summary.added)
+                self.assertEqual([str(Path(root, 'sample.1.spdx'))], summary.updated)
+                self.assertEqual([str(Path(root, 'sample.2.spdx'))], summary.removed)
+                self.assertEqual([str(Path(root, 'sample.0.spdx'))], summary.unchanged)
+                self.assertEqual([str(Path(root, 'sample.1.spdx'))], catalog.find(manufacturer='Sony', year=2025))
+                self.assertEqual(2, catalog.count())
+
+
+if __name__ == '__main__':
+    unittest.main()
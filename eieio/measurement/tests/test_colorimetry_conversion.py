@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for colorimetric conversions
+================================
+
+Test the functions in :mod:`eieio.measurement.colorimetry_conversion`, and their use by
+:mod:`eieio.measurement.batch_colorimetry` and :class:`eieio.measurement.measurement.Measurement`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+
+import numpy as np
+
+from colour.models import XYZ_to_Lab, XYZ_to_xy
+
+from eieio.measurement.batch_colorimetry import resolve_colorimetry, spectra_to_XYZ
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.colorimetry_conversion import conversion_path, conversion_source, convert, white_point_XYZ
+from eieio.measurement.measurement import Measurement
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+OBS_10 = 'CIE 1964 10 Degree Standard Observer'
+XYZ_D65 = (OBS_2, 'CIE XYZ', 'D65')
+XYY_D65 = (OBS_2, 'CIE xyY', 'D65')
+LAB_D65 = (OBS_2, 'CIE Lab', 'D65')
+LAB_D50 = (OBS_2, 'CIE Lab', 'D50')
+
+
+def colorimetry_only_measurement(*colorimetry):
+    m = Measurement()
+    m.values = (1.0, 1.0)
+    m.wavelengths = (380, 780)
+    for c in colorimetry:
+        m.insert_colorimetry(c)
+    return m
+
+
+class TestColorimetryConversion(unittest.TestCase):
+    def test_conversion_path(self):
+        self.assertEqual((2, ('CIE xyY', 'CIE XYZ', 'CIE Lab')), conversion_path('CIE xyY', 'CIE Lab'))
+        self.assertEqual((0, ('CIE Lab',)), conversion_path('CIE Lab', 'CIE Lab'))
+        with self.assertRaises(ValueError):
+            conversion_path('CIE xyY', 'CAM16UCS')
+
+    def test_round_trips(self):
+        XYZ = np.array([[20.0, 21.0, 22.0], [80.0, 90.0, 30.0], [1.0, 2.0, 3.0]])
+        for space in ('CIE xyY', 'CIE UCS', 'CIE Lab', 'CIE Luv', 'Hunter Lab', 'IPT'):
+            target = (OBS_2, space, 'D50')
+            there = convert(XYZ, XYZ_D65, target)
+            np.testing.assert_allclose(XYZ, convert(there, target, XYZ_D65), rtol=1e-7, err_msg=space)
+
+    def test_xyY_to_Lab_uses_white_and_luminance(self):
+        XYZ = np.array([30.0, 40.0, 50.0])
+        xyY = convert(XYZ, XYZ_D65, XYY_D65)
+        expected = XYZ_to_Lab(XYZ / 200, XYZ_to_xy(white_point_XYZ(OBS_2, 'D65')))
+        np.testing.assert_allclose(expected, convert(xyY, XYY_D65, LAB_D65, white_luminance=200))
+
+    def test_change_of_white(self):
+        Lab = convert([30.0, 40.0, 50.0], XYZ_D65, LAB_D65)
+        Lab_D50 = convert(Lab, LAB_D65, LAB_D50)
+        np.testing.assert_allclose(convert([30.0, 40.0, 50.0], XYZ_D65, LAB_D50), Lab_D50)
+        np.testing.assert_allclose(Lab, convert(Lab, LAB_D65, (OBS_2, 'CIE Lab', 'D65')))
+
+    def test_cross_observer_conversion_refused(self):
+        with self.assertRaises(ValueError):
+            convert([30.0, 40.0, 50.0], XYZ_D65, (OBS_10, 'CIE XYZ', 'D65'))
+
+    def test_conversion_source_prefers_cheap_then_measured(self):
+        m = colorimetry_only_measurement(Colorimetry(OBS_2, 'CIE XYZ', 'D65', [1.0, 2.0, 3.0], 'derived'),
+                                         Colorimetry(OBS_2, 'CIE xyY', 'D65', [0.2, 0.3, 2.0], 'measured'),
+                                         Colorimetry(OBS_10, 'CIE XYZ', 'D65', [1.0, 2.0, 3.0], 'measured'))
+        self.assertEqual((1, XYZ_D65), conversion_source(m.colorimetry, LAB_D65))
+        self.assertEqual((0, XYY_D65), conversion_source(m.colorimetry, (OBS_2, 'CIE xyY', 'D50')))
+        self.assertIsNone(conversion_source(m.colorimetry, ('CIE 2015 10 Degree Standard Observer', 'CIE XYZ', 'D65')))
+
+    def test_resolve_colorimetry(self):
+        with_xyY = [colorimetry_only_measurement(Colorimetry(OBS_2, 'CIE xyY', 'D65', [0.3, 0.3, y], 'measured'))
+                    for y in (10.0, 20.0)]
+        spectral = Measurement()
+        spectral.wavelengths = np.arange(380, 781, 10)
+        spectral.values = np.linspace(0.001, 0.002, len(spectral.wavelengths))
+        self.assertEqual(6, resolve_colorimetry(with_xyY + [spectral], [LAB_D65, XYZ_D65]))
+        for m in with_xyY:
+            c = m.colorimetry[LAB_D65]
+            self.assertEqual('derived', c.origin)
+            np.testing.assert_allclose(c.values, convert(m.colorimetry[XYY_D65].values, XYY_D65, LAB_D65))
+        np.testing.assert_allclose(spectral.colorimetry[XYZ_D65].values,
+                                   spectra_to_XYZ(spectral.wavelengths, spectral.values[np.newaxis], OBS_2)[0])
+        with self.assertRaises(ValueError):
+            resolve_colorimetry(with_xyY, [(OBS_10, 'CIE XYZ', 'D65')])
+
+    def test_retrieve_colorimetry(self):
+        xyY = Colorimetry(OBS_2, 'CIE xyY', 'D65', [0.3, 0.3, 10.0], 'measured')
+        m = colorimetry_only_measurement(xyY)
+        self.assertIs(xyY, m.retrieve_colorimetry('CIE xyY', OBS_2, 'D50'))
+        Lab = m.retrieve_colorimetry('cie lab', OBS_2, 'D65')
+        self.assertEqual('derived', Lab.origin)
+        self.assertEqual('CIE Lab', Lab.color_space)
+        self.assertNotIn(LAB_D65, m.colorimetry)
+        with self.assertRaises(ValueError):
+            m.retrieve_colorimetry('CIE XYZ', OBS_10, 'D65')
+        # stored colorimetry in a space the conversion graph doesn't cover is still returned
+        UVW = Colorimetry(OBS_2, 'CIE UVW', 'D65', [1.0, 2.0, 3.0], 'measured')
+        m.insert_colorimetry(UVW)
+        self.assertIs(UVW, m.retrieve_colorimetry('CIE UVW', OBS_2, 'D65'))
+        with self.assertRaises(ValueError):
+            m.retrieve_colorimetry('CIE UVW', OBS_2, 'D50')
+
+    def test_retrieve_colorimetry_without_illuminant(self):
+        xyY = Colorimetry(OBS_2, 'CIE xyY', 'D50', [0.3, 0.3, 10.0], 'measured')
+        m = colorimetry_only_measurement(xyY)
+        # the illuminant doesn't matter in illuminant-insensitive models, so it can be left out
+        self.assertIs(xyY, m.retrieve_colorimetry('CIE xyY', OBS_2, None))
+        XYZ = m.retrieve_colorimetry('CIE XYZ', OBS_2, None)
+        self.assertEqual('derived', XYZ.origin)
+        self.assertEqual('D65', XYZ.illuminant)
+        self.assertAlmostEqual(10.0, XYZ.values[1])
+        with self.assertRaises(ValueError):
+            m.retrieve_colorimetry('CIE Lab', OBS_2, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the colorimetry index
+================================
+
+Test the :class:`eieio.measurement.colorimetry_index.ColorimetryIndex` class and its use
+through :meth:`eieio.measurement.measurement_group.Group.colorimetry_index`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.colorimetry_index import ColorimetryIndex, index_key, sidecar_path
+from eieio.measurement.group_manifest import write_group_manifest
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.spdx_io import write_measurement
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+D65_XY = (0.3127, 0.3290)
+
+
+def write_xyY_measurements(dir_, xyYs):
+    filenames = []
+    for i, xyY in enumerate(xyYs):
+        m = Measurement()
+        m.wavelengths = np.arange(380, 781, 10)
+        m.values = np.full(len(m.wavelengths), 0.01)
+        m.insert_colorimetry(Colorimetry(OBS_2, 'CIE xyY', 'D65', list(xyY), 'measured'))
+        filename = f"sample.{i:04}.spdx"
+        write_measurement(m, Path(dir_, filename))
+        filenames.append(filename)
+    return filenames
+
+
+class TestColorimetryIndex(unittest.TestCase):
+    def test_queries_match_brute_force(self):
+        rng = np.random.default_rng(7)
+        points = rng.random((100_000, 2)) * 0.1 + 0.27
+        sources = np.array([f"m{i}" for i in range(len(points))], dtype=object)
+        index = ColorimetryIndex(index_key(OBS_2, 'CIE xyY', 'D65', (0, 1)), sources, points)
+        distances = np.linalg.norm(points - D65_XY, axis=1)
+        within = index.within_radius(D65_XY, 0.002)
+        self.assertEqual(set(sources[distances <= 0.002]), {source for source, _ in within})
+        self.assertEqual(sorted(d for _, d in within), [d for _, d in within])
+        nearest = index.nearest(D65_XY, k=5)
+        self.assertEqual(list(sources[np.argsort(distances)[:5]]), [source for source, _ in nearest])
+        lower, upper = np.array([0.30, 0.32]), np.array([0.31, 0.325])
+        in_box = np.all((points >= lower) & (points <= upper), axis=1)
+        self.assertEqual(list(sources[in_box]), index.within_range(lower, upper))
+        self.assertEqual(list(sources[in_box]), index.within_range([0.30, 0.32, 0.0], [0.31, 0.325, 0.0]))
+
+    def test_group_index_is_persisted_and_refreshed(self):
+        with TemporaryDirectory() as tmp_dir:
+            xyYs = [(0.3127, 0.3290, 100.0), (0.3130, 0.3292, 50.0), (0.64, 0.33, 20.0)]
+            filenames = write_xyY_measurements(tmp_dir, xyYs)
+            group_file = Path(tmp_dir, 'g.mgm')
+            write_group_manifest(group_file, 'g', {tmp_dir: filenames})
+            group = Group(group_file)
+            index = group.colorimetry_index('cie 2º', 'cie xyy', 'd65', components=(0, 1))
+            self.assertIs(index, group.colorimetry_index(OBS_2, 'CIE xyY', 'D65', components=(0, 1)))
+            sidecar = sidecar_path(group_file, index.key)
+            self.assertTrue(sidecar.exists())
+            self.assertEqual([str(Path(tmp_dir, 'sample.0000.spdx'))],
+                             [source for source, _ in index.nearest(D65_XY)])
+            reloaded = Group(group_file).colorimetry_index(OBS_2, 'CIE xyY', 'D65', components=(0, 1))
+            self.assertIsNot(index, reloaded)
+            self.assertEqual(index.digest, reloaded.digest)
+            np.testing.assert_array_equal(index.points, reloaded.points)
+            self.assertEqual(list(index.sources), list(reloaded.sources))
+            group.remove_measurement_from_file(Path(tmp_dir, 'sample.0000.spdx'))
+            refreshed = group.colorimetry_index(OBS_2, 'CIE xyY', 'D65', components=(0, 1))
+            self.assertEqual(2, len(refreshed))
+            self.assertNotEqual(index.digest, refreshed.digest)
+
+    def test_multiple_groups(self):
+        with TemporaryDirectory() as dir_0, TemporaryDirectory() as dir_1:
+            groups = []
+            for dir_, xyYs in ((dir_0, [(0.31, 0.33, 1.0)]), (dir_1, [(0.32, 0.33, 1.0), (0.5, 0.4, 1.0)])):
+                write_group_manifest(Path(dir_, 'g.mgm'), 'g', {dir_: write_xyY_measurements(dir_, xyYs)})
+                groups.append(Group(Path(dir_, 'g.mgm')))
+            index = ColorimetryIndex.from_groups(groups, OBS_2, 'CIE xyY', 'D65', components=(0, 1))
+            self.assertEqual(3, len(index))
+            self.assertEqual(2, len(index.within_radius((0.315, 0.33), 0.01)))
+
+
+if __name__ == '__main__':
+    unittest.main()
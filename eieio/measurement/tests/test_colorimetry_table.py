@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for columnar colorimetry storage
+================================
+
+Test the :class:`eieio.measurement.colorimetry_table.ColorimetryTable` class.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+
+import numpy as np
+
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.colorimetry_table import ColorimetryTable
+from eieio.measurement.measurement import Measurement
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+OBS_10 = 'CIE 1964 10 Degree Standard Observer'
+
+
+def measurement_with(path, *colorimetry):
+    m = Measurement()
+    m.path = path
+    for c in colorimetry:
+        m.insert_colorimetry(c)
+    return m
+
+
+def sample_measurements():
+    return [measurement_with(f"/data/sample.{i}.spdx",
+                             Colorimetry(OBS_2, 'CIE XYZ', 'D65', [float(i), 2.0 * i, 3.0 * i], 'measured'),
+                             Colorimetry(OBS_10, 'CIE xyY', 'D65', [0.3, 0.3, float(i)], 'derived'))
+            for i in range(4)]
+
+
+class TestColorimetryTable(unittest.TestCase):
+    def test_rows_are_colorimetry_compatible_views(self):
+        measurements = sample_measurements()
+        table = ColorimetryTable.from_measurements(measurements)
+        self.assertEqual(8, len(table))
+        self.assertEqual(2, len(table.categories('observer')))
+        row = table[2]
+        original = measurements[1].colorimetry[(OBS_2, 'CIE XYZ', 'D65')]
+        self.assertEqual(original, row)
+        self.assertEqual(row, original)
+        self.assertEqual(str(original), str(row))
+        self.assertEqual('/data/sample.1.spdx', row.source)
+        self.assertTrue(np.shares_memory(row.values, table.values))
+        self.assertEqual(original, row.to_colorimetry())
+
+    def test_filtering(self):
+        table = ColorimetryTable.from_measurements(sample_measurements())
+        xyz = table.where(observer=OBS_2, color_space='CIE XYZ')
+        self.assertEqual(4, len(xyz))
+        np.testing.assert_array_equal([0.0, 1.0, 2.0, 3.0], xyz.values[:, 0])
+        bright = xyz.where(xyz.values[:, 1] > 3)
+        self.assertEqual(['/data/sample.2.spdx', '/data/sample.3.spdx'], list(bright.column('source')))
+        self.assertEqual(0, len(table.where(illuminant='D50')))
+        self.assertEqual(8, len(table.where(origin=('measured', 'derived'))))
+        self.assertEqual({(OBS_2, 'CIE XYZ', 'D65'), (OBS_10, 'CIE xyY', 'D65')},
+                         set(table.colorimetry_for('/data/sample.3.spdx').keys()))
+
+    def test_aggregate_and_concatenate(self):
+        table = ColorimetryTable.from_measurements(sample_measurements())
+        summary = table.aggregate()
+        xyz = summary[(OBS_2, 'CIE XYZ', 'D65')]
+        self.assertEqual(4, xyz['count'])
+        np.testing.assert_allclose([1.5, 3.0, 4.5], xyz['mean'])
+        np.testing.assert_allclose([0.0, 0.0, 0.0], xyz['min'])
+        np.testing.assert_allclose([3.0, 6.0, 9.0], xyz['max'])
+        np.testing.assert_allclose(np.std([0.0, 1.0, 2.0, 3.0]), xyz['std'][0])
+        other = ColorimetryTable.from_measurements([measurement_with(
+            '/other/sample.0.spdx', Colorimetry(OBS_2, 'CIE Lab', 'D50', [50.0, 1.0, 2.0], 'measured'))])
+        combined = ColorimetryTable.concatenate([table, other])
+        self.assertEqual(9, len(combined))
+        self.assertEqual('CIE Lab', combined[8].color_space)
+        self.assertEqual(OBS_2, combined[8].observer)
+        self.assertEqual(3, len(combined.aggregate(by=('color_space',))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for columnar export
+================================
+
+Test :mod:`eieio.measurement.columnar_export`; writing files needs pyarrow, so those
+tests are skipped without it.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import importlib.util
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from eieio.measurement.catalog import Catalog
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.columnar_export import (colorimetry_column_names, export_catalog_query, export_group,
+                                               record_columns)
+from eieio.measurement.group_manifest import write_group_manifest
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.spdx_io import write_measurement
+
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+XYY_KEY = (OBS_2, 'CIE xyY', 'D65')
+XYZ_KEY = (OBS_2, 'CIE XYZ', 'D65')
+
+
+def measurements():
+    coarse = Measurement()
+    coarse.wavelengths = np.arange(380, 781, 10.0)
+    coarse.values = (coarse.wavelengths - 380) / 400
+    coarse.insert_colorimetry(Colorimetry(*XYY_KEY, [0.31, 0.33, 100.0], 'measured'))
+    fine = Measurement()
+    fine.wavelengths = np.arange(380, 781, 1.0)
+    fine.values = (fine.wavelengths - 380) / 400
+    fine.insert_colorimetry(Colorimetry(*XYZ_KEY, [95.0, 100.0, 108.9], 'derived'))
+    colorimetry_only = Measurement()
+    colorimetry_only.wavelengths = np.array([380.0, 780.0])
+    colorimetry_only.values = np.array([1.0, 1.0])
+    colorimetry_only.insert_colorimetry(Colorimetry(*XYY_KEY, [0.64, 0.33, 20.0], 'measured'))
+    return [coarse, fine, colorimetry_only]
+
+
+def write_group(dir_):
+    filenames = []
+    for i, m in enumerate(measurements()):
+        filenames.append(f"sample.{i}.spdx")
+        write_measurement(m, Path(dir_, filenames[-1]))
+    write_group_manifest(Path(dir_, 'g.mgm'), 'g', {str(dir_): filenames})
+    return Path(dir_, 'g.mgm')
+
+
+class TestColumnarExport(unittest.TestCase):
+    def test_record_columns(self):
+        items = [(f"m{i}", m) for i, m in enumerate(measurements())]
+        columns = record_columns(items, (380, 780, 5), [XYY_KEY, ('cie 2º', 'cie xyz', 'd65')])
+        self.assertEqual(['m0', 'm1', 'm2'], columns['source'])
+        self.assertEqual((3, 81), columns['spectrum'].shape)
+        np.testing.assert_allclose(columns['spectrum'][0], columns['spectrum'][1])
+        self.assertEqual([True, True, False], columns['spectrum valid'].tolist())
+        xyY_names, xyY_origin = colorimetry_column_names(XYY_KEY)
+        np.testing.assert_array_equal([0.31, np.nan, 0.64], columns[xyY_names[0]])
+        self.assertEqual(['measured', None, 'measured'], columns[xyY_origin])
+        XYZ_names, XYZ_origin = colorimetry_column_names(XYZ_KEY)
+        np.testing.assert_array_equal([np.nan, 100.0, np.nan], columns[XYZ_names[1]])
+
+    @unittest.skipUnless(HAVE_PYARROW, 'pyarrow is not installed')
+    def test_group_round_trip(self):
+        import pyarrow.ipc
+        import pyarrow.parquet as pq
+        with TemporaryDirectory() as tmp_dir:
+            group = Group(write_group(tmp_dir))
+            self.assertEqual(3, export_group(group, Path(tmp_dir, 'g.parquet'), chunk_size=2))
+            table = pq.read_table(Path(tmp_dir, 'g.parquet'))
+            self.assertEqual(3, table.num_rows)
+            spectra = table.column('spectrum').to_pylist()
+            self.assertIsNone(spectra[2])
+            np.testing.assert_allclose(spectra[0], spectra[1])
+            self.assertEqual([0.31, None, 0.64], table.column(colorimetry_column_names(XYY_KEY)[0][0]).to_pylist())
+            export_group(group, Path(tmp_dir, 'g.arrow'), chunk_size=2)
+            with pyarrow.ipc.open_file(Path(tmp_dir, 'g.arrow')) as reader:
+                self.assertEqual(2, reader.num_record_batches)
+                self.assertTrue(table.equals(reader.read_all()))
+
+    @unittest.skipUnless(HAVE_PYARROW, 'pyarrow is not installed')
+    def test_catalog_query(self):
+        import pyarrow.parquet as pq
+        with TemporaryDirectory() as tmp_dir:
+            write_group(tmp_dir)
+            with Catalog(Path(tmp_dir, 'catalog.sqlite')) as catalog:
+                catalog.crawl(tmp_dir)
+                self.assertEqual([XYZ_KEY, XYY_KEY], catalog.colorimetry_keys())
+                self.assertEqual(2, export_catalog_query(catalog, Path(tmp_dir, 'q.parquet'),
+                                                         colorimetry=XYY_KEY))
+            table = pq.read_table(Path(tmp_dir, 'q.parquet'))
+            self.assertNotIn(colorimetry_column_names(XYZ_KEY)[1], table.column_names)
+
+    def test_catalog_colorimetry_keys(self):
+        with TemporaryDirectory() as tmp_dir:
+            write_group(tmp_dir)
+            with Catalog(':memory:') as catalog:
+                catalog.crawl(tmp_dir)
+                self.assertEqual([XYZ_KEY, XYY_KEY], catalog.colorimetry_keys())
+                self.assertEqual([XYY_KEY], catalog.colorimetry_keys(colorimetry=XYY_KEY))
+
+
+if __name__ == '__main__':
+    unittest.main()
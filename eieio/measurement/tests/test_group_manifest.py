@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for measurement group manifests
+================================
+
+Test the functions and classes in :mod:`eieio.measurement.group_manifest`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from eieio.measurement.group_manifest import (MANIFEST_VERSION, compress_frames, expand_frames, is_group_manifest,
+                                              read_group_manifest, read_reused_members, write_group_manifest,
+                                              GroupManifestWriter)
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.spdx_io import read_measurement, write_measurement
+from eieio.measurement.tests.test_measurement_group import make_meas, make_meas_seq, make_group_file
+
+
+class TestFrameRanges(unittest.TestCase):
+    def test_compress(self):
+        self.assertEqual('0-3,5,7-8', compress_frames([0, 1, 2, 3, 5, 7, 8]))
+        self.assertEqual('', compress_frames([]))
+
+    def test_expand(self):
+        self.assertEqual([0, 1, 2, 3, 5, 7, 8], list(expand_frames('0-3,5,7-8')))
+        self.assertEqual([1, 3, 5], list(expand_frames('1-5x2')))
+        with self.assertRaises(ValueError):
+            list(expand_frames('1-a'))
+
+
+class TestGroupManifest(unittest.TestCase):
+    def test_round_trip_preserves_names_and_order(self):
+        filenames = ['sample.0.black.spdx'] + [f"sample.{i:04}.spdx" for i in range(0, 1000)] \
+                    + [f"sample.{i}.spdx" for i in (8, 9, 10, 11, 99)] + ['sample.01000.spdx', 'notes.spdx']
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'g.mgm')
+            write_group_manifest(path, 'g', {'/data/run': filenames})
+            with open(path) as f:
+                lines = f.readlines()
+            self.assertLess(len(lines), 8)
+            self.assertIn('"sequence": "sample.@@@@.spdx", "frames": "0-999"', lines[2])
+            name, collections = read_group_manifest(path)
+            self.assertEqual('g', name)
+            self.assertEqual(filenames, collections['/data/run'])
+            write_group_manifest(path, 'g', {'/data/run': filenames}, compress=False)
+            self.assertEqual(filenames, read_group_manifest(path)[1]['/data/run'])
+
+    def test_named_frames_compress(self):
+        def records_for(filenames):
+            path = Path(tmp_dir, 'g.mgm')
+            write_group_manifest(path, 'g', {'/data/run': filenames})
+            self.assertEqual(filenames, read_group_manifest(path)[1]['/data/run'])
+            with open(path) as f:
+                return [json.loads(line) for line in f.readlines()[1:]]
+
+        adaptive = [f"sample.{i}.adaptive_{i}.spdx" for i in range(5)]
+        named = [f"sample.{i}.{name}.spdx" for i, name in zip(range(5, 8), ('red', 'green', 'blue'))]
+        with TemporaryDirectory() as tmp_dir:
+            self.assertEqual([{'dir': '/data/run', 'sequence': 'sample.@.spdx', 'frames': '0-4', 'name': 'adaptive_@'}],
+                             records_for(adaptive))
+            self.assertEqual([{'dir': '/data/run', 'sequence': 'sample.@.spdx', 'frames': '0-7',
+                               'names': ['adaptive_0', 'adaptive_1', 'adaptive_2', 'adaptive_3', 'adaptive_4',
+                                         'red', 'green', 'blue']},
+                              {'dir': '/data/run', 'sequence': 'sample.@.spdx', 'frames': '8-9'}],
+                             records_for(adaptive + named + ['sample.8.spdx', 'sample.9.spdx']))
+
+    def test_appending_writer(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'run.mgm')
+            with GroupManifestWriter(path, 'run') as writer:
+                for i in range(3):
+                    writer.add(tmp_dir, f"sample.{i}.spdx")
+            with GroupManifestWriter(path, 'ignored') as writer:
+                writer.add(tmp_dir, 'sample.3.spdx')
+                writer.remove(tmp_dir, 'sample.1.spdx')
+            name, collections = read_group_manifest(path)
+            self.assertEqual('run', name)
+            self.assertEqual(['sample.0.spdx', 'sample.2.spdx', 'sample.3.spdx'], collections[tmp_dir])
+            with open(path) as f:
+                self.assertEqual({'eieio_group_manifest': MANIFEST_VERSION, 'name': 'run'}, json.loads(f.readline()))
+
+    def test_torn_final_line(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'run.mgm')
+            with GroupManifestWriter(path, 'run') as writer:
+                writer.add(tmp_dir, 'sample.0.spdx')
+            # a run that dies mid-append leaves its last line unfinished
+            with open(path, mode='a') as f:
+                f.write(json.dumps({'dir': tmp_dir, 'files': ['sample.1.spdx']})[:20])
+            self.assertEqual(['sample.0.spdx'], read_group_manifest(path)[1][tmp_dir])
+            with GroupManifestWriter(path, 'run') as writer:
+                writer.add(tmp_dir, 'sample.1.spdx')
+            self.assertEqual(['sample.0.spdx', 'sample.1.spdx'], read_group_manifest(path)[1][tmp_dir])
+            with open(path) as f:
+                self.assertEqual(3, len(f.readlines()))
+            # only the last line may be torn
+            with open(path, mode='a') as f:
+                f.write('{"dir": "\n' + json.dumps({'dir': tmp_dir, 'files': ['sample.2.spdx']}) + '\n')
+            with self.assertRaises(ValueError):
+                read_group_manifest(path)
+
+    def test_reused_members(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'run.mgm')
+            with GroupManifestWriter(path, 'run') as writer:
+                writer.add(tmp_dir, 'sample.0.white.spdx')
+                writer.add(tmp_dir, 'sample.1.white.spdx', reused_from={'sample.1.white.spdx': 'sample.0.white.spdx'})
+                writer.add(tmp_dir, 'sample.2.white.spdx', reused_from={'sample.2.white.spdx': 'sample.0.white.spdx'})
+                writer.remove(tmp_dir, 'sample.2.white.spdx')
+            self.assertEqual(['sample.0.white.spdx', 'sample.1.white.spdx'], read_group_manifest(path)[1][tmp_dir])
+            self.assertEqual({tmp_dir: {'sample.1.white.spdx': 'sample.0.white.spdx'}}, read_reused_members(path))
+            # a reused member read back from its file keeps its flag when the group is saved compressed
+            for filename in ('sample.0.white.spdx', 'sample.1.white.spdx'):
+                make_meas(Path(tmp_dir, filename), 0.5)
+            reused = read_measurement(Path(tmp_dir, 'sample.1.white.spdx'))
+            reused.reused_from = 'sample.0.white.spdx'
+            write_measurement(reused)
+            group = Group(path)
+            compressed = Path(tmp_dir, 'compressed.mgm')
+            group.save_manifest(compressed)
+            self.assertEqual(read_reused_members(path), read_reused_members(compressed))
+
+    def test_writer_refuses_to_append_to_toml(self):
+        with TemporaryDirectory() as tmp_dir:
+            toml_file = make_group_file(tmp_dir, 'g.mg', 'g', *[[tmp_dir, 0, 1]])
+            self.assertFalse(is_group_manifest(toml_file))
+            with self.assertRaises(ValueError):
+                GroupManifestWriter(toml_file, 'g')
+
+    def test_group_reads_manifest_and_toml_alike(self):
+        with TemporaryDirectory() as group_dir:
+            with TemporaryDirectory() as seq_dir:
+                make_meas_seq(seq_dir, 0, 5)
+                make_meas(Path(seq_dir, 'sample.6.white.spdx'), 0.5)
+                toml_file = make_group_file(group_dir, 'g.mg', 'g', *[[seq_dir, 0, 5]])
+                from_toml = Group(toml_file)
+                from_toml.insert_measurement_from_file(Path(seq_dir, 'sample.6.white.spdx'))
+                manifest_file = Path(group_dir, 'g.mgm')
+                from_toml.save_manifest(manifest_file)
+                self.assertTrue(is_group_manifest(manifest_file))
+                from_manifest = Group(manifest_file)
+                self.assertEqual('g', from_manifest.name)
+                self.assertEqual(list(from_toml.collections[seq_dir]), list(from_manifest.collections[seq_dir]))
+                self.assertEqual(from_toml, from_manifest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for measuring with several meters
+================================
+
+Test :meth:`eieio.measurement.cli_tools.measure.Measurer._measure_sample` against a fake
+metering service.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from google.protobuf.duration_pb2 import Duration
+
+from services.metering.metering_pb2 import (MeterName, GenericErrorCode, Observer, ColorSpace, Illuminant,
+                                            CaptureResponse, CaptureError, CaptureManyResponse,
+                                            RetrievalResponse, RetrieveManyResponse,
+                                            SpectralMeasurement, TristimulusMeasurement)
+from eieio.measurement.cli_tools.measure import Measurer, MeteringFailure
+from eieio.measurement.group_manifest import GroupManifestWriter, MANIFEST_SUFFIX, read_reused_members
+from eieio.measurement.instructions import Instructions
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.retry import RequeueingRunner, RetryPolicy
+from eieio.measurement.running_statistics import STATISTICS_DIR
+from utilities.log import Log
+
+WHITE = {'name': 'white', 'space': 'deviceRGB', 'value': [1.0, 1.0, 1.0]}
+GRAY = {'name': 'gray', 'space': 'deviceRGB', 'value': [0.5, 0.5, 0.5]}
+
+
+class FakeStub(object):
+    """
+    Answers batched captures and retrievals as a metering service would, each meter reading its
+    own luminance, and fails the next capture of each meter listed in failures
+    """
+    def __init__(self, luminances, failures=()):
+        self.luminances = luminances
+        self.failures = list(failures)
+        self.captures = []
+
+    def CaptureMany(self, request):
+        names = [capture_request.meter_name.name for capture_request in request.requests]
+        self.captures.append(names)
+        responses = []
+        for name in names:
+            if name in self.failures:
+                self.failures.remove(name)
+                error = CaptureError(generic=GenericErrorCode.DEVICE_UNRESPONSIVE, message='read timed out')
+                responses.append(CaptureResponse(error=error))
+            else:
+                responses.append(CaptureResponse(estimated_duration=Duration(seconds=1)))
+        return CaptureManyResponse(responses=responses)
+
+    def RetrieveMany(self, request):
+        responses = []
+        for retrieval_request in request.requests:
+            luminance = self.luminances[retrieval_request.meter_name.name]
+            wavelengths = list(range(380, 790, 10))
+            spectrum = SpectralMeasurement(wavelengths=wavelengths,
+                                           values=list(np.linspace(0.5, 1.5, len(wavelengths)) * luminance))
+            XYZ = TristimulusMeasurement(observer=Observer.CIE_1931_2_DEGREE_STANDARD_OBSERVER,
+                                         color_space=ColorSpace.CIE_XYZ, illuminant=Illuminant.D65,
+                                         first=0.95 * luminance, second=luminance, third=1.08 * luminance)
+            responses.append(RetrievalResponse(spectral_measurement=spectrum, tristimulus_measurements=[XYZ]))
+        return RetrieveManyResponse(responses=responses)
+
+
+class TestMeasureWithSeveralMeters(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.dir_ = Path(tmp_dir.name)
+        instructions = Instructions(__file__, 'unit test')
+        instructions.meter = {'type': 'fake', 'names': ['left', 'right']}
+        instructions.sample_make = 'ARRI'
+        instructions.sample_model = 'test patch generator'
+        instructions.sample_description = 'gray ramp'
+        instructions.location = 'lab'
+        instructions.statistics = True
+        instructions.stimulus_memo = True
+        self.measurer = Measurer(instructions)
+        self.measurer.log = Log()
+        self.measurer.meter_names = [MeterName(name='left'), MeterName(name='right')]
+        self.measurer.measurement_group = Group(Path(self.dir_, 'run'), missing_ok=True)
+        self.measurer.manifest_writer = GroupManifestWriter(Path(self.dir_, 'run' + MANIFEST_SUFFIX), 'run')
+
+    def measure(self, sequence_number, sample):
+        return self.measurer._measure_sample(self.dir_, sequence_number, sample, [])
+
+    def test_each_meter_has_its_own_directory_memo_and_statistics(self):
+        stub = FakeStub({'left': 100.0, 'right': 50.0})
+        self.measurer.client = stub
+        first = self.measure(0, WHITE)
+        self.assertAlmostEqual(100.0, first.colorimetry[('CIE 1931 2 Degree Standard Observer', 'CIE XYZ', 'D65')]
+                               .values[1])
+        self.measure(1, GRAY)
+        # a repeated stimulus is taken from each meter's memo, without triggering either meter
+        self.measure(2, WHITE)
+        self.assertEqual([['left', 'right']] * 2, stub.captures)
+        for meter in ('left', 'right'):
+            self.assertEqual(['sample.0.white.spdx', 'sample.1.gray.spdx', 'sample.2.white.spdx'],
+                             sorted(path.name for path in Path(self.dir_, meter).glob('*.spdx')))
+        self.assertEqual(1, self.measurer.memo.reused)
+        self.assertEqual(1, self.measurer._memos['right'].reused)
+        self.assertEqual({'sample.2.white.spdx': 'sample.0.white.spdx'},
+                         read_reused_members(Path(self.dir_, 'run' + MANIFEST_SUFFIX))[str(Path(self.dir_, 'left'))])
+        # reused copies stay out of the statistics, which are kept and written per meter
+        for meter, luminance in (('left', 100.0), ('right', 50.0)):
+            white = self.measurer._statistics_by_meter[meter]['white']
+            self.assertEqual(1, white.count)
+            self.assertAlmostEqual(luminance, white.spectral.mean[-1] / 1.5)
+        self.measurer.cleanup(self.dir_)
+        for meter in ('left', 'right'):
+            self.assertTrue(Path(self.dir_, meter, STATISTICS_DIR).is_dir())
+
+    def test_partial_failure_measures_every_meter_again(self):
+        stub = FakeStub({'left': 100.0, 'right': 50.0}, failures=['right'])
+        self.measurer.client = stub
+        waits = []
+        runner = RequeueingRunner(RetryPolicy(sleep=waits.append), Measurer.classify_error)
+        measurement = runner.run('sample.0.white.spdx', lambda: self.measure(0, WHITE))
+        self.assertIsNotNone(measurement)
+        self.assertEqual(1, len(waits))
+        # the left meter's capture succeeded, but both meters capture again, so that their
+        # measurements are of the same showing of the stimulus
+        self.assertEqual([['left', 'right'], ['left', 'right']], stub.captures)
+        for meter in ('left', 'right'):
+            self.assertEqual(['sample.0.white.spdx'], [path.name for path in Path(self.dir_, meter).glob('*.spdx')])
+            self.assertEqual(1, self.measurer._statistics_by_meter[meter]['white'].count)
+        with self.assertRaises(MeteringFailure) as raised:
+            self.measurer.client = FakeStub({'left': 100.0, 'right': 50.0}, failures=['left'])
+            self.measure(1, GRAY)
+        self.assertTrue(raised.exception.transient)
+        self.assertIn('left', str(raised.exception))
+        self.assertFalse(any(Path(self.dir_, meter, 'sample.1.gray.spdx').exists() for meter in ('left', 'right')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the measurement cache
+================================
+
+Test the :class:`eieio.measurement.measurement_cache.MeasurementCache` class.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from eieio.measurement.measurement_cache import MeasurementCache, MEASUREMENT_CACHE, measurement_size
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.tests.test_measurement_group import make_meas, make_meas_seq, make_group_file
+
+
+class TestMeasurementCache(unittest.TestCase):
+    def test_hit_returns_private_copy(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            make_meas(path, 0.25)
+            cache = MeasurementCache()
+            m = cache.measurement(path)
+            m.path = str(Path(tmp_dir, 'elsewhere.spdx'))
+            m.values = m.values * 2
+            hit = cache.measurement(str(path))
+            self.assertIsNot(m, hit)
+            self.assertEqual(str(path.resolve()), hit.path)
+            np.testing.assert_array_equal(m.values / 2, hit.values)
+            self.assertEqual(1, cache.hits)
+            self.assertEqual(1, cache.misses)
+            self.assertEqual(0.5, cache.statistics()['hit_rate'])
+
+    def test_rewritten_file_is_reparsed(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            make_meas(path, 0.25)
+            cache = MeasurementCache()
+            m0 = cache.measurement(path)
+            make_meas(path, 0.75)
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            m1 = cache.measurement(path)
+            self.assertIsNot(m0, m1)
+            self.assertEqual(2, cache.misses)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        with TemporaryDirectory() as tmp_dir:
+            make_meas_seq(tmp_dir, 0, 2)
+            paths = [Path(tmp_dir, f"sample.{i:04}.spdx") for i in range(3)]
+            cache = MeasurementCache()
+            first = cache.measurement(paths[0])
+            cache.byte_budget = 2 * measurement_size(first)
+            cache.measurement(paths[1])
+            cache.measurement(paths[0])  # now most recently used
+            cache.measurement(paths[2])
+            self.assertEqual(2, len(cache))
+            self.assertEqual(1, cache.evictions)
+            self.assertLessEqual(cache.size, cache.byte_budget)
+            cache.measurement(paths[0])
+            self.assertEqual(2, cache.hits)
+
+    def test_invalidate(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            make_meas(path, 0.25)
+            cache = MeasurementCache()
+            cache.measurement(path)
+            cache.invalidate(path)
+            self.assertEqual(0, len(cache))
+            self.assertEqual(0, cache.size)
+
+    def test_overlapping_groups_parse_members_once(self):
+        with TemporaryDirectory() as tmp_dir:
+            make_meas_seq(tmp_dir, 0, 3)
+            fn_0 = make_group_file(tmp_dir, 'g0.toml', 'g0', *[[tmp_dir, 0, 3]])
+            fn_1 = make_group_file(tmp_dir, 'g1.toml', 'g1', *[[tmp_dir, 1, 2]])
+            MEASUREMENT_CACHE.reset_statistics()
+            g0 = Group(fn_0)
+            misses = MEASUREMENT_CACHE.misses
+            g0.remove_measurements_from_group_file(fn_1)
+            self.assertEqual(misses, MEASUREMENT_CACHE.misses)
+            self.assertEqual(2, len(g0.collections[tmp_dir]))
+            g0.insert_measurements_from_group_file(fn_1)
+            self.assertEqual(misses, MEASUREMENT_CACHE.misses)
+            g1 = Group(fn_1)
+            self.assertEqual(misses, MEASUREMENT_CACHE.misses)
+            common = g0.collections[tmp_dir]['sample.0001.spdx']
+            np.testing.assert_array_equal(common.values, g1.collections[tmp_dir]['sample.0001.spdx'].values)
+            # but a change made through one group stays in that group
+            self.assertIsNot(common, g1.collections[tmp_dir]['sample.0001.spdx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
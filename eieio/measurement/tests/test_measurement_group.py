@@ -19,6 +19,9 @@ __all__ = [
 
 
 from tempfile import TemporaryDirectory, NamedTemporaryFile
+import os
+import subprocess
+import sys
 import unittest
 from pathlib import Path
 from copy import deepcopy
@@ -155,6 +158,74 @@ class TestGroup(unittest.TestCase):
                         self.assertEqual(3, len(mg_ng.collections))
                         self.assertEqual(4, len(mg_ng.collections[ng_dir]))
 
+    def test_sync_dir(self):
+        with TemporaryDirectory() as seq_dir:
+            make_meas_seq(seq_dir, 0, 3)
+            mg = Group(Path(seq_dir, 'absent.toml'), missing_ok=True)
+            summary = mg.sync_dir(seq_dir)
+            self.assertEqual([f"sample.{i:04}.spdx" for i in range(4)], summary.added)
+            self.assertEqual(4, len(mg.collections[seq_dir]))
+            summary = mg.sync_dir(seq_dir)
+            self.assertEqual([], summary.added + summary.modified + summary.removed)
+            self.assertEqual(4, len(summary.unchanged))
+            # the capture grows, one frame is redone, and one is thrown away
+            make_meas(Path(seq_dir, 'sample.0004.spdx'), 0.5)
+            redone = Path(seq_dir, 'sample.0001.spdx')
+            make_meas(redone, 0.9)
+            stat = os.stat(redone)
+            os.utime(redone, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            Path(seq_dir, 'sample.0002.spdx').unlink()
+            with open(Path(seq_dir, 'sample.0005.spdx'), 'w') as f:
+                f.write('<IESTM2714 xmlns="http://www.ies.org/iestm2714"')  # still being written
+            summary = mg.sync_dir(seq_dir, max_workers=2)
+            self.assertEqual(['sample.0004.spdx'], summary.added)
+            self.assertEqual(['sample.0001.spdx'], summary.modified)
+            self.assertEqual(['sample.0002.spdx'], summary.removed)
+            self.assertEqual(['sample.0005.spdx'], summary.failed)
+            self.assertEqual(4, len(mg.collections[seq_dir]))
+            self.assertAlmostEqual(0.9, mg.collections[seq_dir]['sample.0001.spdx'].values[0])
+            make_meas(Path(seq_dir, 'sample.0005.spdx'), 0.5)
+            summary = mg.sync_dir(seq_dir)
+            self.assertEqual(['sample.0005.spdx'], summary.added)
+
+    def test_inserted_members_keep_fingerprints(self):
+        with TemporaryDirectory() as seq_dir:
+            make_meas_seq(seq_dir, 0, 3)
+            source = Group(make_group_file(seq_dir, 'g.mg', 'g', *[[seq_dir, 0, 3]]))
+            mg = Group(Path(seq_dir, 'absent.toml'), missing_ok=True)
+            mg.insert_measuremments_from_group(source)
+            summary = mg.sync_dir(seq_dir)
+            self.assertEqual([], summary.added + summary.modified + summary.removed)
+            self.assertEqual(4, len(summary.unchanged))
+
+    def test_group_file_insertion_and_removal(self):
+        with TemporaryDirectory() as seq_dir:
+            make_meas_seq(seq_dir, 0, 3)
+            group_file = make_group_file(seq_dir, 'g.mg', 'g', *[[seq_dir, 0, 3]])
+            mg = Group(Path(seq_dir, 'absent.toml'), missing_ok=True)
+            mg.insert_measurements_from_group_file(group_file)
+            other = Group(group_file)
+            self.assertIsNot(other.collections[seq_dir]['sample.0000.spdx'],
+                             mg.collections[seq_dir]['sample.0000.spdx'])
+            # removal only reads the group file's membership, so its members needn't be readable
+            Path(seq_dir, 'sample.0001.spdx').unlink()
+            Path(seq_dir, 'sample.0002.spdx').write_text('not a measurement')
+            mg.remove_measurements_from_group_file(group_file)
+            self.assertEqual({}, mg.collections[seq_dir])
+            with self.assertRaises(ValueError):
+                mg.remove_measurements_from_group_file(group_file)
+            mg.remove_measurements_from_group_file(group_file, missing_ok=True)
+
+    def test_membership_needs_no_indexes(self):
+        code = ("import sys\n"
+                "import eieio.measurement.measurement_group\n"
+                "print(sorted(m for m in ('eieio.measurement.colorimetry_index', 'eieio.measurement.spectral_index',\n"
+                "                         'eieio.measurement.running_statistics') if m in sys.modules))\n")
+        root = Path(__file__).resolve().parents[3]
+        result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=str(root)))
+        self.assertEqual('[]', result.stdout.strip(), result.stderr)
+
     def test_remove_nonexistent_file_raises(self):
         # load
         pass
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for measurement session loading
+================================
+
+Test loading and rescanning with the :class:`eieio.measurement.session.MeasurementSession` class.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import os
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from colour.io.tm2714 import SpectralDistribution_IESTM2714
+
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.session import _AUTOSAVING_SESSIONS, MeasurementSession
+from eieio.measurement.spdx_io import write_measurement
+
+
+def write_spdx(path, level):
+    m = Measurement()
+    m.wavelengths = np.arange(380, 781, 10.0)
+    m.values = np.linspace(0.0, level, len(m.wavelengths))
+    write_measurement(m, path)
+
+
+class TestMeasurementSession(unittest.TestCase):
+    def test_load_and_rescan(self):
+        with TemporaryDirectory() as tmp_dir:
+            sub_dir = Path(tmp_dir, 'patches')
+            sub_dir.mkdir()
+            top, nested = str(Path(tmp_dir, 'sample.0.spdx')), str(Path(sub_dir, 'sample.1.spdx'))
+            write_spdx(top, 1.0)
+            write_spdx(nested, 2.0)
+            session = MeasurementSession(tmp_dir)
+            scan = session.load(max_workers=2)
+            self.assertEqual(sorted([top, nested]), scan.added)
+            self.assertEqual(sorted([top, nested]), sorted(session.sds))
+            self.assertAlmostEqual(2.0, session.sds[nested].values[-1])
+            self.assertFalse(session.contains_unsaved_measurements())
+            scan = session.rescan()
+            self.assertEqual(([], [], []), (scan.added, scan.modified, scan.removed))
+            self.assertEqual(sorted([top, nested]), scan.unchanged)
+            added = str(Path(sub_dir, 'sample.2.spdx'))
+            write_spdx(added, 3.0)
+            write_spdx(top, 4.0)
+            stat = os.stat(top)
+            os.utime(top, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            os.unlink(nested)
+            Path(tmp_dir, 'torn.spdx').write_text('<?xml version="1.0" ?><IESTM2714')
+            scan = session.rescan()
+            self.assertEqual([added], scan.added)
+            self.assertEqual([top], scan.modified)
+            self.assertEqual([nested], scan.removed)
+            self.assertEqual([str(Path(tmp_dir, 'torn.spdx'))], scan.failed)
+            self.assertAlmostEqual(4.0, session.sds[top].values[-1])
+            self.assertEqual(sorted([top, added]), sorted(session.sds))
+            self.assertFalse(session.contains_unsaved_measurements())
+
+    def test_autosave(self):
+        def eventually(condition, timeout=5.0):
+            deadline = time.monotonic() + timeout
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return condition()
+
+        with TemporaryDirectory() as src_dir, TemporaryDirectory() as session_dir:
+            sds = []
+            for i in range(4):
+                path = str(Path(src_dir, f"sample.{i}.spdx"))
+                write_spdx(path, i + 1.0)
+                sds.append(SpectralDistribution_IESTM2714(path).read())
+            with MeasurementSession(session_dir) as session:
+                session.start_autosave(max_pending=3, max_delay=None)
+                session.add_spectral_measurement(sds[0])
+                # a repeated addition under the same path is coalesced into one write
+                session.add_spectral_measurement(sds[0])
+                time.sleep(0.1)
+                self.assertTrue(session.contains_unsaved_measurements())
+                self.assertEqual([], os.listdir(session_dir))
+                session.add_spectral_measurement(sds[1])
+                self.assertTrue(eventually(lambda: not session.contains_unsaved_measurements()))
+                self.assertEqual(['sample.0.spdx', 'sample.1.spdx'], sorted(os.listdir(session_dir)))
+                session.stop_autosave()
+                session.start_autosave(max_pending=None, max_delay=0.05)
+                session.add_spectral_measurement(sds[2])
+                self.assertTrue(eventually(lambda: Path(session_dir, 'sample.2.spdx').exists()))
+                session.stop_autosave()
+                session.start_autosave(max_pending=100, max_delay=3600)
+                self.assertIn(session, _AUTOSAVING_SESSIONS)
+                session.add_spectral_measurement(sds[3])
+            # leaving the with block stops the saver with a final save, and releases the exit hook's hold
+            self.assertNotIn(session, _AUTOSAVING_SESSIONS)
+            self.assertFalse(session.contains_unsaved_measurements())
+            self.assertEqual([f"sample.{i}.spdx" for i in range(4)], sorted(os.listdir(session_dir)))
+            self.assertEqual(4, len(MeasurementSession(session_dir).load().added))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the .colx to .spdx migration tool
+================================
+
+Test :mod:`eieio.measurement.cli_tools.merge_colx_into_spdx`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+import numpy as np
+
+from eieio.measurement.cli_tools.merge_colx_into_spdx import (JOURNAL_NAME, migrate_colx_into_spdx, plan_migration,
+                                                              read_journal)
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.spdx_io import read_measurement, write_measurement
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+XYY_KEY = (OBS_2, 'CIE xyY', 'D65')
+XYZ_KEY = (OBS_2, 'CIE XYZ', 'D65')
+
+COLX_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<arri:Sample xmlns:arri="http://www.arri.de/camera">
+  <arri:Colorimetry>
+    <arri:ColorSpaceModel>{color_space}</arri:ColorSpaceModel>
+    {components}
+  </arri:Colorimetry>
+</arri:Sample>
+"""
+
+
+def write_colx(path, color_space, values):
+    components = '\n    '.join(f"<arri:ComponentValue>{v}</arri:ComponentValue>" for v in values)
+    Path(path).write_text(COLX_TEMPLATE.format(color_space=color_space, components=components))
+
+
+def write_legacy_frames(dir_, frames, xyz_frames=()):
+    for frame in frames:
+        m = Measurement()
+        m.wavelengths = np.arange(380, 781, 10.0)
+        m.values = np.linspace(0.1, 0.2 + frame, len(m.wavelengths))
+        write_measurement(m, Path(dir_, f"sample.{frame}.spdx"))
+        write_colx(Path(dir_, f"sample.{frame}.cie_xyy.colx"), 'CIE xyY', [0.3, 0.3, float(frame)])
+        if frame in xyz_frames:
+            write_colx(Path(dir_, f"sample.{frame}.cie_xyz.colx"), 'CIE XYZ', [95.0, 100.0, float(frame)])
+
+
+class TestMergeColxIntoSpdx(unittest.TestCase):
+    def test_plan(self):
+        with TemporaryDirectory() as tmp_dir:
+            write_legacy_frames(tmp_dir, [1, 2, 3], xyz_frames=[1, 2])
+            tasks = plan_migration(tmp_dir)
+            self.assertEqual(['sample.1.spdx', 'sample.2.spdx', 'sample.3.spdx'],
+                             [Path(task.spdx).name for task in tasks])
+            self.assertEqual(['cie_xyy', 'cie_xyz'], [color_space for color_space, _ in tasks[0].colx])
+            self.assertEqual(['cie_xyy'], [color_space for color_space, _ in tasks[2].colx])
+            explicit = plan_migration(tmp_dir, ['CIE_XYZ'])
+            self.assertEqual(str(Path(tmp_dir, 'sample.3.cie_xyz.colx')), explicit[2].colx[0][1])
+
+    def test_migrate_and_resume(self):
+        with TemporaryDirectory() as tmp_dir:
+            write_legacy_frames(tmp_dir, [1, 2, 3], xyz_frames=[1, 2])
+            nested = Path(tmp_dir, 'nested')
+            nested.mkdir()
+            write_legacy_frames(nested, [7])
+            summary = migrate_colx_into_spdx(tmp_dir, ['cie_xyy', 'cie_xyz'], max_workers=1)
+            self.assertEqual(2, len(summary.merged))
+            self.assertEqual([str(Path(tmp_dir, 'sample.3.spdx'))], [path for path, _ in summary.failed])
+            # a failed frame is left exactly as it was
+            self.assertEqual({}, read_measurement(Path(tmp_dir, 'sample.3.spdx')).colorimetry)
+            m = read_measurement(Path(tmp_dir, 'sample.2.spdx'))
+            self.assertEqual([0.3, 0.3, 2.0], list(m.colorimetry[XYY_KEY].values))
+            self.assertEqual([95.0, 100.0, 2.0], list(m.colorimetry[XYZ_KEY].values))
+            self.assertEqual({'sample.1.spdx': {'cie_xyy', 'cie_xyz'}, 'sample.2.spdx': {'cie_xyy', 'cie_xyz'}},
+                             read_journal(tmp_dir))
+            self.assertEqual([], [p.name for p in Path(tmp_dir).iterdir() if p.suffix == '.tmp'])
+            # a torn journal line, as an interrupted run might leave, is ignored
+            with open(Path(tmp_dir, JOURNAL_NAME), 'a') as f:
+                f.write('{"spdx": "sample.3')
+            summary = migrate_colx_into_spdx(tmp_dir, recursive=True, max_workers=2)
+            self.assertEqual(sorted([str(Path(tmp_dir, 'sample.1.spdx')), str(Path(tmp_dir, 'sample.2.spdx'))]),
+                             sorted(summary.skipped))
+            self.assertEqual(sorted([str(Path(tmp_dir, 'sample.3.spdx')), str(Path(nested, 'sample.7.spdx'))]),
+                             sorted(summary.merged))
+            self.assertEqual([], summary.failed)
+            self.assertEqual([0.3, 0.3, 7.0], list(read_measurement(Path(nested, 'sample.7.spdx'))
+                                                   .colorimetry[XYY_KEY].values))
+            self.assertEqual({'sample.7.spdx': {'cie_xyy'}}, read_journal(nested))
+
+    def test_rerun_merges_color_spaces_not_yet_journaled(self):
+        with TemporaryDirectory() as tmp_dir:
+            write_legacy_frames(tmp_dir, [1, 2], xyz_frames=[1, 2])
+            summary = migrate_colx_into_spdx(tmp_dir, ['cie_xyy'], max_workers=1)
+            self.assertEqual(2, len(summary.merged))
+            self.assertNotIn(XYZ_KEY, read_measurement(Path(tmp_dir, 'sample.1.spdx')).colorimetry)
+            # asking for more color spaces than were merged merges the rest, not nothing
+            summary = migrate_colx_into_spdx(tmp_dir, ['CIE_XYY', 'cie_xyz'], max_workers=1)
+            self.assertEqual([], summary.skipped)
+            self.assertEqual(2, len(summary.merged))
+            m = read_measurement(Path(tmp_dir, 'sample.1.spdx'))
+            self.assertEqual([95.0, 100.0, 1.0], list(m.colorimetry[XYZ_KEY].values))
+            self.assertIn(XYY_KEY, m.colorimetry)
+            self.assertEqual({'cie_xyy', 'cie_xyz'}, read_journal(tmp_dir)['sample.1.spdx'])
+            summary = migrate_colx_into_spdx(tmp_dir, max_workers=1)
+            self.assertEqual(2, len(summary.skipped))
+
+
+    @unittest.skipIf(resource is None, 'needs the resource module to limit open files')
+    def test_migrating_more_directories_than_open_files(self):
+        with TemporaryDirectory() as tmp_dir:
+            number_of_dirs = 150
+            for i in range(number_of_dirs):
+                dir_ = Path(tmp_dir, f"take_{i}")
+                dir_.mkdir()
+                write_legacy_frames(dir_, [1])
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(100, soft), hard))
+            try:
+                summary = migrate_colx_into_spdx(tmp_dir, recursive=True, max_workers=1)
+            finally:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+            self.assertEqual([], summary.failed)
+            self.assertEqual(number_of_dirs, len(summary.merged))
+            self.assertEqual({'sample.1.spdx': {'cie_xyy'}}, read_journal(Path(tmp_dir, 'take_149')))
+
+if __name__ == '__main__':
+    unittest.main()
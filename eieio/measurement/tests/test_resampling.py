@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for batch spectral resampling
+================================
+
+Test :mod:`eieio.measurement.resampling` against Colour's own per-distribution
+interpolation.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+
+import numpy as np
+from colour.algebra import SpragueInterpolator
+from colour.colorimetry import SpectralDistribution, SpectralShape
+
+from eieio.measurement.batch_colorimetry import derive_colorimetry
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.resampling import (common_shape, resample, resample_measurements, resampling_matrix,
+                                          shape_wavelengths)
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+
+
+def measurement(wavelengths, values):
+    m = Measurement()
+    m.wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    m.values = np.asarray(values, dtype=np.float64)
+    return m
+
+
+class TestResampling(unittest.TestCase):
+    def test_matches_colour_interpolation(self):
+        rng = np.random.default_rng(2)
+        source = np.arange(380, 781, 10.0)
+        spectra = rng.random((5, len(source)))
+        target = shape_wavelengths((400, 700, 1))
+        sprague = resample(source, spectra, target, 'Sprague')
+        for spectrum, resampled in zip(spectra, sprague):
+            np.testing.assert_allclose(SpragueInterpolator(source, spectrum)(target), resampled, atol=1e-10)
+            sd = SpectralDistribution(dict(zip(source, spectrum)))
+            sd.interpolate(SpectralShape(400, 700, 1), interpolator=SpragueInterpolator)
+            np.testing.assert_allclose(sd.values, resampled, atol=1e-10)
+        np.testing.assert_allclose(np.interp(target, source, spectra[0]), resample(source, spectra[0], target))
+
+    def test_matrices_are_cached_and_out_of_range_is_filled(self):
+        source = np.arange(400, 701, 10.0)
+        matrix, outside = resampling_matrix(source, shape_wavelengths((380, 780, 5)))
+        self.assertIs(matrix, resampling_matrix(source.copy(), shape_wavelengths((380, 780, 5)))[0])
+        self.assertEqual(4 + 16, int(outside.sum()))
+        resampled = resample(source, np.ones(len(source)), (380, 780, 5), fill=np.nan)
+        self.assertTrue(np.all(np.isnan(resampled[outside])))
+        np.testing.assert_allclose(1.0, resampled[~outside])
+        with self.assertRaises(ValueError):
+            resampling_matrix(source, source, 'Pchip')
+        with self.assertRaises(ValueError):
+            resampling_matrix([400.0, 410.0, 430.0, 460.0, 500.0, 550.0, 610.0], source, 'Sprague')
+
+    def test_resample_mixed_measurements(self):
+        coarse = np.arange(380, 781, 10.0)
+        fine = np.arange(380, 781, 1.0)
+        measurements = [measurement(coarse, np.linspace(0, 1, len(coarse))),
+                        measurement(fine, np.linspace(0, 1, len(fine))),
+                        measurement(coarse, np.full(len(coarse), 0.5))]
+        self.assertEqual(SpectralShape(380, 780, 1), common_shape(m.wavelengths for m in measurements))
+        wavelengths, spectra = resample_measurements(measurements, (380, 780, 5))
+        self.assertEqual((3, 81), spectra.shape)
+        np.testing.assert_allclose(spectra[0], spectra[1])
+        np.testing.assert_allclose(0.5, spectra[2])
+        np.testing.assert_allclose((wavelengths - 380) / 400, spectra[0])
+
+    def test_derive_colorimetry_on_a_common_shape(self):
+        coarse = np.arange(380, 781, 10.0)
+        fine = np.arange(380, 781, 5.0)
+        measurements = [measurement(coarse, np.full(len(coarse), 0.01)),
+                        measurement(fine, np.full(len(fine), 0.01))]
+        derive_colorimetry(measurements, [(OBS_2, 'CIE XYZ', 'E')], shape=(380, 780, 5))
+        XYZs = [m.colorimetry[(OBS_2, 'CIE XYZ', 'E')].values for m in measurements]
+        np.testing.assert_allclose(XYZs[0], XYZs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
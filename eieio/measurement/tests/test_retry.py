@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for retrying and requeueing
+================================
+
+Test :mod:`eieio.measurement.retry`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+
+from eieio.measurement.retry import REQUEUE, RETRY, RequeueingRunner, RetryPolicy
+
+
+class Transient(Exception):
+    pass
+
+
+class Persistent(Exception):
+    pass
+
+
+def classify(error):
+    if isinstance(error, Transient):
+        return RETRY
+    if isinstance(error, Persistent):
+        return REQUEUE
+    return None
+
+
+class Flaky(object):
+    """Fails with each of a list of errors in turn, then succeeds"""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.calls
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self.waits = []
+        self.policy = RetryPolicy(max_attempts=3, initial_delay=1.0, backoff=2.0, max_delay=3.0,
+                                  max_consecutive_failures=3, sleep=self.waits.append)
+
+    def test_policy(self):
+        outcome = self.policy.call(Flaky(Transient(), Transient()), classify)
+        self.assertEqual((3, 3, None), outcome)
+        self.assertEqual([1.0, 2.0], self.waits)
+        outcome = self.policy.call(Flaky(*[Transient()] * 4), classify)
+        self.assertIsInstance(outcome.error, Transient)
+        self.assertEqual(3, outcome.attempts)
+        self.assertEqual(3.0, self.policy.delay(5))
+        # persistent errors aren't retried, and unrelated ones propagate
+        self.assertEqual(1, self.policy.call(Flaky(Persistent()), classify).attempts)
+        with self.assertRaises(KeyError):
+            self.policy.call(Flaky(KeyError('bug')), classify)
+        with self.assertRaises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_requeue(self):
+        retries = []
+        runner = RequeueingRunner(self.policy, classify, on_retry=lambda key, *args: retries.append(key))
+        self.assertEqual(1, runner.run('a', Flaky()))
+        self.assertIsNone(runner.run('b', Flaky(*[Transient()] * 3)))
+        self.assertEqual(['b', 'b'], retries)
+        self.assertIsNone(runner.run('c', Flaky(Persistent(), Persistent())))
+        self.assertEqual(3, runner.run('d', Flaky(Transient(), Transient())))
+        self.assertEqual(['b', 'c'], runner.pending)
+        # b now succeeds; c fails again and stays unmeasured after the single requeue round
+        self.assertEqual({'b': 4}, runner.drain())
+        self.assertEqual(['c'], runner.pending)
+        # d was recovered by retrying, so it never counted as failed
+        failures = {f.key: f for f in runner.failures}
+        self.assertEqual(['b', 'c'], sorted(failures))
+        self.assertTrue(failures['b'].recovered)
+        self.assertFalse(failures['c'].recovered)
+        self.assertEqual(2, len(failures['c'].errors))
+        summary = runner.summary()
+        self.assertIn('2 samples failed at least once; 1 recovered, 1 not measured', summary)
+        self.assertIn('c: 2 attempts', summary)
+
+    def test_hopeless_run_is_abandoned(self):
+        runner = RequeueingRunner(self.policy, classify)
+        runner.run('a', Flaky(Persistent()))
+        runner.run('b', Flaky(Persistent()))
+        with self.assertRaises(RuntimeError):
+            runner.run('c', Flaky(Persistent()))
+        deferred = RequeueingRunner(self.policy, classify)
+        deferred.run('a', Flaky(Persistent()))
+        self.assertEqual({}, deferred.drain(keep_going=lambda key: False))
+        self.assertEqual(['a'], deferred.pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
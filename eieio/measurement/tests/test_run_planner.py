@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the run planner
+================================
+
+Test :mod:`eieio.measurement.run_planner` against a simulated clock.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from eieio.measurement.run_planner import RunPlanner, TimingHistory
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def gray(level, priority=0):
+    return {'name': f"gray_{level}", 'value': [level] * 3, 'priority': priority}
+
+
+class TestRunPlanner(unittest.TestCase):
+    def test_history(self):
+        history = TimingHistory()
+        self.assertEqual(3.0, history.stage_seconds('capture', decade=-2))
+        history.observe('capture', 2.0, decade=0)
+        history.observe('capture', 4.0, decade=0)
+        self.assertAlmostEqual(3.0, history.stage_seconds('capture', decade=0))
+        # an undecided decade falls back on all captures
+        self.assertAlmostEqual(3.0, history.stage_seconds('capture', decade=-3))
+        # the meter's estimate, plus the overhead seen beyond it, predicts unseen decades
+        history.observe_integration(1.5, decade=0)
+        history.observe('capture', 2.0, decade=0)
+        history.observe_integration(20.0, decade=-3)
+        self.assertAlmostEqual(20.5, history.stage_seconds('capture', decade=-3))
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'timings.json')
+            history.save(path)
+            loaded = TimingHistory.load(path)
+            for decade in (0, -3, -5):
+                self.assertAlmostEqual(history.stage_seconds('capture', decade), loaded.stage_seconds('capture', decade))
+            self.assertEqual(0.5, TimingHistory.load(Path(tmp_dir, 'missing.json')).stage_seconds('retrieve'))
+        with self.assertRaises(ValueError):
+            history.observe('settle', 1.0)
+
+    def test_budgeted_run(self):
+        clock = Clock()
+        samples = [gray(1.0), gray(0.5, priority=2), gray(0.25), gray(0.05, priority=1), gray(0.75)]
+        planner = RunPlanner(samples, 20.0, clock=clock)
+        # 4.55 s each by default, so four fit, highest priority first
+        self.assertEqual([1, 3, 0, 2], planner.plan().order)
+        self.assertEqual([4], planner.plan().dropped)
+        measured = []
+        for index, sample in planner:
+            measured.append(index)
+            # dark stimuli take the meter far longer than predicted
+            capture = 12.0 if sample['value'][0] < 0.1 else 1.0
+            stages = {'target': 1.0, 'capture': capture, 'retrieve': 0.5, 'write': 0.05}
+            clock.now += sum(stages.values())
+            planner.observe(index, stages, integration_seconds=capture - 0.5)
+        # the slow dark patch eats the time planned for white, whose luminance decade has not yet
+        # been captured; a sample from a decade already seen to capture quickly is measured instead
+        self.assertEqual([1, 3, 4], measured)
+        self.assertLessEqual(clock.now, 20.0)
+        self.assertEqual([0, 2], planner.dropped)
+        self.assertIn('dropped', planner.report())
+        self.assertIn(samples[planner.dropped[0]]['name'], planner.report())
+        # everything fits in a generous budget
+        generous = RunPlanner(samples, 1000.0, clock=clock)
+        self.assertEqual(5, len(list(generous)))
+        self.assertEqual([], generous.dropped)
+        # nothing was observed, so everything handed out failed
+        self.assertEqual([0, 1, 2, 3, 4], generous.failed)
+        self.assertEqual([], generous.measured)
+
+    def test_failed_samples(self):
+        clock = Clock()
+        samples = [gray(1.0), gray(0.5), gray(0.25)]
+        planner = RunPlanner(samples, 100.0, clock=clock)
+        stages = {'target': 1.0, 'capture': 1.0, 'retrieve': 0.5, 'write': 0.05}
+        for index, sample in planner:
+            clock.now += 2.0
+            if index != 1:
+                planner.observe(index, stages)
+        self.assertEqual([0, 2], planner.measured)
+        self.assertEqual([1], planner.failed)
+        self.assertEqual([], planner.dropped)
+        self.assertIn('failed 1: gray_0.5', planner.report())
+        self.assertTrue(planner.fits(1))
+        clock.now = 99.0
+        self.assertFalse(planner.fits(1))
+        # a retry that succeeds later still counts
+        planner.observe(1, stages)
+        self.assertEqual([0, 2, 1], planner.measured)
+        self.assertEqual([], planner.failed)
+        self.assertNotIn('failed', planner.report())
+
+
+    def test_given_order_breaks_priority_ties(self):
+        clock = Clock()
+        samples = [gray(1.0), gray(0.05), gray(0.5, priority=1), gray(0.75)]
+        planner = RunPlanner(samples, 1000.0, clock=clock, order=[3, 1, 0, 2])
+        # priority still comes first; the given order replaces sequence order among equals
+        self.assertEqual([2, 3, 1, 0], planner.plan().order)
+        self.assertEqual([2, 3, 1, 0], [index for index, _ in planner])
+        with self.assertRaises(ValueError):
+            RunPlanner(samples, 1000.0, order=[0, 1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
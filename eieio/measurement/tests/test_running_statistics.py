@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for streaming statistics
+================================
+
+Test :mod:`eieio.measurement.running_statistics` and
+:meth:`eieio.measurement.measurement_group.Group.statistics`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.group_manifest import write_group_manifest
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.running_statistics import (RunningStatistics, StatisticsAccumulator,
+                                                  sample_name_from_filename, summary_filename)
+from eieio.measurement.spdx_io import read_measurement, write_measurement
+
+OBS_2 = 'CIE 1931 2 Degree Standard Observer'
+XYZ_KEY = (OBS_2, 'CIE XYZ', 'D65')
+WAVELENGTHS = np.arange(380, 781, 10.0)
+
+
+def measurement(values, XYZ, wavelengths=WAVELENGTHS):
+    m = Measurement()
+    m.wavelengths = wavelengths
+    m.values = np.asarray(values, dtype=np.float64)
+    m.insert_colorimetry(Colorimetry(*XYZ_KEY, list(XYZ), 'measured'))
+    return m
+
+
+class TestRunningStatistics(unittest.TestCase):
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(1)
+        # a large offset is where the naive sum-of-squares formula falls apart
+        data = 1e6 + rng.random((1000, 5))
+        streamed = RunningStatistics(5)
+        for row in data:
+            streamed.update(row)
+        batched = RunningStatistics(5)
+        batched.update_many(data[:300])
+        merged = RunningStatistics(5)
+        merged.update_many(data[300:])
+        batched.merge(merged)
+        for statistics in (streamed, batched):
+            self.assertEqual(1000, statistics.count)
+            np.testing.assert_allclose(data.mean(axis=0), statistics.mean, rtol=1e-12)
+            np.testing.assert_allclose(data.var(axis=0, ddof=1), statistics.variance, rtol=1e-6)
+            np.testing.assert_array_equal(data.min(axis=0), statistics.minimum)
+            np.testing.assert_array_equal(data.max(axis=0), statistics.maximum)
+
+    def test_samples_and_summary_round_trip(self):
+        rng = np.random.default_rng(4)
+        accumulator = StatisticsAccumulator()
+        spectra = 0.5 + 0.01 * rng.random((20, len(WAVELENGTHS)))
+        for spectrum in spectra:
+            accumulator.add('red', measurement(spectrum, spectrum[:3]))
+        fine = np.arange(380, 781, 5.0)
+        accumulator.add('red', measurement(0.5 + (fine - 380) / 4e5, (0.5, 0.5, 0.5), fine))
+        placeholder = Measurement()
+        placeholder.wavelengths = np.array([380.0, 780.0])
+        placeholder.values = np.array([1.0, 1.0])
+        placeholder.insert_colorimetry(Colorimetry(*XYZ_KEY, [1.0, 2.0, 3.0], 'measured'))
+        accumulator.add('blue', placeholder)
+        red = accumulator['red']
+        self.assertEqual(21, red.count)
+        self.assertEqual(21, red.spectral.count)
+        all_spectra = np.vstack((spectra, 0.5 + (WAVELENGTHS - 380) / 4e5))
+        np.testing.assert_allclose(all_spectra.mean(axis=0), red.spectral.mean)
+        self.assertIsNone(accumulator['blue'].spectral)
+        with TemporaryDirectory() as tmp_dir:
+            paths = accumulator.write(tmp_dir)
+            self.assertEqual(2, len(paths))
+            summary = read_measurement(Path(tmp_dir, 'red.spdx'))
+            self.assertEqual(21, summary.statistics['count'])
+            np.testing.assert_allclose(red.spectral.mean, summary.values)
+            self.assertEqual('derived', summary.colorimetry[XYZ_KEY].origin)
+            reloaded = StatisticsAccumulator.load(tmp_dir)
+        self.assertEqual(['blue', 'red'], sorted(reloaded.names))
+        np.testing.assert_allclose(red.spectral.variance, reloaded['red'].spectral.variance)
+        np.testing.assert_allclose(red.colorimetry[XYZ_KEY].variance, reloaded['red'].colorimetry[XYZ_KEY].variance)
+        # accumulation resumes where the earlier run left off
+        reloaded.add('red', measurement(spectra[0], spectra[0][:3]))
+        np.testing.assert_allclose(np.vstack((all_spectra, spectra[:1])).var(axis=0, ddof=1),
+                                   reloaded['red'].spectral.variance)
+
+    def test_narrower_spectrum_contributes_colorimetry_alone(self):
+        accumulator = StatisticsAccumulator()
+        wide = np.linspace(0.5, 0.6, len(WAVELENGTHS))
+        accumulator.add('red', measurement(wide, (1.0, 2.0, 3.0)))
+        narrow = np.arange(400, 701, 10.0)
+        accumulator.add('red', measurement(np.linspace(0.7, 0.8, len(narrow)), (3.0, 4.0, 5.0), narrow))
+        red = accumulator['red']
+        self.assertEqual(2, red.count)
+        # wavelengths the narrower spectrum never measured aren't taken as zeros
+        self.assertEqual(1, red.spectral.count)
+        np.testing.assert_array_equal(wide, red.spectral.mean)
+        np.testing.assert_array_equal(wide, red.spectral.minimum)
+        np.testing.assert_allclose([2.0, 3.0, 4.0], red.colorimetry[XYZ_KEY].mean)
+
+    def test_writing_merges_earlier_runs(self):
+        names = ['red', 'R/G 50%', '..', 'a\\b:c']
+        with TemporaryDirectory() as tmp_dir:
+            first = StatisticsAccumulator()
+            for level, name in enumerate(names):
+                first.add(name, measurement(np.linspace(0, level + 1.0, len(WAVELENGTHS)), (1.0, 2.0, 3.0)))
+            paths = first.write(tmp_dir)
+            self.assertEqual(len(names), len(set(paths)))
+            for path in paths:
+                self.assertEqual(Path(tmp_dir), path.parent)
+            self.assertEqual('R%2FG 50%25.spdx', summary_filename('R/G 50%'))
+            self.assertEqual('%2E..spdx', summary_filename('..'))
+            # a later run writes into the same directory, and writes twice at cleanup
+            second = StatisticsAccumulator()
+            second.add('red', measurement(np.linspace(0, 3.0, len(WAVELENGTHS)), (3.0, 2.0, 1.0)))
+            second.write(tmp_dir)
+            second.write(tmp_dir)
+            reloaded = StatisticsAccumulator.load(tmp_dir)
+            self.assertEqual(sorted(names), sorted(reloaded.names))
+            self.assertEqual(2, reloaded['red'].count)
+            np.testing.assert_allclose(np.linspace(0, 2.0, len(WAVELENGTHS)), reloaded['red'].spectral.mean)
+            self.assertEqual(1, reloaded['R/G 50%'].count)
+            second.write(tmp_dir, merge=False)
+            self.assertEqual(2, StatisticsAccumulator.load(tmp_dir)['red'].count)
+
+    def test_group_statistics(self):
+        self.assertEqual('red', sample_name_from_filename('sample.12.red.spdx'))
+        self.assertEqual('light.red', sample_name_from_filename('sample.12.light.red.spdx'))
+        self.assertIsNone(sample_name_from_filename('sample.12.spdx'))
+        with TemporaryDirectory() as tmp_dir:
+            filenames = []
+            for i, (name, level) in enumerate([('red', 1.0), ('green', 2.0), ('red', 3.0), (None, 9.0)]):
+                filename = f"sample.{i}.{name}.spdx" if name else f"sample.{i}.spdx"
+                write_measurement(measurement(np.linspace(0, level, len(WAVELENGTHS)), (level, level, level)),
+                                  Path(tmp_dir, filename))
+                filenames.append(filename)
+            write_group_manifest(Path(tmp_dir, 'g.mgm'), 'g', {tmp_dir: filenames})
+            accumulator = Group(Path(tmp_dir, 'g.mgm')).statistics()
+        self.assertEqual(['green', 'red'], sorted(accumulator.names))
+        np.testing.assert_allclose([2.0, 2.0, 2.0], accumulator['red'].colorimetry[XYZ_KEY].mean)
+        np.testing.assert_allclose([2.0, 2.0, 2.0], accumulator['red'].colorimetry[XYZ_KEY].variance)
+
+
+if __name__ == '__main__':
+    unittest.main()
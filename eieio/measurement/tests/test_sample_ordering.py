@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for sample ordering
+================================
+
+Test :mod:`eieio.measurement.sample_ordering`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from itertools import permutations
+
+import numpy as np
+
+from eieio.measurement.sample_ordering import TransitionCost, nearest_neighbour_path, order_samples, two_opt
+from eieio.measurement.sample_sources import SampleSequence
+
+
+class TestSampleOrdering(unittest.TestCase):
+    def test_cost(self):
+        cost = TransitionCost(settle_per_decade=2.0, settle_per_chromaticity=0.0, integration_change=1.0)
+        features = cost.features([[1.0, 1.0, 1.0], [0.1 ** (1 / 2.2)] * 3, [0.0, 0.0, 0.0]])
+        # white to 10% gray is one decade and one integration bracket
+        self.assertAlmostEqual(3.0, cost.path_seconds(features, [0, 1]))
+        # black is clamped to 1e-4, three more decades below
+        self.assertAlmostEqual(12.0, cost.path_seconds(features, [0, 1, 2]))
+        self.assertAlmostEqual(cost.path_seconds(features, [1, 0, 2]), cost.path_seconds(features, [2, 0, 1]))
+        display = TransitionCost(rgb_to_XYZ=lambda rgb: 100 * np.asarray(rgb) ** 2.2 @ np.eye(3))
+        np.testing.assert_allclose([[1.0, 1.0, 1.0]], display.stimuli([[1.0, 1.0, 1.0]]))
+
+    def test_small_sequences_are_solved_well(self):
+        rng = np.random.default_rng(5)
+        features = rng.random((8, 4))
+        order = two_opt(features, nearest_neighbour_path(features))
+        cost = TransitionCost()
+        best = min(cost.path_seconds(features, (0,) + p) for p in permutations(range(1, 8)))
+        # a heuristic, so not always optimal, but close
+        self.assertLessEqual(cost.path_seconds(features, order), best * 1.25)
+
+    def test_order_samples(self):
+        samples = list(SampleSequence({'source': 'random', 'count': 2000, 'seed': 11}))
+        ordering = order_samples(samples)
+        self.assertEqual(list(range(len(samples))), sorted(ordering.order))
+        self.assertEqual(0, ordering.order[0])
+        self.assertLess(ordering.ordered_seconds, ordering.original_seconds / 5)
+        cost = TransitionCost()
+        features = cost.features([sample['value'] for sample in samples])
+        self.assertAlmostEqual(cost.path_seconds(features, ordering.order), ordering.ordered_seconds)
+        self.assertEqual(7, order_samples(samples, start=7).order[0])
+        # a sequence already in a good order is left as it is
+        ramp = list(SampleSequence({'source': 'ramp', 'steps': 20, 'channels': ['gray']}))
+        self.assertEqual(list(range(20)), order_samples(ramp).order)
+        with self.assertRaises(ValueError):
+            order_samples(ramp, start=20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for sample sources
+================================
+
+Test :mod:`eieio.measurement.sample_sources` and the uniqueness check of
+:class:`eieio.measurement.sample_id_sequence.SampleIDSequence`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from itertools import islice
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import toml
+
+from eieio.measurement.sample_id_sequence import SampleIDSequence
+from eieio.measurement.sample_sources import SampleSequence, sample_source, write_sample_file
+from eieio.measurement import sample_sources
+
+
+class TestSampleSources(unittest.TestCase):
+    def test_generated_sources(self):
+        content = toml.loads("""
+            sample_sequence = [
+                { space = 'deviceRGB', value = [ 0.18, 0.18, 0.18 ], name = '18% gray' },
+                { source = 'ramp', steps = 3, channels = ['red', 'gray'] },
+                { source = 'cube', size = 17, name = 'c' },
+                { source = 'grid', red = [0.0, 1.0], levels = [0.5] },
+                { source = 'random', count = 100000, seed = 7, min = 0.1, max = 0.9 },
+            ]""")
+        sequence = SampleSequence(content['sample_sequence'])
+        self.assertEqual(1 + 6 + 17 ** 3 + 2 + 100000, len(sequence))
+        head = list(islice(sequence, 9))
+        self.assertEqual('18% gray', head[0]['name'])
+        self.assertEqual(['ramp_red_0', 'ramp_red_1', 'ramp_red_2', 'ramp_gray_0'], [s['name'] for s in head[1:5]])
+        self.assertEqual([0.5, 0.0, 0.0], head[2]['value'])
+        self.assertEqual([0.5, 0.5, 0.5], head[5]['value'])
+        self.assertEqual(('c_00_00_01', [0.0, 0.0, 1 / 16]), (head[8]['name'], head[8]['value']))
+        self.assertEqual('deviceRGB', head[8]['space'])
+        samples = list(sequence)
+        self.assertEqual(len(sequence), len(samples))
+        self.assertEqual([[0.0, 0.5, 0.5], [1.0, 0.5, 0.5]], [s['value'] for s in samples[1 + 6 + 17 ** 3:][:2]])
+        random = np.array([s['value'] for s in samples[-100000:]])
+        self.assertTrue(((random >= 0.1) & (random < 0.9)).all())
+        self.assertEqual(samples[-1], list(SampleSequence(content['sample_sequence']))[-1])
+        with self.assertRaises(ValueError):
+            SampleSequence([{'source': 'sphere'}])
+        with self.assertRaises(ValueError):
+            SampleSequence({'source': 'cube'})
+
+    def test_sample_files(self):
+        with TemporaryDirectory() as tmp_dir:
+            listed = [{'name': 'red', 'value': [1.0, 0.0, 0.0]}, {'name': 'green', 'value': [0.0, 1.0, 0.0]}]
+            self.assertEqual(2, write_sample_file(Path(tmp_dir, 'primaries.npz'), listed))
+            np.save(Path(tmp_dir, 'grays.npy'), np.linspace(0, 1, 5)[:, np.newaxis].repeat(3, axis=1))
+            Path(tmp_dir, 'patches.csv').write_text('name,red,green,blue\nskin,0.8,0.6,0.5\nsky,0.3,0.5,0.9\n')
+            sequence = SampleSequence([{'source': 'file', 'path': 'primaries.npz'},
+                                       {'source': 'file', 'path': 'grays.npy', 'name': 'g'},
+                                       {'source': 'file', 'path': str(Path(tmp_dir, 'patches.csv'))}],
+                                      base_dir=tmp_dir)
+            self.assertEqual(9, len(sequence))
+            samples = list(sequence)
+            self.assertEqual(['red', 'green', 'g_0', 'g_1', 'g_2', 'g_3', 'g_4', 'skin', 'sky'],
+                             [s['name'] for s in samples])
+            self.assertEqual([0.25, 0.25, 0.25], samples[3]['value'])
+            self.assertEqual([0.3, 0.5, 0.9], samples[-1]['value'])
+            with self.assertRaises(FileNotFoundError):
+                SampleSequence([{'source': 'file', 'path': 'missing.npy'}], base_dir=tmp_dir)
+
+    def test_npz_length_from_header(self):
+        with TemporaryDirectory() as tmp_dir:
+            np.savez(Path(tmp_dir, 'plain.npz'), values=np.zeros((1234, 3)))
+            np.savez_compressed(Path(tmp_dir, 'compressed.npz'), values=np.zeros((56, 3)), names=np.array(['a'] * 56))
+            for filename, length in (('plain.npz', 1234), ('compressed.npz', 56)):
+                source = sample_source({'source': 'file', 'path': filename}, base_dir=tmp_dir)
+                self.assertEqual(length, source._npz_length())
+                self.assertEqual(length, len(source))
+        with self.assertRaises(TypeError):
+            sample_sources._Source({'source': 'abstract'})
+
+    def test_sample_id_uniqueness(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'ids.sis')
+            path.write_text('red\ngreen\n\nblue\n')
+            ids = SampleIDSequence(path)
+            ids.load()
+            self.assertEqual(['red', 'green', 'blue'], ids.ids)
+            path.write_text('red\ngreen\nred\n')
+            with self.assertRaises(RuntimeError):
+                SampleIDSequence(path).load()
+
+
+if __name__ == '__main__':
+    unittest.main()
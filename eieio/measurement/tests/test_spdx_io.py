@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for fast TM-27-14 measurement I/O
+================================
+
+Test the functions in :mod:`eieio.measurement.spdx_io`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from colour.io.tm2714 import Header_IESTM2714
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.spdx_io import read_measurement, render_measurement, write_measurement, write_measurements
+
+OBS = 'CIE 1931 2 Degree Standard Observer'
+IL = 'D65'
+
+HEADER_ATTRIBUTES = ('manufacturer', 'catalog_number', 'description', 'document_creator',
+                     'unique_identifier', 'measurement_equipment', 'laboratory', 'report_number',
+                     'report_date', 'document_creation_date', 'comments')
+SD_ATTRIBUTES = ('spectral_quantity', 'reflection_geometry', 'transmission_geometry',
+                 'bandwidth_FWHM', 'bandwidth_corrected')
+
+
+def write_sample_measurement(path, min_lambda, max_lambda, inc_lambda, with_colorimetry=True):
+    header = Header_IESTM2714(manufacturer='ROE Visual', catalog_number='Black Pearl 2',
+                              description='LED wall & <friends>', document_creator='jgoldstone',
+                              laboratory='ARRI Burbank MRPS', report_date='Tue 10:11:12.131415')
+    m = Measurement(header=header, spectral_quantity='radiance', bandwidth_FWHM=5)
+    wavelengths = np.arange(min_lambda, max_lambda + 1, inc_lambda)
+    m.wavelengths = wavelengths
+    m.values = np.linspace(0.001, 0.01, len(wavelengths))
+    if with_colorimetry:
+        m.insert_colorimetry(Colorimetry(OBS, 'CIE XYZ', IL, [95.0, 100.0, 108.9], 'measured'))
+        m.insert_colorimetry(Colorimetry(OBS, 'CIE xyY', IL, [0.3127, 0.329, 100.0], 'measured'))
+    m.path = str(path)
+    m.write()
+    return m
+
+
+def read_with_colour(path):
+    m = Measurement()
+    m.path = str(path)
+    m.read()
+    return m
+
+
+class TestReadMeasurement(unittest.TestCase):
+    def assertSameMeasurement(self, expected, actual):
+        self.assertEqual(expected.path, actual.path)
+        self.assertEqual(expected.name, actual.name)
+        for attribute in HEADER_ATTRIBUTES:
+            self.assertEqual(getattr(expected.header, attribute), getattr(actual.header, attribute), attribute)
+        for attribute in SD_ATTRIBUTES:
+            self.assertEqual(getattr(expected, attribute), getattr(actual, attribute), attribute)
+        np.testing.assert_array_equal(expected.wavelengths, actual.wavelengths)
+        np.testing.assert_array_equal(expected.values, actual.values)
+        self.assertEqual(set(expected.colorimetry.keys()), set(actual.colorimetry.keys()))
+        for key, c in expected.colorimetry.items():
+            self.assertEqual(c, actual.colorimetry[key])
+
+    def test_matches_colour_reader_10nm(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            write_sample_measurement(path, 380, 780, 10)
+            self.assertSameMeasurement(read_with_colour(path), read_measurement(path))
+
+    def test_matches_colour_reader_1nm(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            write_sample_measurement(path, 360, 830, 1)
+            fast = read_measurement(path)
+            self.assertEqual(471, len(fast.values))
+            self.assertSameMeasurement(read_with_colour(path), fast)
+
+    def test_no_colorimetry(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            write_sample_measurement(path, 380, 780, 10, with_colorimetry=False)
+            self.assertSameMeasurement(read_with_colour(path), read_measurement(path))
+
+    def test_unusual_spectral_data_is_parsed_fully(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            write_sample_measurement(path, 380, 780, 10)
+            content = path.read_text()
+            # a comment among the data sends the reader to the full parse
+            path.write_text(content.replace('<SpectralData wavelength="390', '<!-- 390 nm -->'
+                                                                             '<SpectralData wavelength="390', 1))
+            self.assertSameMeasurement(read_with_colour(path), read_measurement(path))
+            prefixed = content.replace('<IESTM2714 xmlns=', '<tm:IESTM2714 xmlns:tm=').replace(
+                '</IESTM2714>', '</tm:IESTM2714>').replace('<SpectralData', '<tm:SpectralData').replace(
+                '</SpectralData>', '</tm:SpectralData>')
+            # which the quick scan of prefixed elements agrees with
+            path.write_text(prefixed)
+            m = read_measurement(path)
+            self.assertEqual(41, len(m.values))
+            np.testing.assert_array_equal(read_with_colour(path).values, m.values)
+
+    def test_fills_in_supplied_measurement(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.0000.spdx')
+            write_sample_measurement(path, 380, 780, 10)
+            m = Measurement()
+            self.assertIs(m, read_measurement(path, m))
+            self.assertEqual(2, len(m.colorimetry))
+
+    def test_missing_namespace_raises(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'bogus.spdx')
+            with open(path, 'w') as f:
+                print('<IESTM2714><Header/></IESTM2714>', file=f)
+            with self.assertRaises(ValueError):
+                read_measurement(path)
+
+
+class TestWriteMeasurement(unittest.TestCase):
+    def test_colour_reads_what_we_write(self):
+        with TemporaryDirectory() as tmp_dir:
+            original = read_with_colour(write_sample_measurement(Path(tmp_dir, 'a.spdx'), 380, 780, 1).path)
+            path = Path(tmp_dir, 'b.spdx')
+            write_measurement(original, path)
+            round_tripped = read_with_colour(path)
+            for attribute in HEADER_ATTRIBUTES:
+                self.assertEqual(getattr(original.header, attribute), getattr(round_tripped.header, attribute))
+            for attribute in SD_ATTRIBUTES:
+                self.assertEqual(getattr(original, attribute), getattr(round_tripped, attribute))
+            np.testing.assert_array_equal(original.wavelengths, round_tripped.wavelengths)
+            np.testing.assert_array_equal(original.values, round_tripped.values)
+            self.assertEqual(original.colorimetry, round_tripped.colorimetry)
+
+    def test_values_round_trip_exactly(self):
+        m = Measurement(spectral_quantity='radiance', bandwidth_FWHM=1)
+        m.wavelengths = np.arange(380, 781)
+        m.values = np.random.default_rng(1).random(401) * 1e-3
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.spdx')
+            write_measurement(m, path)
+            np.testing.assert_array_equal(m.values, read_measurement(path).values)
+
+    def test_placeholders_match_measurement_write(self):
+        with TemporaryDirectory() as tmp_dir:
+            m = Measurement()
+            m.insert_colorimetry(Colorimetry(OBS, 'CIE XYZ', IL, [95.0, 100.0, 108.9], 'measured'))
+            fast_path = Path(tmp_dir, 'fast.spdx')
+            write_measurement(m, fast_path)
+            m.path = str(Path(tmp_dir, 'slow.spdx'))
+            m.write()
+            fast = read_with_colour(fast_path)
+            slow = read_with_colour(m.path)
+            self.assertEqual(slow.bandwidth_FWHM, fast.bandwidth_FWHM)
+            np.testing.assert_array_equal(slow.wavelengths, fast.wavelengths)
+            np.testing.assert_allclose(slow.values, fast.values)
+            self.assertEqual(slow.colorimetry, fast.colorimetry)
+
+    def test_header_text_is_escaped(self):
+        m = Measurement(header=Header_IESTM2714(description='R&D <test>'))
+        self.assertIn('R&amp;D &lt;test&gt;', render_measurement(m))
+
+    def test_bulk_write(self):
+        with TemporaryDirectory() as tmp_dir:
+            measurements = []
+            for i in range(8):
+                m = Measurement(spectral_quantity='radiance', bandwidth_FWHM=10)
+                m.wavelengths = np.arange(380, 790, 10)
+                m.values = np.full(41, i + 1.0)
+                m.path = str(Path(tmp_dir, f"sample.{i:04}.spdx"))
+                measurements.append(m)
+            self.assertEqual(8, write_measurements(measurements, max_workers=4))
+            for i, m in enumerate(measurements):
+                np.testing.assert_array_equal(m.values, read_measurement(m.path).values)
+
+    def test_bulk_write_path_count_mismatch_raises(self):
+        with self.assertRaises(ValueError):
+            write_measurements([Measurement()], paths=[])
+
+    def test_no_path_raises(self):
+        with self.assertRaises(ValueError):
+            write_measurement(Measurement())
+
+
+if __name__ == '__main__':
+    unittest.main()
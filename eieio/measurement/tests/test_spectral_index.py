@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the spectral index
+================================
+
+Test the :class:`eieio.measurement.spectral_index.SpectralIndex` class and its use
+through :meth:`eieio.measurement.measurement_group.Group.spectral_index`.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from eieio.measurement.colorimetry_index import sidecar_path
+from eieio.measurement.group_manifest import write_group_manifest
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.measurement_group import Group
+from eieio.measurement.spectral_index import SPECTRAL_INDEX_SUFFIX, SpectralIndex
+from eieio.measurement.spdx_io import write_measurement
+
+SHAPE = (380, 780, 10)
+WAVELENGTHS = np.arange(380, 781, 10)
+
+
+def smooth_spectra(rng, n):
+    # sums of a few broad gaussians, so most of the variance is in a few components
+    centres = rng.uniform(400, 760, (n, 3, 1))
+    weights = rng.uniform(0, 1, (n, 3, 1))
+    return np.sum(weights * np.exp(-((WAVELENGTHS - centres) / 40) ** 2), axis=1)
+
+
+class TestSpectralIndex(unittest.TestCase):
+    def test_queries_match_brute_force(self):
+        rng = np.random.default_rng(11)
+        spectra = smooth_spectra(rng, 5000)
+        sources = np.array([f"m{i}" for i in range(len(spectra))], dtype=object)
+        index = SpectralIndex(SHAPE, sources, spectra, n_components=6)
+        for reference in smooth_spectra(rng, 5):
+            distances = np.linalg.norm(spectra - reference, axis=1)
+            nearest = index.nearest(reference, k=7)
+            self.assertEqual(list(sources[np.argsort(distances)[:7]]), [source for source, _ in nearest])
+            np.testing.assert_allclose(np.sort(distances)[:7], [d for _, d in nearest])
+            threshold = np.sort(distances)[20]
+            within = index.within(reference, threshold)
+            self.assertEqual(set(sources[distances <= threshold]), {source for source, _ in within})
+            self.assertEqual(sorted(d for _, d in within), [d for _, d in within])
+
+    def test_resampled_reference_and_round_trip(self):
+        rng = np.random.default_rng(3)
+        spectra = smooth_spectra(rng, 200)
+        index = SpectralIndex(SHAPE, [f"m{i}" for i in range(len(spectra))], spectra, n_components=4)
+        fine_wavelengths = np.arange(380, 781, 5)
+        fine = np.interp(fine_wavelengths, WAVELENGTHS, spectra[42])
+        self.assertEqual(('m42', 0.0), index.nearest(fine, wavelengths=fine_wavelengths)[0])
+        with self.assertRaises(ValueError):
+            index.nearest(fine)
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'index.npz')
+            index.save(path)
+            loaded = SpectralIndex.load(path)
+        self.assertEqual(index.shape, loaded.shape)
+        np.testing.assert_array_equal(index.projections, loaded.projections)
+        self.assertEqual(index.nearest(spectra[7], k=3), loaded.nearest(spectra[7], k=3))
+
+    def test_group_index_skips_placeholders_and_is_persisted(self):
+        rng = np.random.default_rng(5)
+        with TemporaryDirectory() as tmp_dir:
+            filenames = []
+            for i, spectrum in enumerate(smooth_spectra(rng, 4)):
+                m = Measurement()
+                m.wavelengths = WAVELENGTHS
+                m.values = spectrum
+                filenames.append(f"sample.{i:04}.spdx")
+                write_measurement(m, Path(tmp_dir, filenames[-1]))
+            placeholder = Measurement()
+            placeholder.wavelengths = np.array([360.0, 830.0])
+            placeholder.values = np.array([0.0, 0.0])
+            filenames.append('placeholder.spdx')
+            write_measurement(placeholder, Path(tmp_dir, filenames[-1]))
+            group_file = Path(tmp_dir, 'g.mgm')
+            write_group_manifest(group_file, 'g', {tmp_dir: filenames})
+            group = Group(group_file)
+            index = group.spectral_index(SHAPE, n_components=3)
+            self.assertEqual(4, len(index))
+            self.assertNotIn(str(Path(tmp_dir, 'placeholder.spdx')), list(index.sources))
+            self.assertIs(index, group.spectral_index(SHAPE, n_components=3))
+            key = ('spectra', tuple(float(x) for x in SHAPE), 3)
+            self.assertTrue(sidecar_path(group_file, key, SPECTRAL_INDEX_SUFFIX).exists())
+            reloaded = Group(group_file).spectral_index(SHAPE, n_components=3)
+            self.assertIsNot(index, reloaded)
+            self.assertEqual(index.digest, reloaded.digest)
+            target = group.collections[tmp_dir]['sample.0002.spdx'].values
+            self.assertEqual(str(Path(tmp_dir, 'sample.0002.spdx')), reloaded.nearest(target)[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the stimulus memo
+================================
+
+Test :mod:`eieio.measurement.stimulus_memo` and the round trip of reused measurements.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from eieio.measurement.colorimetry import Colorimetry
+from eieio.measurement.measurement import Measurement
+from eieio.measurement.spdx_io import read_measurement, write_measurement
+from eieio.measurement.stimulus_memo import StimulusMemo
+
+WHITE = {'name': 'white', 'space': 'deviceRGB', 'value': [1.0, 1.0, 1.0]}
+GRAY = {'name': 'gray', 'space': 'deviceRGB', 'value': [0.5, 0.5, 0.5]}
+
+
+def measurement_of(luminance):
+    measurement = Measurement()
+    measurement.wavelengths = [380, 780]
+    measurement.values = [1.0, 1.0]
+    measurement.insert_colorimetry(Colorimetry('CIE 1931 2 Degree Standard Observer', 'CIE XYZ', 'D65',
+                                               [0.95 * luminance, luminance, 1.08 * luminance], 'measured'))
+    return measurement
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStimulusMemo(unittest.TestCase):
+    def test_reuse_within_staleness_window(self):
+        clock = Clock()
+        memo = StimulusMemo(staleness=60, clock=clock)
+        self.assertIsNone(memo.reuse(WHITE))
+        memo.record(WHITE, 'sample.0.white.spdx', measurement_of(100))
+        clock.now = 30
+        # the same stimulus under another name is the same stimulus
+        reused = memo.reuse(dict(WHITE, name='white again', value=[1.0, 1.0, 1.0 + 1e-9]))
+        self.assertEqual('sample.0.white.spdx', reused.reused_from)
+        self.assertEqual(measurement_of(100).colorimetry.keys(), reused.colorimetry.keys())
+        self.assertIsNone(memo.reuse(GRAY))
+        clock.now = 61
+        self.assertIsNone(memo.reuse(WHITE))
+        self.assertEqual(0, len(memo))
+        self.assertEqual(1, memo.reused)
+
+    def test_drift_guard(self):
+        clock = Clock()
+        memo = StimulusMemo(staleness=None, drift_guard_every=3, anchors=['white'], drift_tolerance=0.05, clock=clock)
+        memo.record(WHITE, 'w0', measurement_of(100))
+        memo.record(GRAY, 'g0', measurement_of(20))
+        # every third occurrence of the anchor is measured again
+        self.assertIsNotNone(memo.reuse(WHITE))
+        self.assertIsNotNone(memo.reuse(WHITE))
+        self.assertIsNone(memo.reuse(WHITE))
+        check = memo.record(WHITE, 'w3', measurement_of(101))
+        self.assertAlmostEqual(0.01, check.drift)
+        self.assertFalse(check.exceeded)
+        self.assertEqual('w3', memo.reuse(WHITE).reused_from)
+        # non-anchors are reused whenever they are fresh
+        for _ in range(5):
+            self.assertEqual('g0', memo.reuse(GRAY).reused_from)
+        self.assertIsNotNone(memo.reuse(WHITE))
+        self.assertIsNone(memo.reuse(WHITE))
+        check = memo.record(WHITE, 'w6', measurement_of(90))
+        self.assertTrue(check.exceeded)
+        # what was measured before the drift can no longer be trusted
+        self.assertIsNone(memo.reuse(GRAY))
+        self.assertEqual(['w3', 'w6'], [c.filename for c in memo.drift_checks])
+        with self.assertRaises(ValueError):
+            StimulusMemo(drift_guard_every=0)
+
+    def test_reuse_survives_round_trip(self):
+        memo = StimulusMemo()
+        memo.record(WHITE, 'sample.0.white.spdx', measurement_of(100))
+        reused = memo.reuse(WHITE)
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'sample.1.white.spdx')
+            reused.path = str(path)
+            write_measurement(reused)
+            self.assertEqual('sample.0.white.spdx', read_measurement(path).reused_from)
+            read_back = Measurement(path=str(path))
+            read_back.read()
+            self.assertEqual('sample.0.white.spdx', read_back.reused_from)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,7 +24,9 @@ from services.metering.metering_pb2 import (IntegrationMode, MeasurementMode,
                                             StatusResponse, CalibrationsUsedAndLeft,
                                             ConfigurationResponse,
                                             CalibrationResponse,
-                                            CaptureResponse,
+                                            CaptureResponse, CaptureError, CaptureSpecificErrorCode,
+                                            GenericErrorCode, RetrievalError,
+                                            CaptureManyResponse, RetrieveManyResponse,
                                             Observer, ColorSpace, Illuminant, TristimulusMeasurement,
                                             RetrievalResponse, SpectralMeasurement)
 from services.metering.metering_pb2_grpc import MeteringServicer, add_MeteringServicer_to_server
@@ -32,7 +34,9 @@ from services.ports import PORT_METERING
 
 from utilities.log import Log, LogEvent
 
-from eieio.meter.minolta.cs2000 import CS2000, cs2000_tty_path
+from eieio.meter.meter_abstractions import MeterError
+from eieio.meter.minolta.cs2000 import (CS2000, cs2000_tty_path, ExcessiveBrightnessOrFlicker,
+                                        MeasurementInProgress, ReadTimeout)
 from eieio.meter.xrite.i1pro import I1Pro
 
 
@@ -46,7 +50,7 @@ class MeteringService(MeteringServicer):
         meter.set_color_space(ColorSpace.CIE_XYZ)
         meter.set_illuminant(Illuminant.D65)
 
-    def __init__(self):
+    def __init__(self, meters=None):
         self._log = None
         self.log = Log()
         self.log.event_mask = (
@@ -58,8 +62,16 @@ class MeteringService(MeteringServicer):
                 LogEvent.METER_SPECTRAL_RETRIEVAL |
                 LogEvent.METER_COLORIMETRIC_RETRIEVAL
         )
-        I1Pro.populate_registry()
         self._meters = dict()
+        # one worker thread per meter: meters are triggered concurrently by CaptureMany, but each
+        # meter only ever sees one request at a time, whichever gRPC thread it arrives on
+        self._meter_threads = dict()
+        self._meter_threads_lock = threading.Lock()
+        if meters is not None:
+            # meters set up by the caller, keyed by name, stand in for those found attached
+            self._meters.update(meters)
+            return
+        I1Pro.populate_registry()
         for meter_name, _ in I1Pro.meter_names_and_models():
             meter = I1Pro(meter_name=meter_name)
             meter.set_log_options(LogEvent.EVERYTHING)
@@ -87,11 +99,49 @@ class MeteringService(MeteringServicer):
     def meters(self):
         return self._meters
 
+    def _meter_thread(self, meter_name):
+        with self._meter_threads_lock:
+            executor = self._meter_threads.get(meter_name)
+            if executor is None:
+                executor = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"meter_{meter_name}")
+                self._meter_threads[meter_name] = executor
+            return executor
+
+    def _on_meter_thread(self, meter_name, fn, *args):
+        return self._meter_thread(meter_name).submit(fn, *args)
+
+    def _check_meter_names(self, meter_names, context, where):
+        for meter_name in meter_names:
+            if meter_name not in self.meters.keys():
+                self.log.add(LogEvent.METER_TRIGGER, f"could not find meter named `{meter_name}", where)
+                context.abort(grpc.StatusCode.NOT_FOUND, f"No meter_desc named `{meter_name}' found")
+        if len(set(meter_names)) != len(meter_names):
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"meters named more than once in {', '.join(meter_names)}")
+
     def shutdown(self):
+        for executor in self._meter_threads.values():
+            executor.shutdown(wait=True)
         for meter in self.meters.values():
             meter.close()
             del meter
 
+    @staticmethod
+    def generic_error_code(error):
+        """
+        Categorize a meter's exception so a client can tell what is worth retrying
+        """
+        if isinstance(error, MeasurementInProgress):
+            return GenericErrorCode.DEVICE_BUSY
+        if isinstance(error, ReadTimeout):
+            return GenericErrorCode.DEVICE_UNRESPONSIVE
+        if isinstance(error, SerialException):
+            return GenericErrorCode.DEVICE_DISCONNECTED
+        return GenericErrorCode.UNCATEGORIZED_ERROR
+
+    @staticmethod
+    def error_details(error):
+        return getattr(error, 'what', None) or str(error) or type(error).__name__
+
     def meter_description(self, name):
         if name not in self.meters.keys():
             return None
@@ -199,12 +249,29 @@ class MeteringService(MeteringServicer):
 
     def Capture(self, request, context):
         meter_name = request.meter_name.name
-        if meter_name not in self.meters.keys():
-            self.log.add(LogEvent.METER_TRIGGER, f"could not find meter named `{meter_name}", 'MeteringServer.Capture')
-            context.abort(grpc.StatusCode.NOT_FOUND, f"No meter_desc named `{meter_name}' found")
+        self._check_meter_names([meter_name], context, 'MeteringServer.Capture')
+        return self._on_meter_thread(meter_name, self._capture, meter_name).result()
+
+    def CaptureMany(self, request, context):
+        meter_names = [capture_request.meter_name.name for capture_request in request.requests]
+        self._check_meter_names(meter_names, context, 'MeteringServer.CaptureMany')
+        self.log.add(LogEvent.METER_TRIGGER, f"triggering {', '.join(meter_names)}", 'MeteringServer.CaptureMany')
+        pending = [self._on_meter_thread(meter_name, self._capture, meter_name) for meter_name in meter_names]
+        return CaptureManyResponse(responses=[future.result() for future in pending])
+
+    def _capture(self, meter_name):
         meter = self.meters[meter_name]
-        self.log.add(LogEvent.METER_TRIGGER, 'triggering measurement', 'MeteringServer.Capture')
-        raw_estimated_duration = meter.trigger_measurement()
+        self.log.add(LogEvent.METER_TRIGGER, f"triggering measurement with `{meter_name}'", 'MeteringServer.Capture')
+        try:
+            raw_estimated_duration = meter.trigger_measurement()
+        except ExcessiveBrightnessOrFlicker as e:
+            self.log.add(LogEvent.METER_TRIGGER, f"capture failed: {e.what}", 'MeteringServer.Capture')
+            return CaptureResponse(error=CaptureError(capture_specific=CaptureSpecificErrorCode.SKETCHY_ILLUMINATION,
+                                                      message=MeteringService.error_details(e)))
+        except (MeterError, SerialException) as e:
+            self.log.add(LogEvent.METER_TRIGGER, f"capture failed: {e}", 'MeteringServer.Capture')
+            return CaptureResponse(error=CaptureError(generic=MeteringService.generic_error_code(e),
+                                                      message=MeteringService.error_details(e)))
         estimated_duration = Duration()
         self.log.add(LogEvent.METER_TRIGGER, f"estimated duration of measurement: {estimated_duration}")
         estimated_duration.seconds = raw_estimated_duration
@@ -221,11 +288,28 @@ class MeteringService(MeteringServicer):
         self.log.add(LogEvent.METER_SPECTRAL_RETRIEVAL | LogEvent.METER_COLORIMETRIC_RETRIEVAL,
                      "retrieving results", "MeteringService.Retrieve")
         meter_name = request.meter_name.name
-        if meter_name not in self.meters.keys():
+        self._check_meter_names([meter_name], context, 'MeteringService.Retrieve')
+        return self._on_meter_thread(meter_name, self._retrieve_reporting_errors, request).result()
+
+    def RetrieveMany(self, request, context):
+        meter_names = [retrieval_request.meter_name.name for retrieval_request in request.requests]
+        self._check_meter_names(meter_names, context, 'MeteringService.RetrieveMany')
+        pending = [self._on_meter_thread(retrieval_request.meter_name.name, self._retrieve_reporting_errors,
+                                         retrieval_request)
+                   for retrieval_request in request.requests]
+        return RetrieveManyResponse(responses=[future.result() for future in pending])
+
+    def _retrieve_reporting_errors(self, request):
+        meter = self.meters[request.meter_name.name]
+        try:
+            return self._retrieve(meter, request)
+        except (MeterError, SerialException) as e:
             self.log.add(LogEvent.METER_SPECTRAL_RETRIEVAL | LogEvent.METER_COLORIMETRIC_RETRIEVAL,
-                         f"could not find meter named `{meter_name}")
-            context.abort(grpc.StatusCode.NOT_FOUND, f"No meter_desc named `{meter_name}' found")
-        meter = self.meters[meter_name]
+                         f"retrieval failed: {e}", 'MeteringService.Retrieve')
+            return RetrievalResponse(error=RetrievalError(generic=MeteringService.generic_error_code(e),
+                                                          details=MeteringService.error_details(e)))
+
+    def _retrieve(self, meter, request):
         spectral_requested = request.spectrum_requested
         if request.colorimetric_configurations:
             self.log.add(LogEvent.METER_COLORIMETRIC_RETRIEVAL, "requested colorimetric configurations:",
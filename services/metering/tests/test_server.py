@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the metering service
+================================
+
+Test :class:`services.metering.server.MeteringService` against fake meters.
+
+"""
+
+__author__ = 'Joseph Goldstone'
+__copyright__ = 'Copyright (C) 2021 Arnold & Richter Cine Technik GmbH & Co. Betriebs KG'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Joseph Goldstone'
+__email__ = 'jgoldstone@arri.com'
+__status__ = 'Experimental'
+
+__all__ = [
+]
+
+import threading
+import unittest
+
+import grpc
+
+from eieio.meter.minolta.cs2000 import ExcessiveBrightnessOrFlicker, MeasurementInProgress, ReadTimeout
+from services.metering.metering_pb2 import (CaptureSpecificErrorCode, GenericErrorCode, MeterName,
+                                            ColorimetricConfiguration, Observer, ColorSpace, Illuminant,
+                                            CaptureRequest, CaptureManyRequest,
+                                            RetrievalRequest, RetrieveManyRequest)
+from services.metering.server import MeteringService
+
+XYY_D65 = ColorimetricConfiguration(observer=Observer.CIE_1931_2_DEGREE_STANDARD_OBSERVER,
+                                    color_space=ColorSpace.CIE_xyY, illuminant=Illuminant.D65)
+
+
+class FakeMeter(object):
+    """Remembers the thread each call ran on, optionally waits for others at a barrier, and fails as told"""
+    def __init__(self, barrier=None, capture_error=None, retrieval_error=None):
+        self.barrier = barrier
+        self.capture_error = capture_error
+        self.retrieval_error = retrieval_error
+        self.threads = set()
+
+    def _called(self):
+        self.threads.add(threading.current_thread().name)
+
+    def trigger_measurement(self):
+        self._called()
+        if self.barrier is not None:
+            # only returns once every meter sharing the barrier is capturing at the same time
+            self.barrier.wait()
+        if self.capture_error is not None:
+            raise self.capture_error
+        return 2
+
+    def spectral_range_supported(self):
+        return 380, 780
+
+    def spectral_resolution(self):
+        return 10
+
+    def spectral_distribution(self):
+        self._called()
+        if self.retrieval_error is not None:
+            raise self.retrieval_error
+        return [0.01 * i for i in range(41)]
+
+    def illuminant(self):
+        return Illuminant.D65
+
+    def colorimetry(self):
+        return 0.3127, 0.329, 100.0
+
+    def close(self):
+        pass
+
+
+class Aborted(Exception):
+    pass
+
+
+class FakeContext(object):
+    """Raises, as a gRPC servicer context does, when a call is aborted"""
+    def __init__(self):
+        self.code = None
+
+    def abort(self, code, details):
+        self.code = code
+        raise Aborted(details)
+
+
+def capture_many(*names):
+    return CaptureManyRequest(requests=[CaptureRequest(meter_name=MeterName(name=name)) for name in names])
+
+
+def retrieve_many(*names):
+    return RetrieveManyRequest(requests=[RetrievalRequest(meter_name=MeterName(name=name), spectrum_requested=True,
+                                                          colorimetric_configurations=[XYY_D65])
+                                         for name in names])
+
+
+class TestMeteringService(unittest.TestCase):
+    def service(self, **meters):
+        service = MeteringService(meters=meters)
+        self.addCleanup(service.shutdown)
+        return service
+
+    def test_meters_capture_concurrently_each_on_its_own_thread(self):
+        barrier = threading.Barrier(2, timeout=5)
+        left, right = FakeMeter(barrier), FakeMeter(barrier)
+        service = self.service(left=left, right=right)
+        for _ in range(3):
+            response = service.CaptureMany(capture_many('left', 'right'), FakeContext())
+            self.assertEqual([2, 2], [r.estimated_duration.seconds for r in response.responses])
+        # a single capture or retrieval goes to the same thread as the batched ones
+        left.barrier = None
+        service.Capture(CaptureRequest(meter_name=MeterName(name='left')), FakeContext())
+        service.RetrieveMany(retrieve_many('left', 'right'), FakeContext())
+        self.assertEqual(1, len(left.threads))
+        self.assertEqual(1, len(right.threads))
+        self.assertNotEqual(left.threads, right.threads)
+
+    def test_errors_are_reported_per_meter(self):
+        service = self.service(ok=FakeMeter(),
+                               flickering=FakeMeter(capture_error=ExcessiveBrightnessOrFlicker('flicker detected')),
+                               slow=FakeMeter(capture_error=ReadTimeout(5)),
+                               busy=FakeMeter(retrieval_error=MeasurementInProgress('still measuring')))
+        ok, flickering, slow = service.CaptureMany(capture_many('ok', 'flickering', 'slow'), FakeContext()).responses
+        self.assertFalse(ok.HasField('error'))
+        self.assertEqual(CaptureSpecificErrorCode.SKETCHY_ILLUMINATION, flickering.error.capture_specific)
+        self.assertEqual('flicker detected', flickering.error.message)
+        self.assertEqual(GenericErrorCode.DEVICE_UNRESPONSIVE, slow.error.generic)
+        self.assertIn('5-second read timeout', slow.error.message)
+        ok, busy = service.RetrieveMany(retrieve_many('ok', 'busy'), FakeContext()).responses
+        self.assertFalse(ok.HasField('error'))
+        self.assertEqual(41, len(ok.spectral_measurement.values))
+        self.assertAlmostEqual(100.0, ok.tristimulus_measurements[0].third)
+        self.assertEqual(GenericErrorCode.DEVICE_BUSY, busy.error.generic)
+        self.assertEqual('still measuring', busy.error.details)
+
+    def test_unknown_or_repeated_meters_abort(self):
+        service = self.service(ok=FakeMeter())
+        context = FakeContext()
+        with self.assertRaises(Aborted):
+            service.CaptureMany(capture_many('ok', 'missing'), context)
+        self.assertEqual(grpc.StatusCode.NOT_FOUND, context.code)
+        with self.assertRaises(Aborted):
+            service.RetrieveMany(retrieve_many('ok', 'ok'), context)
+        self.assertEqual(grpc.StatusCode.INVALID_ARGUMENT, context.code)
+
+
+if __name__ == '__main__':
+    unittest.main()